@@ -171,3 +171,25 @@ class DispatchTruckAssignment(db.Model):
             "route_name": self.route.route_name if self.route else None,
             "notes": self.notes,
         }
+
+
+class VehicleBreadcrumb(db.Model):
+    """One GPS fix from the Samsara poller.  Append-only; on PostgreSQL the
+    table is range-partitioned by day on recorded_at (see
+    app.Services.vehicle_breadcrumbs), so retention drops whole days."""
+
+    __tablename__ = "vehicle_breadcrumbs"
+
+    vehicle_id = db.Column(db.String(128), primary_key=True)
+    recorded_at = db.Column(db.DateTime, primary_key=True)
+    lat = db.Column(db.Float, nullable=False)
+    lon = db.Column(db.Float, nullable=False)
+    heading = db.Column(db.SmallInteger, nullable=True)
+    speed = db.Column(db.Float, nullable=True)
+    branch_code = db.Column(db.String(32), nullable=True)
+
+    __table_args__ = (
+        # Rows arrive in time order, so a BRIN index stays tiny and still
+        # narrows "everything around this instant" to a few block ranges.
+        db.Index("ix_vehicle_breadcrumbs_recorded_at", "recorded_at", postgresql_using="brin"),
+    )
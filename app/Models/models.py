@@ -109,6 +109,8 @@ class AuditEvent(db.Model):
     actor = db.relationship('Pickster', backref=db.backref('audit_events', lazy=True))
     notes = db.Column(db.Text)
     occurred_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    # Kiosk-generated id of the scan that produced this event; makes offline replays idempotent.
+    client_scan_id = db.Column(db.String(64), nullable=True, unique=True, index=True)
 
 
 # ---------------------------------------------------------------------------
@@ -266,8 +268,13 @@ class ERPMirrorCustomer(db.Model, MirrorSyncMetadataMixin):
     credit_account = db.Column(db.Boolean, nullable=True)
     cust_type = db.Column(db.String(32), nullable=True)
     branch_code = db.Column(db.String(32), nullable=True, index=True)
+    # Canonical join keys, computed by the database on every sync write.
+    cust_key_norm = db.Column(db.String(64), db.Computed("TRIM(cust_key)", persisted=True))
+    cust_code_norm = db.Column(db.String(64), db.Computed("TRIM(cust_code)", persisted=True))
     __table_args__ = (
         db.UniqueConstraint('cust_key', name='uq_erp_mirror_cust_key'),
+        db.Index('ix_erp_mirror_cust_key_norm', 'cust_key_norm'),
+        db.Index('ix_erp_mirror_cust_code_norm', 'cust_code_norm'),
     )
 
 
@@ -289,8 +296,11 @@ class ERPMirrorCustomerShipTo(db.Model, MirrorSyncMetadataMixin):
     lon = db.Column(db.Numeric(9, 6), nullable=True)
     geocoded_at = db.Column(db.DateTime, nullable=True)
     geocode_source = db.Column(db.String(64), nullable=True)
+    cust_key_norm = db.Column(db.String(64), db.Computed("TRIM(cust_key)", persisted=True))
+    seq_num_norm = db.Column(db.String(32), db.Computed("TRIM(seq_num)", persisted=True))
     __table_args__ = (
         db.UniqueConstraint('cust_key', 'seq_num', name='uq_erp_mirror_cust_shipto_key'),
+        db.Index('ix_erp_mirror_cust_shipto_norm_key', 'cust_key_norm', 'seq_num_norm'),
     )
 
 
@@ -354,8 +364,11 @@ class ERPMirrorSalesOrderHeader(db.Model, MirrorSyncMetadataMixin):
     order_writer = db.Column(db.String(64), nullable=True)
     po_number = db.Column(db.String(128), nullable=True)
     branch_code = db.Column(db.String(32), nullable=True, index=True)
+    cust_key_norm = db.Column(db.String(64), db.Computed("TRIM(cust_key)", persisted=True))
+    shipto_seq_norm = db.Column(db.String(32), db.Computed("TRIM(shipto_seq_num)", persisted=True))
     __table_args__ = (
         db.UniqueConstraint('system_id', 'so_id', name='uq_erp_mirror_so_header_key'),
+        db.Index('ix_erp_mirror_so_header_cust_norm', 'cust_key_norm', 'shipto_seq_norm'),
     )
 
 
@@ -586,6 +599,107 @@ class DashboardStats(db.Model):
     handling_breakdown_json = db.Column(db.Text, nullable=True)   # JSON dict {code: count}
     open_work_orders = db.Column(db.Integer, nullable=False, default=0)
     updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Workcenter tiles (v2), written by DashboardStatsBuilder on its own cadence.
+    sales_open_orders = db.Column(db.Integer, nullable=True)
+    sales_orders_today = db.Column(db.Integer, nullable=True)
+    todays_deliveries = db.Column(db.Integer, nullable=True)
+    picks_completed_today = db.Column(db.Integer, nullable=True)
+    # Bumped by every writer whenever the row's values change; homepage ETags are built from it.
+    stats_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+
+class DashboardScopeStats(db.Model):
+    """Workcenter tiles that aren't per branch: one 'all' row (scope_key '*')
+    and one 'rep' row per sales rep.  Written with dashboard_stats."""
+    __tablename__ = 'dashboard_scope_stats'
+    scope = db.Column(db.String(16), primary_key=True)       # 'all' | 'rep'
+    scope_key = db.Column(db.String(64), primary_key=True)   # '*' or rep_id
+    sales_open_orders = db.Column(db.Integer, nullable=True)
+    sales_orders_today = db.Column(db.Integer, nullable=True)
+    picks_completed_today = db.Column(db.Integer, nullable=True)
+    total_pickers = db.Column(db.Integer, nullable=True)
+    active_pickers = db.Column(db.Integer, nullable=True)
+    pending_po_reviews = db.Column(db.Integer, nullable=True)
+    stats_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class DeliveryOrderFact(db.Model):
+    """One delivered order (store + ship_date + SO) with the reporting rules
+    already applied.  Maintained by DeliveryFactStore one ship date at a time."""
+    __tablename__ = 'erp_delivery_order_facts'
+    id = db.Column(db.Integer, primary_key=True)
+    store = db.Column(db.String(32), nullable=False)
+    ship_date = db.Column(db.Date, nullable=False)
+    so_id = db.Column(db.String(64), nullable=False)
+    sale_type = db.Column(db.String(64), nullable=False)
+    sale_type_group = db.Column(db.String(64), nullable=False)
+    ship_via = db.Column(db.String(128), nullable=False)
+    ship_via_bucket = db.Column(db.String(128), nullable=False)
+    order_date = db.Column(db.Date, nullable=True)
+    order_time = db.Column(db.Time, nullable=True)
+    same_day_flag = db.Column(db.Boolean, nullable=False, default=False)
+    same_day_after_noon_flag = db.Column(db.Boolean, nullable=False, default=False)
+    shipped_line_count = db.Column(db.Integer, nullable=False, default=0)
+    unique_item_count = db.Column(db.Integer, nullable=False, default=0)
+    total_shipped_qty = db.Column(db.Float, nullable=False, default=0)
+    reference_piece_count = db.Column(db.Float, nullable=False, default=0)
+    __table_args__ = (
+        db.Index('ix_erp_delivery_order_facts_date_store', 'ship_date', 'store', 'so_id'),
+        db.Index('ix_erp_delivery_order_facts_store_so', 'store', 'so_id'),
+    )
+
+
+class DeliveryDailyRollup(db.Model):
+    """Delivery metrics summed per store, ship date, sale type group and ship-via
+    bucket; month / store / sale-type rollups are sums of these rows."""
+    __tablename__ = 'erp_delivery_daily_rollups'
+    id = db.Column(db.Integer, primary_key=True)
+    store = db.Column(db.String(32), nullable=False)
+    ship_date = db.Column(db.Date, nullable=False)
+    sale_type_group = db.Column(db.String(64), nullable=False)
+    ship_via_bucket = db.Column(db.String(128), nullable=False)
+    delivered_orders = db.Column(db.Integer, nullable=False, default=0)
+    same_day_delivered_orders = db.Column(db.Integer, nullable=False, default=0)
+    same_day_after_noon_count = db.Column(db.Integer, nullable=False, default=0)
+    total_shipped_qty = db.Column(db.Float, nullable=False, default=0)
+    reference_piece_count = db.Column(db.Float, nullable=False, default=0)
+    __table_args__ = (
+        db.UniqueConstraint('ship_date', 'store', 'sale_type_group', 'ship_via_bucket', name='uq_erp_delivery_daily_rollups_key'),
+    )
+
+
+class SearchDocument(db.Model):
+    """One global-search hit (sales order, customer, ship-to, work order, PO or
+    pick).  Maintained by SearchIndex from the mirror tables and local writes;
+    on PostgreSQL a generated tsvector column and trigram index back it."""
+    __tablename__ = 'search_documents'
+    id = db.Column(db.Integer, primary_key=True)
+    entity_type = db.Column(db.String(16), nullable=False)
+    entity_key = db.Column(db.String(160), nullable=False)
+    system_id = db.Column(db.String(32), nullable=True)
+    title = db.Column(db.String(255), nullable=False)
+    subtitle = db.Column(db.String(255), nullable=True)
+    target = db.Column(db.String(128), nullable=True)  # key the result URL is built from
+    keywords = db.Column(db.String(255), nullable=False, default='')  # normalized identifiers
+    search_text = db.Column(db.Text, nullable=False, default='')  # normalized tokens
+    sort_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    __table_args__ = (
+        db.UniqueConstraint('entity_type', 'entity_key', name='uq_search_documents_entity'),
+    )
+
+
+class GeocodeCacheEntry(db.Model):
+    """Remote geocoder answer for one normalized address (make_key), kept so
+    the same address is never fetched twice.  A row with no lat/lon is a
+    negative result and is retried once it is older than the negative TTL."""
+    __tablename__ = 'geocode_cache'
+    address_key = db.Column(db.String(512), primary_key=True)
+    lat = db.Column(db.Numeric(9, 6), nullable=True)
+    lon = db.Column(db.Numeric(9, 6), nullable=True)
+    source = db.Column(db.String(64), nullable=False)
+    fetched_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
 
 # -------------------------------------------------------------------
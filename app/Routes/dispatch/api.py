@@ -1,7 +1,17 @@
-from datetime import datetime
-from flask import jsonify, request, send_file
+from datetime import datetime, timedelta
+from flask import Response, jsonify, request
 from app.Routes.dispatch import dispatch_bp
-from app.Routes.dispatch.helpers import dispatch_service, erp_service, samsara_service
+from app.Routes.dispatch.helpers import (
+    _stop_window, _with_route_assignment, dispatch_service, erp_service, samsara_service,
+)
+from app.runtime_settings import get_manifest_settings
+from app.Services.spatial_index import get_spatial_index, stop_key
+from app.Services.vehicle_breadcrumbs import get_breadcrumb_store, parse_located_at
+
+MAX_TRACK_RANGE = timedelta(days=7)
+MAX_SPATIAL_RADIUS_MILES = 250
+MAX_NEAREST = 50
+MANIFEST_CHUNK_BYTES = 64 * 1024
 
 
 @dispatch_bp.get("/api/health")
@@ -25,20 +35,159 @@ def branches():
 def manifest():
     payload = request.get_json(silent=True) or {}
     items = payload.get("items") or []
-    if not isinstance(items, list) or not (1 <= len(items) <= 10):
-        return jsonify({"error": "Provide between 1 and 10 items."}), 400
-    pdf_buffer = dispatch_service.generate_manifest_pdf(items)
-    return send_file(
-        pdf_buffer,
+    max_items = get_manifest_settings()["max_items"]
+    if not isinstance(items, list) or not (1 <= len(items) <= max_items):
+        return jsonify({"error": f"Provide between 1 and {max_items} items."}), 400
+    if not all(isinstance(item, dict) for item in items):
+        return jsonify({"error": "Each item must be an object."}), 400
+    pdf_file = dispatch_service.generate_manifest_pdf(items)
+    size = pdf_file.seek(0, 2)
+    pdf_file.seek(0)
+    return Response(
+        _stream_file(pdf_file),
         mimetype="application/pdf",
-        as_attachment=True,
-        download_name="dispatch-manifest.pdf",
+        headers={
+            "Content-Length": str(size),
+            "Content-Disposition": 'attachment; filename="dispatch-manifest.pdf"',
+        },
+        direct_passthrough=True,
     )
 
 
+def _stream_file(handle, chunk_size=MANIFEST_CHUNK_BYTES):
+    try:
+        while True:
+            chunk = handle.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        handle.close()
+
+
 @dispatch_bp.get("/api/vehicles/live")
 def live_vehicles():
     branch = request.args.get("branch")
     limit = request.args.get("limit", type=int)
     payload = samsara_service.get_dispatch_vehicle_payload(branch=branch, limit=limit)
     return jsonify(payload)
+
+
+@dispatch_bp.get("/api/vehicles/<vehicle_id>/track")
+def vehicle_track(vehicle_id):
+    """Breadcrumbs for one vehicle between ``start`` and ``end`` (ISO 8601, UTC).
+    Defaults to the last two hours; ranges are capped at seven days."""
+    end = parse_located_at(request.args.get("end")) or datetime.utcnow()
+    start = parse_located_at(request.args.get("start")) or end - timedelta(hours=2)
+    if start >= end or end - start > MAX_TRACK_RANGE:
+        return jsonify({"error": "start must be before end and within 7 days of it."}), 400
+    points = get_breadcrumb_store().track(vehicle_id, start, end)
+    return jsonify({
+        "vehicle_id": vehicle_id,
+        "start": start.isoformat() + "Z",
+        "end": end.isoformat() + "Z",
+        "count": len(points),
+        "points": points,
+    })
+
+
+@dispatch_bp.get("/api/vehicles/positions")
+def vehicle_positions():
+    """Every vehicle's last recorded position at ``at`` (ISO 8601, UTC; default now)."""
+    at = parse_located_at(request.args.get("at")) or datetime.utcnow()
+    positions = get_breadcrumb_store().positions_at(at, branch=request.args.get("branch"))
+    return jsonify({"at": at.isoformat() + "Z", "count": len(positions), "vehicles": positions})
+
+
+def _vehicle_index():
+    """The spatial index's vehicle grid, synced with the poller's latest snapshot."""
+    index = get_spatial_index()
+    payload = samsara_service.get_dispatch_vehicle_payload()
+    version = payload.get("fetched_at") if payload.get("source") == "samsara" else None
+    index.sync_vehicles(payload.get("vehicles") or [], version=version)
+    return index.vehicles
+
+
+def _find_stop(index, so_id, shipment_num=None):
+    hit = index.get(stop_key({"id": so_id, "shipment_num": shipment_num}))
+    if hit is None:
+        hit = next(((lat, lon, item) for _key, lat, lon, item in index.items() if str(item.get("id")) == so_id), None)
+    return hit
+
+
+@dispatch_bp.get("/api/spatial/<kind>")
+def spatial_query(kind):
+    """Stops or vehicles near a point, nearest first.
+
+    The centre is ``lat``/``lon``, ``near_vehicle=<id>`` or
+    ``near_stop=<so_id>`` (plus ``shipment_num``).  ``radius_miles`` returns
+    everything within it; otherwise the ``k`` nearest (default 5).  Stop
+    queries use the /api/stops window (``start``, ``end``, ``branch``) and
+    take ``unassigned=1``; vehicle queries filter on ``branch``.
+    """
+    if kind not in ("stops", "vehicles"):
+        return jsonify({"error": "kind must be stops or vehicles."}), 404
+    start, end, branch = _stop_window(request.args)
+    stops = get_spatial_index().stops(start, end, branch) if kind == "stops" or request.args.get("near_stop") else None
+    vehicles = _vehicle_index() if kind == "vehicles" or request.args.get("near_vehicle") else None
+
+    centre = {}
+    exclude = None
+    if request.args.get("near_vehicle"):
+        vehicle_id = request.args["near_vehicle"]
+        hit = vehicles.get(vehicle_id)
+        if hit is None:
+            return jsonify({"error": "Vehicle has no current position."}), 404
+        centre = {"vehicle_id": vehicle_id}
+        exclude = vehicle_id if kind == "vehicles" else None
+    elif request.args.get("near_stop"):
+        so_id = request.args["near_stop"]
+        hit = _find_stop(stops, so_id, request.args.get("shipment_num"))
+        if hit is None:
+            return jsonify({"error": "Stop is not in the window or has no coordinates."}), 404
+        centre = {"so_id": so_id}
+        exclude = stop_key(hit[2]) if kind == "stops" else None
+    else:
+        lat = request.args.get("lat", type=float)
+        lon = request.args.get("lon", type=float)
+        if lat is None or lon is None:
+            return jsonify({"error": "Provide lat and lon, near_vehicle or near_stop."}), 400
+        hit = (lat, lon, None)
+    centre.update({"lat": hit[0], "lon": hit[1]})
+
+    assignments = dispatch_service.get_route_assignments(start, end) if kind == "stops" else {}
+    if kind == "stops":
+        index = stops
+        unassigned_only = request.args.get("unassigned", "").lower() in ("1", "true", "yes", "y")
+
+        def wanted(stop):
+            return stop_key(stop) != exclude and not (unassigned_only and str(stop.get("id")) in assignments)
+    else:
+        index = vehicles
+        wanted_branch = (branch or "").upper()
+
+        def wanted(vehicle):
+            return (str(vehicle.get("id")) != exclude
+                    and (not wanted_branch or (vehicle.get("branch") or "").upper() == wanted_branch))
+
+    radius = request.args.get("radius_miles", type=float)
+    if radius is not None:
+        radius = min(max(radius, 0.0), MAX_SPATIAL_RADIUS_MILES)
+        hits = index.within(centre["lat"], centre["lon"], radius, predicate=wanted)
+        query = {"radius_miles": radius}
+    else:
+        k = min(max(request.args.get("k", 5, type=int), 1), MAX_NEAREST)
+        hits = index.nearest(centre["lat"], centre["lon"], k, predicate=wanted)
+        query = {"k": k}
+
+    results = []
+    for distance, _key, item in hits:
+        row = _with_route_assignment(item, assignments) if kind == "stops" else dict(item)
+        row["distance_miles"] = round(distance, 2)
+        results.append(row)
+    return jsonify({"kind": kind, "center": centre, **query, "count": len(results), "results": results})
+
+
+@dispatch_bp.get("/api/spatial/stats")
+def spatial_stats():
+    return jsonify(get_spatial_index().describe())
@@ -25,3 +25,35 @@ def _parse_iso_date(value: str, fallback: date) -> date:
         return datetime.fromisoformat(value).date()
     except Exception:
         return fallback
+
+
+def _stop_window(args):
+    """(start, end, branch) from query args, defaulting like /api/stops."""
+    today = date.today()
+    default_start = _add_business_days(today, -7)
+    default_end = _add_business_days(today, 1)
+    start = _parse_iso_date(args.get("start", default_start.isoformat()), default_start)
+    end = _parse_iso_date(args.get("end", default_end.isoformat()), default_end)
+    return start, end, args.get("branch")
+
+
+def _parse_bbox(value):
+    """"south,west,north,east" -> floats, or None when missing or malformed."""
+    try:
+        south, west, north, east = (float(part) for part in (value or "").split(","))
+    except ValueError:
+        return None
+    if south > north or west > east:
+        return None
+    return south, west, north, east
+
+
+def _with_route_assignment(stop, assignments):
+    """Copy of an indexed stop with the current local route assignment."""
+    assigned = assignments.get(str(stop.get("id")))
+    return {
+        **stop,
+        "route_assigned": assigned is not None,
+        "local_route_id": assigned["local_route_id"] if assigned else None,
+        "local_route_name": assigned["local_route_name"] if assigned else None,
+    }
@@ -4,8 +4,12 @@ from datetime import date
 from flask import jsonify, request, session
 from app.Routes.dispatch import dispatch_bp
 from app.Routes.dispatch.helpers import (
-    _parse_iso_date, dispatch_service, samsara_service,
+    _parse_iso_date, dispatch_service, erp_service, samsara_service,
 )
+from app.runtime_settings import get_route_optimization_settings
+
+# Keeps an optimize/plan request from tying up a worker thread.
+MAX_OPTIMIZE_BUDGET_MS = 10000
 
 
 def _current_user_id():
@@ -109,6 +113,73 @@ def remove_route_stop(route_id, stop_id):
     return jsonify({"ok": True})
 
 
+# ------------------------------------------------------------------
+# Route Optimization
+# ------------------------------------------------------------------
+
+def _optimize_budget(payload):
+    try:
+        budget = float(payload["time_budget_ms"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return min(max(budget, 10.0), MAX_OPTIMIZE_BUDGET_MS)
+
+
+@dispatch_bp.post("/api/routes/<int:route_id>/optimize")
+def optimize_route_stops(route_id):
+    payload = request.get_json(silent=True) or {}
+    result = dispatch_service.optimize_route(
+        route_id,
+        erp_service.get_dispatch_stop_locations,
+        apply=bool(payload.get("apply")),
+        yard=payload.get("yard"),
+        time_budget_ms=_optimize_budget(payload),
+    )
+    if result is None:
+        return jsonify({"error": "Route not found."}), 404
+    return jsonify(result)
+
+
+@dispatch_bp.post("/api/routes/plan")
+def plan_routes():
+    payload = request.get_json(silent=True) or {}
+    route_date = _parse_iso_date(payload.get("route_date", ""), date.today())
+    branch_code = (payload.get("branch_code") or "").strip().upper()
+    if not branch_code:
+        return jsonify({"error": "branch_code is required."}), 400
+
+    try:
+        trucks = int(payload.get("trucks") or 0)
+        capacity = float(payload["capacity_lbs"]) if payload.get("capacity_lbs") else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "trucks and capacity_lbs must be numbers."}), 400
+    if not trucks:
+        trucks = len(dispatch_service.get_truck_assignments(route_date, branch_code))
+    if trucks < 1:
+        return jsonify({"error": "trucks is required (no truck assignments for that date)."}), 400
+    trucks = min(trucks, get_route_optimization_settings()["max_trucks"])
+
+    stops = erp_service.get_enriched_dispatch_stops(
+        start=route_date,
+        end=route_date,
+        include_no_gps=True,
+        branches=branch_code,
+    )
+    unassigned = [stop for stop in stops if not stop.get("route_assigned")]
+    result = dispatch_service.plan_routes(
+        route_date,
+        branch_code,
+        unassigned,
+        trucks,
+        capacity_lbs=capacity,
+        yard=payload.get("yard"),
+        apply=bool(payload.get("apply")),
+        user_id=_current_user_id(),
+        time_budget_ms=_optimize_budget(payload),
+    )
+    return jsonify(result)
+
+
 # ------------------------------------------------------------------
 # Drivers
 # ------------------------------------------------------------------
@@ -2,8 +2,11 @@ from datetime import date
 from flask import jsonify, request
 from app.Routes.dispatch import dispatch_bp
 from app.Routes.dispatch.helpers import (
-    _add_business_days, _parse_iso_date, erp_service,
+    _add_business_days, _parse_bbox, _parse_iso_date, _stop_window,
+    _with_route_assignment, dispatch_service, erp_service,
 )
+from app.runtime_settings import get_spatial_index_settings
+from app.Services.spatial_index import get_spatial_index
 
 
 @dispatch_bp.get("/api/stops")
@@ -53,6 +56,37 @@ def enriched_stops():
     return jsonify(rows)
 
 
+@dispatch_bp.get("/api/stops/viewport")
+def viewport_stops():
+    """Enriched stops inside ``bbox`` (south,west,north,east) only, served
+    from the spatial index so the map downloads what it can show."""
+    bbox = _parse_bbox(request.args.get("bbox"))
+    if bbox is None:
+        return jsonify({"error": "bbox=south,west,north,east is required."}), 400
+    start, end, branch = _stop_window(request.args)
+    unassigned_only = request.args.get("unassigned", "").lower() in ("1", "true", "yes", "y")
+    limit = min(
+        request.args.get("limit", type=int) or get_spatial_index_settings()["viewport_limit"],
+        get_spatial_index_settings()["viewport_limit"],
+    )
+
+    index = get_spatial_index().stops(start, end, branch)
+    assignments = dispatch_service.get_route_assignments(start, end)
+    hits = index.bbox(
+        *bbox,
+        predicate=(lambda stop: str(stop.get("id")) not in assignments) if unassigned_only else None,
+    )
+    hits.sort(key=lambda hit: (str(hit[1].get("expected_date") or ""), str(hit[1].get("id"))))
+    rows = [_with_route_assignment(stop, assignments) for _key, stop in hits[:limit]]
+    return jsonify({
+        "stops": rows,
+        "count": len(rows),
+        "matched": len(hits),
+        "in_scope": len(index),
+        "truncated": len(hits) > limit,
+    })
+
+
 @dispatch_bp.get("/api/orders/<int:so_id>/lines")
 def shipment_lines(so_id: int):
     shipment_num = request.args.get("shipment_num")
@@ -21,7 +21,7 @@ from app.Routes.main import (  # noqa: E402, F401
 
 @main_bp.before_request
 def _require_login():
-    public_paths = {"/pick_tracker", "/api/smart_scan"}
+    public_paths = {"/pick_tracker", "/api/smart_scan", "/api/smart_scan/batch"}
     public_path_prefixes = (
         "/kiosk/",
         "/tv/",
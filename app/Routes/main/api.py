@@ -1,14 +1,20 @@
 import os
 import re
 import json
-from datetime import datetime, timedelta
-from flask import current_app, request, url_for, jsonify
+import logging
+from datetime import datetime, timedelta, timezone
+from flask import Response, current_app, request, url_for, jsonify
 from sqlalchemy import func, text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import joinedload
 
 from app.extensions import db
 from app.Models.models import Pickster, Pick, PickAssignment, AuditEvent, ERPSyncState
 from app.Services.erp_service import ERPService
+from app.Services.erp.so_attributes import get_so_attribute_index
+from app.Services.live_updates import get_live_hub, sse_stream
+from app.Services.samsara_service import get_location_poller
+from app.runtime_settings import get_live_update_settings
 from app.Routes.main import main_bp
 from app.Routes.main.helpers import (
     WILL_CALL_TYPE_ID, _get_branch,
@@ -18,16 +24,144 @@ from app.Routes.main.helpers import (
 )
 
 
+# Scans accepted per /api/smart_scan/batch call (kiosk queue flushes in chunks this size).
+SMART_SCAN_BATCH_LIMIT = 200
+_BARCODE_RE = re.compile(r'^[0-9\s\-]+$')
+
+
+def _parse_scan_barcode(raw_barcode):
+    """Validate a scanned barcode and split it into (so_number, shipment_num).
+
+    Barcodes are "SO_NUMBER-SHIPMENT_SEQ" (e.g. "0001463004-001") or a bare
+    SO number: digits, spaces and hyphens only, max 50 chars.  Returns None
+    when the format is invalid.
+    """
+    if not _BARCODE_RE.match(raw_barcode) or len(raw_barcode) > 50:
+        return None
+    if '-' in raw_barcode:
+        so_part, shipment = raw_barcode.split('-', 1)
+        return normalize_so_number(so_part.strip()), shipment.strip() or None
+    return normalize_so_number(raw_barcode.replace(' ', '')), None
+
+
+def _parse_scanned_at(value, now):
+    """Parse a kiosk ISO-8601 timestamp to naive UTC, clamped to *now*."""
+    if not value:
+        return now
+    try:
+        scanned_at = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return now
+    if scanned_at.tzinfo is not None:
+        scanned_at = scanned_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(scanned_at, now)
+
+
+def _lookup_scan_attributes(so_numbers):
+    """ERP sale_type / handling_code per SO; an ERP failure falls back to regular picks."""
+    try:
+        return ERPService().get_so_scan_attributes(so_numbers)
+    except Exception as e:
+        logging.warning("Smart scan ERP lookup failed: %s", e)
+        return {}
+
+
+class _ScanState:
+    """Open picks for a set of barcodes, updated as scans are applied in order."""
+
+    def __init__(self, barcodes):
+        self.open_picks = {}
+        if barcodes:
+            rows = (
+                Pick.query
+                .filter(Pick.barcode_number.in_(sorted(barcodes)), Pick.completed_time.is_(None))
+                .order_by(Pick.id)
+                .all()
+            )
+            for pick in rows:
+                self.open_picks.setdefault(pick.barcode_number, []).append(pick)
+
+    def find_open(self, barcode, branch_code):
+        # Scoped to the picker's branch when the picker has one.
+        for pick in self.open_picks.get(barcode, ()):
+            if not branch_code or pick.branch_code == branch_code:
+                return pick
+        return None
+
+    def apply(self, picker, barcode, shipment_num, scanned_at, attributes):
+        """
+        Run the smart-scan decision for one scan and return (pick, action, message).
+
+        1. An incomplete Pick with this barcode -> complete it
+        2. ERP sale_type is WILLCALL -> create an auto-completed will call pick
+        3. Otherwise -> start a new timed pick typed from the handling code
+           (SOs missing from the ERP fall back to a regular Yard pick)
+        """
+        existing_pick = self.find_open(barcode, picker.branch_code)
+        if existing_pick:
+            # A replayed completion can't end before the pick started.
+            existing_pick.completed_time = max(scanned_at, existing_pick.start_time or scanned_at)
+            self.open_picks[barcode].remove(existing_pick)
+            return existing_pick, 'completed', f'Pick {barcode} completed.'
+
+        sale_type = (attributes.get('sale_type') or '').upper()
+        if sale_type == 'WILLCALL':
+            pick_type_id = WILL_CALL_TYPE_ID
+            completed_time = scanned_at
+            action = 'will_call_completed'
+            message = f'Will Call {barcode} recorded.'
+        else:
+            # Map handling_code to pick type; defaults to Yard (1)
+            pick_type_id = pick_type_from_handling_code(attributes.get('handling_code'))
+            completed_time = None
+            action = 'started'
+            message = f'Pick {barcode} started ({get_pick_type_name(pick_type_id)}).'
+
+        ensure_pick_type_exists(pick_type_id)
+        new_pick = Pick(
+            barcode_number=barcode,
+            shipment_num=shipment_num,
+            start_time=scanned_at,
+            completed_time=completed_time,
+            picker_id=picker.id,
+            pick_type_id=pick_type_id,
+            branch_code=picker.branch_code,
+        )
+        db.session.add(new_pick)
+        if completed_time is None:
+            self.open_picks.setdefault(barcode, []).append(new_pick)
+        return new_pick, action, message
+
+
+def _scan_audit(pick, action, barcode, picker, occurred_at, client_scan_id=None):
+    return AuditEvent(
+        event_type='pick_started' if action == 'started' else 'pick_completed',
+        entity_type='pick',
+        entity_id=pick.id,
+        so_number=barcode,
+        actor_id=picker.id,
+        occurred_at=occurred_at,
+        client_scan_id=client_scan_id,
+    )
+
+
+def _scan_result(pick, action, barcode, message):
+    return {
+        'action': action,
+        'pick_id': pick.id,
+        'pick_type': get_pick_type_name(pick.pick_type_id),
+        'so_number': barcode,
+        'message': message,
+    }
+
+
 @main_bp.route('/api/smart_scan', methods=['POST'])
 def api_smart_scan():
     """
     Smart scan endpoint: auto-detects pick type from ERP sale_type.
 
-    Decision flow:
-    1. If an incomplete Pick exists with this barcode -> complete it
-    2. If ERP sale_type is WILLCALL -> create auto-completed will call pick
-    3. Otherwise -> create a new timed pick (regular)
-    4. If barcode not found in ERP -> fallback to regular pick
+    See _ScanState.apply for the decision flow; /api/smart_scan/batch runs
+    the same flow for a queue of scans.
 
     NOTE: This JSON endpoint does not carry CSRF protection.  If a
     CSRF middleware (e.g. Flask-WTF CSRFProtect) is enabled app-wide,
@@ -45,105 +179,123 @@ def api_smart_scan():
     if not picker:
         return jsonify({'error': 'Picker not found'}), 404
 
-    # Validate barcode format: digits, spaces, hyphens only; max 50 chars
-    if not re.match(r'^[0-9\s\-]+$', raw_barcode) or len(raw_barcode) > 50:
+    parsed = _parse_scan_barcode(raw_barcode)
+    if parsed is None:
         return jsonify({'error': 'Invalid barcode format'}), 400
-
-    # Parse barcode: "SO_NUMBER-SHIPMENT_SEQ" (e.g., "0001463004-001")
-    shipment_num = None
-    if '-' in raw_barcode:
-        parts = raw_barcode.split('-', 1)
-        barcode = normalize_so_number(parts[0].strip())
-        shipment_num = parts[1].strip() or None
-    else:
-        barcode = normalize_so_number(raw_barcode.replace(' ', ''))
+    barcode, shipment_num = parsed
 
     now = datetime.utcnow()
+    state = _ScanState({barcode})
+    attributes = {}
+    if not state.find_open(barcode, picker.branch_code):
+        attributes = _lookup_scan_attributes([barcode]).get(barcode, {})
 
-    # 1. Check for existing incomplete pick with this barcode (scoped to picker's branch)
-    incomplete_q = Pick.query.filter_by(barcode_number=barcode, completed_time=None)
-    if picker.branch_code:
-        incomplete_q = incomplete_q.filter_by(branch_code=picker.branch_code)
-    existing_pick = incomplete_q.first()
-
-    if existing_pick:
-        existing_pick.completed_time = now
-        audit = AuditEvent(
-            event_type='pick_completed',
-            entity_type='pick',
-            entity_id=existing_pick.id,
-            so_number=barcode,
-            actor_id=picker.id,
-            occurred_at=now,
-        )
-        db.session.add(audit)
-        db.session.commit()
-        return jsonify({
-            'action': 'completed',
-            'pick_id': existing_pick.id,
-            'pick_type': get_pick_type_name(existing_pick.pick_type_id),
-            'so_number': barcode,
-            'message': f'Pick {barcode} completed.',
+    pick, action, message = state.apply(picker, barcode, shipment_num, now, attributes)
+    db.session.flush()
+    db.session.add(_scan_audit(pick, action, barcode, picker, now))
+    db.session.commit()
+    return jsonify(_scan_result(pick, action, barcode, message))
+
+
+@main_bp.route('/api/smart_scan/batch', methods=['POST'])
+def api_smart_scan_batch():
+    """
+    Apply an ordered queue of kiosk scans in one transaction.
+
+    Body: {"scans": [{"client_id", "picker_id", "barcode", "scanned_at"}, ...]}
+    where scanned_at is the ISO-8601 time the kiosk captured the scan (used
+    for pick start/complete times, clamped to now).  Pickers, open picks and
+    ERP sale types / handling codes are loaded once for the whole batch, the
+    scans run through the smart-scan state machine in order, and all picks
+    and AuditEvent rows commit together.
+
+    client_id is stored on the AuditEvent, so replaying a batch after a lost
+    response reports those scans as duplicates instead of applying them twice.
+    Returns {"results": [...]} in request order; a rejected scan gets an
+    "error" entry without affecting the rest of the batch.
+    """
+    data = request.get_json(silent=True) or {}
+    scans = data.get('scans')
+    if not isinstance(scans, list) or not scans:
+        return jsonify({'error': 'scans must be a non-empty list'}), 400
+    if len(scans) > SMART_SCAN_BATCH_LIMIT:
+        return jsonify({'error': f'At most {SMART_SCAN_BATCH_LIMIT} scans per batch'}), 400
+
+    now = datetime.utcnow()
+    parsed = []
+    for scan in scans:
+        scan = scan if isinstance(scan, dict) else {}
+        client_id = str(scan.get('client_id') or '').strip()[:64] or None
+        raw_barcode = str(scan.get('barcode') or '').strip()
+        barcode_parts = _parse_scan_barcode(raw_barcode) if raw_barcode else None
+        try:
+            picker_id = int(scan.get('picker_id'))
+        except (TypeError, ValueError):
+            picker_id = None
+        parsed.append({
+            'client_id': client_id,
+            'picker_id': picker_id,
+            'barcode': barcode_parts,
+            'scanned_at': _parse_scanned_at(scan.get('scanned_at'), now),
         })
 
-    # 2. Look up sale_type and handling_code from ERP to determine pick type
-    sale_type = None
-    handling_code = None
-    try:
-        erp = ERPService()
-        sale_type = erp.get_so_sale_type(barcode)
-        if not (sale_type and sale_type.upper() == 'WILLCALL'):
-            handling_code = erp.get_so_primary_handling_code(barcode)
-    except Exception:
-        pass  # ERP lookup failure -> fallback to regular pick
-
-    if sale_type and sale_type.upper() == 'WILLCALL':
-        # Will call: auto-complete immediately
-        pick_type_id = WILL_CALL_TYPE_ID
-        completed_time = now
-        action = 'will_call_completed'
-        message = f'Will Call {barcode} recorded.'
-    else:
-        # Map handling_code to pick type; defaults to Yard (1)
-        pick_type_id = pick_type_from_handling_code(handling_code)
-        completed_time = None
-        action = 'started'
-        pick_type_name = get_pick_type_name(pick_type_id)
-        message = f'Pick {barcode} started ({pick_type_name}).'
-
-    ensure_pick_type_exists(pick_type_id)
-
-    new_pick = Pick(
-        barcode_number=barcode,
-        shipment_num=shipment_num,
-        start_time=now,
-        completed_time=completed_time,
-        picker_id=picker.id,
-        pick_type_id=pick_type_id,
-        branch_code=picker.branch_code,
-    )
-    db.session.add(new_pick)
-    db.session.flush()
+    picker_ids = {item['picker_id'] for item in parsed if item['picker_id']}
+    pickers = {}
+    if picker_ids:
+        pickers = {p.id: p for p in Pickster.query.filter(Pickster.id.in_(picker_ids)).all()}
+
+    client_ids = {item['client_id'] for item in parsed if item['client_id']}
+    applied = {}
+    if client_ids:
+        for event in AuditEvent.query.filter(AuditEvent.client_scan_id.in_(client_ids)).all():
+            applied[event.client_scan_id] = event
+
+    barcodes = {item['barcode'][0] for item in parsed if item['barcode']}
+    state = _ScanState(barcodes)
+    # Any scan can start a pick, even for an SO with an open one (in another
+    # branch, or completed earlier in this batch); one query for the batch.
+    attributes = _lookup_scan_attributes(barcodes) if barcodes else {}
+
+    results = []
+    pending = []
+    seen = set()
+    for item in parsed:
+        client_id = item['client_id']
+        result = {'client_id': client_id}
+        results.append(result)
+        if client_id in applied or client_id in seen:
+            event = applied.get(client_id)
+            result.update(status='duplicate', pick_id=event.entity_id if event else None)
+            continue
+        picker = pickers.get(item['picker_id'])
+        if not item['picker_id'] or not item['barcode']:
+            result.update(status='error', error='picker_id and a valid barcode are required')
+            continue
+        if picker is None:
+            result.update(status='error', error='Picker not found')
+            continue
+        if client_id:
+            seen.add(client_id)
+
+        barcode, shipment_num = item['barcode']
+        pick, action, message = state.apply(
+            picker, barcode, shipment_num, item['scanned_at'], attributes.get(barcode, {})
+        )
+        pending.append((result, pick, action, barcode, message, picker, item))
 
-    event_type = 'pick_completed' if completed_time else 'pick_started'
-    audit = AuditEvent(
-        event_type=event_type,
-        entity_type='pick',
-        entity_id=new_pick.id,
-        so_number=barcode,
-        actor_id=picker.id,
-        occurred_at=now,
-    )
-    db.session.add(audit)
-    db.session.commit()
+    if pending:
+        db.session.flush()
+        for result, pick, action, barcode, message, picker, item in pending:
+            db.session.add(_scan_audit(pick, action, barcode, picker, item['scanned_at'], item['client_id']))
+            result.update(status='ok', **_scan_result(pick, action, barcode, message))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another replay of the same queue committed first; the client retries.
+            db.session.rollback()
+            return jsonify({'error': 'Scans were applied concurrently; retry'}), 409
 
-    return jsonify({
-        'action': action,
-        'pick_id': new_pick.id,
-        'pick_type': get_pick_type_name(pick_type_id),
-        'so_number': barcode,
-        'message': message,
-    })
+    return jsonify({'results': results})
 
 
 @main_bp.route('/api/pickers_picks')
@@ -307,6 +459,52 @@ def api_sync_status():
     })
 
 
+@main_bp.route('/api/cache/stats')
+def api_cache_stats():
+    """Hit/miss/eviction counters for this worker's shared ERP query cache,
+    its in-memory SO attribute index and its Samsara location poller."""
+    stats = ERPService.query_cache_stats()
+    index = get_so_attribute_index()
+    stats['so_attribute_index'] = dict(index.stats, size=len(index), loaded=index.is_loaded())
+    poller = get_location_poller()
+    stats['samsara'] = dict(
+        poller.stats,
+        http=poller.client.stats,
+        vehicles=len(poller.buffer),
+        vehicle_metadata=len(poller.meta),
+        polling=poller.is_running(),
+    )
+    return jsonify(stats)
+
+
+@main_bp.route('/api/live/events')
+def api_live_events():
+    """Server-sent "changed" pings for dashboards that fetch their own data.
+
+    Fires after a sync cycle or local pick/audit commit touching the selected
+    branch (any branch when none is selected).
+    """
+    settings = get_live_update_settings()
+    if not settings['streams_enabled']:
+        return Response(status=204)  # EventSource stops reconnecting; the page polls
+    subscription = get_live_hub().subscribe(f"signal:{_get_branch() or 'all'}")
+    return Response(
+        sse_stream(
+            subscription,
+            heartbeat_seconds=settings['heartbeat_seconds'],
+            max_seconds=settings['max_stream_seconds'],
+        ),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+@main_bp.route('/api/live/stats')
+def api_live_stats():
+    """Notification, refresh and subscriber counters for this worker's live-update hub."""
+    return jsonify(get_live_hub().stats())
+
+
 @main_bp.route('/api/geocode-pending', methods=['POST'])
 def api_geocode_pending():
     """Deprecated: geocoding now occurs in beisser-api mirror sync, not WH-Tracker."""
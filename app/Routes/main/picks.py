@@ -1,16 +1,18 @@
 import os
 import re
 import hmac
+import json
+import hashlib
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from flask import render_template, request, redirect, url_for, flash, jsonify, session
+from flask import render_template, request, redirect, url_for, flash, jsonify, session, make_response
 from sqlalchemy import func
 from sqlalchemy.orm import joinedload
 from sqlalchemy.exc import IntegrityError
 
 from app.extensions import db
-from app.Models.models import Pickster, Pick, PickTypes, AuditEvent, POSubmission, DashboardStats
+from app.Models.models import Pickster, Pick, PickTypes, AuditEvent
+from app.Services.dashboard_stats import local_tile_counts, read_workcenter_tiles
 from app.Services.erp_service import ERPService
 from app.Routes.main import main_bp
 from app.Routes.main.helpers import (
@@ -23,200 +25,116 @@ from app.Routes.main.helpers import (
 logger = logging.getLogger(__name__)
 
 
-def _read_dashboard_stats(branch=None):
-    """Read pre-computed counts from dashboard_stats (written by Pi sync worker).
+def _live_homepage_tiles(erp, branch, rep_id, need):
+    """Query the tiles in *need* directly, one after another.
 
-    Returns aggregated stats for the given branch (or all branches if None).
-    DSM is treated as 20GR + 25BW combined.
-    Falls back to None if rows are missing or stale (>5 min).
+    Only used while the precomputed tiles are missing or stale (the sync
+    worker is down); a tile that fails to load is None.
     """
-    import json as _json
-    try:
-        if branch == 'DSM':
-            branch_ids = ['20GR', '25BW']
-        elif branch:
-            branch_ids = [branch]
-        else:
-            branch_ids = None
-
-        if branch_ids:
-            rows = DashboardStats.query.filter(DashboardStats.system_id.in_(branch_ids)).all()
-        else:
-            rows = DashboardStats.query.all()
-
-        if not rows:
+    def load(name, func, *args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            logger.exception("Homepage: failed to load %s", name)
             return None
 
-        now = datetime.utcnow()
-        for row in rows:
-            if not row.updated_at:
-                return None
-            if (now - row.updated_at).total_seconds() >= 300:
-                return None
-
-        total_picks = sum(r.open_picks or 0 for r in rows)
-        total_wo = sum(r.open_work_orders or 0 for r in rows)
-        merged_breakdown = {}
-        for row in rows:
-            if row.handling_breakdown_json:
-                try:
-                    for code, cnt in _json.loads(row.handling_breakdown_json).items():
-                        merged_breakdown[code] = merged_breakdown.get(code, 0) + cnt
-                except (ValueError, TypeError):
-                    pass
-
-        return {
-            'picks': {'total': total_picks, 'handling_breakdown': merged_breakdown},
-            'work_orders': total_wo,
-        }
-    except Exception:
-        logger.debug("dashboard_stats read failed, falling back to live queries")
-    return None
-
-
-def _build_homepage_data(roles, rep_id, branch):
+    tiles = {}
+    if 'sales' in need:
+        metrics = load('sales', erp.get_sales_hub_metrics, rep_id=rep_id or '') or {}
+        tiles['sales_open_orders'] = metrics.get('open_orders_count')
+        tiles['sales_orders_today'] = metrics.get('total_orders_today')
+    if 'picks' in need:
+        picks = load('picks', erp.get_open_picks_count) or {}
+        tiles['open_picks'] = picks.get('total')
+        tiles['handling_breakdown'] = picks.get('handling_breakdown') or {}
+    if 'work_orders' in need:
+        tiles['open_work_orders'] = load('work_orders', erp.get_open_work_orders_count)
+    if 'dispatch' in need:
+        tiles['todays_deliveries'] = load('dispatch', erp.get_delivery_count, branch_id=branch)
+    if need & {'completed', 'pickers', 'purchasing'}:
+        with db.engine.connect() as conn:
+            tiles.update(load('local counts', local_tile_counts, conn) or {})
+    return tiles
+
+
+def _homepage_needs(roles):
+    need = set()
+    if roles & {'sales', 'admin', 'ops'}:
+        need.add('sales')
+    if roles & {'warehouse', 'picker', 'admin', 'ops', 'supervisor'}:
+        need |= {'picks', 'completed'}
+    if roles & {'supervisor', 'admin', 'ops'}:
+        need |= {'pickers', 'work_orders'}
+    if roles & {'dispatch', 'delivery', 'admin', 'ops'}:
+        need.add('dispatch')
+    if roles & {'purchasing', 'manager', 'supervisor', 'admin', 'ops'}:
+        need.add('purchasing')
+    return need
+
+
+def _build_homepage_data(roles, rep_id, branch, tiles=None):
     """Build role-appropriate dashboard data for the homepage.
 
-    Reads pre-computed picks/WO counts from dashboard_stats (updated by the
-    Pi sync worker).  Falls back to live ERP queries if the cached row is
-    missing or stale.  Other stats still use the thread pool.
+    *tiles* are the precomputed workcenter tiles (read_workcenter_tiles).
+    Without them each tile this user needs is queried live.
     """
     data = {'roles_active': []}
     roles = set(roles or [])
-    erp = ERPService()
-    today = datetime.utcnow().date()
-
-    # ── Determine which data sections are needed ──
-    need_sales = bool(roles & {'sales', 'admin', 'ops'})
-    need_warehouse = bool(roles & {'warehouse', 'picker', 'admin', 'ops', 'supervisor'})
-    need_supervisor = bool(roles & {'supervisor', 'admin', 'ops'})
-    need_work_orders = need_supervisor
-    need_dispatch = bool(roles & {'dispatch', 'delivery', 'admin', 'ops'})
-    need_purchasing = bool(roles & {'purchasing', 'manager', 'supervisor', 'admin', 'ops'})
-
-    # ── Try pre-computed stats first (single row read) ──
-    cached_stats = None
-    if need_warehouse or need_work_orders:
-        cached_stats = _read_dashboard_stats(branch)
-
-    # ── Submit remaining independent tasks to a thread pool ──
-    futures = {}
-    with ThreadPoolExecutor(max_workers=6) as pool:
-        if need_sales:
-            futures['sales'] = pool.submit(
-                erp.get_sales_hub_metrics, rep_id=rep_id or ''
-            )
-        if need_warehouse:
-            futures['completed_today'] = pool.submit(
-                _count_completed_today, today
-            )
-            if not cached_stats:
-                futures['picks'] = pool.submit(erp.get_open_picks_count)
-        if need_supervisor:
-            futures['pickers'] = pool.submit(_get_picker_counts)
-        if need_work_orders and not cached_stats:
-            futures['work_orders'] = pool.submit(erp.get_open_work_orders_count)
-        if need_dispatch:
-            futures['dispatch'] = pool.submit(
-                erp.get_delivery_count, branch_id=branch
-            )
-        if need_purchasing:
-            futures['purchasing'] = pool.submit(_count_pending_po_reviews)
-
-        # ── Collect results ──
-        results = {}
-        for key, fut in futures.items():
-            try:
-                results[key] = fut.result(timeout=15)
-            except Exception:
-                logger.exception("Homepage: failed to load %s", key)
-                results[key] = None
-
-    # ── Assemble data dict ──
-    if need_sales:
-        metrics = results.get('sales')
-        if metrics:
-            data['sales'] = {
-                'open_orders': metrics.get('open_orders_count', 0),
-                'shipping_today': metrics.get('total_orders_today', 0),
-            }
-        else:
-            data['sales'] = {'open_orders': None, 'shipping_today': None}
+    need = _homepage_needs(roles)
+    if tiles is None:
+        tiles = _live_homepage_tiles(ERPService(), branch, rep_id, need)
+
+    if 'sales' in need:
+        data['sales'] = {
+            'open_orders': tiles.get('sales_open_orders'),
+            'shipping_today': tiles.get('sales_orders_today'),
+        }
         if 'sales' in roles:
             data['roles_active'].append('sales')
 
-    if need_warehouse:
-        picks_data = cached_stats['picks'] if cached_stats else results.get('picks')
-        if picks_data:
-            data['warehouse'] = {
-                'open_picks': picks_data['total'],
-                'handling_breakdown': picks_data['handling_breakdown'],
-            }
-        else:
-            data['warehouse'] = {'open_picks': None, 'handling_breakdown': {}}
-        data['warehouse']['picks_completed_today'] = results.get('completed_today')
+    if 'picks' in need:
+        data['warehouse'] = {
+            'open_picks': tiles.get('open_picks'),
+            'handling_breakdown': tiles.get('handling_breakdown') or {},
+            'picks_completed_today': tiles.get('picks_completed_today'),
+        }
         if roles & {'warehouse', 'picker'}:
             data['roles_active'].append('warehouse')
 
-    if need_supervisor:
-        picker_info = results.get('pickers')
-        if picker_info:
-            data['supervisor'] = picker_info
-        else:
-            data['supervisor'] = {
-                'total_pickers': None, 'active_pickers': None, 'idle_pickers': None,
-            }
+    if 'pickers' in need:
+        total, active = tiles.get('total_pickers'), tiles.get('active_pickers')
+        data['supervisor'] = {
+            'total_pickers': total,
+            'active_pickers': active,
+            'idle_pickers': total - active if total is not None and active is not None else None,
+        }
         if 'supervisor' in roles:
             data['roles_active'].append('supervisor')
 
-    if need_work_orders:
-        wo_count = cached_stats['work_orders'] if cached_stats else results.get('work_orders')
-        data['work_orders'] = {'open_count': wo_count if wo_count is not None else None}
+    if 'work_orders' in need:
+        data['work_orders'] = {'open_count': tiles.get('open_work_orders')}
 
-    if need_dispatch:
-        delivery_count = results.get('dispatch')
-        data['dispatch'] = {'todays_deliveries': delivery_count if delivery_count is not None else None}
+    if 'dispatch' in need:
+        data['dispatch'] = {'todays_deliveries': tiles.get('todays_deliveries')}
         if roles & {'dispatch', 'delivery'}:
             data['roles_active'].append('dispatch')
 
     if roles & {'admin', 'ops'}:
         data['roles_active'].append('ops')
 
-    if need_purchasing:
-        po_count = results.get('purchasing')
-        data['purchasing'] = {'pending_reviews': po_count if po_count is not None else None}
+    if 'purchasing' in need:
+        data['purchasing'] = {'pending_reviews': tiles.get('pending_po_reviews')}
         if roles & {'purchasing', 'manager', 'supervisor'}:
             data['roles_active'].append('purchasing')
 
     return data
 
 
-def _count_completed_today(today):
-    """Count picks completed today (local DB)."""
-    return Pick.query.filter(func.date(Pick.completed_time) == today).count()
-
-
-def _get_picker_counts():
-    """Get active/idle picker counts (local DB)."""
-    total_pickers = Pickster.query.filter(
-        (Pickster.user_type == 'picker') | (Pickster.user_type.is_(None))
-    ).count()
-    active_count = db.session.query(
-        func.count(func.distinct(Pick.picker_id))
-    ).join(Pickster, Pick.picker_id == Pickster.id).filter(
-        (Pickster.user_type == 'picker') | (Pickster.user_type.is_(None)),
-        Pick.completed_time.is_(None),
-    ).scalar() or 0
-    return {
-        'total_pickers': total_pickers,
-        'active_pickers': active_count,
-        'idle_pickers': total_pickers - active_count,
-    }
-
-
-def _count_pending_po_reviews():
-    """Count pending PO reviews (local DB)."""
-    return POSubmission.query.filter(POSubmission.status == 'pending').count()
+def _homepage_etag(roles, rep_id, branch, versions):
+    """The page only changes with the deploy, the viewer, or a tile row's version."""
+    deploy = os.environ.get('FLY_IMAGE_REF') or os.environ.get('VERCEL_GIT_COMMIT_SHA') or ''
+    key = json.dumps([deploy, session.get('user_id'), sorted(roles or []), rep_id, branch, versions])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
 
 
 @main_bp.route('/')
@@ -224,8 +142,28 @@ def work_center():
     roles = session.get('user_roles', [])
     rep_id = session.get('user_rep_id', '')
     branch = session.get('selected_branch') or None
-    homepage_data = _build_homepage_data(roles, rep_id, branch)
-    return render_template('workcenter.html', data=homepage_data)
+    try:
+        tiles = read_workcenter_tiles(branch, rep_id)
+    except Exception:
+        logger.debug("dashboard tiles read failed, falling back to live queries")
+        tiles = None
+
+    etag = None
+    if tiles is not None:
+        etag = _homepage_etag(roles, rep_id, branch, tiles['versions'])
+        # Pending flash messages are part of the page, so never answer 304 over them.
+        if request.if_none_match.contains(etag) and not session.get('_flashes'):
+            response = make_response('', 304)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+
+    homepage_data = _build_homepage_data(roles, rep_id, branch, tiles)
+    response = make_response(render_template('workcenter.html', data=homepage_data))
+    if etag:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 @main_bp.route('/pick_tracker')
@@ -1,11 +1,17 @@
+import logging
+
 from flask import request, url_for, jsonify
 
 from app.Models.models import Pickster, Pick, WorkOrder
 from app.Services.erp_service import ERPService
+from app.Services.search_index import SearchIndex
 from app.Routes.main import main_bp
 from app.Routes.main.helpers import localize_to_cst
+from app.runtime_settings import get_search_settings
 from app import db
 
+logger = logging.getLogger(__name__)
+
 
 @main_bp.route('/search_results')
 def search_results():
@@ -13,6 +19,46 @@ def search_results():
     if not query:
         return jsonify([])
 
+    settings = get_search_settings()
+    index = SearchIndex()
+    if not index.is_ready():
+        return jsonify(_search_live(query)[:settings['max_results']])
+
+    try:
+        result = index.search(
+            query,
+            limit=settings['max_results'],
+            per_type=settings['max_per_type'],
+            budget_ms=settings['latency_budget_ms'],
+        )
+    except Exception as e:
+        logger.error("Search index query failed: %s", e)
+        return jsonify([])
+    response = jsonify([_hit_result(hit) for hit in result['hits']])
+    if result['timed_out']:
+        response.headers['X-Search-Timed-Out'] = '1'
+    return response
+
+
+def _hit_result(hit):
+    """Shape an index hit like the search box expects: title, subtitle, url, type."""
+    kind, target, subtitle = hit['entity_type'], hit['target'], hit['subtitle']
+    if kind in ('order', 'pick'):
+        url = url_for('main.pick_detail', so_number=target)
+    elif kind in ('customer', 'shipto'):
+        url = url_for('sales.customer_profile', customer_number=target)
+    elif kind == 'po':
+        url = url_for('purchasing.po_workspace', po_number=target)
+    else:
+        url = url_for('main.supervisor_work_orders')
+    if kind == 'pick':
+        completed = hit['sort_at']
+        subtitle = f'{subtitle} — {localize_to_cst(completed).strftime("%m/%d %I:%M %p") if completed else "In Progress"}'
+    return {'title': hit['title'], 'subtitle': subtitle, 'url': url, 'type': kind}
+
+
+def _search_live(query):
+    """Sequential order / work order / pick search, used until the index is built."""
     results = []
 
     # 1. Sales orders / customers via ERP
@@ -85,4 +131,4 @@ def search_results():
     except Exception:
         pass
 
-    return jsonify(results[:15])
+    return results
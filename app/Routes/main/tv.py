@@ -1,52 +1,81 @@
-from flask import render_template
+from flask import Response, render_template
 
 from app.Models.models import Pickster, PickAssignment
 from app.Services.erp_service import ERPService
+from app.Services.live_updates import get_live_hub, sse_stream
+from app.runtime_settings import get_live_update_settings
 from app.Routes.main import main_bp
 from app.Routes.main.helpers import _tv_context
 
 
-@main_bp.route('/tv/<branch>/picks')
-def tv_open_picks(branch):
-    """Open picks TV display for a specific branch."""
-    ctx = _tv_context(branch)
-    normalized = ctx['tv_branch']
-    erp = ERPService()
-    summary = erp.get_open_so_summary(branch=normalized)
+def _tv_summary(branch):
+    """Open SO summary for a TV branch with each order's assigned picker attached."""
+    summary = ERPService().get_open_so_summary(branch=branch)
 
-    assignments = PickAssignment.query.filter(
-        (PickAssignment.branch_code == normalized) | (PickAssignment.branch_code == None)
-    ).all()
-    assignment_map = {a.so_number: a.picker_id for a in assignments}
-    pickers = Pickster.query.filter_by(user_type='picker').order_by(Pickster.name).all()
-    picker_map = {p.id: p for p in pickers}
+    assignments = {a.so_number: a.picker_id for a in PickAssignment.query.filter(
+        (PickAssignment.branch_code == branch) | (PickAssignment.branch_code == None)
+    ).all()}
+    pickers = {p.id: p for p in Pickster.query.filter_by(user_type='picker').all()}
 
     for item in summary:
-        picker_id = assignment_map.get(item['so_number'])
-        item['assigned_picker'] = picker_map.get(picker_id) if picker_id else None
+        picker_id = assignments.get(item['so_number'])
+        item['assigned_picker'] = pickers.get(picker_id) if picker_id else None
+    return summary
+
 
-    return render_template('tv/open_picks.html', summary=summary, **ctx)
+def _tv_feed_rows(branch):
+    """JSON-safe TV card rows; one feed per branch serves every TV page."""
+    return [
+        {
+            'so_number': item['so_number'],
+            'customer_name': item.get('customer_name'),
+            'reference': item.get('reference'),
+            'handling_code': item.get('handling_code'),
+            'line_count': item.get('line_count'),
+            'assigned_picker_name': item['assigned_picker'].name if item['assigned_picker'] else None,
+        }
+        for item in _tv_summary(branch)
+    ]
+
+
+@main_bp.route('/tv/<branch>/picks')
+def tv_open_picks(branch):
+    """Open picks TV display for a specific branch."""
+    ctx = _tv_context(branch)
+    summary = _tv_summary(ctx['tv_branch'])
+    return render_template('tv/open_picks.html', summary=summary,
+                           live_updates=get_live_update_settings()['streams_enabled'], **ctx)
 
 
 @main_bp.route('/tv/<branch>/board/<handling_code>')
 def tv_board_branch(branch, handling_code):
     """Department TV board for a specific branch + handling code."""
     ctx = _tv_context(branch)
-    normalized = ctx['tv_branch']
-    erp = ERPService()
-    raw_summary = erp.get_open_so_summary(branch=normalized)
-
-    filtered = [item for item in raw_summary
+    filtered = [item for item in _tv_summary(ctx['tv_branch'])
                 if item.get('handling_code') and item['handling_code'].upper() == handling_code.upper()]
+    return render_template('tv/tv_board.html', summary=filtered,
+                           handling_code=handling_code.upper(),
+                           live_updates=get_live_update_settings()['streams_enabled'], **ctx)
 
-    assignments = {a.so_number: a.picker_id for a in PickAssignment.query.filter(
-        (PickAssignment.branch_code == normalized) | (PickAssignment.branch_code == None)
-    ).all()}
-    pickers = {p.id: p for p in Pickster.query.filter_by(user_type='picker').all()}
-
-    for item in filtered:
-        picker_id = assignments.get(item['so_number'])
-        item['assigned_picker'] = pickers.get(picker_id) if picker_id else None
 
-    return render_template('tv/tv_board.html', summary=filtered,
-                           handling_code=handling_code.upper(), **ctx)
+@main_bp.route('/tv/<branch>/events')
+def tv_events(branch):
+    """Server-sent open-pick snapshot + diffs for every TV page on a branch."""
+    normalized = _tv_context(branch)['tv_branch']
+    settings = get_live_update_settings()
+    if not settings['streams_enabled']:
+        return Response(status=204)
+    subscription = get_live_hub().subscribe(
+        f'open_so_summary:{normalized}',
+        loader=lambda: _tv_feed_rows(normalized),
+        key=lambda row: f"{row['so_number']}|{row.get('handling_code') or ''}",
+    )
+    return Response(
+        sse_stream(
+            subscription,
+            heartbeat_seconds=settings['heartbeat_seconds'],
+            max_seconds=settings['max_stream_seconds'],
+        ),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
@@ -10,7 +10,11 @@ logger = logging.getLogger(__name__)
 
 @sales_bp.route('/api/transactions')
 def api_transactions():
-    """JSON endpoint for transaction workspace — supports AJAX filtering."""
+    """JSON endpoint for transaction workspace — supports AJAX filtering.
+
+    Pages by keyset: pass the ``X-Next-Cursor`` response header back as
+    ``cursor`` to fetch the following page (``page`` still works as OFFSET).
+    """
     q = request.args.get('q', '').strip()
     status = request.args.get('status', '').strip()
     date_from = request.args.get('date_from', '')
@@ -19,19 +23,25 @@ def api_transactions():
     rep_id = _get_rep_id()
     limit = min(int(request.args.get('limit', 100)), 500)
     page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor', '').strip()
     open_only = not status and not date_from and not date_to and not q
+    next_cursor = None
     try:
-        orders = [
-            _normalize_order_row(r) for r in erp.get_sales_order_status(
-                q=q, limit=limit, branch=branch, open_only=open_only,
-                rep_id=rep_id, status=status, date_from=date_from, date_to=date_to,
-                page=page,
-            )
-        ]
+        rows = erp.get_sales_order_status(
+            q=q, limit=limit, branch=branch, open_only=open_only,
+            rep_id=rep_id, status=status, date_from=date_from, date_to=date_to,
+            page=page, cursor=cursor,
+        )
+        if len(rows) == limit:
+            next_cursor = erp.encode_order_cursor(rows[-1])
+        orders = [_normalize_order_row(r) for r in rows]
     except Exception as e:
         logger.error("API transactions query failed: %s", e)
         orders = []
-    return jsonify(orders)
+    response = jsonify(orders)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
 
 
 # Keep old API endpoint working
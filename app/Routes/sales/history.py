@@ -22,18 +22,23 @@ def history(customer_number):
     rep_id = _get_rep_id()
     page = request.args.get('page', 1, type=int)
     page = max(1, page)
+    cursor = request.args.get('cursor', '').strip()
     # Accept customer_number from URL path OR query param
     if not customer_number:
         customer_number = request.args.get('customer_number', '').strip()
     searched = bool(customer_number or q or date_from or date_to or status or branch)
 
     history_rows = []
+    next_cursor = None
     if searched:
         try:
-            history_rows = [_normalize_order_row(r) for r in erp.get_sales_customer_orders(
+            rows = erp.get_sales_customer_orders(
                 customer_number, q=q, date_from=date_from, date_to=date_to, status=status,
-                branch=branch, limit=PAGE_SIZE, page=page, rep_id=rep_id,
-            )]
+                branch=branch, limit=PAGE_SIZE, page=page, rep_id=rep_id, cursor=cursor,
+            )
+            if len(rows) == PAGE_SIZE:
+                next_cursor = erp.encode_order_cursor(rows[-1])
+            history_rows = [_normalize_order_row(r) for r in rows]
         except Exception as e:
             logger.error("Purchase history query failed: %s", e)
             history_rows = []
@@ -46,6 +51,7 @@ def history(customer_number):
         page=page,
         page_size=PAGE_SIZE,
         has_next=len(history_rows) == PAGE_SIZE,
+        next_cursor=next_cursor,
         rep_id=rep_id,
     )
 
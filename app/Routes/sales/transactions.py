@@ -71,6 +71,7 @@ def transactions():
     user_rep_id = _get_user_rep_id()
     page = request.args.get('page', 1, type=int)
     page = max(1, page)
+    cursor = request.args.get('cursor', '').strip()
     my_orders = request.args.get('my_orders', '')
     today = date.today()
 
@@ -126,6 +127,7 @@ def transactions():
     open_only = not active_view and not status and not date_from and not date_to and not q and not filter_salesperson and not filter_customer
 
     query_error = ''
+    next_cursor = None
     try:
         if use_shipment_query:
             orders = [
@@ -136,15 +138,16 @@ def transactions():
                 )
             ]
         else:
-            orders = [
-                _normalize_order_row(r, rep_id=user_rep_id) for r in erp.get_sales_order_status(
-                    q=q, limit=PAGE_SIZE, branch=branch, open_only=open_only,
-                    rep_id=rep_id, status=status, date_from=date_from, date_to=date_to,
-                    page=page, sale_type=sale_type, exclude_sale_types=exclude_sale_types,
-                    customer_code=filter_customer, salesperson=filter_salesperson,
-                    shipto_seq=filter_shipto,
-                )
-            ]
+            rows = erp.get_sales_order_status(
+                q=q, limit=PAGE_SIZE, branch=branch, open_only=open_only,
+                rep_id=rep_id, status=status, date_from=date_from, date_to=date_to,
+                page=page, sale_type=sale_type, exclude_sale_types=exclude_sale_types,
+                customer_code=filter_customer, salesperson=filter_salesperson,
+                shipto_seq=filter_shipto, cursor=cursor,
+            )
+            if len(rows) == PAGE_SIZE:
+                next_cursor = erp.encode_order_cursor(rows[-1])
+            orders = [_normalize_order_row(r, rep_id=user_rep_id) for r in rows]
     except Exception as e:
         logger.error("Transactions query failed: %s", e, exc_info=True)
         orders = []
@@ -173,6 +176,7 @@ def transactions():
         page=page,
         page_size=PAGE_SIZE,
         has_next=len(orders) == PAGE_SIZE,
+        next_cursor=next_cursor,
         status_counts=status_counts,
         active_view=active_view,
         view_presets=VIEW_PRESETS,
@@ -0,0 +1,310 @@
+"""Precomputed workcenter tiles (dashboard_stats v2).
+
+The sync worker computes every homepage tile on its own cadence and stores
+them next to the open pick / work order counts it already writes:
+
+- ``dashboard_stats`` (one row per branch): sales hub numbers, today's
+  deliveries and picks completed today, alongside open picks and WOs.
+- ``dashboard_scope_stats``: tiles that aren't per branch — the ('all', '*')
+  row with company-wide sales and the local picker / PO review counts, and
+  one ('rep', rep_id) row per sales rep.
+
+Every row carries ``stats_version``, bumped whenever its values change, so the
+homepage is one indexed read and its ETag is built from the versions it read.
+"""
+from __future__ import annotations
+
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import bindparam, func, select, text
+
+from app.Models.models import DashboardScopeStats, DashboardStats, Pick, Pickster, POSubmission
+from app.runtime_settings import get_dashboard_stats_settings
+
+BRANCH_STATS = DashboardStats.__table__
+SCOPE_STATS = DashboardScopeStats.__table__
+
+BRANCH_TILES = ("sales_open_orders", "sales_orders_today", "todays_deliveries", "picks_completed_today")
+SCOPE_TILES = (
+    "sales_open_orders", "sales_orders_today", "picks_completed_today",
+    "total_pickers", "active_pickers", "pending_po_reviews",
+)
+ALL_SCOPE = ("all", "*")
+
+# DSM is read as 20GR + 25BW combined everywhere on the homepage.
+BRANCH_GROUPS = {"DSM": ["20GR", "25BW"]}
+
+
+def _coerce_datetime(value):
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def local_tile_counts(conn, today=None) -> dict[str, Any]:
+    """Tiles that come from the app database rather than the ERP mirror."""
+    start = datetime.combine(today or datetime.utcnow().date(), datetime.min.time())
+    completed = dict(
+        conn.execute(
+            select(Pick.branch_code, func.count())
+            .where(Pick.completed_time >= start, Pick.completed_time < start + timedelta(days=1))
+            .group_by(Pick.branch_code)
+        ).all()
+    )
+    is_picker = (Pickster.user_type == "picker") | (Pickster.user_type.is_(None))
+    total_pickers = conn.execute(select(func.count()).select_from(Pickster).where(is_picker)).scalar() or 0
+    active_pickers = conn.execute(
+        select(func.count(func.distinct(Pick.picker_id)))
+        .join(Pickster, Pick.picker_id == Pickster.id)
+        .where(is_picker, Pick.completed_time.is_(None))
+    ).scalar() or 0
+    pending_reviews = conn.execute(
+        select(func.count()).select_from(POSubmission).where(POSubmission.status == "pending")
+    ).scalar() or 0
+    return {
+        "completed_by_branch": {str(branch): int(count) for branch, count in completed.items() if branch},
+        "picks_completed_today": int(sum(completed.values())),
+        "total_pickers": int(total_pickers),
+        "active_pickers": int(active_pickers),
+        "pending_po_reviews": int(pending_reviews),
+    }
+
+
+class DashboardStatsBuilder:
+    """Computes the workcenter tiles and writes the rows whose values changed."""
+
+    def __init__(self, erp=None, engine=None) -> None:
+        if erp is None:
+            from app.Services.erp_service import ERPService
+
+            erp = ERPService()
+        if engine is None:
+            from app.extensions import db
+
+            engine = db.engine
+        self.erp = erp
+        self.engine = engine
+
+    def compute(self, today=None) -> tuple[dict[str, dict], dict[tuple[str, str], dict]]:
+        """Return ({system_id: branch tiles}, {(scope, scope_key): scope tiles})."""
+        sales = self.erp.get_sales_hub_metrics_grouped()
+        deliveries = self.erp.get_delivery_counts_by_branch()
+        with self.engine.connect() as conn:
+            local = local_tile_counts(conn, today)
+
+        branch_tiles = {}
+        for system_id in set(sales["branches"]) | set(deliveries) | set(local["completed_by_branch"]):
+            metrics = sales["branches"].get(system_id, {})
+            branch_tiles[system_id] = {
+                "sales_open_orders": metrics.get("open_orders_count", 0),
+                "sales_orders_today": metrics.get("total_orders_today", 0),
+                "todays_deliveries": deliveries.get(system_id, 0),
+                "picks_completed_today": local["completed_by_branch"].get(system_id, 0),
+            }
+
+        scope_tiles = {
+            ALL_SCOPE: {
+                "sales_open_orders": sales["all"]["open_orders_count"],
+                "sales_orders_today": sales["all"]["total_orders_today"],
+                "picks_completed_today": local["picks_completed_today"],
+                "total_pickers": local["total_pickers"],
+                "active_pickers": local["active_pickers"],
+                "pending_po_reviews": local["pending_po_reviews"],
+            }
+        }
+        for rep_id, metrics in sales["reps"].items():
+            scope_tiles[("rep", rep_id[:64])] = {
+                "sales_open_orders": metrics["open_orders_count"],
+                "sales_orders_today": metrics["total_orders_today"],
+            }
+        return branch_tiles, scope_tiles
+
+    def refresh(self, today=None) -> dict[str, Any]:
+        started = time.monotonic()
+        branch_tiles, scope_tiles = self.compute(today)
+        now = datetime.utcnow()
+        with self.engine.begin() as conn:
+            branches_changed = self._write_branches(conn, branch_tiles, now)
+            scopes_changed = self._write_scopes(conn, scope_tiles, now)
+        return {
+            "branches": len(branch_tiles),
+            "reps": len(scope_tiles) - 1,
+            "changed": branches_changed + scopes_changed,
+            "duration_ms": int((time.monotonic() - started) * 1000),
+        }
+
+    def _write_branches(self, conn, tiles, now) -> int:
+        columns = [BRANCH_STATS.c[name] for name in BRANCH_TILES]
+        existing = {
+            row.system_id: tuple(row[1:])
+            for row in conn.execute(select(BRANCH_STATS.c.system_id, *columns))
+        }
+        zeros = dict.fromkeys(BRANCH_TILES, 0)
+        changed = 0
+        # A branch that dropped out of every tile is written back as zero.
+        for system_id in set(existing) | set(tiles):
+            values = tiles.get(system_id, zeros)
+            if existing.get(system_id) == tuple(values[name] for name in BRANCH_TILES):
+                continue
+            changed += 1
+            if system_id in existing:
+                conn.execute(
+                    BRANCH_STATS.update()
+                    .where(BRANCH_STATS.c.system_id == system_id)
+                    .values(**values, stats_version=BRANCH_STATS.c.stats_version + 1)
+                )
+            else:
+                # sync_erp may insert the same branch's pick counts concurrently.
+                conn.execute(self._upsert_branch(conn).values(
+                    system_id=system_id, open_picks=0, open_work_orders=0, updated_at=now,
+                    stats_version=1, **values,
+                ).on_conflict_do_update(
+                    index_elements=["system_id"],
+                    set_={**values, "stats_version": BRANCH_STATS.c.stats_version + 1},
+                ))
+        return changed
+
+    @staticmethod
+    def _upsert_branch(conn):
+        if conn.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        return insert(BRANCH_STATS)
+
+    def _write_scopes(self, conn, tiles, now) -> int:
+        columns = [SCOPE_STATS.c[name] for name in SCOPE_TILES]
+        existing = {
+            (row.scope, row.scope_key): tuple(row[2:])
+            for row in conn.execute(select(SCOPE_STATS.c.scope, SCOPE_STATS.c.scope_key, *columns))
+        }
+        key_match = (SCOPE_STATS.c.scope == bindparam("b_scope")) & (SCOPE_STATS.c.scope_key == bindparam("b_key"))
+
+        stale = [{"b_scope": scope, "b_key": key} for scope, key in existing if (scope, key) not in tiles]
+        if stale:
+            conn.execute(SCOPE_STATS.delete().where(key_match), stale)
+
+        changed = len(stale)
+        for (scope, key), values in tiles.items():
+            values = {name: values.get(name) for name in SCOPE_TILES}
+            if existing.get((scope, key)) == tuple(values.values()):
+                if (scope, key) == ALL_SCOPE:
+                    # The 'all' row doubles as the heartbeat the homepage checks for freshness.
+                    conn.execute(SCOPE_STATS.update().where(key_match).values(updated_at=now),
+                                 {"b_scope": scope, "b_key": key})
+                continue
+            changed += 1
+            if (scope, key) in existing:
+                conn.execute(
+                    SCOPE_STATS.update().where(key_match)
+                    .values(**values, updated_at=now, stats_version=SCOPE_STATS.c.stats_version + 1),
+                    {"b_scope": scope, "b_key": key},
+                )
+            else:
+                conn.execute(SCOPE_STATS.insert().values(
+                    scope=scope, scope_key=key, updated_at=now, stats_version=1, **values,
+                ))
+        return changed
+
+
+def read_workcenter_tiles(branch=None, rep_id=None, engine=None) -> dict[str, Any] | None:
+    """
+    Every tile the homepage shows for *branch* / *rep_id*, in one query.
+
+    Returns None when the sync worker hasn't written the tiles yet, or when the
+    builder's 'all' row or sync_erp's last successful cycle (erp_sync_state) is
+    older than DASHBOARD_STATS_MAX_AGE_SECONDS; callers then query the tiles
+    live.  ``versions`` lists (scope, key, stats_version) for every tile row
+    read, for the page's ETag.
+    """
+    if engine is None:
+        from app.extensions import db
+
+        engine = db.engine
+    branch_ids = BRANCH_GROUPS.get(branch, [branch]) if branch else None
+    scope_nulls = ", ".join(f"NULL AS {name}" for name in ("open_picks", "handling_breakdown_json", "open_work_orders",
+                                                            "todays_deliveries"))
+    branch_nulls = ", ".join(f"NULL AS {name}" for name in ("total_pickers", "active_pickers", "pending_po_reviews"))
+    tile_nulls = ", ".join(["NULL"] * 10)
+    sql = f"""
+        SELECT 'branch' AS scope, system_id AS scope_key, stats_version, updated_at,
+               sales_open_orders, sales_orders_today, picks_completed_today,
+               open_picks, handling_breakdown_json, open_work_orders, todays_deliveries,
+               {branch_nulls}
+        FROM dashboard_stats
+        {"WHERE system_id IN :branch_ids" if branch_ids else ""}
+        UNION ALL
+        SELECT scope, scope_key, stats_version, updated_at,
+               sales_open_orders, sales_orders_today, picks_completed_today,
+               {scope_nulls},
+               total_pickers, active_pickers, pending_po_reviews
+        FROM dashboard_scope_stats
+        WHERE (scope = 'all' AND scope_key = '*') OR (scope = 'rep' AND scope_key = :rep_id)
+        UNION ALL
+        SELECT 'sync', '*', 0, MAX(last_success_at), {tile_nulls}
+        FROM erp_sync_state
+    """
+    statement = text(sql)
+    params = {"rep_id": str(rep_id or "")}
+    if branch_ids:
+        statement = statement.bindparams(bindparam("branch_ids", expanding=True))
+        params["branch_ids"] = branch_ids
+    with engine.connect() as conn:
+        rows = conn.execute(statement, params).mappings().all()
+
+    overall = next((row for row in rows if row["scope"] == "all"), None)
+    if overall is None:
+        return None
+    branch_rows = [row for row in rows if row["scope"] == "branch"]
+    # Branch rows carry sync_erp's open pick / WO counts, which go stale on
+    # their own when that worker stops; its heartbeat row says whether it has.
+    heartbeat = next(row for row in rows if row["scope"] == "sync")
+    max_age = get_dashboard_stats_settings()["max_age_seconds"]
+    now = datetime.utcnow()
+    for row in (overall, heartbeat):
+        if row["updated_at"] is None or (now - _coerce_datetime(row["updated_at"])).total_seconds() > max_age:
+            return None
+
+    rep_row = next((row for row in rows if row["scope"] == "rep"), None)
+    sales_row = rep_row if rep_id else overall
+
+    breakdown = {}
+    for row in branch_rows:
+        try:
+            for code, count in json.loads(row["handling_breakdown_json"] or "{}").items():
+                breakdown[code] = breakdown.get(code, 0) + count
+        except (ValueError, TypeError):
+            pass
+
+    def branch_sum(name):
+        return sum(row[name] or 0 for row in branch_rows)
+
+    return {
+        # A rep without a row has no open orders.
+        "sales_open_orders": sales_row["sales_open_orders"] if sales_row else 0,
+        "sales_orders_today": sales_row["sales_orders_today"] if sales_row else 0,
+        "open_picks": branch_sum("open_picks"),
+        "handling_breakdown": breakdown,
+        "open_work_orders": branch_sum("open_work_orders"),
+        "todays_deliveries": branch_sum("todays_deliveries"),
+        "picks_completed_today": overall["picks_completed_today"],
+        "total_pickers": overall["total_pickers"],
+        "active_pickers": overall["active_pickers"],
+        "pending_po_reviews": overall["pending_po_reviews"],
+        "versions": sorted(
+            (row["scope"], str(row["scope_key"]), int(row["stats_version"] or 0)) for row in rows if row is not heartbeat
+        ),
+    }
+
+
+def refresh_dashboard_tiles() -> dict[str, Any]:
+    """Sync-worker entry point."""
+    result = DashboardStatsBuilder().refresh()
+    print(
+        f"[{datetime.now()}] Dashboard tiles: {result['branches']} branches, {result['reps']} reps, "
+        f"{result['changed']} changed in {result['duration_ms']}ms"
+    )
+    return result
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Callable, Iterable
+
+# numpy costs ~80ms to import, so it loads on the first group-by, not with the app.
+_UNLOADED = object()
+np = _UNLOADED
+
+# Measure order used everywhere below: orders, same-day, after-noon, qty, pieces.
+MEASURE_COUNT = 5
+COUNT_MEASURES = 3
+EMPTY_MEASURES = (0,) * MEASURE_COUNT
+
+
+def _numpy():
+    """The numpy module, or None when it isn't installed."""
+    global np
+    if np is _UNLOADED:
+        try:
+            import numpy
+        except ImportError:  # the pure-Python group-by gives identical results, just slower
+            numpy = None
+        np = numpy
+    return np
+
+
+def _empty() -> list:
+    # Integer zeros so an empty group formats exactly like sum([]) did.
+    return [0] * MEASURE_COUNT
+
+
+def _add(target: list, values) -> None:
+    for index in range(MEASURE_COUNT):
+        target[index] += values[index]
+
+
+def _encode(values: list) -> tuple[list[int], list]:
+    """Dictionary-encode *values*: (integer code per value, label per code)."""
+    codes: dict = {}
+    encoded = [codes.setdefault(value, len(codes)) for value in values]
+    return encoded, list(codes)
+
+
+class DeliveryColumns:
+    """
+    Delivery rows decoded once into parallel columns.
+
+    Ship dates become day ordinals and store / sale type group / ship-via
+    bucket become integer codes into ``stores`` / ``groups`` / ``buckets``.
+    ``measures`` maps a row to its five measures, so both per-order rows and
+    pre-summed daily rollups load the same way.  Rows without a ship date are
+    dropped (no window or trend counts them).
+    """
+
+    def __init__(self, rows: Iterable[dict[str, Any]], measures: Callable[[dict[str, Any]], tuple]):
+        rows = [row for row in rows if row["ship_date"]]
+        self.day = [row["ship_date"].toordinal() for row in rows]
+        self.store, self.stores = _encode([row["store"] for row in rows])
+        self.group, self.groups = _encode([row["sale_type_group"] for row in rows])
+        self.bucket, self.buckets = _encode([row["ship_via_bucket"] for row in rows])
+        self.values = tuple(map(list, zip(*map(measures, rows)))) or tuple([] for _ in range(MEASURE_COUNT))
+
+    def __len__(self) -> int:
+        return len(self.day)
+
+    def group_sum(self, keys: list[int | None]) -> dict[int, list]:
+        """Sum every measure per integer key in one pass; ``None`` keys are skipped."""
+        if _numpy() is not None:
+            return self._group_sum_numpy(keys)
+
+        slots: dict[int, int] = {}
+        positions = [None if key is None else slots.setdefault(key, len(slots)) for key in keys]
+        sums = [[0] * len(slots) for _ in range(MEASURE_COUNT)]
+        for column, target in zip(self.values, sums):
+            for position, value in zip(positions, column):
+                if position is not None:
+                    target[position] += value
+        return {key: [sums[column][slot] for column in range(MEASURE_COUNT)] for key, slot in slots.items()}
+
+    def _group_sum_numpy(self, keys: list[int | None]) -> dict[int, list]:
+        mask = np.fromiter((key is not None for key in keys), dtype=bool, count=len(keys))
+        packed = np.fromiter((key or 0 for key in keys), dtype=np.int64, count=len(keys))[mask]
+        if not len(packed):
+            return {}
+        unique_keys, inverse = np.unique(packed, return_inverse=True)
+        sums = [
+            np.bincount(inverse, weights=np.asarray(column, dtype=np.float64)[mask], minlength=len(unique_keys))
+            for column in self.values
+        ]
+        result = {}
+        for slot, key in enumerate(unique_keys.tolist()):
+            values = [int(round(sums[column][slot])) for column in range(COUNT_MEASURES)]
+            values.extend(float(sums[column][slot]) for column in range(COUNT_MEASURES, MEASURE_COUNT))
+            result[key] = values
+        return result
+
+
+@dataclass
+class WindowTotals:
+    total: list = field(default_factory=_empty)
+    by_store: dict = field(default_factory=lambda: defaultdict(_empty))
+    by_group: dict = field(default_factory=lambda: defaultdict(_empty))
+    by_store_group: dict = field(default_factory=lambda: defaultdict(_empty))
+    by_group_bucket: dict = field(default_factory=lambda: defaultdict(_empty))
+    by_store_group_bucket: dict = field(default_factory=lambda: defaultdict(_empty))
+
+
+@dataclass
+class DeliveryAggregate:
+    """Every window, grouping and trend of the delivery dashboard, keyed by labels."""
+    windows: dict[str, WindowTotals]
+    daily: dict[tuple[str, int], list]
+    monthly: dict[tuple[str, tuple[int, int]], list]
+
+
+def aggregate(
+    columns: DeliveryColumns,
+    windows: dict[str, date],
+    daily_range: tuple[date, date],
+    monthly_start: date,
+) -> DeliveryAggregate:
+    """
+    Compute every window, grouping and trend from one scan of the columns.
+
+    Rows are summed once per (store, group, bucket, window segment), where a
+    segment is the set of windows a ship date falls in, and once per (store,
+    day), which feeds both trends.  Segment and month lookups are resolved
+    over the distinct days only, and the small segment cube is then folded
+    into each window's groupings.
+    """
+    result = DeliveryAggregate(
+        windows={name: WindowTotals() for name in windows},
+        daily={},
+        monthly={},
+    )
+    if not len(columns):
+        return result
+
+    # Segment k covers ship dates in windows ordered[k:]; the last one is outside them all.
+    ordered = sorted(windows.items(), key=lambda item: item[1], reverse=True)
+    segment_count = len(ordered) + 1
+    daily_first, daily_last = (value.toordinal() for value in daily_range)
+    monthly_first = monthly_start.toordinal()
+    segment_of: dict[int, int] = {}
+    month_of: dict[int, tuple[int, int] | None] = {}
+    for day in set(columns.day):
+        segment_of[day] = next((index for index, (_, start) in enumerate(ordered) if day >= start.toordinal()), len(ordered))
+        ship_date = date.fromordinal(day)
+        month_of[day] = (ship_date.year, ship_date.month) if day >= monthly_first else None
+
+    group_count, bucket_count = len(columns.groups), len(columns.buckets)
+    cube = columns.group_sum([
+        ((store * group_count + group) * bucket_count + bucket) * segment_count + segment_of[day]
+        for store, group, bucket, day in zip(columns.store, columns.group, columns.bucket, columns.day)
+    ])
+    for packed, sums in cube.items():
+        rest, segment = divmod(packed, segment_count)
+        rest, bucket_code = divmod(rest, bucket_count)
+        store_code, group_code = divmod(rest, group_count)
+        store, group, bucket = columns.stores[store_code], columns.groups[group_code], columns.buckets[bucket_code]
+        for name, _start in ordered[segment:]:
+            totals = result.windows[name]
+            _add(totals.total, sums)
+            _add(totals.by_store[store], sums)
+            _add(totals.by_group[(group,)], sums)
+            _add(totals.by_store_group[(store, group)], sums)
+            _add(totals.by_group_bucket[(group, bucket)], sums)
+            _add(totals.by_store_group_bucket[(store, group, bucket)], sums)
+
+    first_day = min(columns.day)
+    day_span = max(columns.day) - first_day + 1
+    by_store_day = columns.group_sum([store * day_span + day - first_day for store, day in zip(columns.store, columns.day)])
+    for packed, sums in by_store_day.items():
+        store_code, offset = divmod(packed, day_span)
+        store, day = columns.stores[store_code], first_day + offset
+        if daily_first <= day <= daily_last:
+            result.daily[(store, day)] = sums
+        month = month_of[day]
+        if month is not None:
+            _add(result.monthly.setdefault((store, month), _empty()), sums)
+    return result
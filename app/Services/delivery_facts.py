@@ -0,0 +1,327 @@
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+from typing import Any
+
+from sqlalchemy import case, delete, func, insert, inspect, select, text
+
+from app.Models.models import DeliveryDailyRollup, DeliveryOrderFact
+
+FACTS = DeliveryOrderFact.__table__
+ROLLUPS = DeliveryDailyRollup.__table__
+
+ROLLUP_KEYS = ("store", "ship_date", "sale_type_group", "ship_via_bucket")
+ROLLUP_MEASURES = (
+    "delivered_orders",
+    "same_day_delivered_orders",
+    "same_day_after_noon_count",
+    "total_shipped_qty",
+    "reference_piece_count",
+)
+
+
+class DeliveryFactStore:
+    """
+    Incrementally maintained delivery facts for DeliveryReportingService.
+
+    ``refresh()`` finds the ship dates touched by mirror rows synced since the
+    last run (shipment header/detail, SO header, tally), deletes those dates
+    from erp_delivery_order_facts and erp_delivery_daily_rollups and rebuilds
+    them from the reporting query.  Each chunk of dates is swapped in one
+    transaction so readers never see a half-built day.  The watermark (max
+    mirror synced_at) lives in erp_sync_table_state like the mirror tables'.
+    """
+
+    STATE_TABLE_NAME = "erp_delivery_order_facts"
+    SOURCE_TABLES = (
+        "erp_mirror_shipments_header",
+        "erp_mirror_shipments_detail",
+        "erp_mirror_so_header",
+        "erp_mirror_shipments_tally_detail",
+    )
+    # Sync writes stamp synced_at before they commit, so a row stamped just
+    # before a refresh may only become visible after it.  The stored watermark
+    # never gets closer than this to the refresh start.
+    WATERMARK_OVERLAP = timedelta(minutes=2)
+    DATES_PER_CHUNK = 31
+    INSERT_BATCH_SIZE = 2000
+
+    def __init__(self, reporting=None, engine=None) -> None:
+        if reporting is None:
+            from app.Services.delivery_reporting_service import DeliveryReportingService
+
+            reporting = DeliveryReportingService()
+        self.reporting = reporting
+        self.engine = engine if engine is not None else reporting.erp._mirror_engine()
+
+    # ------------------------------------------------------------------
+    # Readers
+    # ------------------------------------------------------------------
+
+    def is_ready(self) -> bool:
+        """True once a full build has completed."""
+        if self.engine is None:
+            return False
+        try:
+            with self.engine.connect() as conn:
+                value = conn.execute(
+                    text("SELECT last_success_at FROM erp_sync_table_state WHERE table_name = :table_name"),
+                    {"table_name": self.STATE_TABLE_NAME},
+                ).scalar()
+        except Exception:
+            return False
+        return value is not None
+
+    def daily_rollups(self, start_date: date) -> list[dict[str, Any]]:
+        query = select(*(ROLLUPS.c[name] for name in ROLLUP_KEYS + ROLLUP_MEASURES)).where(
+            ROLLUPS.c.ship_date >= start_date
+        )
+        with self.engine.connect() as conn:
+            return [dict(row) for row in conn.execute(query).mappings()]
+
+    def order_rows(self, start_date: date, sale_type_group: str = "All", limit: int | None = None) -> list[dict[str, Any]]:
+        """Fact rows newest first, in the reporting detail order."""
+        query = (
+            select(*(column for column in FACTS.c if column.name != "id"))
+            .where(FACTS.c.ship_date >= start_date)
+            .order_by(FACTS.c.ship_date.desc(), FACTS.c.store.desc(), FACTS.c.so_id.desc())
+        )
+        if sale_type_group != "All":
+            query = query.where(func.lower(FACTS.c.sale_type_group) == sale_type_group.lower())
+        if limit is not None:
+            query = query.limit(limit)
+        with self.engine.connect() as conn:
+            return [dict(row) for row in conn.execute(query).mappings()]
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def refresh(self, rebuild: bool = False) -> dict[str, Any]:
+        """Bring the facts up to date; a full rebuild on first run or on request."""
+        if self.engine is None:
+            raise RuntimeError("Delivery facts require CENTRAL_DB_URL / DATABASE_URL mirror access.")
+
+        started = datetime.utcnow()
+        start_12m = self.reporting._window_start("12m")
+        watermark = None if rebuild else self._load_watermark()
+        source_mark = self._source_watermark()
+        if source_mark is not None:
+            source_mark = min(source_mark, started - self.WATERMARK_OVERLAP)
+
+        if watermark is None:
+            dates = None
+            fact_rows = self._write_dates(None)
+        else:
+            dates = sorted(d for d in self._changed_dates(watermark) if d >= start_12m)
+            fact_rows = 0
+            for offset in range(0, len(dates), self.DATES_PER_CHUNK):
+                fact_rows += self._write_dates(dates[offset:offset + self.DATES_PER_CHUNK])
+
+        with self.engine.begin() as conn:
+            conn.execute(delete(FACTS).where(FACTS.c.ship_date < start_12m))
+            conn.execute(delete(ROLLUPS).where(ROLLUPS.c.ship_date < start_12m))
+
+        duration_ms = int((datetime.utcnow() - started).total_seconds() * 1000)
+        self._record_state(source_mark or watermark, fact_rows, duration_ms)
+        return {
+            "mode": "rebuild" if dates is None else "incremental",
+            "ship_dates": None if dates is None else len(dates),
+            "fact_rows": fact_rows,
+            "duration_ms": duration_ms,
+        }
+
+    def _write_dates(self, ship_dates: list[date] | None) -> int:
+        """Replace facts + rollups for *ship_dates* (None = the whole 12-month window)."""
+        if ship_dates is not None and not ship_dates:
+            return 0
+        rows = self.reporting._iter_order_rows(ship_dates=ship_dates)
+        written = 0
+        with self.engine.begin() as conn:
+            if ship_dates is None:
+                conn.execute(delete(FACTS))
+                conn.execute(delete(ROLLUPS))
+            else:
+                conn.execute(delete(FACTS).where(FACTS.c.ship_date.in_(ship_dates)))
+                conn.execute(delete(ROLLUPS).where(ROLLUPS.c.ship_date.in_(ship_dates)))
+
+            batch: list[dict[str, Any]] = []
+            for row in rows:
+                if row["ship_date"] is None:
+                    continue
+                batch.append(row)
+                if len(batch) >= self.INSERT_BATCH_SIZE:
+                    conn.execute(insert(FACTS), batch)
+                    written += len(batch)
+                    batch = []
+            if batch:
+                conn.execute(insert(FACTS), batch)
+                written += len(batch)
+
+            conn.execute(self._rollup_insert(ship_dates))
+        return written
+
+    def _rollup_insert(self, ship_dates: list[date] | None):
+        same_day = func.sum(case((FACTS.c.same_day_flag, 1), else_=0))
+        after_noon = func.sum(case((FACTS.c.same_day_after_noon_flag, 1), else_=0))
+        query = select(
+            *(FACTS.c[name] for name in ROLLUP_KEYS),
+            func.count(),
+            same_day,
+            after_noon,
+            func.sum(FACTS.c.total_shipped_qty),
+            func.sum(FACTS.c.reference_piece_count),
+        ).group_by(*(FACTS.c[name] for name in ROLLUP_KEYS))
+        if ship_dates is not None:
+            query = query.where(FACTS.c.ship_date.in_(ship_dates))
+        return insert(ROLLUPS).from_select(list(ROLLUP_KEYS + ROLLUP_MEASURES), query)
+
+    def _existing_sources(self) -> list[str]:
+        inspector = inspect(self.engine)
+        return [name for name in self.SOURCE_TABLES if inspector.has_table(name)]
+
+    def _source_watermark(self) -> datetime | None:
+        marks = []
+        with self.engine.connect() as conn:
+            for table_name in self._existing_sources():
+                marks.append(self._coerce_datetime(conn.execute(text(f"SELECT MAX(synced_at) FROM {table_name}")).scalar()))
+        marks = [mark for mark in marks if mark is not None]
+        return max(marks) if marks else None
+
+    def _changed_dates(self, since: datetime) -> set[date]:
+        """Ship dates of shipments whose header, lines, SO header or tally
+        changed since *since*, plus the dates those orders were filed under
+        before (a shipment whose ship_date moved leaves its old day stale)."""
+        sources = set(self._existing_sources())
+        statements = [
+            """
+            SELECT DATE(sh.ship_date) FROM erp_mirror_shipments_header sh
+            WHERE sh.synced_at > :since AND sh.ship_date IS NOT NULL
+            """,
+            """
+            SELECT DATE(sh.ship_date) FROM erp_mirror_shipments_detail sd
+            JOIN erp_mirror_shipments_header sh
+                ON sh.system_id = sd.system_id AND sh.so_id = sd.so_id AND sh.shipment_num = sd.shipment_num
+            WHERE sd.synced_at > :since AND sh.ship_date IS NOT NULL
+            """,
+            """
+            SELECT DATE(sh.ship_date) FROM erp_mirror_so_header soh
+            JOIN erp_mirror_shipments_header sh ON sh.system_id = soh.system_id AND sh.so_id = soh.so_id
+            WHERE soh.synced_at > :since AND sh.ship_date IS NOT NULL
+            """,
+            """
+            SELECT f.ship_date FROM erp_mirror_shipments_header sh
+            JOIN erp_delivery_order_facts f ON f.store = sh.system_id AND f.so_id = sh.so_id
+            WHERE sh.synced_at > :since
+            """,
+            """
+            SELECT f.ship_date FROM erp_mirror_so_header soh
+            JOIN erp_delivery_order_facts f ON f.store = soh.system_id AND f.so_id = soh.so_id
+            WHERE soh.synced_at > :since
+            """,
+        ]
+        if "erp_mirror_shipments_tally_detail" in sources and "synced_at" in set(
+            self.reporting._safe_columns("erp_mirror_shipments_tally_detail")
+        ):
+            statements.append(
+                """
+                SELECT DATE(sh.ship_date) FROM erp_mirror_shipments_tally_detail tally
+                JOIN erp_mirror_shipments_header sh
+                    ON sh.system_id = tally.system_id
+                   AND sh.so_id = CAST(tally.so_id AS TEXT)
+                   AND sh.shipment_num = CAST(tally.shipment_num AS TEXT)
+                WHERE tally.synced_at > :since AND sh.ship_date IS NOT NULL
+                """
+            )
+
+        dates: set[date] = set()
+        with self.engine.connect() as conn:
+            for statement in statements:
+                for (value,) in conn.execute(text(statement), {"since": since}):
+                    coerced = self.reporting._coerce_date(value)
+                    if coerced is not None:
+                        dates.add(coerced)
+        return dates
+
+    def _load_watermark(self) -> datetime | None:
+        try:
+            with self.engine.connect() as conn:
+                value = conn.execute(
+                    text(
+                        "SELECT last_source_updated_at FROM erp_sync_table_state "
+                        "WHERE table_name = :table_name AND last_success_at IS NOT NULL"
+                    ),
+                    {"table_name": self.STATE_TABLE_NAME},
+                ).scalar()
+        except Exception:
+            return None
+        return self._coerce_datetime(value)
+
+    def _record_state(self, source_mark: datetime | None, row_count: int, duration_ms: int) -> None:
+        now = datetime.utcnow()
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    """
+                    INSERT INTO erp_sync_table_state (
+                        table_name, family, strategy, last_status, last_success_at,
+                        last_source_updated_at, last_row_count, last_duration_ms
+                    ) VALUES (
+                        :table_name, 'operational', 'incremental', 'success', :now,
+                        :source_mark, :row_count, :duration_ms
+                    )
+                    ON CONFLICT (table_name) DO UPDATE SET
+                        last_status = 'success',
+                        last_success_at = :now,
+                        last_error = NULL,
+                        last_source_updated_at = :source_mark,
+                        last_row_count = :row_count,
+                        last_duration_ms = :duration_ms
+                    """
+                ),
+                {
+                    "table_name": self.STATE_TABLE_NAME,
+                    "now": now,
+                    "source_mark": source_mark,
+                    "row_count": row_count,
+                    "duration_ms": duration_ms,
+                },
+            )
+
+    @staticmethod
+    def _coerce_datetime(value: Any) -> datetime | None:
+        if value is None or isinstance(value, datetime):
+            return value
+        return datetime.fromisoformat(str(value))
+
+
+def refresh_delivery_facts(rebuild: bool = False) -> dict[str, Any] | None:
+    """Sync-worker entry point; no-op when the mirror database is not configured."""
+    store = DeliveryFactStore()
+    if store.engine is None:
+        return None
+    result = store.refresh(rebuild=rebuild)
+    print(
+        f"[{datetime.now()}] Delivery facts {result['mode']}: "
+        f"{result['fact_rows']} orders over {result['ship_dates'] if result['ship_dates'] is not None else 'all'} ship dates "
+        f"in {result['duration_ms']}ms"
+    )
+    return result
+
+
+
+def main() -> None:
+    import argparse
+
+    from app.runtime_settings import load_tracker_env
+
+    parser = argparse.ArgumentParser(description="Build or refresh the delivery reporting fact tables.")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the whole 12-month window")
+    args = parser.parse_args()
+    load_tracker_env()
+    if refresh_delivery_facts(rebuild=args.rebuild) is None:
+        raise SystemExit("CENTRAL_DB_URL / DATABASE_URL is not configured.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
-from collections import defaultdict
 from datetime import date, datetime, time, timedelta
 from decimal import Decimal
-from typing import Any
+from itertools import islice, takewhile
+from typing import Any, Iterator
 
+from app.Services.delivery_aggregation import EMPTY_MEASURES, DeliveryColumns, WindowTotals, aggregate
+from app.Services.delivery_facts import DeliveryFactStore
 from app.Services.erp_service import ERPService
 
 
@@ -24,6 +26,10 @@ class DeliveryReportingService:
     - Reference piece count:
         Use tally piece_count when available.
         Otherwise fall back to shipped qty only for piece-based UOMs.
+
+    Once DeliveryFactStore has been built (sync worker), dashboards and
+    exports read the per-order facts and daily rollups instead of re-running
+    the 12-month shipment query.
     """
 
     STORE_CODES = ("20GR", "25BW", "10FD", "40CV")
@@ -37,18 +43,35 @@ class DeliveryReportingService:
 
     def get_dashboard_payload(self, sale_type: str = "all", detail_limit: int = 250) -> dict[str, Any]:
         self._require_central_db()
-        rows = self._fetch_order_rows()
-        available_sale_types = self._available_sale_types(rows)
-        filtered_rows = self._filter_sale_type(rows, sale_type)
-
         today = date.today()
         start_30d = today - timedelta(days=29)
         start_12m = self._month_floor(self._shift_months(today, -11))
 
+        facts = self._fact_store()
+        rows = facts.daily_rollups(start_12m) if facts else self._fetch_order_rows()
+        available_sale_types = self._available_sale_types(rows)
+        filtered_rows = self._filter_sale_type(rows, sale_type)
+        sale_type_filter = self._normalize_sale_type_filter(sale_type)
+
+        # One columnar group-by pass feeds both windows and both trends.
+        totals = aggregate(
+            DeliveryColumns(filtered_rows, self._row_measures),
+            windows={"30d": start_30d, "12m": start_12m},
+            daily_range=(start_30d, today),
+            monthly_start=start_12m,
+        )
+        sorted_rows = None
+        if facts is None:
+            sorted_rows = sorted(
+                (row for row in filtered_rows if row["ship_date"]),
+                key=lambda item: (item["ship_date"], item["store"], item["so_id"]),
+                reverse=True,
+            )
+
         return {
             "generated_at": datetime.utcnow().isoformat() + "Z",
             "stores": list(self.STORE_CODES),
-            "sale_type_filter": self._normalize_sale_type_filter(sale_type),
+            "sale_type_filter": sale_type_filter,
             "available_sale_types": available_sale_types,
             "metric_definitions": {
                 "delivered_orders": "Distinct delivered orders using ship_date as the delivery date.",
@@ -57,19 +80,23 @@ class DeliveryReportingService:
                 "reference_piece_count": "Tally piece_count when available, otherwise shipped qty only for piece-based UOMs.",
             },
             "windows": {
-                "30d": self._build_window_payload(filtered_rows, start_30d, detail_limit),
-                "12m": self._build_window_payload(filtered_rows, start_12m, detail_limit),
+                "30d": self._build_window_payload(totals.windows["30d"], start_30d, detail_limit, facts, sale_type_filter, sorted_rows),
+                "12m": self._build_window_payload(totals.windows["12m"], start_12m, detail_limit, facts, sale_type_filter, sorted_rows),
             },
             "trends": {
-                "daily_30d": self._build_daily_trend(filtered_rows, start_30d, today),
-                "monthly_12m": self._build_monthly_trend(filtered_rows, start_12m, today),
+                "daily_30d": self._build_daily_trend(totals.daily, start_30d, today),
+                "monthly_12m": self._build_monthly_trend(totals.monthly, start_12m, today),
             },
         }
 
     def get_export_rows(self, sale_type: str = "all", window: str = "30d") -> list[dict[str, Any]]:
         self._require_central_db()
-        rows = self._filter_sale_type(self._fetch_order_rows(), sale_type)
         start_date = self._window_start(window)
+        facts = self._fact_store()
+        if facts:
+            rows = facts.order_rows(start_date, self._normalize_sale_type_filter(sale_type))
+            return [self._serialize_detail_row(row) for row in rows]
+        rows = self._filter_sale_type(self._fetch_order_rows(), sale_type)
         return [
             self._serialize_detail_row(row)
             for row in sorted(
@@ -83,6 +110,10 @@ class DeliveryReportingService:
         if not self.erp.central_db_mode:
             raise RuntimeError("Delivery reporting requires CENTRAL_DB_URL / DATABASE_URL mirror access.")
 
+    def _fact_store(self) -> DeliveryFactStore | None:
+        store = DeliveryFactStore(self)
+        return store if store.is_ready() else None
+
     def _safe_columns(self, table_name: str) -> set[str]:
         try:
             return set(self.erp._mirror_columns(table_name))
@@ -105,7 +136,13 @@ class DeliveryReportingService:
             return self._month_floor(self._shift_months(today, -11))
         return today - timedelta(days=29)
 
-    def _fetch_order_rows(self) -> list[dict[str, Any]]:
+    def _fetch_order_rows(self, ship_dates: list[date] | None = None) -> list[dict[str, Any]]:
+        """Delivered orders for the 12-month window, or only for *ship_dates*."""
+        return list(self._iter_order_rows(ship_dates))
+
+    def _iter_order_rows(self, ship_dates: list[date] | None = None) -> Iterator[dict[str, Any]]:
+        """Like _fetch_order_rows, but normalizes rows as the server-side cursor
+        yields them, for callers that make a single pass."""
         so_columns = self._safe_columns("erp_mirror_so_header")
         ship_columns = self._safe_columns("erp_mirror_shipments_header")
         ship_detail_columns = self._safe_columns("erp_mirror_shipments_detail")
@@ -175,22 +212,37 @@ class DeliveryReportingService:
             tally_join = f"LEFT JOIN tally ON {' AND '.join(join_parts)}"
             piece_expr = "tally.piece_count"
 
-        start_12m = self._window_start("12m")
-        rows = self.erp._mirror_query(
+        params: dict[str, Any] = {
+            "stores": list(self.STORE_CODES),
+            "piece_uoms": sorted(self.PIECE_BASED_UOMS),
+        }
+        expanding = {"stores", "piece_uoms"}
+        if ship_dates is None:
+            date_filter = "sh.ship_date >= :start_12m"
+            params["start_12m"] = self._window_start("12m").isoformat()
+        else:
+            # The range keeps the (ship_date) index usable; DATE() picks the exact days.
+            date_filter = "sh.ship_date >= :date_from AND sh.ship_date < :date_to AND DATE(sh.ship_date) IN :ship_dates"
+            params["date_from"] = min(ship_dates).isoformat()
+            params["date_to"] = (max(ship_dates) + timedelta(days=1)).isoformat()
+            params["ship_dates"] = sorted(value.isoformat() for value in ship_dates)
+            expanding.add("ship_dates")
+
+        rows = self.erp._mirror_stream(
             f"""
             WITH
             {tally_cte}
             shipment_lines AS (
                 SELECT
                     sh.system_id AS store,
-                    CAST(sh.ship_date AS DATE) AS ship_date,
-                    CAST(sh.so_id AS TEXT) AS so_id,
+                    DATE(sh.ship_date) AS ship_date,
+                    sh.so_id AS so_id,
                     COALESCE(NULLIF(TRIM(CAST(soh.sale_type AS TEXT)), ''), 'Unknown') AS sale_type_raw,
                     COALESCE(NULLIF(TRIM(CAST({ship_via_expr} AS TEXT)), ''), 'Unknown') AS ship_via_raw,
-                    CAST(soh.created_date AS DATE) AS order_date,
+                    DATE(soh.created_date) AS order_date,
                     {order_time_expr} AS order_time_raw,
                     CAST(sd.item_ptr AS TEXT) AS item_ptr,
-                    CONCAT(COALESCE(CAST(sh.shipment_num AS TEXT), ''), ':', COALESCE(CAST({line_no_expr} AS TEXT), '')) AS shipment_line_key,
+                    COALESCE(sh.shipment_num, '') || ':' || COALESCE(CAST({line_no_expr} AS TEXT), '') AS shipment_line_key,
                     COALESCE({qty_expr}, 0) AS shipped_qty,
                     CASE
                         WHEN {piece_expr} IS NOT NULL THEN COALESCE({piece_expr}, 0)
@@ -201,18 +253,18 @@ class DeliveryReportingService:
                 JOIN erp_mirror_shipments_detail sd
                     ON sd.is_deleted = false
                    AND sd.system_id = sh.system_id
-                   AND CAST(sd.so_id AS TEXT) = CAST(sh.so_id AS TEXT)
-                   AND CAST(sd.shipment_num AS TEXT) = CAST(sh.shipment_num AS TEXT)
+                   AND sd.so_id = sh.so_id
+                   AND sd.shipment_num = sh.shipment_num
                 JOIN erp_mirror_so_header soh
                     ON soh.is_deleted = false
                    AND soh.system_id = sh.system_id
-                   AND CAST(soh.so_id AS TEXT) = CAST(sh.so_id AS TEXT)
+                   AND soh.so_id = sh.so_id
                 LEFT JOIN erp_mirror_item i
                     ON i.is_deleted = false
-                   AND CAST(i.item_ptr AS TEXT) = CAST(sd.item_ptr AS TEXT)
+                   AND i.item_ptr = sd.item_ptr
                 {tally_join}
                 WHERE sh.is_deleted = false
-                  AND CAST(sh.ship_date AS DATE) >= :start_12m
+                  AND {date_filter}
                   AND sh.system_id IN :stores
                   AND UPPER(COALESCE(soh.sale_type, '')) <> 'DIRECT'
             )
@@ -239,45 +291,40 @@ class DeliveryReportingService:
                 order_time_raw
             ORDER BY ship_date DESC, store, so_id
             """,
-            {
-                "start_12m": start_12m.isoformat(),
-                "stores": list(self.STORE_CODES),
-                "piece_uoms": sorted(self.PIECE_BASED_UOMS),
-            },
-            expanding={"stores", "piece_uoms"},
+            params,
+            expanding=expanding,
         )
+        return (self._normalize_order_row(row) for row in rows)
+
+    def _normalize_order_row(self, row: Any) -> dict[str, Any]:
+        """Apply the reporting rules (sale type group, ship-via bucket, same-day flags) to one query row."""
+        store = (row.store or "").strip()
+        ship_date = self._coerce_date(row.ship_date)
+        order_date = self._coerce_date(row.order_date)
+        order_time = self._parse_time_value(row.order_time_raw)
+        sale_type_raw = self._clean_text(row.sale_type_raw, default="Unknown")
+        sale_type_group = self._normalize_sale_type_group(sale_type_raw)
+        ship_via_raw = self._clean_text(row.ship_via_raw, default="Unknown")
+        same_day_flag = bool(order_date and ship_date and order_date == ship_date)
+        same_day_after_noon_flag = bool(same_day_flag and order_time and order_time >= time(12, 0))
 
-        normalized_rows: list[dict[str, Any]] = []
-        for row in rows:
-            store = (row.get("store") or "").strip()
-            ship_date = self._coerce_date(row.get("ship_date"))
-            order_date = self._coerce_date(row.get("order_date"))
-            order_time = self._parse_time_value(row.get("order_time_raw"))
-            sale_type_raw = self._clean_text(row.get("sale_type_raw"), default="Unknown")
-            sale_type_group = self._normalize_sale_type_group(sale_type_raw)
-            ship_via_raw = self._clean_text(row.get("ship_via_raw"), default="Unknown")
-            same_day_flag = bool(order_date and ship_date and order_date == ship_date)
-            same_day_after_noon_flag = bool(same_day_flag and order_time and order_time >= time(12, 0))
-
-            normalized_rows.append({
-                "store": store,
-                "ship_date": ship_date,
-                "so_id": self._clean_text(row.get("so_id")),
-                "sale_type": sale_type_raw,
-                "sale_type_group": sale_type_group,
-                "ship_via": ship_via_raw,
-                "ship_via_bucket": self._bucket_ship_via(store, sale_type_raw, sale_type_group, ship_via_raw),
-                "order_date": order_date,
-                "order_time": order_time,
-                "same_day_flag": same_day_flag,
-                "same_day_after_noon_flag": same_day_after_noon_flag,
-                "shipped_line_count": int(row.get("shipped_line_count") or 0),
-                "unique_item_count": int(row.get("unique_item_count") or 0),
-                "total_shipped_qty": self._to_float(row.get("total_shipped_qty")),
-                "reference_piece_count": self._to_float(row.get("reference_piece_count")),
-            })
-
-        return normalized_rows
+        return {
+            "store": store,
+            "ship_date": ship_date,
+            "so_id": self._clean_text(row.so_id),
+            "sale_type": sale_type_raw,
+            "sale_type_group": sale_type_group,
+            "ship_via": ship_via_raw,
+            "ship_via_bucket": self._bucket_ship_via(store, sale_type_raw, sale_type_group, ship_via_raw),
+            "order_date": order_date,
+            "order_time": order_time,
+            "same_day_flag": same_day_flag,
+            "same_day_after_noon_flag": same_day_after_noon_flag,
+            "shipped_line_count": int(row.shipped_line_count or 0),
+            "unique_item_count": int(row.unique_item_count or 0),
+            "total_shipped_qty": self._to_float(row.total_shipped_qty),
+            "reference_piece_count": self._to_float(row.reference_piece_count),
+        }
 
     def _coerce_date(self, value: Any) -> date | None:
         if value is None:
@@ -362,27 +409,54 @@ class DeliveryReportingService:
             return rows
         return [row for row in rows if row["sale_type_group"].lower() == normalized.lower()]
 
-    def _build_window_payload(self, rows: list[dict[str, Any]], start_date: date, detail_limit: int) -> dict[str, Any]:
-        window_rows = [row for row in rows if row["ship_date"] and row["ship_date"] >= start_date]
-        sorted_rows = sorted(window_rows, key=lambda item: (item["ship_date"], item["store"], item["so_id"]), reverse=True)
+    def _build_window_payload(
+        self,
+        totals: WindowTotals,
+        start_date: date,
+        detail_limit: int,
+        facts: DeliveryFactStore | None = None,
+        sale_type: str = "All",
+        sorted_rows: list[dict[str, Any]] | None = None,
+    ) -> dict[str, Any]:
+        detail_limit = max(1, min(detail_limit, 1000))
+        if facts is not None:
+            detail_rows = facts.order_rows(start_date, sale_type, limit=detail_limit)
+        else:
+            # sorted_rows is newest first, so each window's details are a prefix of it.
+            in_window = takewhile(lambda row: row["ship_date"] >= start_date, sorted_rows or [])
+            detail_rows = list(islice(in_window, detail_limit))
         return {
-            "summary": self._metric_block(window_rows),
-            "store_comparison": self._store_comparison(window_rows),
-            "sale_type_totals": self._group_metrics(window_rows, ("sale_type_group",)),
-            "sale_type_totals_by_store": self._group_metrics(window_rows, ("store", "sale_type_group")),
-            "sale_type_ship_via_totals": self._group_metrics(window_rows, ("sale_type_group", "ship_via_bucket")),
-            "sale_type_ship_via_totals_by_store": self._group_metrics(window_rows, ("store", "sale_type_group", "ship_via_bucket")),
-            "detail_total_count": len(sorted_rows),
-            "details": [self._serialize_detail_row(row) for row in sorted_rows[: max(1, min(detail_limit, 1000))]],
+            "summary": self._metric_block(totals.total),
+            "store_comparison": self._store_comparison(totals),
+            "sale_type_totals": self._group_metrics(totals.by_group, ("sale_type_group",)),
+            "sale_type_totals_by_store": self._group_metrics(totals.by_store_group, ("store", "sale_type_group")),
+            "sale_type_ship_via_totals": self._group_metrics(totals.by_group_bucket, ("sale_type_group", "ship_via_bucket")),
+            "sale_type_ship_via_totals_by_store": self._group_metrics(totals.by_store_group_bucket, ("store", "sale_type_group", "ship_via_bucket")),
+            "detail_total_count": totals.total[0],
+            "details": [self._serialize_detail_row(row) for row in detail_rows],
         }
 
-    def _metric_block(self, rows: list[dict[str, Any]]) -> dict[str, Any]:
-        delivered_orders = len(rows)
-        same_day_delivered_orders = sum(1 for row in rows if row["same_day_flag"])
-        same_day_after_noon_count = sum(1 for row in rows if row["same_day_after_noon_flag"])
-        total_shipped_qty = sum(row["total_shipped_qty"] for row in rows)
-        reference_piece_count = sum(row["reference_piece_count"] for row in rows)
+    def _row_measures(self, row: dict[str, Any]) -> tuple[int, int, int, float, float]:
+        """(orders, same-day, after-noon, qty, pieces) for an order row or a daily rollup row."""
+        if "delivered_orders" in row:
+            return (
+                row["delivered_orders"],
+                row["same_day_delivered_orders"],
+                row["same_day_after_noon_count"],
+                row["total_shipped_qty"],
+                row["reference_piece_count"],
+            )
+        return (
+            1,
+            1 if row["same_day_flag"] else 0,
+            1 if row["same_day_after_noon_flag"] else 0,
+            row["total_shipped_qty"],
+            row["reference_piece_count"],
+        )
 
+    def _metric_block(self, sums: list) -> dict[str, Any]:
+        """Format summed (orders, same-day, after-noon, qty, pieces) measures."""
+        delivered_orders, same_day_delivered_orders, same_day_after_noon_count, total_shipped_qty, reference_piece_count = sums
         return {
             "delivered_orders": delivered_orders,
             "same_day_delivered_orders": same_day_delivered_orders,
@@ -393,43 +467,34 @@ class DeliveryReportingService:
             "reference_piece_count": round(reference_piece_count, 2),
         }
 
-    def _store_comparison(self, rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    def _store_comparison(self, totals: WindowTotals) -> list[dict[str, Any]]:
         comparison: list[dict[str, Any]] = []
         for store in self.STORE_CODES:
-            store_rows = [row for row in rows if row["store"] == store]
-            metrics = self._metric_block(store_rows)
+            metrics = self._metric_block(totals.by_store.get(store) or EMPTY_MEASURES)
             metrics["store"] = store
             comparison.append(metrics)
 
-        total_metrics = self._metric_block(rows)
+        total_metrics = self._metric_block(totals.total)
         total_metrics["store"] = "Combined"
         comparison.append(total_metrics)
         return comparison
 
-    def _group_metrics(self, rows: list[dict[str, Any]], keys: tuple[str, ...]) -> list[dict[str, Any]]:
-        grouped: dict[tuple[Any, ...], list[dict[str, Any]]] = defaultdict(list)
-        for row in rows:
-            grouped[tuple(row[key] for key in keys)].append(row)
-
+    def _group_metrics(self, grouped: dict[tuple[Any, ...], list], keys: tuple[str, ...]) -> list[dict[str, Any]]:
         results: list[dict[str, Any]] = []
-        for key_values, group_rows in grouped.items():
+        for key_values, sums in grouped.items():
             payload = {key: value for key, value in zip(keys, key_values)}
-            payload.update(self._metric_block(group_rows))
+            payload.update(self._metric_block(sums))
             results.append(payload)
 
         return sorted(results, key=lambda item: tuple(str(item[key]) for key in keys))
 
-    def _build_daily_trend(self, rows: list[dict[str, Any]], start_date: date, end_date: date) -> list[dict[str, Any]]:
-        metrics_by_store_day: dict[tuple[str, date], list[dict[str, Any]]] = defaultdict(list)
-        for row in rows:
-            if row["ship_date"] and start_date <= row["ship_date"] <= end_date:
-                metrics_by_store_day[(row["store"], row["ship_date"])].append(row)
-
+    def _build_daily_trend(self, daily: dict[tuple[str, int], list], start_date: date, end_date: date) -> list[dict[str, Any]]:
         trend_rows: list[dict[str, Any]] = []
         cursor = start_date
         while cursor <= end_date:
+            day = cursor.toordinal()
             for store in self.STORE_CODES:
-                metrics = self._metric_block(metrics_by_store_day.get((store, cursor), []))
+                metrics = self._metric_block(daily.get((store, day)) or EMPTY_MEASURES)
                 trend_rows.append({
                     "date": cursor.isoformat(),
                     "store": store,
@@ -438,20 +503,13 @@ class DeliveryReportingService:
             cursor += timedelta(days=1)
         return trend_rows
 
-    def _build_monthly_trend(self, rows: list[dict[str, Any]], start_date: date, end_date: date) -> list[dict[str, Any]]:
-        metrics_by_store_month: dict[tuple[str, date], list[dict[str, Any]]] = defaultdict(list)
-        for row in rows:
-            ship_date = row["ship_date"]
-            if ship_date and ship_date >= start_date:
-                month_key = ship_date.replace(day=1)
-                metrics_by_store_month[(row["store"], month_key)].append(row)
-
+    def _build_monthly_trend(self, monthly: dict[tuple[str, tuple[int, int]], list], start_date: date, end_date: date) -> list[dict[str, Any]]:
         trend_rows: list[dict[str, Any]] = []
         current_month = self._month_floor(start_date)
         final_month = self._month_floor(end_date)
         while current_month <= final_month:
             for store in self.STORE_CODES:
-                metrics = self._metric_block(metrics_by_store_month.get((store, current_month), []))
+                metrics = self._metric_block(monthly.get((store, (current_month.year, current_month.month))) or EMPTY_MEASURES)
                 trend_rows.append({
                     "month": current_month.strftime("%Y-%m"),
                     "label": current_month.strftime("%b %Y"),
@@ -1,20 +1,13 @@
 import csv
 import os
 from datetime import date, datetime, timedelta
-from io import BytesIO
-from typing import Any, Dict, List, Optional, Tuple
-
-from PIL import Image
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.units import inch
-from reportlab.lib.utils import ImageReader
-from reportlab.pdfgen import canvas
-import qrcode
+from typing import IO, Any, Callable, Dict, List, Optional, Tuple
+
 from sqlalchemy import func, text
 
 from app.branch_utils import expand_branch_filter
 from app.extensions import db
+from app.Services import route_optimizer
 from app.runtime_settings import build_sql_connection_strings, sql_connection_configured
 
 try:
@@ -434,6 +427,21 @@ class DispatchService:
         routes = q.order_by(DispatchRoute.route_name).all()
         return [r.to_dict() for r in routes]
 
+    def get_route_assignments(self, start: date, end: date) -> Dict[str, Dict[str, Any]]:
+        """{so_id: {"local_route_id", "local_route_name"}} for routes dated start..end."""
+        from app.Models.dispatch_models import DispatchRoute, DispatchRouteStop
+
+        rows = (
+            db.session.query(DispatchRouteStop.so_id, DispatchRoute.id, DispatchRoute.route_name)
+            .join(DispatchRoute, DispatchRouteStop.route_id == DispatchRoute.id)
+            .filter(DispatchRoute.route_date >= start, DispatchRoute.route_date <= end)
+            .all()
+        )
+        return {
+            str(so_id): {"local_route_id": route_id, "local_route_name": route_name}
+            for so_id, route_id, route_name in rows
+        }
+
     def create_route(
         self,
         route_date: date,
@@ -549,6 +557,109 @@ class DispatchService:
         db.session.commit()
         return True
 
+    # ------------------------------------------------------------------
+    # Route Optimization
+    # ------------------------------------------------------------------
+
+    def optimize_route(
+        self,
+        route_id: int,
+        locate: Callable[[List[str]], Dict[str, Dict[str, Any]]],
+        apply: bool = False,
+        yard: Optional[Dict[str, Any]] = None,
+        time_budget_ms: Optional[float] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Re-sequence a route's stops by distance from the branch yard.
+
+        *locate* maps so_ids to {"lat", "lon", ...} (ERPService.
+        get_dispatch_stop_locations).  With *apply* the new order is saved
+        through reorder_stops; otherwise it is only returned.
+        """
+        from app.Models.dispatch_models import DispatchRoute
+
+        route = DispatchRoute.query.get(route_id)
+        if not route:
+            return None
+
+        stops = [s.to_dict() for s in route.stops]
+        locations = locate([s["so_id"] for s in stops]) if stops else {}
+        for stop in stops:
+            location = locations.get(str(stop["so_id"])) or {}
+            stop["lat"] = location.get("lat")
+            stop["lon"] = location.get("lon")
+            stop["shipto_name"] = location.get("shipto_name")
+
+        result = route_optimizer.optimize_sequence(
+            stops, route_optimizer.resolve_yard(route.branch_code, yard), time_budget_ms
+        )
+        for seq, stop in enumerate(result["stops"], start=1):
+            stop["sequence"] = seq
+        if apply and result["stops"]:
+            self.reorder_stops(route_id, [stop["id"] for stop in result["stops"]])
+        return {"route_id": route_id, "applied": bool(apply), **result}
+
+    def plan_routes(
+        self,
+        route_date: date,
+        branch_code: str,
+        stops: List[Dict[str, Any]],
+        trucks: int,
+        capacity_lbs: Optional[float] = None,
+        yard: Optional[Dict[str, Any]] = None,
+        apply: bool = False,
+        user_id: Optional[int] = None,
+        time_budget_ms: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """Split a day's unassigned *stops* (get_enriched_dispatch_stops rows)
+        between *trucks* trucks by total_weight and sequence each one.  With
+        *apply* every truck becomes a draft route named "Auto N", all saved in
+        one commit so a failure leaves no partial plan behind."""
+        candidates = [
+            {
+                "so_id": str(stop.get("id")),
+                "shipment_num": str(stop["shipment_num"]) if stop.get("shipment_num") is not None else None,
+                "shipto_name": stop.get("shipto_name"),
+                "lat": stop.get("lat"),
+                "lon": stop.get("lon"),
+                "total_weight": stop.get("total_weight") or 0,
+            }
+            for stop in stops
+            if stop.get("id") is not None
+        ]
+        result = route_optimizer.plan_routes(
+            candidates,
+            trucks,
+            capacity_lbs,
+            route_optimizer.resolve_yard(branch_code, yard),
+            time_budget_ms,
+        )
+        if apply:
+            from app.Models.dispatch_models import DispatchRoute, DispatchRouteStop
+
+            routes = []
+            try:
+                for truck in result["trucks"]:
+                    route = DispatchRoute(
+                        route_date=route_date,
+                        route_name=f"Auto {truck['truck']}",
+                        branch_code=branch_code,
+                        notes="Planned by route optimizer",
+                        created_by=user_id,
+                    )
+                    route.stops = [
+                        DispatchRouteStop(so_id=s["so_id"], shipment_num=s.get("shipment_num"), sequence=seq)
+                        for seq, s in enumerate(truck["stops"], start=1)
+                    ]
+                    db.session.add(route)
+                    routes.append(route)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            for truck, route in zip(result["trucks"], routes):
+                truck["route_id"] = route.id
+        return {"route_date": route_date.isoformat(), "branch_code": branch_code, "applied": bool(apply), **result}
+
     # ------------------------------------------------------------------
     # Driver Roster
     # ------------------------------------------------------------------
@@ -837,155 +948,9 @@ class DispatchService:
                 expanded.append(b)
         return sorted(set(expanded))
 
-    def generate_manifest_pdf(self, items: List[Dict[str, Any]]) -> BytesIO:
-        buffer = BytesIO()
-        pdf = canvas.Canvas(buffer, pagesize=letter)
-        total = len(items)
-        logo_path = os.environ.get("LOGO_PATH") or r"C:\Users\amcgrean\python\dd\beisser_logo_full_color_CMYK (print).png"
-
-        for page_number, item in enumerate(items, start=1):
-            self._draw_manifest_page(pdf, item, page_number, total, logo_path)
-            pdf.showPage()
-
-        pdf.save()
-        buffer.seek(0)
-        return buffer
-
-    def _draw_manifest_page(
-        self, pdf: canvas.Canvas, item: Dict[str, Any], page_number: int, total_pages: int, logo_path: str
-    ) -> None:
-        width, height = letter
-        margin = 0.6 * inch
-        x0 = margin
-        y0 = height - margin
-        logo_width = 1.8 * inch
-        logo_height = 0.7 * inch
-
-        if logo_path and os.path.exists(logo_path):
-            try:
-                pdf.drawImage(
-                    logo_path,
-                    x0,
-                    y0 - logo_height + 6,
-                    width=logo_width,
-                    height=logo_height,
-                    preserveAspectRatio=True,
-                    mask="auto",
-                )
-            except Exception:
-                pass
-            title_x = x0 + logo_width + 10
-        else:
-            title_x = x0
-
-        pdf.setFont("Helvetica-Bold", 16)
-        pdf.drawString(title_x, y0, "Dispatch Manifest")
-        pdf.setFont("Helvetica", 9)
-        pdf.drawRightString(width - margin, y0, datetime.now().strftime("%Y-%m-%d %H:%M"))
-        y = y0 - 0.25 * inch
-        pdf.line(margin, y, width - margin, y)
-        y -= 0.2 * inch
-
-        order_id = str(item.get("id", ""))
-        qr_img = qrcode.make(f"SO:{order_id}")
-        qr_buf = BytesIO()
-        qr_img.save(qr_buf, format="PNG")
-        qr_buf.seek(0)
-        pdf.drawImage(
-            ImageReader(qr_buf),
-            width - margin - 1.5 * inch,
-            y,
-            1.5 * inch,
-            1.5 * inch,
-            preserveAspectRatio=True,
-            mask="auto",
-        )
-
-        pdf.setFont("Helvetica-Bold", 12)
-        pdf.drawString(x0, y, f"Order: {order_id}")
-        pdf.setFont("Helvetica", 10)
-        y -= 0.22 * inch
-        pdf.drawString(
-            x0,
-            y,
-            f"Type: {(item.get('doc_kind') or item.get('type') or '').upper()}    Status: {item.get('so_status') or ''}",
-        )
-        y -= 0.18 * inch
-        pdf.drawString(
-            x0,
-            y,
-            f"Branch: {item.get('branch') or ''}    Route: {item.get('route_id') or ''}    Shipment#: {item.get('shipment_num') or ''}",
-        )
-        y -= 0.18 * inch
-        pdf.drawString(
-            x0,
-            y,
-            f"Driver: {item.get('driver') or ''}    Expected: {str(item.get('expected_date') or '')[:10]}",
-        )
-        y -= 0.28 * inch
-        pdf.setFont("Helvetica-Bold", 11)
-        pdf.drawString(x0, y, "Ship-To:")
-        y -= 0.2 * inch
-        pdf.setFont("Helvetica", 10)
-        pdf.drawString(x0, y, (item.get("shipto_name") or "")[:80])
-        y -= 0.18 * inch
-        pdf.drawString(x0, y, (item.get("address") or "")[:110])
-        y -= 0.28 * inch
-
-        y = self._draw_lines_table(pdf, x0, y, item.get("lines") or [])
-        y -= 0.2 * inch
-        pdf.setFont("Helvetica-Bold", 11)
-        pdf.drawString(x0, y, "Notes / Instructions:")
-        y -= 0.18 * inch
-        pdf.setStrokeColor(colors.grey)
-        box_top = y
-        box_height = 1.6 * inch
-        pdf.rect(x0, box_top - box_height, width - 2 * margin, box_height, stroke=1, fill=0)
-        for index in range(1, 6):
-            line_y = box_top - (index * (box_height / 5))
-            pdf.line(x0 + 6, line_y, width - margin - 6, line_y)
-        y = box_top - box_height - 0.25 * inch
-        pdf.setStrokeColor(colors.black)
-        pdf.line(x0, y, x0 + 2.5 * inch, y)
-        pdf.drawString(x0, y - 12, "Customer Signature")
-        pdf.line(x0 + 3.0 * inch, y, x0 + 5.5 * inch, y)
-        pdf.drawString(x0 + 3.0 * inch, y - 12, "Printed Name")
-        pdf.drawRightString(width - margin, margin / 2, f"Page {page_number} of {total_pages}")
-
-    def _draw_lines_table(self, pdf: canvas.Canvas, x0: float, y: float, lines: List[Dict[str, Any]], max_rows: int = 12) -> float:
-        if not lines:
-            return y
-
-        columns = [
-            ("line_no", "Ln", 0.4 * inch),
-            ("item_id", "Item", 1.2 * inch),
-            ("item_description", "Description", 2.4 * inch),
-            ("qty_ordered", "Ord", 0.6 * inch),
-            ("qty_shipped", "Shp", 0.6 * inch),
-            ("uom", "UOM", 0.5 * inch),
-            ("weight", "Wt", 0.5 * inch),
-        ]
+    def generate_manifest_pdf(self, items: List[Dict[str, Any]]) -> IO[bytes]:
+        """Rendered manifest as a rewound file; the caller streams and closes it."""
+        # reportlab and qrcode load on the first manifest, not at app start.
+        from app.Services.manifest_pdf import render_manifest_pdf
 
-        pdf.setFont("Helvetica-Bold", 11)
-        pdf.drawString(x0, y, "Shipment Lines")
-        y -= 0.18 * inch
-        pdf.setFont("Helvetica", 9)
-        x = x0
-        for _, title, width in columns:
-            pdf.drawString(x, y, title)
-            x += width
-        y -= 0.16 * inch
-        pdf.setStrokeColor(colors.grey)
-        pdf.line(x0, y, x0 + sum(width for _, _, width in columns), y)
-        y -= 0.08 * inch
-        pdf.setStrokeColor(colors.black)
-
-        for line in lines[:max_rows]:
-            x = x0
-            for key, _, width in columns:
-                pdf.drawString(x, y, str(line.get(key, ""))[:28])
-                x += width
-            y -= 0.16 * inch
-            if y < 1.1 * inch:
-                break
-        return y
+        return render_manifest_pdf(items)
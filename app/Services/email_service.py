@@ -28,14 +28,13 @@ import requests
 from datetime import datetime
 from email.header import decode_header, make_header
 
-# Microsoft Graph / HEIC support
-import msal
-from PIL import Image
-import pillow_heif
-pillow_heif.register_heif_opener()
+# msal (Microsoft Graph) and pillow_heif (HEIC) load where they are used.
 
 logger = logging.getLogger(__name__)
 
+# Graph calls without a timeout can hang the credit sync indefinitely.
+GRAPH_TIMEOUT_SECONDS = 30
+
 # Allowed image/document extensions to save
 ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.pdf', '.tiff', '.tif', '.heic', '.heif'}
 
@@ -245,6 +244,8 @@ def process_credit_emails_graph(upload_base_dir):
     results = []
     
     # 1. Authenticate via MSAL (Client Credentials Flow)
+    import msal
+
     authority = f"https://login.microsoftonline.com/{tenant_id}"
     app = msal.ConfidentialClientApplication(client_id, authority=authority, client_credential=client_secret)
     
@@ -264,7 +265,7 @@ def process_credit_emails_graph(upload_base_dir):
     search_url = f"{base_url}/messages?$filter={query}&$select=id,subject,from,receivedDateTime,hasAttachments"
 
     try:
-        resp = requests.get(search_url, headers=headers)
+        resp = requests.get(search_url, headers=headers, timeout=GRAPH_TIMEOUT_SECONDS)
         resp.raise_for_status()
         messages = resp.json().get('value', [])
         logger.info("Found %d potential RMA emails via Graph API.", len(messages))
@@ -292,7 +293,7 @@ def process_credit_emails_graph(upload_base_dir):
 
             # 3. Fetch Attachments
             attach_url = f"{base_url}/messages/{msg_id}/attachments"
-            att_resp = requests.get(attach_url, headers=headers)
+            att_resp = requests.get(attach_url, headers=headers, timeout=GRAPH_TIMEOUT_SECONDS)
             att_resp.raise_for_status()
             attachments = att_resp.json().get('value', [])
 
@@ -328,6 +329,8 @@ def process_credit_emails_graph(upload_base_dir):
                     try:
                         # Convert to JPG
                         import io
+                        import pillow_heif
+                        from PIL import Image
                         heif_file = pillow_heif.read_heif(io.BytesIO(payload))
                         image = Image.frombytes(heif_file.mode, heif_file.size, heif_file.data, "raw", heif_file.mode, heif_file.stride)
                         
@@ -357,7 +360,8 @@ def process_credit_emails_graph(upload_base_dir):
                 })
 
             # 4. Mark as Read (PATCH message)
-            requests.patch(f"{base_url}/messages/{msg_id}", headers=headers, json={'isRead': True})
+            requests.patch(f"{base_url}/messages/{msg_id}", headers=headers, json={'isRead': True},
+                           timeout=GRAPH_TIMEOUT_SECONDS)
 
     except Exception as e:
         logger.error("Graph API sync error: %s", e)
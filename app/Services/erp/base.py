@@ -6,6 +6,7 @@ from functools import lru_cache
 from sqlalchemy import bindparam, create_engine, func, inspect, text
 from app.branch_utils import normalize_branch, expand_branch, expand_branch_filter
 from app.extensions import db
+from app.Services.erp.query_cache import get_query_cache
 from app.runtime_settings import (
     build_sql_connection_strings,
     env_bool,
@@ -36,26 +37,43 @@ class ERPServiceBase:
             f"LEGACY_ERP_FALLBACK={self.allow_legacy_erp_fallback}"
         )
         self._gps_cache = None
-        # Simple TTL cache for expensive sales queries: {key: (ts, data)}
-        self._sales_cache: dict = {}
 
     # ------------------------------------------------------------------
-    # Sales query cache helpers (per-instance, TTL in seconds)
+    # Query cache helpers — backed by the process-wide QueryCache so every
+    # ERPService() instance (one per request) shares hits.
+    # Keys without their own TTL use ERP_CACHE_TTL_SECONDS.
     # ------------------------------------------------------------------
-    _SALES_CACHE_TTL = 60  # seconds
+
+    def _cache_key(self, key: str) -> str:
+        # Central and legacy modes return differently-shaped rows; never mix them.
+        return f"{'central' if self.central_db_mode else 'legacy'}:{key}"
 
     def _cache_get(self, key: str):
         """Return cached value or None if missing / expired."""
-        import time
-        entry = self._sales_cache.get(key)
-        if entry and (time.time() - entry[0]) < self._SALES_CACHE_TTL:
-            return entry[1]
-        return None
+        return get_query_cache().get(self._cache_key(key))
+
+    def _cache_set(self, key: str, value, ttl: int | None = None):
+        return get_query_cache().set(self._cache_key(key), value, ttl)
 
-    def _cache_set(self, key: str, value):
-        import time
-        self._sales_cache[key] = (time.time(), value)
-        return value
+    def _cached(self, key: str, loader, ttl: int | None = None):
+        """Return the cached value for *key*, running *loader* once on a miss.
+
+        Concurrent misses on the same key in this process wait for the first
+        loader instead of each running the query.
+        """
+        return get_query_cache().get_or_load(self._cache_key(key), loader, ttl)
+
+    @staticmethod
+    def invalidate_query_cache(prefix: str = ""):
+        """Drop cached ERP results whose key starts with *prefix* (both modes)."""
+        cache = get_query_cache()
+        if not prefix:
+            return cache.invalidate()
+        return cache.invalidate(f"central:{prefix}") + cache.invalidate(f"legacy:{prefix}")
+
+    @staticmethod
+    def query_cache_stats():
+        return get_query_cache().stats()
 
     @staticmethod
     @lru_cache(maxsize=1)
@@ -65,19 +83,52 @@ class ERPServiceBase:
             return None
         return create_engine(url, **get_sqlalchemy_engine_options(url))
 
+    # Rows buffered per round trip when streaming through a server-side cursor.
+    _MIRROR_STREAM_BATCH_SIZE = 2000
+
+    @staticmethod
+    def _mirror_text(sql, params, expanding):
+        query = text(sql)
+        for name in expanding or ():
+            if name in params:
+                query = query.bindparams(bindparam(name, expanding=True))
+        return query
+
     def _mirror_query(self, sql, params=None, expanding=None):
         engine = self._mirror_engine()
         if engine is None:
             raise RuntimeError("CENTRAL_DB_URL is not configured.")
         params = params or {}
-        query = text(sql)
-        for name in expanding or ():
-            if name in params:
-                query = query.bindparams(bindparam(name, expanding=True))
+        query = self._mirror_text(sql, params, expanding)
         with engine.connect() as conn:
             result = conn.execute(query, params)
             return result.mappings().all()
 
+    def _mirror_stream(self, sql, params=None, expanding=None, batch_size=None, row_factory=None):
+        """Yield mirror rows one at a time through a server-side cursor.
+
+        Only ``batch_size`` rows are buffered at once, so peak memory stays flat
+        however large the result.  Rows are SQLAlchemy ``Row`` tuples (read
+        columns as attributes) unless *row_factory* converts them.  The
+        connection stays checked out until the generator is exhausted or closed.
+        """
+        engine = self._mirror_engine()
+        if engine is None:
+            raise RuntimeError("CENTRAL_DB_URL is not configured.")
+        params = params or {}
+        query = self._mirror_text(sql, params, expanding)
+        batch_size = batch_size or self._MIRROR_STREAM_BATCH_SIZE
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(query, params)
+            try:
+                if row_factory is None:
+                    yield from result
+                else:
+                    for row in result:
+                        yield row_factory(row)
+            finally:
+                result.close()
+
     _mirror_columns_cache: dict = {}
 
     @staticmethod
@@ -141,6 +192,39 @@ class ERPServiceBase:
             return f"(COALESCE(salesperson, '') = {param} OR COALESCE(order_writer, '') = {param})"
         return f"COALESCE(salesperson, '') = {param}"
 
+    def _has_join_key_columns(self):
+        """Check the normalized join-key columns exist on so_header, cust and cust_shipto."""
+        return (
+            "cust_key_norm" in set(self._mirror_columns("erp_mirror_so_header"))
+            and "cust_key_norm" in set(self._mirror_columns("erp_mirror_cust"))
+            and "seq_num_norm" in set(self._mirror_columns("erp_mirror_cust_shipto"))
+        )
+
+    def _cust_join_clause(self, cust="c", soh="soh"):
+        """Join condition from a sales order header to erp_mirror_cust."""
+        if self._has_join_key_columns():
+            return f"{cust}.cust_key_norm = {soh}.cust_key_norm"
+        return f"TRIM(CAST({cust}.cust_key AS TEXT)) = TRIM(CAST({soh}.cust_key AS TEXT))"
+
+    def _shipto_join_clause(self, shipto="cs", soh="soh"):
+        """Join condition from a sales order header to its erp_mirror_cust_shipto row."""
+        if self._has_join_key_columns():
+            return (
+                f"{shipto}.cust_key_norm = {soh}.cust_key_norm"
+                f" AND {shipto}.seq_num_norm = {soh}.shipto_seq_norm"
+            )
+        return (
+            f"TRIM(CAST({shipto}.cust_key AS TEXT)) = TRIM(CAST({soh}.cust_key AS TEXT))"
+            f" AND TRIM(CAST({shipto}.seq_num AS TEXT)) = TRIM(CAST({soh}.shipto_seq_num AS TEXT))"
+        )
+
+    def _cust_lookup_clause(self, alias="", param=":cust"):
+        """SQL clause matching a trimmed customer code or key on erp_mirror_cust."""
+        prefix = f"{alias}." if alias else ""
+        if "cust_code_norm" in set(self._mirror_columns("erp_mirror_cust")):
+            return f"({prefix}cust_code_norm = {param} OR {prefix}cust_key_norm = {param})"
+        return f"(TRIM({prefix}cust_code) = {param} OR TRIM({prefix}cust_key) = {param})"
+
     def _mirror_item_branch_qty_expr(self, alias="ib"):
         columns = set(self._mirror_columns("erp_mirror_item_branch"))
         if "qty_available" in columns:
@@ -285,6 +369,13 @@ class ERPServiceBase:
                 states[so] = 'Pick Printed'
         return states
 
+    def _overlay_local_pick_states(self, items):
+        """Set ``local_pick_state`` on each SO dict from the local Pick table."""
+        local_states = self._get_local_pick_states([item['so_number'] for item in items])
+        for item in items:
+            item['local_pick_state'] = local_states.get(item['so_number'], 'Pick Printed')
+        return items
+
     def _get_pick_states_by_shipment(self, so_numbers=None):
         """
         Like _get_local_pick_states but keys on (so_number, shipment_num) so that
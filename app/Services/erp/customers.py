@@ -75,14 +75,11 @@ class CustomersMixin:
 
     def get_sales_reports(self, period_days=30, branch="", rep_id=""):
         cache_key = f'sales_reports_{period_days}_{rep_id}' if not branch and not rep_id else None
-        if cache_key:
-            cached = self._cache_get(cache_key)
-            if cached is not None:
-                return cached
-        result = self._get_sales_reports_inner(period_days=period_days, branch=branch, rep_id=rep_id)
-        if cache_key:
-            self._cache_set(cache_key, result)
-        return result
+
+        def load():
+            return self._get_sales_reports_inner(period_days=period_days, branch=branch, rep_id=rep_id)
+
+        return self._cached(cache_key, load) if cache_key else load()
 
     def _get_sales_reports_inner(self, period_days=30, branch="", rep_id=""):
         if self.central_db_mode:
@@ -129,7 +126,7 @@ class CustomersMixin:
                     COUNT(DISTINCT soh.so_id) AS order_count
                 FROM erp_mirror_so_header soh
                 LEFT JOIN erp_mirror_cust c
-                    ON TRIM(c.cust_key) = TRIM(soh.cust_key)
+                    ON {self._cust_join_clause()}
                 WHERE soh.is_deleted = false
                   AND soh.expect_date >= :since
                   {branch_join_clause}
@@ -239,13 +236,13 @@ class CustomersMixin:
         if not customer_number or not self.central_db_mode:
             return {}
         rows = self._mirror_query(
-            """
+            f"""
             SELECT
                 cust_key, cust_code, cust_name, phone, email,
                 balance, credit_limit, terms, branch_code
             FROM erp_mirror_cust
             WHERE is_deleted = false
-              AND (TRIM(cust_code) = :cust OR TRIM(cust_key) = :cust)
+              AND {self._cust_lookup_clause()}
             LIMIT 1
             """,
             {"cust": customer_number.strip()},
@@ -256,17 +253,18 @@ class CustomersMixin:
         """Fetch all ship-to addresses for a customer from erp_mirror_cust_shipto."""
         if not customer_number or not self.central_db_mode:
             return []
+        key_column = "cust_key_norm" if self._has_join_key_columns() else "TRIM(cust_key)"
         rows = self._mirror_query(
-            """
+            f"""
             SELECT
                 seq_num, shipto_name, address_1, address_2,
                 city, state, zip, phone, lat, lon
             FROM erp_mirror_cust_shipto
             WHERE is_deleted = false
-              AND TRIM(cust_key) IN (
-                  SELECT TRIM(cust_key) FROM erp_mirror_cust
+              AND {key_column} IN (
+                  SELECT {key_column} FROM erp_mirror_cust
                   WHERE is_deleted = false
-                    AND (TRIM(cust_code) = :cust OR TRIM(cust_key) = :cust)
+                    AND {self._cust_lookup_clause()}
               )
             ORDER BY seq_num
             """,
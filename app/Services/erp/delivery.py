@@ -38,9 +38,9 @@ class DeliveryMixin:
                     MAX(sh.status_flag_delivery) AS status_flag_delivery
                 FROM erp_mirror_so_header soh
                 LEFT JOIN erp_mirror_cust c
-                    ON TRIM(c.cust_key) = TRIM(soh.cust_key)
+                    ON {self._cust_join_clause()}
                 LEFT JOIN erp_mirror_cust_shipto cs
-                    ON TRIM(cs.cust_key) = TRIM(soh.cust_key) AND TRIM(CAST(cs.seq_num AS TEXT)) = TRIM(CAST(soh.shipto_seq_num AS TEXT))
+                    ON {self._shipto_join_clause()}
                 LEFT JOIN erp_mirror_shipments_header sh
                     ON sh.system_id = soh.system_id AND sh.so_id = soh.so_id
                 WHERE soh.is_deleted = false
@@ -187,8 +187,17 @@ class DeliveryMixin:
     def get_historical_delivery_stats(self, days=7, branch_id=None):
         """
         Fetches historical delivery counts by date for the last X days from local ERP.
-        Used by the sync service to populate KPI tables.
+        Used by the sync service to populate KPI tables.  Only covers days before
+        today, so results are cached for 5 minutes per (day, window, branch).
         """
+        cache_key = f'historical_delivery_stats_{date.today().isoformat()}_{int(days)}_{branch_id or "all"}'
+        return self._cached(
+            cache_key,
+            lambda: self._get_historical_delivery_stats_inner(days=days, branch_id=branch_id),
+            ttl=300,
+        )
+
+    def _get_historical_delivery_stats_inner(self, days=7, branch_id=None):
         if self.central_db_mode:
             params = {"days": int(days)}
             branch_filter = ""
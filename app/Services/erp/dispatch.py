@@ -211,10 +211,9 @@ class DispatchMixin:
                     soh.system_id AS branch
                 FROM erp_mirror_so_header soh
                 LEFT JOIN erp_mirror_cust c
-                    ON TRIM(CAST(c.cust_key AS TEXT)) = TRIM(CAST(soh.cust_key AS TEXT))
+                    ON {self._cust_join_clause()}
                 LEFT JOIN erp_mirror_cust_shipto cs
-                    ON TRIM(CAST(cs.cust_key AS TEXT)) = TRIM(CAST(soh.cust_key AS TEXT))
-                   AND TRIM(CAST(cs.seq_num AS TEXT)) = TRIM(CAST(soh.shipto_seq_num AS TEXT))
+                    ON {self._shipto_join_clause()}
                 LEFT JOIN erp_mirror_shipments_header sh
                     ON sh.system_id = soh.system_id AND sh.so_id = soh.so_id AND sh.is_deleted = false
                 WHERE {' AND '.join(filters)}
@@ -438,7 +437,7 @@ class DispatchMixin:
                 SELECT CAST(so_id AS TEXT) AS so_id,
                        SUM(COALESCE(price, 0) * COALESCE(qty_ordered, 0)) AS order_value
                 FROM erp_mirror_so_detail
-                WHERE is_deleted = false AND CAST(so_id AS TEXT) IN :so_ids
+                WHERE is_deleted = false AND so_id IN :so_ids
                 GROUP BY so_id
                 """,
                 {"so_ids": so_ids},
@@ -477,7 +476,7 @@ class DispatchMixin:
                 """
                 SELECT DISTINCT CAST(source_id AS TEXT) AS so_id
                 FROM erp_mirror_wo_header
-                WHERE is_deleted = false AND CAST(source_id AS TEXT) IN :so_ids
+                WHERE is_deleted = false AND source_id IN :so_ids
                 """,
                 {"so_ids": so_ids},
                 expanding={"so_ids"},
@@ -493,7 +492,7 @@ class DispatchMixin:
                 SELECT CAST(so_id AS TEXT) AS so_id, ship_via, po_number, salesperson,
                        promise_date, cust_key
                 FROM erp_mirror_so_header
-                WHERE is_deleted = false AND CAST(so_id AS TEXT) IN :so_ids
+                WHERE is_deleted = false AND so_id IN :so_ids
                 """,
                 {"so_ids": so_ids},
                 expanding={"so_ids"},
@@ -567,6 +566,53 @@ class DispatchMixin:
         return base_stops
 
 
+    def get_dispatch_stop_locations(self, so_ids):
+        """Ship-to coordinates and load weight per sales order, for route
+        optimization: {so_id: {"lat", "lon", "shipto_name", "total_weight"}}.
+        Only works in central_db (cloud mirror) mode."""
+        so_ids = [str(so_id) for so_id in so_ids if so_id is not None]
+        if not self.central_db_mode or not so_ids:
+            return {}
+        rows = self._mirror_query(
+            f"""
+            SELECT
+                CAST(soh.so_id AS TEXT) AS so_id,
+                cs.lat,
+                cs.lon,
+                COALESCE(cs.shipto_name, c.cust_name) AS shipto_name
+            FROM erp_mirror_so_header soh
+            LEFT JOIN erp_mirror_cust c
+                ON {self._cust_join_clause()}
+            LEFT JOIN erp_mirror_cust_shipto cs
+                ON {self._shipto_join_clause()}
+            WHERE soh.is_deleted = false
+              AND CAST(soh.so_id AS TEXT) IN :so_ids
+            """,
+            {"so_ids": so_ids},
+            expanding={"so_ids"},
+        )
+        locations = {}
+        for row in rows:
+            current = locations.get(row["so_id"])
+            if current and current.get("lat") is not None:
+                continue
+            locations[row["so_id"]] = {
+                "lat": float(row["lat"]) if row.get("lat") is not None else None,
+                "lon": float(row["lon"]) if row.get("lon") is not None else None,
+                "shipto_name": (row.get("shipto_name") or "").strip() or None,
+                "total_weight": 0.0,
+            }
+        try:
+            aggregates = self._aggregate_dispatch_details(list(locations))
+        except Exception:
+            aggregates = {}
+        for (so_id, _shipment_num), info in aggregates.items():
+            location = locations.get(str(so_id))
+            if location is not None:
+                location["total_weight"] = round(location["total_weight"] + (info.get("total_weight") or 0), 2)
+        return locations
+
+
     def get_customer_ar_summary(self, cust_key):
         """Get AR aging buckets for a customer."""
         if not self.central_db_mode:
@@ -614,7 +660,7 @@ class DispatchMixin:
                 """
                 SELECT wo_id, wo_status, item_ptr, qty, department, branch_code
                 FROM erp_mirror_wo_header
-                WHERE is_deleted = false AND CAST(source_id AS TEXT) = :so_id
+                WHERE is_deleted = false AND source_id = :so_id
                 ORDER BY wo_id
                 """,
                 {"so_id": str(so_id)},
@@ -680,9 +726,9 @@ class DispatchMixin:
 
             weight_expr = "weight" if "weight" in columns else "NULL AS weight"
             params = {"so_id": str(so_id), "limit": limit}
-            where = "CAST(so_id AS TEXT) = :so_id"
+            where = "so_id = :so_id"
             if shipment_num is not None:
-                where += " AND CAST(shipment_num AS TEXT) = :shipment_num"
+                where += " AND shipment_num = :shipment_num"
                 params["shipment_num"] = str(shipment_num)
             rows = self._mirror_query(
                 f"""
@@ -769,7 +815,11 @@ class DispatchMixin:
         Fetches open Sales Orders that are ready for delivery (status 'K').
         Returns a list of dicts with SO header info plus line counts, suitable for the delivery board.
         This reuses the open SO summary but could be refined to filter by delivery-specific handling codes.
+        Cached for 30 seconds.
         """
+        return self._cached('delivery_orders', self._get_delivery_orders_inner, ttl=30)
+
+    def _get_delivery_orders_inner(self):
         if self.central_db_mode:
             backorder_expr = self._mirror_so_detail_backorder_expr()
             rows = self._mirror_query(
@@ -789,9 +839,9 @@ class DispatchMixin:
                 JOIN erp_mirror_so_header soh
                     ON soh.system_id = sod.system_id AND soh.so_id = sod.so_id
                 LEFT JOIN erp_mirror_cust c
-                    ON TRIM(c.cust_key) = TRIM(soh.cust_key)
+                    ON {self._cust_join_clause()}
                 LEFT JOIN erp_mirror_cust_shipto cs
-                    ON TRIM(cs.cust_key) = TRIM(soh.cust_key) AND TRIM(CAST(cs.seq_num AS TEXT)) = TRIM(CAST(soh.shipto_seq_num AS TEXT))
+                    ON {self._shipto_join_clause()}
                 LEFT JOIN erp_mirror_shipments_header sh
                     ON sh.system_id = soh.system_id AND sh.so_id = soh.so_id
                 WHERE soh.is_deleted = false
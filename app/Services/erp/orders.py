@@ -1,4 +1,5 @@
 from app.branch_utils import expand_branch
+from app.Services.erp.so_attributes import get_so_attribute_index
 
 
 class OrdersMixin:
@@ -8,14 +9,13 @@ class OrdersMixin:
         Optional *branch* filters by system_id (expanded via branch_utils).
         Returns: List of dicts {so_number, customer_name, address, reference, handling_code, line_count}
         """
-        cache_key = f'open_so_summary_{branch or "all"}'
-        cached = self._cache_get(cache_key)
-        if cached is not None:
-            return cached
+        # Local pick state changes on every scan, so it is overlaid after the cached ERP rows.
+        return self._overlay_local_pick_states(self._open_so_summary_rows(branch=branch))
 
-        result = self._get_open_so_summary_inner(branch=branch)
-        self._cache_set(cache_key, result)
-        return result
+    def _open_so_summary_rows(self, branch=None):
+        """Cached ERP rows behind get_open_so_summary, without local pick state."""
+        cache_key = f'open_so_summary_{branch or "all"}'
+        return self._cached(cache_key, lambda: self._get_open_so_summary_inner(branch=branch), ttl=30)
 
     def get_open_order_board_summary(self, branch=None):
         """
@@ -23,13 +23,13 @@ class OrdersMixin:
         Returns: List of dicts {so_number, customer_name, address, reference, line_count, handling_codes}
         """
         cache_key = f'open_order_board_summary_{branch or "all"}'
-        cached = self._cache_get(cache_key)
-        if cached is not None:
-            return cached
+        summary = self._cached(cache_key, lambda: self._get_open_order_board_summary_inner(branch=branch), ttl=30)
+        return self._overlay_local_pick_states(summary)
 
+    def _get_open_order_board_summary_inner(self, branch=None):
         if self.central_db_mode:
             # Reuse per-handling-code summary and aggregate to SO level
-            per_code = self.get_open_so_summary(branch=branch)
+            per_code = self._open_so_summary_rows(branch=branch)
             so_map = {}
             for item in per_code:
                 so_num = item['so_number']
@@ -53,7 +53,7 @@ class OrdersMixin:
                 summary.append(data)
         else:
             # Legacy fallback: reuse per-handling summary and aggregate in Python.
-            per_code_summary = self.get_open_so_summary(branch=branch)
+            per_code_summary = self._open_so_summary_rows(branch=branch)
             so_map = {}
             for item in per_code_summary:
                 so_num = item['so_number']
@@ -76,12 +76,6 @@ class OrdersMixin:
                 data['handling_codes'] = sorted(list(data['handling_codes']))
                 summary.append(data)
 
-        so_numbers = [s['so_number'] for s in summary]
-        local_states = self._get_local_pick_states(so_numbers)
-        for item in summary:
-            item['local_pick_state'] = local_states.get(item['so_number'], 'Pick Printed')
-
-        self._cache_set(cache_key, summary)
         return summary
 
     def _get_open_so_summary_inner(self, branch=None):
@@ -124,10 +118,9 @@ class OrdersMixin:
                 JOIN erp_mirror_item_branch ib
                     ON ib.item_ptr = sod.item_ptr AND sod.system_id = ib.system_id
                 LEFT JOIN erp_mirror_cust c
-                    ON TRIM(c.cust_key) = TRIM(CAST(soh.cust_key AS TEXT))
+                    ON {self._cust_join_clause()}
                 LEFT JOIN erp_mirror_cust_shipto cs
-                    ON TRIM(cs.cust_key) = TRIM(CAST(soh.cust_key AS TEXT))
-                   AND TRIM(CAST(cs.seq_num AS TEXT)) = TRIM(CAST(soh.shipto_seq_num AS TEXT))
+                    ON {self._shipto_join_clause()}
                 WHERE {where_clause}
                 GROUP BY soh.so_id, soh.system_id, c.cust_name, cs.address_1, cs.city,
                          soh.reference, ib.handling_code
@@ -145,11 +138,6 @@ class OrdersMixin:
                 'handling_code': row['handling_code'],
                 'line_count': int(row['line_count']) if row['line_count'] is not None else 0,
             } for row in rows]
-
-            so_numbers = [s['so_number'] for s in summary]
-            local_states = self._get_local_pick_states(so_numbers)
-            for item in summary:
-                item['local_pick_state'] = local_states.get(item['so_number'], 'Pick Printed')
             return summary
 
         self._require_central_db_for_cloud_mode()
@@ -195,13 +183,6 @@ class OrdersMixin:
                     })
 
             conn.close()
-
-            so_numbers = [s['so_number'] for s in summary]
-            local_states = self._get_local_pick_states(so_numbers)
-
-            for s in summary:
-                s['local_pick_state'] = local_states.get(s['so_number'], 'Pick Printed')
-
             return summary
 
         except Exception as e:
@@ -242,10 +223,9 @@ class OrdersMixin:
                     ON ib.system_id = sod.system_id
                    AND ib.item_ptr = sod.item_ptr
                 LEFT JOIN erp_mirror_cust c
-                    ON TRIM(c.cust_key) = TRIM(soh.cust_key)
+                    ON {self._cust_join_clause()}
                 LEFT JOIN erp_mirror_cust_shipto cs
-                    ON TRIM(cs.cust_key) = TRIM(soh.cust_key)
-                   AND TRIM(CAST(cs.seq_num AS TEXT)) = TRIM(CAST(soh.shipto_seq_num AS TEXT))
+                    ON {self._shipto_join_clause()}
                 WHERE soh.is_deleted = false AND {' AND '.join(filters)}
                 GROUP BY soh.so_id, c.cust_name, cs.address_1, cs.city, soh.reference, ib.handling_code
                 """,
@@ -333,6 +313,9 @@ class OrdersMixin:
         Returns uppercase sale_type string, or None if not found.
         """
         if self.central_db_mode:
+            indexed = get_so_attribute_index().get(so_number)
+            if indexed is not None:
+                return indexed.sale_type
             rows = self._mirror_query(
                 """
                 SELECT UPPER(COALESCE(soh.sale_type, '')) AS sale_type
@@ -372,6 +355,9 @@ class OrdersMixin:
         line items for a single SO.  Returns uppercase string or None.
         """
         if self.central_db_mode:
+            indexed = get_so_attribute_index().get(so_number)
+            if indexed is not None:
+                return indexed.handling_code
             rows = self._mirror_query(
                 """
                 SELECT UPPER(COALESCE(ib.handling_code, '')) AS handling_code,
@@ -426,13 +412,83 @@ class OrdersMixin:
             print(f"ERP Connection Error (SO Primary Handling Code): {e}")
             return None
 
+    def get_so_scan_attributes(self, so_numbers):
+        """
+        Batch form of get_so_sale_type + get_so_primary_handling_code.
+
+        Returns {so_number: {'sale_type': str|None, 'handling_code': str|None}}
+        for every SO found.  Open orders come from the in-memory
+        SOAttributeIndex; the rest are resolved in a single mirror round trip.
+        """
+        so_numbers = sorted({str(so) for so in so_numbers if so})
+        if not so_numbers:
+            return {}
+
+        if self.central_db_mode:
+            indexed = get_so_attribute_index().get_many(so_numbers)
+            attributes = {
+                so_number: {'sale_type': entry.sale_type, 'handling_code': entry.handling_code}
+                for so_number, entry in indexed.items()
+            }
+            so_numbers = [so_number for so_number in so_numbers if so_number not in indexed]
+            if not so_numbers:
+                return attributes
+            rows = self._mirror_query(
+                """
+                WITH heads AS (
+                    SELECT soh.so_id, soh.system_id,
+                           UPPER(COALESCE(soh.sale_type, '')) AS sale_type
+                    FROM erp_mirror_so_header soh
+                    WHERE soh.is_deleted = false
+                      AND soh.so_id IN :so_numbers
+                )
+                SELECT h.so_id, 'sale_type' AS kind, h.sale_type AS value, 0 AS cnt
+                FROM heads h
+                UNION ALL
+                SELECT sod.so_id, 'handling_code' AS kind,
+                       UPPER(COALESCE(ib.handling_code, '')) AS value,
+                       COUNT(*) AS cnt
+                FROM erp_mirror_so_detail sod
+                JOIN heads h
+                    ON h.so_id = sod.so_id AND h.system_id = sod.system_id
+                LEFT JOIN erp_mirror_item_branch ib
+                    ON ib.system_id = sod.system_id AND ib.item_ptr = sod.item_ptr
+                WHERE COALESCE(ib.handling_code, '') != ''
+                GROUP BY sod.so_id, UPPER(COALESCE(ib.handling_code, ''))
+                """,
+                {"so_numbers": so_numbers},
+                expanding={"so_numbers"},
+            )
+            handling_counts = {}
+            for row in rows:
+                so_number = str(row['so_id'])
+                entry = attributes.setdefault(so_number, {'sale_type': None, 'handling_code': None})
+                if row['kind'] == 'sale_type':
+                    entry['sale_type'] = entry['sale_type'] or row['value'] or None
+                else:
+                    handling_counts.setdefault(so_number, []).append((-int(row['cnt']), row['value']))
+            # Most common handling code wins; ties go to the first alphabetically.
+            for so_number, counts in handling_counts.items():
+                attributes[so_number]['handling_code'] = min(counts)[1]
+            return attributes
+
+        attributes = {}
+        for so_number in so_numbers:
+            sale_type = self.get_so_sale_type(so_number)
+            handling_code = None
+            if sale_type != 'WILLCALL':
+                handling_code = self.get_so_primary_handling_code(so_number)
+            if sale_type or handling_code:
+                attributes[so_number] = {'sale_type': sale_type, 'handling_code': handling_code}
+        return attributes
+
     def get_so_header(self, so_number):
         """
         Fetches header info (Customer, Reference, etc.) for a single Sales Order.
         """
         if self.central_db_mode:
             rows = self._mirror_query(
-                """
+                f"""
                 SELECT
                     soh.so_id,
                     c.cust_name,
@@ -449,10 +505,9 @@ class OrdersMixin:
                     sh.status_flag_delivery
                 FROM erp_mirror_so_header soh
                 LEFT JOIN erp_mirror_cust c
-                    ON TRIM(CAST(c.cust_key AS TEXT)) = TRIM(CAST(soh.cust_key AS TEXT))
+                    ON {self._cust_join_clause()}
                 LEFT JOIN erp_mirror_cust_shipto cs
-                    ON TRIM(CAST(cs.cust_key AS TEXT)) = TRIM(CAST(soh.cust_key AS TEXT))
-                   AND TRIM(CAST(cs.seq_num AS TEXT)) = TRIM(CAST(soh.shipto_seq_num AS TEXT))
+                    ON {self._shipto_join_clause()}
                 LEFT JOIN erp_mirror_shipments_header sh
                     ON sh.system_id = soh.system_id AND sh.so_id = soh.so_id
                 WHERE soh.is_deleted = false
@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
 
 class PicksMixin:
@@ -8,6 +8,28 @@ class PicksMixin:
     self._mirror_query, self._cache_get, etc. calls resolve at runtime.
     """
 
+    # Materialized view maintained by the sync worker (see migration u4v5w6x7y8z9).
+    OPEN_PICK_READ_MODEL = "erp_open_pick_lines"
+    # The view holds a day of slack around CURRENT_DATE; this applies the exact
+    # "today" rules of the live query with the application clock.
+    _OPEN_PICK_READ_MODEL_FILTER = """
+        (
+          (UPPER(COALESCE(so_status, '')) IN ('K', 'P', 'S'))
+          OR (UPPER(COALESCE(so_status, '')) = 'I' AND invoice_day = :today)
+          OR (expect_day = :today)
+          OR (ship_day = :today)
+        )
+    """
+
+    def _open_pick_read_model_ready(self):
+        # _mirror_columns doesn't cache a missing table; re-check it once a
+        # minute rather than on every call until the migration lands.
+        return self._cached(
+            'open_pick_read_model_ready',
+            lambda: bool(self._mirror_columns(self.OPEN_PICK_READ_MODEL)),
+            ttl=60,
+        )
+
     def get_open_picks(self):
         """
         Fetches all open picks (status 'k') from the ERP, joined with details and handling codes.
@@ -15,131 +37,141 @@ class PicksMixin:
         """
         if self.central_db_mode:
             today = datetime.now().strftime('%Y-%m-%d')
-            rows = self._mirror_query(
-                """
-                WITH shipment_rollup AS (
+            if self._open_pick_read_model_ready():
+                rows = self._mirror_stream(
+                    f"""
+                    SELECT *
+                    FROM {self.OPEN_PICK_READ_MODEL}
+                    WHERE {self._OPEN_PICK_READ_MODEL_FILTER}
+                    ORDER BY so_id, handling_code, sequence
+                    """,
+                    {"today": today},
+                )
+            else:
+                rows = self._mirror_stream(
+                    f"""
+                    WITH shipment_rollup AS (
+                        SELECT
+                            sh.system_id,
+                            sh.so_id,
+                            MAX(sh.status_flag) AS status_flag,
+                            MAX(sh.invoice_date) AS invoice_date,
+                            MAX(sh.ship_date) AS ship_date,
+                            MAX(sh.ship_via) AS ship_via,
+                            MAX(sh.driver) AS driver,
+                            MAX(sh.route_id_char) AS route_id_char,
+                            MAX(sh.loaded_time) AS loaded_time,
+                            MAX(sh.loaded_date) AS loaded_date,
+                            MAX(sh.status_flag_delivery) AS status_flag_delivery
+                        FROM erp_mirror_shipments_header sh
+                        WHERE sh.is_deleted = false
+                          AND (
+                            sh.invoice_date >= CURRENT_DATE - INTERVAL '180 days'
+                            OR sh.ship_date    >= CURRENT_DATE - INTERVAL '180 days'
+                            OR UPPER(COALESCE(sh.status_flag, '')) NOT IN ('C', 'X')
+                          )
+                        GROUP BY sh.system_id, sh.so_id
+                    ),
+                    pick_rollup AS (
+                        SELECT
+                            pd.system_id,
+                            pd.tran_id AS so_id,
+                            MAX(ph.created_date) AS created_date,
+                            MAX(ph.created_time) AS created_time
+                        FROM erp_mirror_pick_header ph
+                        JOIN erp_mirror_pick_detail pd
+                            ON ph.pick_id = pd.pick_id
+                           AND ph.system_id = pd.system_id
+                        WHERE ph.is_deleted = false
+                          AND pd.is_deleted = false
+                          AND UPPER(COALESCE(ph.print_status, '')) = 'PICK TICKET'
+                          AND UPPER(COALESCE(pd.tran_type, '')) = 'SO'
+                          AND ph.created_date >= CURRENT_DATE - INTERVAL '30 days'
+                        GROUP BY pd.system_id, pd.tran_id
+                    )
                     SELECT
-                        sh.system_id,
-                        sh.so_id,
-                        MAX(sh.status_flag) AS status_flag,
-                        MAX(sh.invoice_date) AS invoice_date,
-                        MAX(sh.ship_date) AS ship_date,
-                        MAX(sh.ship_via) AS ship_via,
-                        MAX(sh.driver) AS driver,
-                        MAX(sh.route_id_char) AS route_id_char,
-                        MAX(sh.loaded_time) AS loaded_time,
-                        MAX(sh.loaded_date) AS loaded_date,
-                        MAX(sh.status_flag_delivery) AS status_flag_delivery
-                    FROM erp_mirror_shipments_header sh
-                    WHERE sh.is_deleted = false
+                        soh.so_id,
+                        sod.sequence,
+                        i.item,
+                        i.description,
+                        ib.handling_code,
+                        sod.qty_ordered,
+                        c.cust_name,
+                        cs.address_1,
+                        cs.city,
+                        soh.reference,
+                        soh.so_status,
+                        sh.status_flag,
+                        soh.system_id,
+                        soh.expect_date,
+                        soh.sale_type,
+                        sh.ship_via,
+                        sh.driver,
+                        sh.route_id_char AS route,
+                        ph.created_time AS pick_printed_time,
+                        ph.created_date AS pick_printed_date,
+                        sh.loaded_time,
+                        sh.loaded_date,
+                        sh.ship_date,
+                        sh.status_flag_delivery
+                    FROM erp_mirror_so_detail sod
+                    JOIN erp_mirror_so_header soh
+                        ON soh.system_id = sod.system_id
+                       AND soh.so_id = sod.so_id
+                    LEFT JOIN erp_mirror_item i
+                        ON i.item_ptr = sod.item_ptr
+                       AND i.is_deleted = false
+                    LEFT JOIN erp_mirror_item_branch ib
+                        ON ib.system_id = sod.system_id
+                       AND ib.item_ptr = sod.item_ptr
+                       AND ib.is_deleted = false
+                    LEFT JOIN erp_mirror_cust c
+                        ON {self._cust_join_clause()}
+                    LEFT JOIN erp_mirror_cust_shipto cs
+                        ON {self._shipto_join_clause()}
+                    LEFT JOIN shipment_rollup sh
+                        ON sh.system_id = soh.system_id
+                       AND sh.so_id = soh.so_id
+                    LEFT JOIN pick_rollup ph
+                        ON ph.system_id = soh.system_id
+                       AND ph.so_id = soh.so_id
+                    WHERE soh.is_deleted = false
+                      AND sod.is_deleted = false
+                      AND UPPER(COALESCE(soh.so_status, '')) != 'C'
                       AND (
-                        sh.invoice_date >= CURRENT_DATE - INTERVAL '180 days'
-                        OR sh.ship_date    >= CURRENT_DATE - INTERVAL '180 days'
-                        OR UPPER(COALESCE(sh.status_flag, '')) NOT IN ('C', 'X')
+                        (UPPER(COALESCE(soh.so_status, '')) IN ('K', 'P', 'S'))
+                        OR (UPPER(COALESCE(soh.so_status, '')) = 'I' AND CAST(sh.invoice_date AS DATE) = :today)
+                        OR (CAST(soh.expect_date AS DATE) = :today)
+                        OR (CAST(sh.ship_date AS DATE) = :today)
                       )
-                    GROUP BY sh.system_id, sh.so_id
-                ),
-                pick_rollup AS (
-                    SELECT
-                        pd.system_id,
-                        pd.tran_id AS so_id,
-                        MAX(ph.created_date) AS created_date,
-                        MAX(ph.created_time) AS created_time
-                    FROM erp_mirror_pick_header ph
-                    JOIN erp_mirror_pick_detail pd
-                        ON ph.pick_id = pd.pick_id
-                       AND ph.system_id = pd.system_id
-                    WHERE ph.is_deleted = false
-                      AND pd.is_deleted = false
-                      AND UPPER(COALESCE(ph.print_status, '')) = 'PICK TICKET'
-                      AND UPPER(COALESCE(pd.tran_type, '')) = 'SO'
-                      AND ph.created_date >= CURRENT_DATE - INTERVAL '30 days'
-                    GROUP BY pd.system_id, pd.tran_id
+                      AND UPPER(COALESCE(soh.sale_type, '')) NOT IN ('DIRECT', 'WILLCALL', 'XINSTALL', 'HOLD')
+                    ORDER BY soh.so_id, ib.handling_code, sod.sequence
+                    """,
+                    {"today": today},
                 )
-                SELECT
-                    soh.so_id,
-                    sod.sequence,
-                    i.item,
-                    i.description,
-                    ib.handling_code,
-                    sod.qty_ordered,
-                    c.cust_name,
-                    cs.address_1,
-                    cs.city,
-                    soh.reference,
-                    soh.so_status,
-                    sh.status_flag,
-                    soh.system_id,
-                    soh.expect_date,
-                    soh.sale_type,
-                    sh.ship_via,
-                    sh.driver,
-                    sh.route_id_char AS route,
-                    ph.created_time AS pick_printed_time,
-                    ph.created_date AS pick_printed_date,
-                    sh.loaded_time,
-                    sh.loaded_date,
-                    sh.ship_date,
-                    sh.status_flag_delivery
-                FROM erp_mirror_so_detail sod
-                JOIN erp_mirror_so_header soh
-                    ON soh.system_id = sod.system_id
-                   AND soh.so_id = sod.so_id
-                LEFT JOIN erp_mirror_item i
-                    ON i.item_ptr = sod.item_ptr
-                   AND i.is_deleted = false
-                LEFT JOIN erp_mirror_item_branch ib
-                    ON ib.system_id = sod.system_id
-                   AND ib.item_ptr = sod.item_ptr
-                   AND ib.is_deleted = false
-                LEFT JOIN erp_mirror_cust c
-                    ON TRIM(c.cust_key) = TRIM(soh.cust_key)
-                LEFT JOIN erp_mirror_cust_shipto cs
-                    ON TRIM(cs.cust_key) = TRIM(soh.cust_key)
-                   AND TRIM(CAST(cs.seq_num AS TEXT)) = TRIM(CAST(soh.shipto_seq_num AS TEXT))
-                LEFT JOIN shipment_rollup sh
-                    ON sh.system_id = soh.system_id
-                   AND sh.so_id = soh.so_id
-                LEFT JOIN pick_rollup ph
-                    ON ph.system_id = soh.system_id
-                   AND ph.so_id = soh.so_id
-                WHERE soh.is_deleted = false
-                  AND sod.is_deleted = false
-                  AND UPPER(COALESCE(soh.so_status, '')) != 'C'
-                  AND (
-                    (UPPER(COALESCE(soh.so_status, '')) IN ('K', 'P', 'S'))
-                    OR (UPPER(COALESCE(soh.so_status, '')) = 'I' AND CAST(sh.invoice_date AS DATE) = :today)
-                    OR (CAST(soh.expect_date AS DATE) = :today)
-                    OR (CAST(sh.ship_date AS DATE) = :today)
-                  )
-                  AND UPPER(COALESCE(soh.sale_type, '')) NOT IN ('DIRECT', 'WILLCALL', 'XINSTALL', 'HOLD')
-                ORDER BY soh.so_id, ib.handling_code, sod.sequence
-                """,
-                {"today": today},
-            )
 
             picks = [{
-                'so_number': str(row['so_id']),
-                'sequence': row['sequence'],
-                'item_number': row['item'],
-                'description': row['description'],
-                'handling_code': row['handling_code'],
-                'qty': float(row['qty_ordered']) if row['qty_ordered'] is not None else 0,
-                'customer_name': row['cust_name'] or 'Unknown',
-                'address': f"{row['address_1']}, {row['city']}" if row['address_1'] else 'No Address',
-                'reference': row['reference'],
-                'so_status': row['so_status'],
-                'shipment_status': row['status_flag'],
-                'system_id': row['system_id'],
-                'expect_date': str(row['expect_date']) if row['expect_date'] else '',
-                'sale_type': row['sale_type'],
-                'ship_via': row['ship_via'],
-                'driver': row['driver'],
-                'route': row['route'],
-                'printed_at': f"{row['pick_printed_date']} {row['pick_printed_time']}" if row['pick_printed_date'] else None,
-                'staged_at': f"{row['loaded_date']} {row['loaded_time']}" if row['loaded_date'] else None,
-                'delivered_at': f"{row['ship_date']}" if row['ship_date'] else None,
-                'status_flag_delivery': row['status_flag_delivery'],
+                'so_number': str(row.so_id),
+                'sequence': row.sequence,
+                'item_number': row.item,
+                'description': row.description,
+                'handling_code': row.handling_code,
+                'qty': float(row.qty_ordered) if row.qty_ordered is not None else 0,
+                'customer_name': row.cust_name or 'Unknown',
+                'address': f"{row.address_1}, {row.city}" if row.address_1 else 'No Address',
+                'reference': row.reference,
+                'so_status': row.so_status,
+                'shipment_status': row.status_flag,
+                'system_id': row.system_id,
+                'expect_date': str(row.expect_date) if row.expect_date else '',
+                'sale_type': row.sale_type,
+                'ship_via': row.ship_via,
+                'driver': row.driver,
+                'route': row.route,
+                'printed_at': f"{row.pick_printed_date} {row.pick_printed_time}" if row.pick_printed_date else None,
+                'staged_at': f"{row.loaded_date} {row.loaded_time}" if row.loaded_date else None,
+                'delivered_at': f"{row.ship_date}" if row.ship_date else None,
+                'status_flag_delivery': row.status_flag_delivery,
                 'line_count': 1,
             } for row in rows]
 
@@ -276,17 +308,16 @@ class PicksMixin:
 
     def get_open_picks_count(self):
         """Return open pick total count (distinct SOs) and handling-code
-        breakdown without fetching full row data.  Cached for 60 seconds.
+        breakdown without fetching full row data.  Cached for 30 seconds.
 
         NOTE: Counts distinct sales orders, not individual pick lines.
         The handling breakdown counts distinct SOs per handling code (an SO
         with items in multiple handling codes appears in each category).
         """
-        cache_key = 'open_picks_count'
-        cached = self._cache_get(cache_key)
-        if cached is not None:
-            return cached
+        counts = self._cached('open_picks_count', self._get_open_picks_count_inner, ttl=30)
+        return counts if counts is not None else {'total': 0, 'handling_breakdown': {}}
 
+    def _get_open_picks_count_inner(self):
         _PICK_STATUS_FILTER = """
             UPPER(COALESCE(soh.so_status, '')) != 'C'
             AND (
@@ -298,6 +329,35 @@ class PicksMixin:
             AND UPPER(COALESCE(soh.sale_type, '')) NOT IN ('DIRECT', 'WILLCALL', 'XINSTALL', 'HOLD')
         """
 
+        if self.central_db_mode and self._open_pick_read_model_ready():
+            today = datetime.now().strftime('%Y-%m-%d')
+            rows = self._mirror_query(
+                f"""
+                SELECT UPPER(COALESCE(handling_code, '')) AS handling_code, COUNT(DISTINCT so_id) AS cnt
+                FROM {self.OPEN_PICK_READ_MODEL}
+                WHERE {self._OPEN_PICK_READ_MODEL_FILTER}
+                GROUP BY system_id, UPPER(COALESCE(handling_code, ''))
+                """,
+                {"today": today},
+            )
+            total_rows = self._mirror_query(
+                f"""
+                SELECT COUNT(*) AS cnt
+                FROM (
+                    SELECT DISTINCT system_id, so_id
+                    FROM {self.OPEN_PICK_READ_MODEL}
+                    WHERE {self._OPEN_PICK_READ_MODEL_FILTER}
+                ) open_sos
+                """,
+                {"today": today},
+            )
+            handling = {}
+            for r in rows:
+                code = (r['handling_code'] or '').strip() or '—'
+                handling[code] = handling.get(code, 0) + int(r['cnt'])
+            total = int(total_rows[0]['cnt']) if total_rows else 0
+            return {'total': total, 'handling_breakdown': dict(sorted(handling.items()))}
+
         if self.central_db_mode:
             today = datetime.now().strftime('%Y-%m-%d')
 
@@ -340,7 +400,7 @@ class PicksMixin:
                 code = (r['handling_code'] or '').strip() or '—'
                 handling[code] = int(r['cnt'])
             result = {'total': total, 'handling_breakdown': dict(sorted(handling.items()))}
-            return self._cache_set(cache_key, result)
+            return result
 
         self._require_central_db_for_cloud_mode()
         try:
@@ -386,18 +446,17 @@ class PicksMixin:
                 handling[code] = int(row.cnt)
             conn.close()
             result = {'total': total, 'handling_breakdown': dict(sorted(handling.items()))}
-            return self._cache_set(cache_key, result)
+            return result
         except Exception as e:
             print(f"ERP Connection Error (open_picks_count): {e}")
-            return {'total': 0, 'handling_breakdown': {}}
+            return None  # not cached; the caller falls back to zero
 
     def get_open_work_orders_count(self):
-        """Return count of open work orders.  Cached for 60 seconds."""
-        cache_key = 'open_wo_count'
-        cached = self._cache_get(cache_key)
-        if cached is not None:
-            return cached
+        """Return count of open work orders.  Cached for ERP_CACHE_TTL_SECONDS."""
+        count = self._cached('open_wo_count', self._get_open_work_orders_count_inner)
+        return count if count is not None else 0
 
+    def _get_open_work_orders_count_inner(self):
         if self.central_db_mode:
             rows = self._mirror_query(
                 """
@@ -408,7 +467,7 @@ class PicksMixin:
                 """
             )
             count = int(rows[0]['cnt']) if rows else 0
-            return self._cache_set(cache_key, count)
+            return count
 
         self._require_central_db_for_cloud_mode()
         try:
@@ -422,17 +481,42 @@ class PicksMixin:
             row = cursor.fetchone()
             conn.close()
             count = int(row.cnt) if row else 0
-            return self._cache_set(cache_key, count)
+            return count
         except Exception as e:
             print(f"ERP Connection Error (open_wo_count): {e}")
-            return 0
+            return None  # not cached; the caller falls back to zero
 
     def get_delivery_count(self, branch_id=None):
-        """Return count of today's deliveries.  Cached for 60 seconds."""
+        """Return count of today's deliveries.  Cached for ERP_CACHE_TTL_SECONDS."""
         cache_key = f'delivery_count_{branch_id or "all"}'
-        cached = self._cache_get(cache_key)
-        if cached is not None:
-            return cached
+        count = self._cached(cache_key, lambda: self._get_delivery_count_inner(branch_id=branch_id))
+        return count if count is not None else 0
+
+    def _get_delivery_count_inner(self, branch_id=None):
+        if self.central_db_mode and self._open_pick_read_model_ready():
+            params = {"today": datetime.now().strftime('%Y-%m-%d')}
+            branch_filter = ""
+            system_id = self._normalize_branch_system_id(branch_id)
+            if system_id:
+                branch_filter = " AND system_id = :branch_id"
+                params["branch_id"] = system_id
+            rows = self._mirror_query(
+                f"""
+                SELECT COUNT(*) AS cnt
+                FROM (
+                    SELECT DISTINCT system_id, so_id
+                    FROM {self.OPEN_PICK_READ_MODEL}
+                    WHERE (
+                        (expect_day = :today)
+                        OR (ship_day = :today)
+                        OR (UPPER(COALESCE(so_status, '')) = 'I' AND invoice_day = :today)
+                        OR (UPPER(COALESCE(so_status, '')) IN ('K', 'P', 'S') AND (expect_day = :today OR expect_day < :today))
+                    ){branch_filter}
+                ) deliveries
+                """,
+                params,
+            )
+            return int(rows[0]['cnt']) if rows else 0
 
         if self.central_db_mode:
             today = datetime.now().strftime('%Y-%m-%d')
@@ -463,7 +547,7 @@ class PicksMixin:
                 params,
             )
             count = int(rows[0]['cnt']) if rows else 0
-            return self._cache_set(cache_key, count)
+            return count
 
         self._require_central_db_for_cloud_mode()
         try:
@@ -494,7 +578,79 @@ class PicksMixin:
             row = cursor.fetchone()
             conn.close()
             count = int(row.cnt) if row else 0
-            return self._cache_set(cache_key, count)
+            return count
         except Exception as e:
             print(f"ERP Connection Error (delivery_count): {e}")
-            return 0
+            return None  # not cached; the caller falls back to zero
+
+    def get_delivery_counts_by_branch(self):
+        """Today's deliveries per system_id in one query (get_delivery_count for every branch)."""
+        today = datetime.combine(datetime.now().date(), datetime.min.time())
+        if self.central_db_mode and self._open_pick_read_model_ready():
+            rows = self._mirror_query(
+                f"""
+                SELECT system_id, COUNT(*) AS cnt
+                FROM (
+                    SELECT DISTINCT system_id, so_id
+                    FROM {self.OPEN_PICK_READ_MODEL}
+                    WHERE (
+                        (expect_day = :today)
+                        OR (ship_day = :today)
+                        OR (UPPER(COALESCE(so_status, '')) = 'I' AND invoice_day = :today)
+                        OR (UPPER(COALESCE(so_status, '')) IN ('K', 'P', 'S') AND (expect_day = :today OR expect_day < :today))
+                    )
+                ) deliveries
+                GROUP BY system_id
+                """,
+                {"today": today.strftime('%Y-%m-%d')},
+            )
+            return {str(row['system_id']): int(row['cnt']) for row in rows}
+
+        if self.central_db_mode:
+            rows = self._mirror_query(
+                """
+                SELECT soh.system_id, COUNT(DISTINCT soh.so_id) AS cnt
+                FROM erp_mirror_so_header soh
+                LEFT JOIN erp_mirror_shipments_header sh
+                    ON sh.system_id = soh.system_id AND sh.so_id = soh.so_id
+                WHERE soh.is_deleted = false
+                  AND UPPER(COALESCE(soh.so_status, '')) != 'C'
+                  AND (
+                    (soh.expect_date >= :today AND soh.expect_date < :tomorrow)
+                    OR (sh.ship_date >= :today AND sh.ship_date < :tomorrow)
+                    OR (UPPER(COALESCE(soh.so_status, '')) = 'I'
+                        AND sh.invoice_date >= :today AND sh.invoice_date < :tomorrow)
+                    OR (UPPER(COALESCE(soh.so_status, '')) IN ('K', 'P', 'S') AND soh.expect_date < :tomorrow)
+                  )
+                  AND UPPER(COALESCE(soh.sale_type, '')) NOT IN ('DIRECT', 'WILLCALL', 'XINSTALL', 'HOLD')
+                GROUP BY soh.system_id
+                """,
+                {"today": today, "tomorrow": today + timedelta(days=1)},
+            )
+            return {str(row['system_id']): int(row['cnt']) for row in rows}
+
+        self._require_central_db_for_cloud_mode()
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            day = today.strftime('%Y-%m-%d')
+            cursor.execute("""
+                SELECT soh.system_id, COUNT(DISTINCT soh.so_id) AS cnt
+                FROM so_header soh
+                LEFT JOIN shipments_header sh ON soh.so_id = sh.so_id AND soh.system_id = sh.system_id
+                WHERE UPPER(COALESCE(soh.so_status, '')) != 'C'
+                  AND (
+                    (soh.expect_date = ?)
+                    OR (sh.ship_date = ?)
+                    OR (UPPER(COALESCE(soh.so_status, '')) = 'I' AND sh.invoice_date = ?)
+                    OR (UPPER(COALESCE(soh.so_status, '')) IN ('K', 'P', 'S') AND (soh.expect_date = ? OR soh.expect_date < ?))
+                  )
+                  AND UPPER(COALESCE(soh.sale_type, '')) NOT IN ('DIRECT', 'WILLCALL', 'XINSTALL', 'HOLD')
+                GROUP BY soh.system_id
+            """, [day] * 5)
+            counts = {str(row.system_id): int(row.cnt) for row in cursor.fetchall()}
+            conn.close()
+            return counts
+        except Exception as e:
+            print(f"ERP Connection Error (delivery_counts_by_branch): {e}")
+            return {}
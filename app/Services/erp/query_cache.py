@@ -0,0 +1,256 @@
+"""Process-wide query cache shared by every ERPService instance.
+
+Routes build a fresh ``ERPService()`` per request, so a per-instance cache
+almost never hits.  This module keeps one cache per process (one per
+gunicorn worker) with per-key TTLs, a bounded LRU size, single-flight
+loading and hit/miss/eviction counters.  Setting ``ERP_CACHE_BACKEND=redis``
+stores values in Redis instead so all workers share them; single-flight
+coalescing stays per process.
+"""
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from app.runtime_settings import get_query_cache_settings
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def _detach(value):
+    """Copy containers so callers can mutate results without touching the cache."""
+    if isinstance(value, dict):
+        return {key: _detach(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_detach(item) for item in value]
+    if isinstance(value, set):
+        return set(value)
+    return value
+
+
+class InProcessCacheBackend:
+    """Thread-safe TTL + LRU store living in the current process."""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max(1, int(max_entries))
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+        return _detach(value)
+
+    def set(self, key, value, ttl):
+        stored = _detach(value)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, stored)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete_prefix(self, prefix=""):
+        with self._lock:
+            keys = [key for key in self._entries if key.startswith(prefix)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class RedisCacheBackend:
+    """Shared store for multi-worker deployments; Redis enforces size via maxmemory."""
+
+    def __init__(self, url, namespace="wh-tracker:erp-cache:"):
+        if redis is None:
+            raise RuntimeError("redis is not installed. Install it or set ERP_CACHE_BACKEND=memory.")
+        self._client = redis.Redis.from_url(url)
+        self.namespace = namespace
+        self.evictions = 0
+
+    def get(self, key):
+        raw = self._client.get(self.namespace + key)
+        if raw is None:
+            return _MISSING
+        return pickle.loads(raw)
+
+    def set(self, key, value, ttl):
+        self._client.set(self.namespace + key, pickle.dumps(value), ex=max(1, int(ttl)))
+
+    def delete_prefix(self, prefix=""):
+        keys = list(self._client.scan_iter(match=f"{self.namespace}{prefix}*"))
+        if keys:
+            self._client.delete(*keys)
+        return len(keys)
+
+    def size(self):
+        return sum(1 for _ in self._client.scan_iter(match=f"{self.namespace}*"))
+
+
+class _Flight:
+    __slots__ = ("event", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.error = None
+
+
+class QueryCache:
+    """TTL cache front-end with single-flight loading and counters."""
+
+    def __init__(self, backend, default_ttl=60, load_timeout=30):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self.load_timeout = load_timeout
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "loads": 0, "coalesced": 0, "errors": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _backend_get(self, key):
+        try:
+            return self.backend.get(key)
+        except Exception as exc:
+            self._count("errors")
+            logger.warning("Query cache read failed for %s: %s", key, exc)
+            return _MISSING
+
+    def get(self, key):
+        """Return the cached value or None if missing / expired."""
+        value = self._backend_get(key)
+        if value is _MISSING:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return value
+
+    def set(self, key, value, ttl=None):
+        try:
+            self.backend.set(key, value, ttl or self.default_ttl)
+        except Exception as exc:
+            self._count("errors")
+            logger.warning("Query cache write failed for %s: %s", key, exc)
+        return value
+
+    def get_or_load(self, key, loader, ttl=None):
+        """Return the cached value, running *loader* once for concurrent misses."""
+        value = self._backend_get(key)
+        if value is not _MISSING:
+            self._count("hits")
+            return value
+
+        with self._lock:
+            self._counters["misses"] += 1
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+            else:
+                self._counters["coalesced"] += 1
+
+        if not leader:
+            if flight.event.wait(self.load_timeout) and flight.error is None:
+                value = self._backend_get(key)
+                if value is not _MISSING:
+                    return value
+            # Leader failed, stalled or produced nothing cacheable — load independently.
+            return loader()
+
+        try:
+            self._count("loads")
+            value = loader()
+            if value is not None:
+                self.set(key, value, ttl)
+            return value
+        except Exception as exc:
+            flight.error = exc
+            raise
+        finally:
+            flight.event.set()
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def invalidate(self, prefix=""):
+        """Drop every key starting with *prefix* (everything when empty)."""
+        try:
+            return self.backend.delete_prefix(prefix)
+        except Exception as exc:
+            self._count("errors")
+            logger.warning("Query cache invalidate failed for %r: %s", prefix, exc)
+            return 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else None
+        stats["evictions"] = getattr(self.backend, "evictions", 0)
+        try:
+            stats["entries"] = self.backend.size()
+        except Exception:
+            stats["entries"] = None
+        stats["backend"] = type(self.backend).__name__
+        return stats
+
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+
+def _build_query_cache():
+    settings = get_query_cache_settings()
+    backend = None
+    if settings["backend"] == "redis" and settings["redis_url"]:
+        try:
+            backend = RedisCacheBackend(settings["redis_url"])
+        except Exception as exc:
+            logger.warning("Redis query cache unavailable (%s); using in-process cache.", exc)
+    if backend is None:
+        backend = InProcessCacheBackend(max_entries=settings["max_entries"])
+    return QueryCache(
+        backend,
+        default_ttl=settings["default_ttl_seconds"],
+        load_timeout=settings["load_timeout_seconds"],
+    )
+
+
+def get_query_cache():
+    """Return the process-wide QueryCache, creating it on first use."""
+    global _query_cache
+    if _query_cache is None:
+        with _query_cache_lock:
+            if _query_cache is None:
+                _query_cache = _build_query_cache()
+    return _query_cache
+
+
+def reset_query_cache():
+    """Discard the process-wide cache (tests, or after settings change)."""
+    global _query_cache
+    with _query_cache_lock:
+        _query_cache = None
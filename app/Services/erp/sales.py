@@ -1,15 +1,13 @@
 """ERP sales domain — hub metrics, order status, transactions, invoice lookup."""
+import base64
+import json
 from datetime import date, datetime, timedelta
 
 
 class SalesMixin:
     def get_sales_hub_metrics(self, rep_id=""):
         cache_key = f'hub_metrics_{rep_id}' if rep_id else 'hub_metrics'
-        cached = self._cache_get(cache_key)
-        if cached is not None:
-            return cached
-        result = self._get_sales_hub_metrics_inner(rep_id=rep_id)
-        return self._cache_set(cache_key, result)
+        return self._cached(cache_key, lambda: self._get_sales_hub_metrics_inner(rep_id=rep_id))
 
 
     def _get_sales_hub_metrics_inner(self, rep_id=""):
@@ -61,27 +59,142 @@ class SalesMixin:
             conn.close()
 
 
+    def get_sales_hub_metrics_grouped(self):
+        """
+        Hub metrics for every scope the workcenter tiles need, in one query.
+
+        Returns {'all': metrics, 'branches': {system_id: metrics},
+        'reps': {rep_id: metrics}} where metrics has the same keys as
+        get_sales_hub_metrics.  A rep counts orders where they are the
+        salesperson or the order writer, across all branches.
+        """
+        today = datetime.combine(date.today(), datetime.min.time())
+        if not self.central_db_mode:
+            return self._get_sales_hub_metrics_grouped_legacy(today)
+
+        params = {"today": today, "tomorrow": today + timedelta(days=1)}
+        rep_columns = ["salesperson"]
+        if self._has_order_writer_column():
+            rep_columns.append("order_writer")
+        reps_sql = "\n                    UNION\n".join(
+            f"SELECT COALESCE({column}, '') AS rep_id, so_id, is_open, is_today FROM heads"
+            for column in rep_columns
+        )
+        rows = self._mirror_query(
+            f"""
+            WITH heads AS (
+                SELECT system_id, so_id, {", ".join(rep_columns)},
+                       CASE WHEN UPPER(COALESCE(so_status, '')) = 'O' THEN 1 ELSE 0 END AS is_open,
+                       CASE WHEN expect_date >= :today AND expect_date < :tomorrow THEN 1 ELSE 0 END AS is_today
+                FROM erp_mirror_so_header
+                WHERE is_deleted = false
+                  AND (UPPER(COALESCE(so_status, '')) = 'O'
+                       OR (expect_date >= :today AND expect_date < :tomorrow))
+            )
+            SELECT 'all' AS scope, '*' AS scope_key,
+                   COUNT(DISTINCT CASE WHEN is_open = 1 THEN so_id END) AS open_orders_count,
+                   COUNT(DISTINCT CASE WHEN is_today = 1 THEN so_id END) AS total_orders_today
+            FROM heads
+            UNION ALL
+            SELECT 'branch', system_id,
+                   COUNT(DISTINCT CASE WHEN is_open = 1 THEN so_id END),
+                   COUNT(DISTINCT CASE WHEN is_today = 1 THEN so_id END)
+            FROM heads
+            GROUP BY system_id
+            UNION ALL
+            SELECT 'rep', rep_id,
+                   COUNT(DISTINCT CASE WHEN is_open = 1 THEN so_id END),
+                   COUNT(DISTINCT CASE WHEN is_today = 1 THEN so_id END)
+            FROM (
+                    {reps_sql}
+            ) reps
+            WHERE rep_id != ''
+            GROUP BY rep_id
+            """,
+            params,
+        )
+        return self._group_hub_metrics(rows)
+
+    @staticmethod
+    def _group_hub_metrics(rows):
+        grouped = {"all": {"open_orders_count": 0, "total_orders_today": 0}, "branches": {}, "reps": {}}
+        for row in rows:
+            metrics = {
+                "open_orders_count": int(row["open_orders_count"] or 0),
+                "total_orders_today": int(row["total_orders_today"] or 0),
+            }
+            if row["scope"] == "all":
+                grouped["all"] = metrics
+            elif row["scope"] == "branch":
+                grouped["branches"][str(row["scope_key"])] = metrics
+            else:
+                grouped["reps"][str(row["scope_key"])] = metrics
+        return grouped
+
+    def _get_sales_hub_metrics_grouped_legacy(self, today):
+        self._require_central_db_for_cloud_mode()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            day = today.strftime('%Y-%m-%d')
+            cursor.execute(
+                """
+                WITH heads AS (
+                    SELECT system_id, so_id, salesperson,
+                           CASE WHEN UPPER(COALESCE(so_status, '')) = 'O' THEN 1 ELSE 0 END AS is_open,
+                           CASE WHEN CAST(expect_date AS DATE) = ? THEN 1 ELSE 0 END AS is_today
+                    FROM so_header
+                )
+                SELECT 'all' AS scope, '*' AS scope_key,
+                       COUNT(DISTINCT CASE WHEN is_open = 1 THEN so_id END) AS open_orders_count,
+                       COUNT(DISTINCT CASE WHEN is_today = 1 THEN so_id END) AS total_orders_today
+                FROM heads
+                UNION ALL
+                SELECT 'branch', system_id,
+                       COUNT(DISTINCT CASE WHEN is_open = 1 THEN so_id END),
+                       COUNT(DISTINCT CASE WHEN is_today = 1 THEN so_id END)
+                FROM heads
+                GROUP BY system_id
+                UNION ALL
+                SELECT 'rep', COALESCE(salesperson, ''),
+                       COUNT(DISTINCT CASE WHEN is_open = 1 THEN so_id END),
+                       COUNT(DISTINCT CASE WHEN is_today = 1 THEN so_id END)
+                FROM heads
+                WHERE COALESCE(salesperson, '') != ''
+                GROUP BY COALESCE(salesperson, '')
+                """,
+                (day,),
+            )
+            rows = [
+                {
+                    "scope": row.scope,
+                    "scope_key": row.scope_key,
+                    "open_orders_count": row.open_orders_count,
+                    "total_orders_today": row.total_orders_today,
+                }
+                for row in cursor.fetchall()
+            ]
+            return self._group_hub_metrics(rows)
+        finally:
+            cursor.close()
+            conn.close()
+
     def get_sales_rep_metrics(self, period_days=30):
         cache_key = f'rep_metrics_{period_days}'
-        cached = self._cache_get(cache_key)
-        if cached is not None:
-            return cached
-        result = self._get_sales_rep_metrics_inner(period_days=period_days)
-        self._cache_set(cache_key, result)
-        return result
+        return self._cached(cache_key, lambda: self._get_sales_rep_metrics_inner(period_days=period_days))
 
 
     def _get_sales_rep_metrics_inner(self, period_days=30):
         if self.central_db_mode:
             since = datetime.utcnow() - timedelta(days=period_days)
             rows = self._mirror_query(
-                """
+                f"""
                 SELECT
                     COUNT(DISTINCT COALESCE(c.cust_key, soh.cust_key)) AS active_customers,
                     COALESCE(SUM(sod.qty_ordered * sod.price), 0) AS open_orders_value
                 FROM erp_mirror_so_header soh
                 LEFT JOIN erp_mirror_cust c
-                    ON TRIM(c.cust_key) = TRIM(soh.cust_key)
+                    ON {self._cust_join_clause()}
                 LEFT JOIN erp_mirror_so_detail sod
                     ON sod.system_id = soh.system_id AND sod.so_id = soh.so_id
                 WHERE soh.is_deleted = false
@@ -130,41 +243,166 @@ class SalesMixin:
             conn.close()
 
 
+    @staticmethod
+    def encode_order_cursor(row):
+        """Opaque cursor for the page after *row* (the last row of a page), or None."""
+        if not row or not row.get("system_id"):
+            return None
+        expect_date = row.get("expect_date")
+        if isinstance(expect_date, datetime):
+            expect_date = expect_date.isoformat(sep=" ")
+        elif expect_date is not None:
+            expect_date = str(expect_date)
+        payload = json.dumps([expect_date, row["system_id"], str(row["so_number"])], separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+    @staticmethod
+    def _decode_order_cursor(cursor):
+        """(expect_date, system_id, so_id) from encode_order_cursor(); None if absent or malformed."""
+        if not cursor:
+            return None
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            expect_date, system_id, so_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (ValueError, TypeError):
+            return None
+        if not isinstance(system_id, str) or not isinstance(so_id, str):
+            return None
+        if expect_date is not None and not isinstance(expect_date, str):
+            return None
+        return expect_date, system_id, so_id
+
+
+    @staticmethod
+    def _expect_date_clauses(date_from, date_to, params):
+        """expect_date range filters written against the bare column so the keyset index serves them."""
+        clauses = []
+        if date_from:
+            params["date_from"] = date_from
+            clauses.append("soh.expect_date >= :date_from")
+        if date_to:
+            try:
+                params["date_to_next"] = (date.fromisoformat(str(date_to)[:10]) + timedelta(days=1)).isoformat()
+                clauses.append("soh.expect_date < :date_to_next")
+            except ValueError:
+                params["date_to"] = date_to
+                clauses.append("CAST(soh.expect_date AS DATE) <= :date_to")
+        return clauses
+
+
+    def _order_cust_exists(self, predicate):
+        """Customer-side filter as EXISTS, so the page scan needs no join or GROUP BY."""
+        return f"EXISTS (SELECT 1 FROM erp_mirror_cust c WHERE {self._cust_join_clause()} AND {predicate})"
+
+
+    def _order_page_sql(self, clauses, params, limit=None, page=1, cursor="",
+                        handling_code_expr="'' AS handling_code"):
+        """
+        Order-list SQL for the mirror: pick one page of header ids, then decorate it.
+
+        The ``page`` CTE filters erp_mirror_so_header alone in (expect_date,
+        system_id, so_id) DESC order, so with a cursor it resumes right after
+        the previous page instead of skipping ``OFFSET`` rows.  Without one, ``page`` falls back to OFFSET
+        paging over the same narrow scan.  Customer / ship-to columns and the
+        line count are only resolved for the rows on the page.
+        """
+        sod_columns = set(self._mirror_columns("erp_mirror_so_detail"))
+        if "line_no" in sod_columns:
+            line_count_expr = "COUNT(DISTINCT sod.line_no)"
+        elif "sequence" in sod_columns:
+            line_count_expr = "COUNT(DISTINCT sod.sequence)"
+        else:
+            line_count_expr = "COUNT(sod.id)"
+
+        clauses = list(clauses)
+        keyset = self._decode_order_cursor(cursor)
+        if keyset:
+            cursor_date, params["cursor_system_id"], params["cursor_so_id"] = keyset
+            after_key = "(soh.system_id, soh.so_id) < (:cursor_system_id, :cursor_so_id)"
+            if cursor_date is None:
+                clauses.append(f"(soh.expect_date IS NULL AND {after_key})")
+            else:
+                params["cursor_date"] = cursor_date
+                clauses.append(
+                    "(soh.expect_date < :cursor_date OR soh.expect_date IS NULL"
+                    f" OR (soh.expect_date = :cursor_date AND {after_key}))"
+                )
+        paging = ""
+        if limit:
+            params["limit"] = limit
+            paging = "LIMIT :limit"
+            page = max(1, page)
+            if not keyset and page > 1:
+                params["offset"] = (page - 1) * limit
+                paging += " OFFSET :offset"
+
+        return f"""
+            WITH page AS (
+                SELECT soh.id
+                FROM erp_mirror_so_header soh
+                WHERE {" AND ".join(clauses)}
+                ORDER BY soh.expect_date DESC NULLS LAST, soh.system_id DESC, soh.so_id DESC
+                {paging}
+            )
+            SELECT
+                CAST(soh.so_id AS TEXT) AS so_number,
+                soh.system_id,
+                MAX(c.cust_name) AS customer_name,
+                MAX(c.cust_code) AS customer_code,
+                MAX(cs.address_1) AS address_1,
+                MAX(cs.city) AS city,
+                MAX(soh.expect_date) AS expect_date,
+                MAX(soh.reference) AS reference,
+                MAX(soh.so_status) AS so_status,
+                MAX(soh.synced_at) AS synced_at,
+                {handling_code_expr},
+                MAX(soh.sale_type) AS sale_type,
+                MAX(COALESCE(soh.ship_via, '')) AS ship_via,
+                MAX(COALESCE(soh.salesperson, '')) AS salesperson,
+                {self._order_writer_select()},
+                MAX(COALESCE(soh.po_number, '')) AS po_number,
+                (SELECT {line_count_expr}
+                 FROM erp_mirror_so_detail sod
+                 WHERE sod.system_id = soh.system_id AND sod.so_id = soh.so_id
+                ) AS line_count
+            FROM page
+            JOIN erp_mirror_so_header soh ON soh.id = page.id
+            LEFT JOIN erp_mirror_cust c
+                ON {self._cust_join_clause()}
+            LEFT JOIN erp_mirror_cust_shipto cs
+                ON {self._shipto_join_clause()}
+            GROUP BY soh.system_id, soh.so_id
+            ORDER BY MAX(soh.expect_date) DESC NULLS LAST, soh.system_id DESC, soh.so_id DESC
+            """
+
+
     def get_sales_order_status(self, q="", limit=100, branch="", open_only=True, rep_id="",
                                status="", date_from="", date_to="", page=1,
                                sale_type="", exclude_sale_types="",
-                               customer_code="", salesperson="", shipto_seq=""):
+                               customer_code="", salesperson="", shipto_seq="", cursor=""):
         # Cache unfiltered list for 60 s; skip cache when any filters are active
-        has_filters = q or branch or rep_id or status or date_from or date_to or page > 1 or sale_type or exclude_sale_types or customer_code or salesperson or shipto_seq
+        has_filters = q or branch or rep_id or status or date_from or date_to or page > 1 or cursor or sale_type or exclude_sale_types or customer_code or salesperson or shipto_seq
         cache_key = f'order_status_{limit}' if not has_filters and open_only else None
-        if cache_key:
-            cached = self._cache_get(cache_key)
-            if cached is not None:
-                return cached
-        result = self._get_sales_order_status_inner(
-            q=q, limit=limit, branch=branch, open_only=open_only, rep_id=rep_id,
-            status=status, date_from=date_from, date_to=date_to, page=page,
-            sale_type=sale_type, exclude_sale_types=exclude_sale_types,
-            customer_code=customer_code, salesperson=salesperson, shipto_seq=shipto_seq,
-        )
-        if cache_key:
-            self._cache_set(cache_key, result)
-        return result
+
+        def load():
+            return self._get_sales_order_status_inner(
+                q=q, limit=limit, branch=branch, open_only=open_only, rep_id=rep_id,
+                status=status, date_from=date_from, date_to=date_to, page=page,
+                sale_type=sale_type, exclude_sale_types=exclude_sale_types,
+                customer_code=customer_code, salesperson=salesperson, shipto_seq=shipto_seq,
+                cursor=cursor,
+            )
+
+        return self._cached(cache_key, load) if cache_key else load()
 
 
     def _get_sales_order_status_inner(self, q="", limit=100, branch="", open_only=True,
                                       rep_id="", status="", date_from="", date_to="", page=1,
                                       sale_type="", exclude_sale_types="",
-                                      customer_code="", salesperson="", shipto_seq=""):
+                                      customer_code="", salesperson="", shipto_seq="", cursor=""):
         if self.central_db_mode:
-            sod_columns = set(self._mirror_columns("erp_mirror_so_detail"))
-            if "line_no" in sod_columns:
-                line_count_expr = "COUNT(DISTINCT sod.line_no) AS line_count"
-            elif "sequence" in sod_columns:
-                line_count_expr = "COUNT(DISTINCT sod.sequence) AS line_count"
-            else:
-                line_count_expr = "COUNT(sod.id) AS line_count"
-            params: dict = {"limit": limit}
+            params: dict = {}
             clauses = ["soh.is_deleted = false"]
             # Status filtering — explicit status param takes precedence over open_only flag
             if status:
@@ -176,12 +414,14 @@ class SalesMixin:
                 clauses.append("UPPER(COALESCE(soh.so_status, '')) = 'O'")
             if q:
                 params["q"] = f"%{q}%"
+                cust_match = self._order_cust_exists(
+                    "(COALESCE(c.cust_name, '') ILIKE :q OR COALESCE(c.cust_code, '') ILIKE :q)"
+                )
                 clauses.append(
-                    "(soh.so_id::text ILIKE :q"
-                    " OR COALESCE(c.cust_name, '') ILIKE :q"
-                    " OR COALESCE(c.cust_code, '') ILIKE :q"
+                    "(soh.so_id ILIKE :q"
                     " OR COALESCE(soh.po_number, '') ILIKE :q"
-                    " OR COALESCE(soh.reference, '') ILIKE :q)"
+                    " OR COALESCE(soh.reference, '') ILIKE :q"
+                    f" OR {cust_match})"
                 )
             if branch:
                 system_id = self._normalize_branch_system_id(branch)
@@ -196,16 +436,17 @@ class SalesMixin:
                 clauses.append("COALESCE(soh.salesperson, '') = :sp_filter")
             if customer_code:
                 params["cust_filter"] = customer_code.strip()
-                clauses.append("(TRIM(c.cust_code) = :cust_filter OR TRIM(soh.cust_key) = :cust_filter)")
+                if self._has_join_key_columns():
+                    clauses.append(f"(soh.cust_key_norm = :cust_filter OR {self._order_cust_exists('c.cust_code_norm = :cust_filter')})")
+                else:
+                    clauses.append(f"(TRIM(soh.cust_key) = :cust_filter OR {self._order_cust_exists('TRIM(c.cust_code) = :cust_filter')})")
             if shipto_seq:
                 params["shipto_filter"] = shipto_seq.strip()
-                clauses.append("TRIM(CAST(soh.shipto_seq_num AS TEXT)) = :shipto_filter")
-            if date_from:
-                params["date_from"] = date_from
-                clauses.append("CAST(soh.expect_date AS DATE) >= :date_from")
-            if date_to:
-                params["date_to"] = date_to
-                clauses.append("CAST(soh.expect_date AS DATE) <= :date_to")
+                if self._has_join_key_columns():
+                    clauses.append("soh.shipto_seq_norm = :shipto_filter")
+                else:
+                    clauses.append("TRIM(CAST(soh.shipto_seq_num AS TEXT)) = :shipto_filter")
+            clauses.extend(self._expect_date_clauses(date_from, date_to, params))
             if sale_type:
                 valid_types = [t.strip().upper() for t in sale_type.split(',') if t.strip()]
                 if valid_types:
@@ -216,48 +457,14 @@ class SalesMixin:
                 if valid_excludes:
                     excl_ph = ', '.join(f"'{t}'" for t in valid_excludes)
                     clauses.append(f"UPPER(COALESCE(soh.sale_type, '')) NOT IN ({excl_ph})")
-            where_clause = "WHERE " + " AND ".join(clauses)
-            page = max(1, page)
-            offset = (page - 1) * limit
-            params["offset"] = offset
-            rows = self._mirror_query(
-                f"""
-                SELECT
-                    soh.so_id::text AS so_number,
-                    MAX(c.cust_name) AS customer_name,
-                    MAX(c.cust_code) AS customer_code,
-                    MAX(cs.address_1) AS address_1,
-                    MAX(cs.city) AS city,
-                    MAX(soh.expect_date) AS expect_date,
-                    MAX(soh.reference) AS reference,
-                    MAX(soh.so_status) AS so_status,
-                    MAX(soh.synced_at) AS synced_at,
-                    '' AS handling_code,
-                    MAX(soh.sale_type) AS sale_type,
-                    MAX(COALESCE(soh.ship_via, '')) AS ship_via,
-                    MAX(COALESCE(soh.salesperson, '')) AS salesperson,
-                    {self._order_writer_select()},
-                    MAX(COALESCE(soh.po_number, '')) AS po_number,
-                    {line_count_expr}
-                FROM erp_mirror_so_header soh
-                LEFT JOIN erp_mirror_cust c
-                    ON TRIM(c.cust_key) = TRIM(soh.cust_key)
-                LEFT JOIN erp_mirror_cust_shipto cs
-                    ON TRIM(cs.cust_key) = TRIM(soh.cust_key)
-                    AND TRIM(CAST(cs.seq_num AS TEXT)) = TRIM(CAST(soh.shipto_seq_num AS TEXT))
-                LEFT JOIN erp_mirror_so_detail sod
-                    ON sod.system_id = soh.system_id AND sod.so_id = soh.so_id
-                {where_clause}
-                GROUP BY soh.system_id, soh.so_id
-                ORDER BY MAX(soh.expect_date) DESC NULLS LAST, soh.so_id DESC
-                LIMIT :limit OFFSET :offset
-                """,
+            rows = self._mirror_stream(
+                self._order_page_sql(clauses, params, limit=limit, page=page, cursor=cursor),
                 params,
             )
             return [
                 {
-                    **dict(row),
-                    "address": ", ".join(part for part in [row.get("address_1"), row.get("city")] if part),
+                    **row._asdict(),
+                    "address": ", ".join(part for part in [row.address_1, row.city] if part),
                 }
                 for row in rows
             ]
@@ -444,10 +651,9 @@ class SalesMixin:
             INNER JOIN erp_mirror_shipments_header sh
                 ON sh.system_id = soh.system_id AND sh.so_id = soh.so_id
             LEFT JOIN erp_mirror_cust c
-                ON TRIM(c.cust_key) = TRIM(soh.cust_key)
+                ON {self._cust_join_clause()}
             LEFT JOIN erp_mirror_cust_shipto cs
-                ON TRIM(cs.cust_key) = TRIM(soh.cust_key)
-                AND TRIM(CAST(cs.seq_num AS TEXT)) = TRIM(CAST(soh.shipto_seq_num AS TEXT))
+                ON {self._shipto_join_clause()}
             LEFT JOIN erp_mirror_so_detail sod
                 ON sod.system_id = soh.system_id AND sod.so_id = soh.so_id
             {where_clause}
@@ -510,7 +716,7 @@ class SalesMixin:
                     MAX(COALESCE(soh.po_number, '')) AS po_number
                 FROM erp_mirror_so_header soh
                 LEFT JOIN erp_mirror_cust c
-                    ON TRIM(c.cust_key) = TRIM(soh.cust_key)
+                    ON {self._cust_join_clause()}
                 LEFT JOIN erp_mirror_shipments_header sh
                     ON sh.system_id = soh.system_id AND sh.so_id = soh.so_id
                 WHERE {' AND '.join(clauses)}
@@ -588,54 +794,41 @@ class SalesMixin:
             conn.close()
 
 
-    def get_sales_customer_orders(self, customer_number, q="", limit=None, date_from="", date_to="", status="", branch="", page=1, rep_id=""):
+    def get_sales_customer_orders(self, customer_number, q="", limit=None, date_from="", date_to="", status="", branch="", page=1, rep_id="", cursor=""):
         # Cache per-customer full order lists for up to 60 s (skip cache when filtering/paginating)
-        cache_key = f'cust_orders_{customer_number}_{limit}' if not (q or date_from or date_to or status or branch or page > 1 or rep_id) else None
-        if cache_key:
-            cached = self._cache_get(cache_key)
-            if cached is not None:
-                return cached
-        result = self._get_sales_customer_orders_inner(
-            customer_number=customer_number, q=q, limit=limit,
-            date_from=date_from, date_to=date_to, status=status, branch=branch, page=page,
-            rep_id=rep_id,
-        )
-        if cache_key:
-            self._cache_set(cache_key, result)
-        return result
+        cache_key = f'cust_orders_{customer_number}_{limit}' if not (q or date_from or date_to or status or branch or page > 1 or rep_id or cursor) else None
+
+        def load():
+            return self._get_sales_customer_orders_inner(
+                customer_number=customer_number, q=q, limit=limit,
+                date_from=date_from, date_to=date_to, status=status, branch=branch, page=page,
+                rep_id=rep_id, cursor=cursor,
+            )
+
+        return self._cached(cache_key, load) if cache_key else load()
 
 
-    def _get_sales_customer_orders_inner(self, customer_number, q="", limit=None, date_from="", date_to="", status="", branch="", page=1, rep_id=""):
+    def _get_sales_customer_orders_inner(self, customer_number, q="", limit=None, date_from="", date_to="", status="", branch="", page=1, rep_id="", cursor=""):
         if self.central_db_mode:
-            sod_columns = set(self._mirror_columns("erp_mirror_so_detail"))
-            if "line_no" in sod_columns:
-                line_count_expr = "COUNT(DISTINCT sod.line_no) AS line_count"
-            elif "sequence" in sod_columns:
-                line_count_expr = "COUNT(DISTINCT sod.sequence) AS line_count"
-            else:
-                line_count_expr = "COUNT(sod.id) AS line_count"
             params: dict = {}
             clauses = ["soh.is_deleted = false"]
             if customer_number:
                 params["customer_number"] = f"%{customer_number}%"
-                clauses.append(
+                clauses.append(self._order_cust_exists(
                     "(COALESCE(c.cust_code, '') ILIKE :customer_number"
                     " OR COALESCE(c.cust_name, '') ILIKE :customer_number)"
-                )
+                ))
             if q:
                 params["q"] = f"%{q}%"
+                cust_match = self._order_cust_exists(
+                    "(COALESCE(c.cust_name, '') ILIKE :q OR COALESCE(c.cust_code, '') ILIKE :q)"
+                )
                 clauses.append(
-                    "(soh.so_id::text ILIKE :q"
+                    "(soh.so_id ILIKE :q"
                     " OR COALESCE(soh.reference, '') ILIKE :q"
-                    " OR COALESCE(c.cust_name, '') ILIKE :q"
-                    " OR COALESCE(c.cust_code, '') ILIKE :q)"
+                    f" OR {cust_match})"
                 )
-            if date_from:
-                params["date_from"] = date_from
-                clauses.append("CAST(soh.expect_date AS DATE) >= :date_from")
-            if date_to:
-                params["date_to"] = date_to
-                clauses.append("CAST(soh.expect_date AS DATE) <= :date_to")
+            clauses.extend(self._expect_date_clauses(date_from, date_to, params))
             if status:
                 valid_statuses = [s.strip().upper() for s in status.split(',') if s.strip()]
                 if valid_statuses:
@@ -650,53 +843,18 @@ class SalesMixin:
             if rep_id:
                 params["rep_id"] = rep_id
                 clauses.append(self._rep_filter_clause())
-            page = max(1, page)
-            offset = (page - 1) * limit if limit else 0
-            if limit:
-                params["limit"] = limit
-                params["offset"] = offset
-                limit_clause = "LIMIT :limit OFFSET :offset"
-            else:
-                limit_clause = ""
-            where_clause = "WHERE " + " AND ".join(clauses)
 
-            rows = self._mirror_query(
-                f"""
-                SELECT
-                    soh.so_id::text AS so_number,
-                    MAX(c.cust_name) AS customer_name,
-                    MAX(c.cust_code) AS customer_code,
-                    MAX(cs.address_1) AS address_1,
-                    MAX(cs.city) AS city,
-                    MAX(soh.expect_date) AS expect_date,
-                    MAX(soh.reference) AS reference,
-                    MAX(soh.so_status) AS so_status,
-                    MAX(soh.synced_at) AS synced_at,
-                    (SELECT MAX(ib.handling_code)
+            handling_code_expr = """(SELECT MAX(ib.handling_code)
                      FROM erp_mirror_so_detail sod
                      JOIN erp_mirror_item_branch ib
                          ON ib.system_id = sod.system_id AND ib.item_ptr = sod.item_ptr
                      WHERE sod.system_id = soh.system_id AND sod.so_id = soh.so_id
-                    ) AS handling_code,
-                    MAX(soh.sale_type) AS sale_type,
-                    MAX(COALESCE(soh.ship_via, '')) AS ship_via,
-                    MAX(COALESCE(soh.salesperson, '')) AS salesperson,
-                    {self._order_writer_select()},
-                    MAX(COALESCE(soh.po_number, '')) AS po_number,
-                    {line_count_expr}
-                FROM erp_mirror_so_header soh
-                LEFT JOIN erp_mirror_cust c
-                    ON TRIM(c.cust_key) = TRIM(soh.cust_key)
-                LEFT JOIN erp_mirror_cust_shipto cs
-                    ON TRIM(cs.cust_key) = TRIM(soh.cust_key)
-                    AND TRIM(CAST(cs.seq_num AS TEXT)) = TRIM(CAST(soh.shipto_seq_num AS TEXT))
-                LEFT JOIN erp_mirror_so_detail sod
-                    ON sod.system_id = soh.system_id AND sod.so_id = soh.so_id
-                {where_clause}
-                GROUP BY soh.system_id, soh.so_id
-                ORDER BY MAX(soh.expect_date) DESC NULLS LAST, soh.so_id DESC
-                {limit_clause}
-                """,
+                    ) AS handling_code"""
+            rows = self._mirror_query(
+                self._order_page_sql(
+                    clauses, params, limit=limit, page=page, cursor=cursor,
+                    handling_code_expr=handling_code_expr,
+                ),
                 params,
             )
             return [
@@ -0,0 +1,283 @@
+"""In-memory scan-time attributes for open sales orders.
+
+Smart scans need the sale type and primary handling code of the scanned SO.
+Both are fixed for the life of an open order, so every worker keeps them for
+all open orders in one dict and answers scans without a mirror round trip.
+The index is loaded when a gunicorn web worker starts (gunicorn.conf.py) and
+then refreshed from the mirror ``synced_at`` watermarks.  Each refresh reloads
+only the SOs whose header or lines changed, or whose items' handling codes
+changed.  Closed, invoiced and deleted orders drop out.  A miss (a brand-new or already invoiced SO) just
+falls back to the regular mirror query.
+"""
+import logging
+import sys
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import inspect, text
+
+from app.runtime_settings import get_central_db_url, get_so_attribute_index_settings
+
+logger = logging.getLogger(__name__)
+
+SOAttributes = namedtuple("SOAttributes", "system_id so_status sale_type handling_code branch_code")
+
+CLOSED_STATUSES = ("C", "I")
+SOURCE_TABLES = ("erp_mirror_so_header", "erp_mirror_so_detail", "erp_mirror_item_branch")
+
+_OPEN_SCOPE = f"""
+    soh.is_deleted = false
+    AND UPPER(COALESCE(soh.so_status, '')) NOT IN ({", ".join(f"'{status}'" for status in CLOSED_STATUSES)})
+"""
+
+# Orders touched since :since — their header, a line, or the handling code of an item on a line.
+_CHANGED_SCOPE = """
+    (soh.system_id, soh.so_id) IN (
+        SELECT system_id, so_id FROM erp_mirror_so_header WHERE synced_at > :since
+        UNION
+        SELECT system_id, so_id FROM erp_mirror_so_detail WHERE synced_at > :since
+        UNION
+        SELECT sod.system_id, sod.so_id
+        FROM erp_mirror_so_detail sod
+        JOIN erp_mirror_item_branch ib
+            ON ib.system_id = sod.system_id AND ib.item_ptr = sod.item_ptr
+        WHERE ib.synced_at > :since
+    )
+"""
+
+_ATTRIBUTES_SQL = """
+    WITH heads AS (
+        SELECT soh.system_id, soh.so_id,
+               UPPER(COALESCE(soh.so_status, '')) AS so_status,
+               UPPER(COALESCE(soh.sale_type, '')) AS sale_type,
+               soh.branch_code,
+               soh.is_deleted
+        FROM erp_mirror_so_header soh
+        WHERE {scope}
+    )
+    SELECT h.system_id, h.so_id, 'head' AS kind, h.sale_type AS value,
+           h.so_status, h.branch_code, h.is_deleted, 0 AS cnt
+    FROM heads h
+    UNION ALL
+    SELECT sod.system_id, sod.so_id, 'handling_code' AS kind,
+           UPPER(COALESCE(ib.handling_code, '')) AS value,
+           NULL, NULL, NULL, COUNT(*) AS cnt
+    FROM erp_mirror_so_detail sod
+    JOIN heads h
+        ON h.system_id = sod.system_id AND h.so_id = sod.so_id
+    LEFT JOIN erp_mirror_item_branch ib
+        ON ib.system_id = sod.system_id AND ib.item_ptr = sod.item_ptr
+    WHERE COALESCE(ib.handling_code, '') != ''
+    GROUP BY sod.system_id, sod.so_id, UPPER(COALESCE(ib.handling_code, ''))
+"""
+
+
+def _intern(value):
+    # A few dozen distinct sale types / codes / branches repeat across every order.
+    return sys.intern(str(value)) if value else None
+
+
+def _coerce_datetime(value):
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+class SOAttributeIndex:
+    """Process-wide so_id -> SOAttributes map for open orders."""
+
+    # Sync writes stamp synced_at before they commit, so a row stamped just
+    # before a refresh may only become visible after it.
+    WATERMARK_OVERLAP = timedelta(minutes=2)
+
+    def __init__(self, engine=None):
+        self._engine = engine
+        self._entries = {}  # so_id -> tuple of SOAttributes (one per system_id)
+        self._watermark = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        # Separate from _lock, which a refresh holds across its mirror queries.
+        self._stats_lock = threading.Lock()
+        self._thread = None
+        self.stats = {"hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0, "last_refresh_ms": 0}
+
+    @property
+    def engine(self):
+        if self._engine is not None:
+            return self._engine
+        from app.Services.erp.base import ERPServiceBase
+
+        return ERPServiceBase._mirror_engine()
+
+    def is_loaded(self):
+        return self._loaded
+
+    def __len__(self):
+        return len(self._entries)
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def get(self, so_number):
+        """SOAttributes for an open SO, or None when it isn't in the index."""
+        entries = self._entries.get(str(so_number)) if self._loaded else None
+        if not entries:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return entries[0]
+
+    def get_many(self, so_numbers):
+        """{so_number: SOAttributes} for the SOs found; callers query the rest."""
+        found = {}
+        for so_number in so_numbers:
+            attributes = self.get(so_number)
+            if attributes is not None:
+                found[str(so_number)] = attributes
+        return found
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    def refresh(self, rebuild=False):
+        """Load every open order, or only those changed since the last watermark."""
+        started = time.monotonic()
+        with self._lock:
+            since = None if rebuild or not self._loaded else self._watermark
+            watermark = self._source_watermark()
+            if since is None:
+                params = {}
+                scope = _OPEN_SCOPE
+            else:
+                params = {"since": since - self.WATERMARK_OVERLAP}
+                scope = _CHANGED_SCOPE
+            with self.engine.connect() as conn:
+                rows = conn.execute(text(_ATTRIBUTES_SQL.format(scope=scope)), params).mappings().all()
+            changed = self._build(rows)
+
+            entries = {} if since is None else dict(self._entries)
+            for so_id, systems in changed.items():
+                merged = {entry.system_id: entry for entry in entries.get(so_id, ())}
+                merged.update(systems)
+                values = tuple(sorted(entry for entry in merged.values() if entry is not None))
+                if values:
+                    entries[so_id] = values
+                else:
+                    entries.pop(so_id, None)
+            # Swap the whole dict so lookups never see a half-applied refresh.
+            self._entries = entries
+            if watermark is not None:
+                self._watermark = watermark
+            self._loaded = True
+
+        elapsed_ms = int((time.monotonic() - started) * 1000)
+        self._count("refreshes")
+        self.stats["last_refresh_ms"] = elapsed_ms
+        return {
+            "mode": "rebuild" if since is None else "incremental",
+            "orders": len(changed),
+            "size": len(self._entries),
+            "duration_ms": elapsed_ms,
+        }
+
+    def _build(self, rows):
+        """Group query rows into so_id -> {system_id: SOAttributes}.
+
+        Closed and deleted headers map to None so an incremental refresh
+        evicts them.
+        """
+        heads = {}
+        handling = {}
+        for row in rows:
+            key = (str(row["system_id"]), str(row["so_id"]))
+            if row["kind"] == "head":
+                heads[key] = row
+            else:
+                handling.setdefault(key, []).append((-int(row["cnt"]), row["value"]))
+
+        grouped = {}
+        for (system_id, so_id), head in heads.items():
+            systems = grouped.setdefault(so_id, {})
+            system_id = _intern(system_id)
+            if head["is_deleted"] or head["so_status"] in CLOSED_STATUSES:
+                systems[system_id] = None
+                continue
+            # Most common handling code wins; ties go to the first alphabetically.
+            counts = handling.get((system_id, so_id))
+            systems[system_id] = SOAttributes(
+                system_id=system_id,
+                so_status=_intern(head["so_status"]),
+                sale_type=_intern(head["value"]),
+                handling_code=_intern(min(counts)[1]) if counts else None,
+                branch_code=_intern(head["branch_code"]),
+            )
+        return grouped
+
+    def _source_watermark(self):
+        inspector = inspect(self.engine)
+        marks = []
+        with self.engine.connect() as conn:
+            for table_name in SOURCE_TABLES:
+                if inspector.has_table(table_name):
+                    marks.append(_coerce_datetime(conn.execute(text(f"SELECT MAX(synced_at) FROM {table_name}")).scalar()))
+        marks = [mark for mark in marks if mark is not None]
+        return max(marks) if marks else None
+
+    # ------------------------------------------------------------------
+    # Background refresh
+    # ------------------------------------------------------------------
+
+    def start(self, refresh_seconds):
+        """Load now and keep refreshing every *refresh_seconds* on a daemon thread."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, args=(refresh_seconds,), name="so-attribute-index", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self, refresh_seconds):
+        while True:
+            try:
+                self.refresh()
+            except Exception as exc:
+                self._count("refresh_errors")
+                logger.warning("SO attribute index refresh failed: %s", exc)
+            time.sleep(refresh_seconds)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_so_attribute_index():
+    """Return the process-wide SOAttributeIndex, creating it on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SOAttributeIndex()
+    return _index
+
+
+def init_so_attribute_index():
+    """Preload the index when a mirror database is configured.
+
+    Called from gunicorn's post_worker_init hook, so only web workers keep the
+    index; other processes look SOs up in the mirror.
+    """
+    settings = get_so_attribute_index_settings()
+    if not settings["enabled"] or not get_central_db_url():
+        return None
+    index = get_so_attribute_index()
+    index.start(settings["refresh_seconds"])
+    return index
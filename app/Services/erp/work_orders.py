@@ -35,7 +35,7 @@ class WorkOrdersMixin:
                     )
                    AND ib.system_id = COALESCE(wh.branch_code, sod.system_id)
                 WHERE wh.is_deleted = false
-                  AND CAST(wh.source_id AS TEXT) = :barcode
+                  AND wh.source_id = :barcode
                   AND UPPER(COALESCE(wh.source, '')) = 'SO'
                 ORDER BY wh.wo_id
                 """,
@@ -112,7 +112,7 @@ class WorkOrdersMixin:
         """
         if self.central_db_mode:
             rows = self._mirror_query(
-                """
+                f"""
                 SELECT
                     wh.wo_id,
                     wh.source_id,
@@ -134,7 +134,7 @@ class WorkOrdersMixin:
                 LEFT JOIN erp_mirror_so_header soh
                     ON soh.so_id = wh.source_id
                 LEFT JOIN erp_mirror_cust c
-                    ON TRIM(c.cust_key) = TRIM(soh.cust_key)
+                    ON {self._cust_join_clause()}
                 WHERE wh.is_deleted = false
                   AND UPPER(COALESCE(wh.wo_status, '')) NOT IN ('COMPLETED', 'CANCELED', 'C')
                 ORDER BY wh.wo_id DESC
@@ -0,0 +1,313 @@
+"""Compiled on-disk address index for GeocodingService.
+
+``build_index()`` is the offline step.  It streams ``source.geojson(.gz)``
+once, normalizes every address point and writes a SQLite file.  Each row holds
+the precomputed match key, house number and street core.  The file also carries
+(zip, house number) and (city, house number) postings for the fuzzy tiers.
+
+``GeocodeIndex`` opens that file read-only and memory-mapped on the first
+lookup.  Workers start instantly and share the OS page cache instead of each
+parsing the GeoJSON into its own dicts.
+
+    python -m app.Services.geocoding_index source.geojson.gz --output source.geocode.sqlite
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+# Normalization constants (ported from match_all_jobs_to_geojson.py)
+STREET_ABBR = {
+    "STREET":"ST","ST":"ST","AVENUE":"AVE","AVE":"AVE","ROAD":"RD","RD":"RD",
+    "DRIVE":"DR","DR":"DR","COURT":"CT","CT":"CT","CIRCLE":"CIR","CIR":"CIR",
+    "PLACE":"PL","PL":"PL","LANE":"LN","LN":"LN","TERRACE":"TER","TER":"TER",
+    "PARKWAY":"PKWY","PKWY":"PKWY","HIGHWAY":"HWY","HWY":"HWY","BOULEVARD":"BLVD","BLVD":"BLVD",
+    "WAY":"WAY","TRAIL":"TRL","TRL":"TRL"
+}
+DIR_ABBR = {"NORTH":"N","SOUTH":"S","EAST":"E","WEST":"W",
+            "NORTHEAST":"NE","NORTHWEST":"NW","SOUTHEAST":"SE","SOUTHWEST":"SW",
+            "N":"N","S":"S","E":"E","W":"W","NE":"NE","NW":"NW","SE":"SE","SW":"SW"}
+
+STREET_STOP = set([
+    "ST","AVE","AVENUE","RD","ROAD","DR","DRIVE","CT","COURT","CIR","CIRCLE",
+    "PL","PLACE","LN","LANE","TER","TERRACE","PKWY","PARKWAY","HWY","HIGHWAY",
+    "BLVD","BOULEVARD","WAY","TRL","TRAIL"
+]) | set(DIR_ABBR.keys())
+
+HN_RE      = re.compile(r"^\s*(\d+)", re.IGNORECASE)
+POBOX_RE   = re.compile(r"\bP\.?\s*O\.?\s*BOX\b|\bPO\s+BOX\b", re.IGNORECASE)
+PARENS_RE  = re.compile(r"\([^)]*\)")
+UNIT_TAILS = re.compile(r"\b(APT|UNIT|STE|SUITE|#)\b.*$", re.IGNORECASE)
+
+_NON_WORD_RE = re.compile(r"[^\w\s]")
+_SPACES_RE = re.compile(r"\s+")
+_NON_DIGIT_RE = re.compile(r"[^\d]")
+_LEADING_NUMBER_RE = re.compile(r"^\s*\d+(-\d+)?\s*")
+_ORDINAL_RE = re.compile(r"^\d+(ST|ND|RD|TH)$")
+
+FORMAT_VERSION = "1"
+DEFAULT_INDEX_NAME = "source.geocode.sqlite"
+
+
+def norm_zip(z) -> str:
+    s = str(z if z is not None else "").strip()
+    s = _NON_DIGIT_RE.sub("", s)
+    return s[:5] if s else ""
+
+
+def _clean_upper(s: str) -> str:
+    return _SPACES_RE.sub(" ", _NON_WORD_RE.sub(" ", s.upper())).strip()
+
+
+def norm_city(s: str) -> str:
+    if not isinstance(s, str): return ""
+    return _clean_upper(s)
+
+
+def leading_housenumber(s: str) -> str:
+    if not isinstance(s, str): return ""
+    m = HN_RE.match(s)
+    return m.group(1) if m else ""
+
+
+def street_core(s: str) -> str:
+    if not isinstance(s, str): return ""
+    t = _LEADING_NUMBER_RE.sub("", _clean_upper(s))
+    toks = []
+    for tok in t.split():
+        if tok in STREET_STOP: continue
+        if tok.isalpha() or _ORDINAL_RE.match(tok):
+            toks.append(tok)
+    return " ".join(toks)
+
+
+def norm_street(s: str) -> str:
+    if not isinstance(s, str): return ""
+    out = []
+    for p in _clean_upper(s).split():
+        if p in DIR_ABBR: out.append(DIR_ABBR[p])
+        elif p in STREET_ABBR: out.append(STREET_ABBR[p])
+        else: out.append(p)
+    return " ".join(out).strip()
+
+
+def make_key(addr, city, state, zip5) -> str:
+    return " | ".join([norm_street(addr), norm_city(city), (state or "IA").upper().strip(), norm_zip(zip5)])
+
+
+def default_index_path(geojson_path=None) -> Path:
+    """``GEOCODE_INDEX_PATH``, else ``source.geocode.sqlite`` beside the GeoJSON."""
+    configured = (os.environ.get("GEOCODE_INDEX_PATH") or "").strip()
+    if configured:
+        return Path(configured)
+    if geojson_path:
+        return Path(geojson_path).with_name(DEFAULT_INDEX_NAME)
+    return Path(DEFAULT_INDEX_NAME)
+
+
+def iter_features(path):
+    """Yield GeoJSON features from a FeatureCollection or line-delimited file (.gz ok)."""
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8", errors="ignore") as f:
+        first = f.readline()
+        try:
+            obj = json.loads(first)
+        except ValueError:
+            obj = None
+        if isinstance(obj, dict) and obj.get("type") != "FeatureCollection":
+            # Line-delimited features: stream without holding the file in memory.
+            yield obj
+            for line in f:
+                try: yield json.loads(line)
+                except ValueError: continue
+            return
+        if obj is None:
+            text = first + f.read()
+            try:
+                obj = json.loads(text)
+            except ValueError:
+                for line in text.splitlines():
+                    try: yield json.loads(line)
+                    except ValueError: continue
+                return
+    if isinstance(obj, dict) and obj.get("type") == "FeatureCollection":
+        yield from obj.get("features", [])
+
+
+def feature_record(feat):
+    """Normalize one feature into the index row tuple, or None for non-points."""
+    props = feat.get("properties") or {}
+    geom = feat.get("geometry") or {}
+    if geom.get("type") != "Point": return None
+    coords = geom.get("coordinates")
+    if not coords or len(coords) < 2: return None
+
+    num = props.get("number") or props.get("housenumber") or ""
+    st = props.get("street") or props.get("street_name") or ""
+    city = props.get("city") or ""
+    zp = norm_zip(props.get("postcode") or props.get("zip"))
+    full = props.get("full") or props.get("address") or f"{num} {st}".strip()
+    return (
+        make_key(full, city, "IA", zp), full, city, zp, coords[1], coords[0],
+        leading_housenumber(full), street_core(full), norm_city(city),
+    )
+
+
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID;
+CREATE TABLE points (
+    id INTEGER PRIMARY KEY,
+    match_key TEXT NOT NULL UNIQUE,
+    full TEXT,
+    city TEXT,
+    zip TEXT,
+    lat REAL,
+    lon REAL,
+    house_number TEXT,
+    street_core TEXT,
+    city_norm TEXT
+);
+"""
+
+# Postings are built after the bulk load; id keeps source order for tie-breaks.
+_POSTINGS = """
+CREATE INDEX ix_points_zip_hn ON points (zip, house_number, id);
+CREATE INDEX ix_points_city_hn ON points (city_norm, house_number, id);
+"""
+
+
+def build_index(geojson_path, output_path=None, batch_size=5000):
+    """Compile *geojson_path* into a SQLite index; return the number of features read.
+
+    The first point for a match key wins, as with the in-memory index.  The
+    file is written beside the target and swapped in atomically, so readers
+    never see a half-built index.
+    """
+    output_path = Path(output_path or default_index_path(geojson_path))
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript("PRAGMA journal_mode = OFF; PRAGMA synchronous = OFF;" + _SCHEMA)
+        insert = "INSERT OR IGNORE INTO points (match_key, full, city, zip, lat, lon, house_number, street_core, city_norm) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+        count, batch = 0, []
+        for feat in iter_features(geojson_path):
+            rec = feature_record(feat)
+            if rec is None: continue
+            batch.append(rec)
+            count += 1
+            if len(batch) >= batch_size:
+                conn.executemany(insert, batch)
+                batch.clear()
+        if batch:
+            conn.executemany(insert, batch)
+        conn.executescript(_POSTINGS + "ANALYZE;")
+        source = Path(geojson_path)
+        conn.executemany(
+            "INSERT INTO meta (key, value) VALUES (?, ?)",
+            [
+                ("format_version", FORMAT_VERSION),
+                ("source_path", str(source)),
+                ("source_mtime", str(source.stat().st_mtime)),
+                ("features", str(count)),
+                ("built_at", datetime.now().isoformat(timespec="seconds")),
+            ],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, output_path)
+    return count
+
+
+_RECORD_COLUMNS = "full, city, zip, lat, lon, house_number, street_core"
+
+
+class GeocodeIndex:
+    """Read-only view over a compiled index; one lazily opened connection per thread.
+
+    Rows come back as ``(full, city, zip, lat, lon, house_number, street_core)``,
+    the same shape as the in-memory index records.
+    """
+
+    def __init__(self, path, mmap_bytes=256 * 1024 * 1024):
+        self.path = Path(path)
+        self.mmap_bytes = int(mmap_bytes)
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # immutable=1 skips file locking; rebuilds replace the file, never edit it.
+            conn = sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro&immutable=1", uri=True)
+            conn.execute(f"PRAGMA mmap_size = {self.mmap_bytes}")
+            self._local.conn = conn
+        return conn
+
+    def metadata(self):
+        return dict(self._conn().execute("SELECT key, value FROM meta").fetchall())
+
+    def is_stale(self, geojson_path):
+        """True when *geojson_path* changed after this index was built."""
+        try:
+            built_from = float(self.metadata().get("source_mtime") or 0)
+            return Path(geojson_path).stat().st_mtime > built_from
+        except (OSError, ValueError, sqlite3.Error):
+            return False
+
+    def exact(self, key):
+        return self._conn().execute(
+            f"SELECT {_RECORD_COLUMNS} FROM points WHERE match_key = ?", (key,)
+        ).fetchone()
+
+    def exact_many(self, keys, chunk_size=500):
+        """``{match_key: record}`` for the keys present in the index."""
+        keys = list(keys)
+        found = {}
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            rows = self._conn().execute(
+                f"SELECT match_key, {_RECORD_COLUMNS} FROM points WHERE match_key IN ({', '.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+            found.update((row[0], row[1:]) for row in rows)
+        return found
+
+    def zip_candidates(self, zip5, house_number):
+        if not zip5:
+            return []
+        return self._conn().execute(
+            f"SELECT {_RECORD_COLUMNS} FROM points WHERE zip = ? AND house_number = ? ORDER BY id",
+            (zip5, house_number),
+        ).fetchall()
+
+    def city_candidates(self, city_norm, house_number):
+        if not city_norm:
+            return []
+        return self._conn().execute(
+            f"SELECT {_RECORD_COLUMNS} FROM points WHERE city_norm = ? AND house_number = ? ORDER BY id",
+            (city_norm, house_number),
+        ).fetchall()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile source.geojson(.gz) into a geocoding index")
+    parser.add_argument("geojson", help="Path to source.geojson or source.geojson.gz")
+    parser.add_argument("--output", help=f"Index file (default: {DEFAULT_INDEX_NAME} beside the source)")
+    args = parser.parse_args(argv)
+
+    output = Path(args.output) if args.output else default_index_path(args.geojson)
+    print(f"[{datetime.now()}] Building geocoding index {output} from {args.geojson}...")
+    count = build_index(args.geojson, output)
+    print(f"[{datetime.now()}] Indexed {count} features ({output.stat().st_size // 1024} KiB).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""Batch geocoding for erp_mirror_cust_shipto.
+
+Each run of ``ShiptoGeocoder``:
+
+1. reads a batch of ship-tos without coordinates and groups them by
+   normalized address (``make_key``), so an address shared by many ship-tos
+   is resolved once;
+2. resolves those addresses against the local GeocodingService index in one
+   ``geocode_addresses()`` call;
+3. looks the misses up in ``geocode_cache``, which also remembers addresses
+   the remote geocoder had no result for;
+4. sends at most ``remote_max_per_run`` of the remaining addresses to the
+   remote geocoder (Nominatim).  The async fetcher spaces requests to its
+   rate limit and caches every answer;
+5. writes the coordinates back with bulk UPDATEs.
+
+Addresses the remote geocoder failed on are stamped ``nominatim_error`` and
+retried after ``error_retry_hours``, so a bad address can't take the remote
+budget every run.  Negative results are retried after ``negative_ttl_days``.
+
+    python -m app.Services.geocoding_pipeline --batch-size 2000
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import bindparam, text
+
+from app.Models.models import GeocodeCacheEntry
+from app.runtime_settings import get_geocoding_settings
+from app.Services.geocoding_index import make_key
+
+CACHE = GeocodeCacheEntry.__table__
+
+LOCAL_STATUSES = ("exact", "fuzzy_zip", "fuzzy_city")
+REMOTE_SOURCE = "nominatim"
+NO_RESULT_SOURCE = "nominatim_no_result"
+REMOTE_ERROR_SOURCE = "nominatim_error"
+LOCAL_NO_RESULT_SOURCE = "local_no_result"
+UPDATE_CHUNK_SIZE = 1000
+
+
+@dataclass
+class PendingAddress:
+    key: str
+    address_1: str | None
+    city: str | None
+    state: str | None
+    zip: str | None
+    ids: list[int] = field(default_factory=list)
+
+    @property
+    def query(self) -> str:
+        parts = [self.address_1, self.city, self.state, self.zip]
+        return ", ".join(str(part).strip() for part in parts if part and str(part).strip())
+
+
+class NominatimFetcher:
+    """Blocking single-address lookup against Nominatim; None means no result."""
+
+    URL = "https://nominatim.openstreetmap.org/search"
+    source = REMOTE_SOURCE
+
+    def __init__(self, user_agent: str, timeout: float = 10, session=None) -> None:
+        if session is None:
+            import requests
+
+            session = requests.Session()
+        self.session = session
+        self.user_agent = user_agent
+        self.timeout = timeout
+
+    def fetch(self, query: str):
+        resp = self.session.get(
+            self.URL,
+            params={"q": query, "format": "json", "limit": 1},
+            headers={"User-Agent": self.user_agent},
+            timeout=self.timeout,
+        )
+        resp.raise_for_status()
+        results = resp.json()
+        if not results:
+            return None
+        return float(results[0]["lat"]), float(results[0]["lon"])
+
+
+class AsyncRateLimiter:
+    """Spaces request starts at least *min_interval* seconds apart."""
+
+    def __init__(self, min_interval: float) -> None:
+        self.min_interval = min_interval
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.min_interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+async def fetch_all(fetcher, queries: dict[str, str], min_interval: float, concurrency: int) -> dict[str, Any]:
+    """{key: (lat, lon) | None | exception} for every query, rate limited.
+
+    ``fetcher.fetch`` is blocking, so each call runs on the default executor;
+    *concurrency* bounds how many are in flight while a slow response is
+    outstanding.
+    """
+    limiter = AsyncRateLimiter(min_interval)
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    async def one(query):
+        async with semaphore:
+            await limiter.wait()
+            return await loop.run_in_executor(None, fetcher.fetch, query)
+
+    results = await asyncio.gather(*(one(query) for query in queries.values()), return_exceptions=True)
+    return dict(zip(queries, results))
+
+
+class ShiptoGeocoder:
+    """Local index first, then the geocode cache, then the rate-limited remote geocoder."""
+
+    def __init__(self, engine=None, geocoder=None, fetcher=None, settings=None) -> None:
+        if engine is None:
+            from app.extensions import db
+
+            engine = db.engine
+        self.engine = engine
+        self.settings = settings or get_geocoding_settings()
+        self._geocoder = geocoder
+        if fetcher is None and self.settings["remote_enabled"]:
+            fetcher = NominatimFetcher(self.settings["user_agent"])
+        self.fetcher = fetcher
+
+    @property
+    def geocoder(self):
+        if self._geocoder is None:
+            from app.Services.geocoding_service import GeocodingService
+
+            self._geocoder = GeocodingService()
+        return self._geocoder
+
+    def pending(self, batch_size: int, now: datetime) -> list[PendingAddress]:
+        retry_before = now - timedelta(days=self.settings["negative_ttl_days"])
+        error_retry_before = now - timedelta(hours=self.settings["error_retry_hours"])
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT id, address_1, city, state, zip "
+                    "FROM erp_mirror_cust_shipto "
+                    "WHERE lat IS NULL AND is_deleted = false "
+                    "  AND (address_1 IS NOT NULL OR city IS NOT NULL) "
+                    "  AND (geocoded_at IS NULL OR geocoded_at < :retry_before "
+                    "       OR (geocode_source = :error_source AND geocoded_at < :error_retry_before)) "
+                    "ORDER BY id "
+                    "LIMIT :n"
+                ),
+                {"retry_before": retry_before, "error_source": REMOTE_ERROR_SOURCE,
+                 "error_retry_before": error_retry_before, "n": batch_size},
+            ).fetchall()
+
+        addresses = {}
+        for row in rows:
+            key = make_key(row.address_1, row.city, row.state, row.zip)
+            entry = addresses.get(key)
+            if entry is None:
+                entry = addresses[key] = PendingAddress(key, row.address_1, row.city, row.state, row.zip)
+            entry.ids.append(row.id)
+        return list(addresses.values())
+
+    def _resolve_local(self, addresses: list[PendingAddress]) -> dict[str, tuple]:
+        results = self.geocoder.geocode_addresses([(a.address_1, a.city, a.zip) for a in addresses])
+        return {
+            address.key: (lat, lon, f"local_{status}")
+            for address, (lat, lon, status) in zip(addresses, results)
+            if status in LOCAL_STATUSES
+        }
+
+    def _read_cache(self, keys: list[str], now: datetime) -> dict[str, tuple]:
+        if not keys:
+            return {}
+        stale_before = now - timedelta(days=self.settings["negative_ttl_days"])
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                text("SELECT address_key, lat, lon, source, fetched_at FROM geocode_cache WHERE address_key IN :keys")
+                .bindparams(bindparam("keys", expanding=True)),
+                {"keys": keys},
+            ).fetchall()
+        cached = {}
+        for row in rows:
+            fetched_at = row.fetched_at
+            if isinstance(fetched_at, str):
+                fetched_at = datetime.fromisoformat(fetched_at)
+            if row.lat is None and fetched_at < stale_before:
+                continue  # negative result past its TTL: ask again
+            cached[row.address_key] = (row.lat, row.lon, row.source)
+        return cached
+
+    def _fetch_remote(self, addresses: list[PendingAddress]) -> dict[str, Any]:
+        queries = {address.key: address.query for address in addresses}
+        return asyncio.run(fetch_all(
+            self.fetcher,
+            queries,
+            min_interval=self.settings["remote_min_interval_ms"] / 1000,
+            concurrency=self.settings["remote_concurrency"],
+        ))
+
+    def run(self, batch_size: int | None = None, now: datetime | None = None) -> dict[str, Any]:
+        started = time.monotonic()
+        now = now or datetime.utcnow()
+        addresses = self.pending(batch_size or self.settings["batch_size"], now)
+        summary = {
+            "rows": sum(len(a.ids) for a in addresses), "addresses": len(addresses),
+            "local": 0, "cached": 0, "remote": 0, "no_result": 0, "errors": 0, "deferred": 0,
+        }
+        if not addresses:
+            summary["duration_ms"] = int((time.monotonic() - started) * 1000)
+            return summary
+
+        resolved = self._resolve_local(addresses)
+        summary["local"] = len(resolved)
+        misses = [a for a in addresses if a.key not in resolved]
+
+        cached = self._read_cache([a.key for a in misses], now)
+        summary["cached"] = len(cached)
+        resolved.update(cached)
+        misses = [a for a in misses if a.key not in cached]
+
+        new_cache_rows = []
+        if self.fetcher is None:
+            # No remote geocoder: park local misses until the negative TTL passes.
+            for address in misses:
+                resolved[address.key] = (None, None, LOCAL_NO_RESULT_SOURCE)
+        else:
+            budget = self.settings["remote_max_per_run"]
+            summary["deferred"] = max(0, len(misses) - budget)
+            fetched = self._fetch_remote(misses[:budget]) if budget else {}
+            for key, result in fetched.items():
+                if isinstance(result, BaseException):
+                    summary["errors"] += 1
+                    print(f"[{datetime.now()}] Geocoder error for {key!r}: {result}")
+                    # Stamp the attempt (not cached) so it waits error_retry_hours.
+                    resolved[key] = (None, None, REMOTE_ERROR_SOURCE)
+                    continue
+                lat, lon = result if result else (None, None)
+                source = getattr(self.fetcher, "source", REMOTE_SOURCE) if result else NO_RESULT_SOURCE
+                summary["remote" if result else "no_result"] += 1
+                resolved[key] = (lat, lon, source)
+                new_cache_rows.append({"address_key": key, "lat": lat, "lon": lon, "source": source, "fetched_at": now})
+
+        updates = [
+            {"id": shipto_id, "lat": resolved[a.key][0], "lon": resolved[a.key][1], "source": resolved[a.key][2]}
+            for a in addresses if a.key in resolved
+            for shipto_id in a.ids
+        ]
+        with self.engine.begin() as conn:
+            if new_cache_rows:
+                conn.execute(
+                    CACHE.delete().where(CACHE.c.address_key.in_([row["address_key"] for row in new_cache_rows]))
+                )
+                conn.execute(CACHE.insert(), new_cache_rows)
+            _bulk_update_shiptos(conn, updates, now)
+
+        summary["updated"] = sum(1 for update in updates if update["lat"] is not None)
+        summary["duration_ms"] = int((time.monotonic() - started) * 1000)
+        return summary
+
+
+def _bulk_update_shiptos(conn, updates: list[dict], ts: datetime) -> None:
+    """Write coordinates for many ship-tos: one UPDATE ... FROM (VALUES ...) per
+    chunk on PostgreSQL, a single executemany elsewhere."""
+    if not updates:
+        return
+    if conn.dialect.name != "postgresql":
+        conn.execute(
+            text(
+                "UPDATE erp_mirror_cust_shipto "
+                "SET lat = :lat, lon = :lon, geocoded_at = :ts, geocode_source = :source "
+                "WHERE id = :id"
+            ),
+            [{**update, "ts": ts} for update in updates],
+        )
+        return
+    for start in range(0, len(updates), UPDATE_CHUNK_SIZE):
+        chunk = updates[start:start + UPDATE_CHUNK_SIZE]
+        params = {"ts": ts}
+        values = []
+        for i, update in enumerate(chunk):
+            values.append(f"(:id{i}, CAST(:lat{i} AS numeric), CAST(:lon{i} AS numeric), :source{i})")
+            params.update({f"id{i}": update["id"], f"lat{i}": update["lat"],
+                           f"lon{i}": update["lon"], f"source{i}": update["source"]})
+        conn.execute(
+            text(
+                "UPDATE erp_mirror_cust_shipto AS s "
+                "SET lat = v.lat, lon = v.lon, geocoded_at = :ts, geocode_source = v.source "
+                f"FROM (VALUES {', '.join(values)}) AS v(id, lat, lon, source) "
+                "WHERE s.id = v.id"
+            ),
+            params,
+        )
+
+
+def refresh_shipto_geocodes(engine=None, geocoder=None, batch_size: int | None = None) -> dict[str, Any]:
+    """Sync-worker entry point."""
+    result = ShiptoGeocoder(engine=engine, geocoder=geocoder).run(batch_size)
+    if result["rows"]:
+        print(
+            f"[{datetime.now()}] Geocoded {result['updated']}/{result['rows']} ship-tos "
+            f"({result['addresses']} addresses: {result['local']} local, {result['cached']} cached, "
+            f"{result['remote']} remote, {result['no_result']} no result, {result['errors']} errors, "
+            f"{result['deferred']} deferred) in {result['duration_ms']}ms"
+        )
+    return result
+
+
+def main() -> None:
+    import argparse
+
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description="Geocode ship-tos that have no coordinates yet.")
+    parser.add_argument("--batch-size", type=int, default=None, help="Ship-to rows to read this run")
+    args = parser.parse_args()
+    with create_app().app_context():
+        refresh_shipto_geocodes(batch_size=args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,43 @@
-import os
-import gzip
-import json
-import re
-import io
-import math
 from pathlib import Path
 from collections import defaultdict
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
 from datetime import datetime
 
-# Normalization constants (ported from match_all_jobs_to_geojson.py)
-STREET_ABBR = {
-    "STREET":"ST","ST":"ST","AVENUE":"AVE","AVE":"AVE","ROAD":"RD","RD":"RD",
-    "DRIVE":"DR","DR":"DR","COURT":"CT","CT":"CT","CIRCLE":"CIR","CIR":"CIR",
-    "PLACE":"PL","PL":"PL","LANE":"LN","LN":"LN","TERRACE":"TER","TER":"TER",
-    "PARKWAY":"PKWY","PKWY":"PKWY","HIGHWAY":"HWY","HWY":"HWY","BOULEVARD":"BLVD","BLVD":"BLVD",
-    "WAY":"WAY","TRAIL":"TRL","TRL":"TRL"
-}
-DIR_ABBR = {"NORTH":"N","SOUTH":"S","EAST":"E","WEST":"W",
-            "NORTHEAST":"NE","NORTHWEST":"NW","SOUTHEAST":"SE","SOUTHWEST":"SW",
-            "N":"N","S":"S","E":"E","W":"W","NE":"NE","NW":"NW","SE":"SE","SW":"SW"}
-
-STREET_STOP = set([
-    "ST","AVE","AVENUE","RD","ROAD","DR","DRIVE","CT","COURT","CIR","CIRCLE",
-    "PL","PLACE","LN","LANE","TER","TERRACE","PKWY","PARKWAY","HWY","HIGHWAY",
-    "BLVD","BOULEVARD","WAY","TRL","TRAIL"
-]) | set(DIR_ABBR.keys())
-
-HN_RE      = re.compile(r"^\s*(\d+)", re.IGNORECASE)
-POBOX_RE   = re.compile(r"\bP\.?\s*O\.?\s*BOX\b|\bPO\s+BOX\b", re.IGNORECASE)
-PARENS_RE  = re.compile(r"\([^)]*\)")
-UNIT_TAILS = re.compile(r"\b(APT|UNIT|STE|SUITE|#)\b.*$", re.IGNORECASE)
+try:
+    import numpy  # rapidfuzz.process.cdist returns numpy matrices
+except ImportError:
+    numpy = None
+
+from app.Services.geocoding_index import (  # noqa: F401 - constants re-exported for callers
+    DIR_ABBR, HN_RE, PARENS_RE, POBOX_RE, STREET_ABBR, STREET_STOP, UNIT_TAILS,
+    GeocodeIndex, default_index_path, feature_record, iter_features,
+    leading_housenumber, make_key, norm_city, norm_street, norm_zip, street_core,
+)
+
+# Fuzzy tiers: candidates scoring below FUZZY_MIN_SCORE are ignored; the best
+# surviving candidate is accepted at FUZZY_ACCEPT_SCORE.
+FUZZY_MIN_SCORE = 88
+FUZZY_ACCEPT_SCORE = 90
+FUZZY_MIN_OVERLAP = 50
+
+
+def _token_overlap(job_tok, cand_tok):
+    union = len(job_tok | cand_tok) or 1
+    return int(round(100 * len(job_tok & cand_tok) / union))
+
+
+def _score_matrix(queries, choices):
+    """token_set_ratio for every query x choice; scores under FUZZY_MIN_SCORE become 0."""
+    if numpy is not None:
+        return process.cdist(
+            queries, choices, scorer=fuzz.token_set_ratio,
+            score_cutoff=FUZZY_MIN_SCORE, dtype=numpy.float64, workers=1,
+        ).tolist()
+    return [[fuzz.token_set_ratio(q, c, score_cutoff=FUZZY_MIN_SCORE) for c in choices] for q in queries]
+
 
 class GeocodingService:
-    def __init__(self, geojson_path=None):
+    def __init__(self, geojson_path=None, index_path=None):
         if geojson_path is None:
             # Look for it in common locations
             paths_to_try = [
@@ -47,172 +51,188 @@ class GeocodingService:
                     break
         
         self.geojson_path = geojson_path
+        self.index_path = Path(index_path) if index_path else default_index_path(geojson_path)
+        self.index = None
         self.exact_idx = {}
         self.by_zip_idx = {}
         self.by_city_idx = {}
+        self._zip_hn_idx = {}
+        self._city_hn_idx = {}
         self.is_loaded = False
-        
-        if self.geojson_path:
+
+        if self.index_path.exists():
+            # Compiled index: opened lazily on the first lookup, nothing parsed here.
+            self.index = GeocodeIndex(self.index_path)
+            self.is_loaded = True
+            if self.geojson_path and self.index.is_stale(self.geojson_path):
+                print(f"[{datetime.now()}] GeocodingService: {self.index_path} is older than {self.geojson_path}; rebuild it with python -m app.Services.geocoding_index.")
+        elif self.geojson_path:
+            print(f"[{datetime.now()}] GeocodingService: no compiled index at {self.index_path}; build one with python -m app.Services.geocoding_index {self.geojson_path}")
             self._load_index()
 
     def _norm_zip(self, z) -> str:
-        s = str(z if z is not None else "").strip()
-        s = re.sub(r"[^\d]", "", s)
-        return s[:5] if s else ""
+        return norm_zip(z)
 
     def _norm_city(self, s: str) -> str:
-        if not isinstance(s, str): return ""
-        t = re.sub(r"[^\w\s]", " ", s.upper())
-        return re.sub(r"\s+", " ", t).strip()
+        return norm_city(s)
 
     def _leading_housenumber(self, s: str) -> str:
-        if not isinstance(s, str): return ""
-        m = HN_RE.match(s)
-        return m.group(1) if m else ""
+        return leading_housenumber(s)
 
     def _street_core(self, s: str) -> str:
-        if not isinstance(s, str): return ""
-        t = s.upper()
-        t = re.sub(r"[^\w\s]", " ", t)
-        t = re.sub(r"\s+", " ", t).strip()
-        t = re.sub(r"^\s*\d+(-\d+)?\s*", "", t)
-        toks = []
-        for tok in t.split():
-            if tok in STREET_STOP: continue
-            if tok.isalpha() or re.match(r"^\d+(ST|ND|RD|TH)$", tok):
-                toks.append(tok)
-        return " ".join(toks)
+        return street_core(s)
 
     def _norm_street(self, s: str) -> str:
-        if not isinstance(s, str): return ""
-        t = s.upper()
-        t = re.sub(r"[^\w\s]", " ", t)
-        t = re.sub(r"\s+", " ", t).strip()
-        out = []
-        for p in t.split():
-            if p in DIR_ABBR: out.append(DIR_ABBR[p])
-            elif p in STREET_ABBR: out.append(STREET_ABBR[p])
-            else: out.append(p)
-        return " ".join(out).strip()
+        return norm_street(s)
 
     def _make_key(self, addr, city, state, zip5) -> str:
-        return " | ".join([self._norm_street(addr), self._norm_city(city), (state or "IA").upper().strip(), self._norm_zip(zip5)])
+        return make_key(addr, city, state, zip5)
 
     def _load_index(self):
+        """Legacy in-memory index, used only when no compiled index file exists."""
         print(f"[{datetime.now()}] GeocodingService: Loading index from {self.geojson_path}...")
         exact = defaultdict(list)
         by_zip = defaultdict(list)
         by_city = defaultdict(list)
-        
-        def stream_geojson(path):
-            raw_bytes = None
-            if str(path).endswith(".gz"):
-                with gzip.open(path, "rb") as gz: raw_bytes = gz.read()
-            else:
-                with open(path, "rb") as f: raw_bytes = f.read()
-            
-            try:
-                text = raw_bytes.decode("utf-8", errors="ignore")
-                obj = json.loads(text)
-                if isinstance(obj, dict) and obj.get("type") == "FeatureCollection":
-                    for feat in obj.get("features", []): yield feat
-            except:
-                buf = io.BytesIO(raw_bytes)
-                for line in buf.readlines():
-                    try: yield json.loads(line.decode("utf-8", errors="ignore"))
-                    except: continue
+        by_zip_hn = defaultdict(list)
+        by_city_hn = defaultdict(list)
 
         cnt = 0
-        for feat in stream_geojson(self.geojson_path):
-            props = feat.get("properties") or {}
-            geom = feat.get("geometry") or {}
-            if geom.get("type") != "Point": continue
-            coords = geom.get("coordinates")
-            if not coords or len(coords) < 2: continue
-            
-            num = props.get("number") or props.get("housenumber") or ""
-            st = props.get("street") or props.get("street_name") or ""
-            city = props.get("city") or ""
-            zp = self._norm_zip(props.get("postcode") or props.get("zip"))
-            full = props.get("full") or props.get("address") or f"{num} {st}".strip()
-            
-            hn = self._leading_housenumber(full)
-            core = self._street_core(full)
-            lat, lon = coords[1], coords[0]
-            
-            key = self._make_key(full, city, "IA", zp)
-            rec = (full, city, zp, lat, lon, hn, core)
-            exact[key].append(rec)
-            
+        for feat in iter_features(self.geojson_path):
+            row = feature_record(feat)
+            if row is None: continue
+            key, full, city, zp, lat, lon, hn, core, city_norm = row
+            if key not in exact:
+                if zp: by_zip_hn[(zp, hn)].append(key)
+                if city: by_city_hn[(city_norm, hn)].append(key)
+            exact[key].append((full, city, zp, lat, lon, hn, core))
+
             if zp: by_zip[zp].append(key)
-            if city: by_city[self._norm_city(city)].append(key)
+            if city: by_city[city_norm].append(key)
             cnt += 1
 
         self.exact_idx = exact
         self.by_zip_idx = {z: list(dict.fromkeys(lst)) for z, lst in by_zip.items()}
         self.by_city_idx = {c: list(dict.fromkeys(lst)) for c, lst in by_city.items()}
+        # (pool, house number) postings so the fuzzy tiers skip other house numbers.
+        self._zip_hn_idx = dict(by_zip_hn)
+        self._city_hn_idx = dict(by_city_hn)
         self.is_loaded = True
         print(f"[{datetime.now()}] GeocodingService: Indexed {cnt} features.")
 
-    def geocode_address(self, address, city, zip_code):
+    def _exact_records(self, keys):
+        if self.index is not None:
+            return self.index.exact_many(keys)
+        return {key: self.exact_idx[key][0] for key in keys if key in self.exact_idx}
+
+    def _zip_candidates(self, zip5, house_number):
+        if self.index is not None:
+            return self.index.zip_candidates(zip5, house_number)
+        return [self.exact_idx[k][0] for k in self._zip_hn_idx.get((zip5, house_number), [])]
+
+    def _city_candidates(self, city_norm, house_number):
+        if self.index is not None:
+            return self.index.city_candidates(city_norm, house_number)
+        return [self.exact_idx[k][0] for k in self._city_hn_idx.get((city_norm, house_number), [])]
+
+    def _best_matches(self, jobs, cands):
+        """Best ``(score, rec)`` (or None) per ``(job_core, job_tok)`` against one candidate block.
+
+        A candidate needs at least one street token in common with the job to
+        reach FUZZY_MIN_OVERLAP, so candidates are first blocked through a
+        token posting list and only those are scored, in one matrix call.
+        Ties keep the earliest candidate, as the per-candidate loop did.
+        """
+        if not cands:
+            return [None] * len(jobs)
+        cand_toks = [set(rec[6].split()) for rec in cands]
+        postings = defaultdict(list)
+        for i, toks in enumerate(cand_toks):
+            for tok in toks:
+                postings[tok].append(i)
+
+        blocked = [sorted({i for tok in job_tok for i in postings.get(tok, ())}) for _, job_tok in jobs]
+        columns = sorted({i for block in blocked for i in block})
+        if not columns:
+            return [None] * len(jobs)
+        position = {i: col for col, i in enumerate(columns)}
+        scores = _score_matrix([job_core for job_core, _ in jobs], [cands[i][6] for i in columns])
+
+        results = []
+        for row, ((_, job_tok), block) in enumerate(zip(jobs, blocked)):
+            best = None
+            for i in block:
+                c_sim = scores[row][position[i]]
+                if c_sim < FUZZY_MIN_SCORE: continue
+                if _token_overlap(job_tok, cand_toks[i]) < FUZZY_MIN_OVERLAP: continue
+                if best is None or c_sim > best[0]:
+                    best = (c_sim, cands[i])
+            results.append(best)
+        return results
+
+    def _fuzzy_tier(self, jobs, pending, results, pool, candidates, status):
+        """Resolve *pending* job indexes against one pool tier, one block per (pool, house number)."""
+        blocks = defaultdict(list)
+        for idx in pending:
+            blocks[(jobs[idx][pool], jobs[idx]["hn"])].append(idx)
+
+        unresolved = []
+        for (pool_key, hn), idxs in blocks.items():
+            cands = candidates(pool_key, hn)
+            block_jobs = [(jobs[idx]["core"], jobs[idx]["tok"]) for idx in idxs]
+            for idx, best in zip(idxs, self._best_matches(block_jobs, cands)):
+                if best and best[0] >= FUZZY_ACCEPT_SCORE:
+                    results[idx] = (best[1][3], best[1][4], status)
+                else:
+                    unresolved.append(idx)
+        return unresolved
+
+    def geocode_addresses(self, addresses):
+        """Geocode many ``(address, city, zip_code)`` tuples in one pass.
+
+        Returns ``(lat, lon, status)`` per input, in order, with the same
+        statuses as geocode_address.  Exact keys are looked up together and the
+        fuzzy tiers score each (pool, house number) block once for every
+        address that falls into it.
+        """
+        addresses = list(addresses)
         if not self.is_loaded:
-            return None, None, "not_loaded"
-        
-        if not address or POBOX_RE.search(address):
-            return None, None, "invalid_or_pobox"
-
-        zip5 = self._norm_zip(zip_code)
-        norm_c = self._norm_city(city)
-        job_key = self._make_key(address, city, "IA", zip5)
-        job_hn = self._leading_housenumber(address)
-        job_core = self._street_core(address)
-        job_tok = set(job_core.split())
+            return [(None, None, "not_loaded")] * len(addresses)
+
+        results = [None] * len(addresses)
+        jobs = {}
+        for idx, (address, city, zip_code) in enumerate(addresses):
+            if not address or POBOX_RE.search(address):
+                results[idx] = (None, None, "invalid_or_pobox")
+                continue
+            zip5 = self._norm_zip(zip_code)
+            core = self._street_core(address)
+            jobs[idx] = {
+                "key": self._make_key(address, city, "IA", zip5),
+                "zip": zip5,
+                "city": self._norm_city(city),
+                "hn": self._leading_housenumber(address),
+                "core": core,
+                "tok": set(core.split()),
+            }
 
         # 1. Exact Match
-        if job_key in self.exact_idx:
-            rec = self.exact_idx[job_key][0]
-            return rec[3], rec[4], "exact"
+        exact = self._exact_records({job["key"] for job in jobs.values()})
+        pending = []
+        for idx, job in jobs.items():
+            rec = exact.get(job["key"])
+            if rec is not None:
+                results[idx] = (rec[3], rec[4], "exact")
+            else:
+                pending.append(idx)
 
         # 2. Fuzzy Tier 1: ZIP pool + same house number
-        cands = self.by_zip_idx.get(zip5, [])
-        best = None
-        for ck in cands:
-            rec = self.exact_idx[ck][0]
-            if rec[5] != job_hn: continue
-            
-            c_sim = fuzz.token_set_ratio(job_core, rec[6])
-            if c_sim < 88: continue
-            
-            cand_tok = set(rec[6].split())
-            union = len(job_tok | cand_tok) or 1
-            overlap = int(round(100 * len(job_tok & cand_tok) / union))
-            if overlap < 50: continue
-            
-            if best is None or c_sim > best[0]:
-                best = (c_sim, rec)
-        
-        if best and best[0] >= 90:
-            return best[1][3], best[1][4], "fuzzy_zip"
-
+        pending = self._fuzzy_tier(jobs, pending, results, "zip", self._zip_candidates, "fuzzy_zip")
         # 3. Fuzzy Tier 2: City pool + same house number
-        cands = self.by_city_idx.get(norm_c, [])
-        best = None
-        for ck in cands:
-            rec = self.exact_idx[ck][0]
-            if rec[5] != job_hn: continue
-            
-            c_sim = fuzz.token_set_ratio(job_core, rec[6])
-            if c_sim < 88: continue
-            
-            cand_tok = set(rec[6].split())
-            union = len(job_tok | cand_tok) or 1
-            overlap = int(round(100 * len(job_tok & cand_tok) / union))
-            if overlap < 50: continue
-            
-            if best is None or c_sim > best[0]:
-                best = (c_sim, rec)
-        
-        if best and best[0] >= 90:
-            return best[1][3], best[1][4], "fuzzy_city"
+        pending = self._fuzzy_tier(jobs, pending, results, "city", self._city_candidates, "fuzzy_city")
+        for idx in pending:
+            results[idx] = (None, None, "failed")
+        return results
 
-        return None, None, "failed"
+    def geocode_address(self, address, city, zip_code):
+        return self.geocode_addresses([(address, city, zip_code)])[0]
@@ -0,0 +1,585 @@
+"""Server-sent live updates for TV boards, kiosks and supervisor screens.
+
+Floor screens used to reload or poll every 30-60 seconds, so each one ran
+``get_open_so_summary`` about once a minute all day.  Here change
+notifications mark per-branch feeds dirty instead.  Notifications come from the
+sync worker after a non-empty delta and from local pick, assignment and audit
+commits.  The hub refreshes a dirty feed with one upstream query, diffs it
+against the previous snapshot and fans the diff out to every subscribed screen.
+Nothing is sent when nothing changed.
+
+``LIVE_UPDATES_BACKEND=postgres`` carries notifications between processes (the
+sync worker and every gunicorn worker) with LISTEN/NOTIFY.  ``memory`` (the
+default) only sees writes made in this process.  Either way each feed is also
+re-read every ``LIVE_UPDATES_IDLE_REFRESH_SECONDS`` as a safety net.
+"""
+import json
+import logging
+import queue
+import select
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import create_engine, event, text
+
+from app.branch_utils import expand_branch
+from app.runtime_settings import get_live_update_settings, is_pooled_postgres_url
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "wh_live_updates"
+SIGNAL_PREFIX = "signal:"
+ALL_BRANCHES = "all"
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def encode_change(source, branches=None):
+    return json.dumps({"source": source, "branches": sorted(branches) if branches is not None else None})
+
+
+def decode_change(payload):
+    """Return ``(source, branches)``; ``branches`` is None when every branch is affected."""
+    try:
+        message = json.loads(payload or "{}")
+    except ValueError:
+        return "unknown", None
+    branches = message.get("branches")
+    return message.get("source") or "unknown", set(branches) if branches is not None else None
+
+
+def notify_change(engine, source, branches=None):
+    """NOTIFY live-update listeners through *engine*; a no-op off PostgreSQL.
+
+    Used by processes without a hub (the sync worker) to wake every web worker.
+    """
+    if engine is None or engine.dialect.name != "postgresql":
+        return False
+    with engine.begin() as conn:
+        conn.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": CHANNEL, "payload": encode_change(source, branches)},
+        )
+    return True
+
+
+def format_sse(event_name, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_name}")
+    lines.append(f"data: {json.dumps(data, default=_json_default, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+class InProcessBroker:
+    """Delivers change notifications to listeners in the current process."""
+
+    def __init__(self):
+        self._listeners = []
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def _dispatch(self, source, branches):
+        for callback in list(self._listeners):
+            try:
+                callback(source, branches)
+            except Exception as exc:
+                logger.warning("Live update listener failed: %s", exc)
+
+    def publish(self, source, branches=None):
+        self._dispatch(source, set(branches) if branches is not None else None)
+
+    def close(self):
+        pass
+
+
+class PostgresBroker(InProcessBroker):
+    """LISTEN/NOTIFY broker shared by every process on the same database.
+
+    Publishing sends a NOTIFY; this process hears its own notifications through
+    the listener thread like everyone else, so delivery order is the same in
+    every worker.  Needs a direct (non-pgbouncer) psycopg2 connection.
+    """
+
+    def __init__(self, url, channel=CHANNEL, poll_seconds=5.0):
+        super().__init__()
+        self.channel = channel
+        self.poll_seconds = poll_seconds
+        self.engine = create_engine(url, pool_size=1, max_overflow=2, pool_pre_ping=True)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._listen, name="live-updates-listen", daemon=True)
+        self._thread.start()
+
+    def publish(self, source, branches=None):
+        notify_change(self.engine, source, branches)
+
+    def _listen(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            raw = None
+            try:
+                raw = self.engine.raw_connection()
+                dbapi_conn = raw.driver_connection
+                dbapi_conn.autocommit = True
+                with dbapi_conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.channel}")
+                backoff = 1.0
+                while not self._stop.is_set():
+                    if select.select([dbapi_conn], [], [], self.poll_seconds) == ([], [], []):
+                        continue
+                    dbapi_conn.poll()
+                    while dbapi_conn.notifies:
+                        notification = dbapi_conn.notifies.pop(0)
+                        self._dispatch(*decode_change(notification.payload))
+            except Exception as exc:
+                logger.warning("Live update listener lost its connection (%s); retrying in %.0fs.", exc, backoff)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 60.0)
+            finally:
+                if raw is not None:
+                    try:
+                        raw.invalidate()
+                    except Exception:
+                        pass
+
+    def close(self):
+        self._stop.set()
+        self.engine.dispose()
+
+
+class LiveFeed:
+    """Latest rows for one topic plus the diff against the previous refresh."""
+
+    def __init__(self, topic, loader, key):
+        self.topic = topic
+        self.loader = loader
+        self.key = key
+        self.rows = {}
+        self.order = []
+        self._fingerprints = {}
+        self.version = 0
+        self.dirty = True
+        self.last_refresh = None
+
+    @property
+    def branch(self):
+        return self.topic.partition(":")[2] or ALL_BRANCHES
+
+    def snapshot(self):
+        return {"version": self.version, "rows": [self.rows[key] for key in self.order]}
+
+    def refresh(self):
+        """Re-read the loader; return the diff, or None when nothing changed."""
+        rows, order, fingerprints = {}, [], {}
+        for row in self.loader() or []:
+            key = str(self.key(row))
+            if key in rows:
+                continue
+            rows[key] = {**row, "key": key}
+            order.append(key)
+            fingerprints[key] = json.dumps(rows[key], sort_keys=True, default=_json_default)
+
+        upsert = [rows[key] for key in order if fingerprints[key] != self._fingerprints.get(key)]
+        remove = [key for key in self.order if key not in rows]
+        if self.version and not upsert and not remove and order == self.order:
+            return None
+
+        self.rows, self.order, self._fingerprints = rows, order, fingerprints
+        self.version += 1
+        return {"version": self.version, "upsert": upsert, "remove": remove, "order": order}
+
+
+class LiveSubscription:
+    """One connected screen: a bounded queue of ``(event, data)`` pairs."""
+
+    def __init__(self, hub, topic, max_pending=100):
+        self.hub = hub
+        self.topic = topic
+        self.needs_snapshot = True
+        self._queue = queue.Queue(maxsize=max_pending)
+
+    def put(self, event_name, data):
+        try:
+            self._queue.put_nowait((event_name, data))
+        except queue.Full:
+            # A screen that fell this far behind drops its backlog; feed screens
+            # get a fresh snapshot, signal screens just the latest ping.
+            self._drain()
+            if self.topic.startswith(SIGNAL_PREFIX):
+                self._queue.put_nowait((event_name, data))
+            else:
+                self.needs_snapshot = True
+                self.hub.request_refresh(self.topic)
+
+    def _drain(self):
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def get(self, timeout=None):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class LiveUpdateHub:
+    """Fans change notifications out to subscribed screens.
+
+    Topics are ``<feed>:<branch>`` (a loader-backed feed, diffed per refresh) or
+    ``signal:<branch>`` (a bare "something changed" ping for pages that fetch
+    their own data).  A dirty feed is refreshed at most once per
+    ``min_refresh_seconds`` however many notifications arrive, and only while
+    somebody is subscribed.
+    """
+
+    def __init__(
+        self,
+        broker=None,
+        *,
+        min_refresh_seconds=2.0,
+        idle_refresh_seconds=60.0,
+        app=None,
+        clock=time.monotonic,
+        start_thread=True,
+        max_streams=None,
+    ):
+        self.broker = broker or InProcessBroker()
+        self.min_refresh_seconds = min_refresh_seconds
+        self.idle_refresh_seconds = idle_refresh_seconds
+        self.app = app
+        self._clock = clock
+        self._start_thread = start_thread
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._feeds = {}
+        self._subscribers = {}
+        self._thread = None
+        # Each open SSE stream holds a request thread; None means no cap.
+        self.max_streams = max_streams
+        self._streams = 0
+        self._counters = {"notifications": 0, "refreshes": 0, "diffs_sent": 0, "refresh_errors": 0,
+                          "streams_refused": 0}
+        self.broker.add_listener(self.on_change)
+
+    def publish(self, source, branches=None):
+        self.broker.publish(source, branches)
+
+    @staticmethod
+    def _matches(topic_branch, branches):
+        if branches is None or topic_branch == ALL_BRANCHES:
+            return True
+        # DSM screens follow both of its system_ids.
+        return topic_branch in branches or any(code in branches for code in expand_branch(topic_branch))
+
+    def on_change(self, source, branches):
+        with self._lock:
+            self._counters["notifications"] += 1
+            for feed in self._feeds.values():
+                if self._matches(feed.branch, branches):
+                    feed.dirty = True
+            signals = [
+                subscription
+                for topic, subscriptions in self._subscribers.items()
+                if topic.startswith(SIGNAL_PREFIX) and self._matches(topic[len(SIGNAL_PREFIX):] or ALL_BRANCHES, branches)
+                for subscription in subscriptions
+            ]
+        payload = {"source": source, "branches": sorted(branches) if branches is not None else None}
+        for subscription in signals:
+            subscription.put("changed", payload)
+        self._wake.set()
+
+    def subscribe(self, topic, loader=None, key=None):
+        """Subscribe to *topic*; feed topics need a *loader* and a row *key*."""
+        subscription = LiveSubscription(self, topic)
+        with self._lock:
+            self._subscribers.setdefault(topic, set()).add(subscription)
+            if topic.startswith(SIGNAL_PREFIX):
+                subscription.needs_snapshot = False
+            elif topic not in self._feeds:
+                if loader is None:
+                    raise ValueError(f"Live feed {topic!r} needs a loader")
+                self._feeds[topic] = LiveFeed(topic, loader, key or (lambda row: row.get("id")))
+            else:
+                feed = self._feeds[topic]
+                if feed.version:
+                    subscription.put("snapshot", feed.snapshot())
+                    subscription.needs_snapshot = False
+                else:
+                    feed.dirty = True
+        self._ensure_thread()
+        self._wake.set()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.topic)
+            if subscriptions is None:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscribers[subscription.topic]
+                self._feeds.pop(subscription.topic, None)
+
+    def open_stream(self):
+        """Claim a stream slot; False when ``max_streams`` are already open."""
+        with self._lock:
+            if self.max_streams is not None and self._streams >= self.max_streams:
+                self._counters["streams_refused"] += 1
+                return False
+            self._streams += 1
+            return True
+
+    def close_stream(self):
+        with self._lock:
+            self._streams = max(0, self._streams - 1)
+
+    def request_refresh(self, topic):
+        with self._lock:
+            feed = self._feeds.get(topic)
+            if feed is not None:
+                feed.dirty = True
+        self._wake.set()
+
+    def _due_feeds(self, now):
+        with self._lock:
+            return [
+                feed for feed in self._feeds.values()
+                if feed.last_refresh is None
+                or (feed.dirty and now - feed.last_refresh >= self.min_refresh_seconds)
+                or now - feed.last_refresh >= self.idle_refresh_seconds
+            ]
+
+    def refresh_due(self):
+        """Refresh every due feed once and fan out the results; return the count."""
+        feeds = self._due_feeds(self._clock())
+        for feed in feeds:
+            self._refresh_feed(feed)
+        return len(feeds)
+
+    def _refresh_feed(self, feed):
+        with self._lock:
+            feed.dirty = False
+            feed.last_refresh = self._clock()
+        try:
+            if self.app is not None:
+                with self.app.app_context():
+                    diff = feed.refresh()
+            else:
+                diff = feed.refresh()
+        except Exception as exc:
+            with self._lock:
+                self._counters["refresh_errors"] += 1
+            logger.warning("Live feed %s refresh failed: %s", feed.topic, exc)
+            return
+        with self._lock:
+            self._counters["refreshes"] += 1
+            subscriptions = list(self._subscribers.get(feed.topic, ()))
+        for subscription in subscriptions:
+            if subscription.needs_snapshot:
+                subscription.needs_snapshot = False
+                subscription.put("snapshot", feed.snapshot())
+            elif diff is not None:
+                subscription.put("diff", diff)
+                with self._lock:
+                    self._counters["diffs_sent"] += 1
+
+    def _ensure_thread(self):
+        if not self._start_thread or (self._thread is not None and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="live-updates", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(timeout=1.0)
+            self._wake.clear()
+            try:
+                self.refresh_due()
+            except Exception as exc:
+                logger.warning("Live update refresh loop failed: %s", exc)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["feeds"] = len(self._feeds)
+            stats["subscribers"] = sum(len(subs) for subs in self._subscribers.values())
+            stats["streams"] = self._streams
+        stats["backend"] = type(self.broker).__name__
+        return stats
+
+
+def sse_stream(subscription, *, heartbeat_seconds=15, max_seconds=300, busy_retry_ms=30000, clock=time.monotonic):
+    """Yield SSE frames for *subscription* until *max_seconds* elapse.
+
+    Streams end on a timer so a worker thread is not held forever;
+    EventSource reconnects on its own and receives a fresh snapshot.  When the
+    hub already has ``max_streams`` open, the screen gets whatever is queued
+    for it and is told to reconnect after *busy_retry_ms*, leaving the other
+    request threads for ordinary page loads.
+    """
+    hub = subscription.hub
+    if not hub.open_stream():
+        try:
+            yield f"retry: {busy_retry_ms}\n\n"
+            item = subscription.get(timeout=0)
+            if item is not None:
+                event_name, data = item
+                yield format_sse(event_name, data, event_id=data.get("version"))
+        finally:
+            subscription.close()
+        return
+
+    deadline = clock() + max_seconds
+    try:
+        yield "retry: 5000\n\n"
+        while clock() < deadline:
+            item = subscription.get(timeout=min(heartbeat_seconds, max(0.0, deadline - clock())))
+            if item is None:
+                # A named event rather than a comment so pages can tell a quiet
+                # stream from a dead one.
+                yield "event: ping\ndata: {}\n\n"
+                continue
+            event_name, data = item
+            yield format_sse(event_name, data, event_id=data.get("version"))
+    finally:
+        subscription.close()
+        hub.close_stream()
+
+
+_hub = None
+_hub_app = None
+_tracked_models = ()
+_hub_lock = threading.Lock()
+
+
+def _build_broker(settings):
+    if settings["backend"] == "postgres":
+        url = settings["database_url"] or ""
+        if not url.startswith("postgresql://"):
+            logger.warning("LIVE_UPDATES_BACKEND=postgres needs a PostgreSQL URL; using in-process updates.")
+        elif is_pooled_postgres_url(url):
+            logger.warning(
+                "LISTEN does not work through a transaction pooler; set LIVE_UPDATES_DATABASE_URL "
+                "to a direct connection. Using in-process updates."
+            )
+        else:
+            try:
+                return PostgresBroker(url)
+            except Exception as exc:
+                logger.warning("Postgres live updates unavailable (%s); using in-process updates.", exc)
+    return InProcessBroker()
+
+
+def get_live_hub():
+    """Return the process-wide LiveUpdateHub, creating it on first use."""
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                settings = get_live_update_settings()
+                hub = LiveUpdateHub(
+                    _build_broker(settings),
+                    min_refresh_seconds=settings["min_refresh_seconds"],
+                    idle_refresh_seconds=settings["idle_refresh_seconds"],
+                    app=_hub_app,
+                    max_streams=settings["max_streams_per_worker"],
+                )
+                hub.broker.add_listener(_invalidate_synced_results)
+                _hub = hub
+    return _hub
+
+
+def reset_live_hub():
+    """Discard the process-wide hub (tests, or after settings change)."""
+    global _hub
+    with _hub_lock:
+        if _hub is not None:
+            _hub.broker.close()
+        _hub = None
+
+
+def publish_change(source, branches=None):
+    """Announce a change to every live screen; never raises into the caller."""
+    try:
+        get_live_hub().publish(source, branches)
+    except Exception as exc:
+        logger.warning("Live update publish failed: %s", exc)
+
+
+def _invalidate_synced_results(source, branches):
+    # The sync worker just rewrote mirror-derived rows; drop the short-TTL ERP
+    # results so the refresh that follows reads them instead of a cached copy.
+    if source != "sync":
+        return
+    from app.Services.erp.base import ERPServiceBase
+    ERPServiceBase.invalidate_query_cache("open_so_summary")
+    ERPServiceBase.invalidate_query_cache("open_order_board_summary")
+
+
+def _collect_changed_branches(session, flush_context):
+    if not _tracked_models:
+        return
+    pending = session.info.setdefault("live_update_branches", {"branches": set(), "unscoped": False})
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if not isinstance(obj, _tracked_models):
+            continue
+        branch = getattr(obj, "branch_code", None)
+        if branch:
+            pending["branches"].add(branch)
+        else:
+            pending["unscoped"] = True
+
+
+def _publish_committed_changes(session):
+    pending = session.info.pop("live_update_branches", None)
+    if not pending:
+        return
+    if pending["unscoped"]:
+        # A row without a branch can show up on any screen; wake them all.
+        publish_change("local")
+    elif pending["branches"]:
+        publish_change("local", pending["branches"])
+
+
+def _discard_changes(session, previous_transaction=None):
+    session.info.pop("live_update_branches", None)
+
+
+def init_live_updates(app, session, models):
+    """Publish a change after every commit that touches one of *models*.
+
+    The hub itself (and any LISTEN connection) is only built when the first
+    screen subscribes or the first tracked write commits.
+    """
+    global _hub_app, _tracked_models
+    _hub_app = app
+    _tracked_models = tuple(models)
+    if event.contains(session, "after_commit", _publish_committed_changes):
+        return
+    event.listen(session, "after_flush", _collect_changed_branches)
+    event.listen(session, "after_commit", _publish_committed_changes)
+    event.listen(session, "after_soft_rollback", _discard_changes)
@@ -0,0 +1,345 @@
+"""Dispatch manifest PDFs: one page per order with a QR code and its shipment lines.
+
+Imported on first use by DispatchService.generate_manifest_pdf so reportlab
+and qrcode stay out of app start-up.
+
+Full-route manifests run to 100+ pages, so the per-page work is kept small:
+
+* The logo is decoded once per process (keyed by path and mtime).  The
+  header (logo, title, timestamp, rule) is drawn once per document as a
+  form XObject, and each page references it.
+* QR codes are drawn as vector rectangles from the module matrix.  Each
+  page no longer encodes a PNG, and the matrix is cached per SO.
+* Helvetica is one of the PDF base fonts.  Nothing is embedded, and
+  pdfmetrics keeps its widths after the first manifest.
+* Large manifests are split into page batches and rendered in a process
+  pool when MANIFEST_WORKERS is above 1 and pypdf is installed to merge
+  them.  Otherwise (the default) they render serially.  The pool is shared
+  by the requests of one web worker.
+* The document is written to a spooled temporary file rather than a
+  ``BytesIO``, so a large manifest spills to disk instead of sitting in
+  worker memory while it streams out.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from functools import lru_cache
+from io import BytesIO
+from multiprocessing import get_context
+from tempfile import SpooledTemporaryFile
+from typing import IO, Any, Dict, List, Optional, Tuple
+
+import qrcode
+from reportlab import rl_config
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+from app.runtime_settings import get_manifest_settings
+
+try:
+    from pypdf import PdfWriter
+except ImportError:  # batches can't be merged without it; render serially
+    PdfWriter = None
+
+logger = logging.getLogger(__name__)
+
+# Binary Flate streams: ASCII85 wrapping adds a quarter to the file size and,
+# without the rl_accel extension, is the slowest step in rendering.
+rl_config.useA85 = 0
+
+PAGE_WIDTH, PAGE_HEIGHT = letter
+MARGIN = 0.6 * inch
+LOGO_WIDTH = 1.8 * inch
+LOGO_HEIGHT = 0.7 * inch
+QR_SIZE = 1.5 * inch
+HEADER_FORM = "manifest_header"
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def render_manifest_pdf(items: List[Dict[str, Any]], settings: Optional[Dict[str, Any]] = None) -> IO[bytes]:
+    """Render ``items`` into a rewound spooled file.  The caller closes it."""
+    settings = settings or get_manifest_settings()
+    generated_at = datetime.now().strftime("%Y-%m-%d %H:%M")
+    total = len(items)
+    output = SpooledTemporaryFile(max_size=settings["spool_bytes"])
+
+    batch = max(1, settings["batch_pages"])
+    if _can_parallelize(total, settings):
+        jobs = [(items[start:start + batch], start + 1, total, generated_at, settings["logo_path"])
+                for start in range(0, total, batch)]
+        pool = None
+        try:
+            pool = _get_pool(settings["workers"])
+            _merge_batches(pool.map(_render_batch, *zip(*jobs)), output)
+            output.seek(0)
+            return output
+        except Exception as exc:
+            logger.warning("Parallel manifest render failed, rendering serially: %s", exc)
+            if pool is not None and isinstance(exc, BrokenProcessPool):
+                # Other requests may still be using the pool; only a dead one is dropped.
+                _discard_pool(pool)
+            output.seek(0)
+            output.truncate()
+
+    _render_pages(output, items, 1, total, generated_at, settings["logo_path"])
+    output.seek(0)
+    return output
+
+
+def _can_parallelize(total: int, settings: Dict[str, Any]) -> bool:
+    return (
+        PdfWriter is not None
+        and settings["workers"] > 1
+        and total >= settings["parallel_min_pages"]
+        and total > settings["batch_pages"]
+    )
+
+
+def _render_batch(items: List[Dict[str, Any]], first_page: int, total: int, generated_at: str, logo_path: str) -> bytes:
+    """Process-pool entry point: one batch of pages as a standalone PDF."""
+    buffer = BytesIO()
+    _render_pages(buffer, items, first_page, total, generated_at, logo_path)
+    return buffer.getvalue()
+
+
+def _merge_batches(batches, output: IO[bytes]) -> None:
+    writer = PdfWriter()
+    for data in batches:
+        writer.append(BytesIO(data))
+    # Every batch embeds its own copy of the logo and header form.
+    writer.compress_identical_objects()
+    writer.write(output)
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # Spawned, not forked: forking a threaded web worker can copy
+            # locks held by other request threads.
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def _reset_pool() -> None:
+    """Shut the pool down, cancelling pending batches (tests, benchmarks)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _render_pages(
+    output: IO[bytes], items: List[Dict[str, Any]], first_page: int, total: int, generated_at: str, logo_path: str
+) -> None:
+    pdf = canvas.Canvas(output, pagesize=letter)
+    _define_header(pdf, generated_at, logo_path)
+    for page_number, item in enumerate(items, start=first_page):
+        _draw_manifest_page(pdf, item, page_number, total)
+        pdf.showPage()
+    pdf.save()
+
+
+def _logo(logo_path: str) -> Optional[ImageReader]:
+    if not logo_path:
+        return None
+    try:
+        mtime = os.path.getmtime(logo_path)
+    except OSError:
+        return None
+    return _load_logo(logo_path, mtime)
+
+
+@lru_cache(maxsize=4)
+def _load_logo(logo_path: str, mtime: float) -> Optional[ImageReader]:
+    try:
+        reader = ImageReader(logo_path)
+        reader.getRGBData()  # decode now; the reader keeps the pixels
+        return reader
+    except Exception as exc:
+        logger.warning("Manifest logo %s could not be read: %s", logo_path, exc)
+        return None
+
+
+def _define_header(pdf: canvas.Canvas, generated_at: str, logo_path: str) -> None:
+    y0 = PAGE_HEIGHT - MARGIN
+    title_x = MARGIN
+    pdf.beginForm(HEADER_FORM)
+    logo = _logo(logo_path)
+    if logo is not None:
+        pdf.drawImage(
+            logo,
+            MARGIN,
+            y0 - LOGO_HEIGHT + 6,
+            width=LOGO_WIDTH,
+            height=LOGO_HEIGHT,
+            preserveAspectRatio=True,
+            mask="auto",
+        )
+        title_x = MARGIN + LOGO_WIDTH + 10
+
+    pdf.setFont("Helvetica-Bold", 16)
+    pdf.drawString(title_x, y0, "Dispatch Manifest")
+    pdf.setFont("Helvetica", 9)
+    pdf.drawRightString(PAGE_WIDTH - MARGIN, y0, generated_at)
+    y = y0 - 0.25 * inch
+    pdf.line(MARGIN, y, PAGE_WIDTH - MARGIN, y)
+    pdf.endForm()
+
+
+@lru_cache(maxsize=4096)
+def _qr_runs(data: str) -> Tuple[int, Tuple[Tuple[int, int, int], ...]]:
+    """(modules per side including the quiet zone, dark runs as (row, col, length))."""
+    code = qrcode.QRCode(border=4)
+    code.add_data(data)
+    code.make(fit=True)
+    matrix = code.get_matrix()
+    runs = []
+    for row, cells in enumerate(matrix):
+        col = 0
+        while col < len(cells):
+            if cells[col]:
+                start = col
+                while col < len(cells) and cells[col]:
+                    col += 1
+                runs.append((row, start, col - start))
+            else:
+                col += 1
+    return len(matrix), tuple(runs)
+
+
+def _draw_qr(pdf: canvas.Canvas, data: str, x: float, y: float, size: float) -> None:
+    modules, runs = _qr_runs(data)
+    cell = size / modules
+    top = y + size
+    path = pdf.beginPath()
+    for row, col, length in runs:
+        path.rect(x + col * cell, top - (row + 1) * cell, length * cell, cell)
+    pdf.drawPath(path, stroke=0, fill=1)
+
+
+def _draw_manifest_page(pdf: canvas.Canvas, item: Dict[str, Any], page_number: int, total_pages: int) -> None:
+    width = PAGE_WIDTH
+    margin = MARGIN
+    x0 = margin
+    pdf.doForm(HEADER_FORM)
+    y = PAGE_HEIGHT - margin - 0.45 * inch
+
+    order_id = str(item.get("id", ""))
+    _draw_qr(pdf, f"SO:{order_id}", width - margin - QR_SIZE, y, QR_SIZE)
+
+    pdf.setFont("Helvetica-Bold", 12)
+    pdf.drawString(x0, y, f"Order: {order_id}")
+    pdf.setFont("Helvetica", 10)
+    y -= 0.22 * inch
+    pdf.drawString(
+        x0,
+        y,
+        f"Type: {(item.get('doc_kind') or item.get('type') or '').upper()}    Status: {item.get('so_status') or ''}",
+    )
+    y -= 0.18 * inch
+    pdf.drawString(
+        x0,
+        y,
+        f"Branch: {item.get('branch') or ''}    Route: {item.get('route_id') or ''}    Shipment#: {item.get('shipment_num') or ''}",
+    )
+    y -= 0.18 * inch
+    pdf.drawString(
+        x0,
+        y,
+        f"Driver: {item.get('driver') or ''}    Expected: {str(item.get('expected_date') or '')[:10]}",
+    )
+    y -= 0.28 * inch
+    pdf.setFont("Helvetica-Bold", 11)
+    pdf.drawString(x0, y, "Ship-To:")
+    y -= 0.2 * inch
+    pdf.setFont("Helvetica", 10)
+    pdf.drawString(x0, y, (item.get("shipto_name") or "")[:80])
+    y -= 0.18 * inch
+    pdf.drawString(x0, y, (item.get("address") or "")[:110])
+    y -= 0.28 * inch
+
+    y = _draw_lines_table(pdf, x0, y, item.get("lines") or [])
+    y -= 0.2 * inch
+    pdf.setFont("Helvetica-Bold", 11)
+    pdf.drawString(x0, y, "Notes / Instructions:")
+    y -= 0.18 * inch
+    pdf.setStrokeColor(colors.grey)
+    box_top = y
+    box_height = 1.6 * inch
+    pdf.rect(x0, box_top - box_height, width - 2 * margin, box_height, stroke=1, fill=0)
+    for index in range(1, 6):
+        line_y = box_top - (index * (box_height / 5))
+        pdf.line(x0 + 6, line_y, width - margin - 6, line_y)
+    y = box_top - box_height - 0.25 * inch
+    pdf.setStrokeColor(colors.black)
+    pdf.line(x0, y, x0 + 2.5 * inch, y)
+    pdf.drawString(x0, y - 12, "Customer Signature")
+    pdf.line(x0 + 3.0 * inch, y, x0 + 5.5 * inch, y)
+    pdf.drawString(x0 + 3.0 * inch, y - 12, "Printed Name")
+    pdf.drawRightString(width - margin, margin / 2, f"Page {page_number} of {total_pages}")
+
+
+def _draw_lines_table(pdf: canvas.Canvas, x0: float, y: float, lines: List[Dict[str, Any]], max_rows: int = 12) -> float:
+    if not lines:
+        return y
+
+    columns = [
+        ("line_no", "Ln", 0.4 * inch),
+        ("item_id", "Item", 1.2 * inch),
+        ("item_description", "Description", 2.4 * inch),
+        ("qty_ordered", "Ord", 0.6 * inch),
+        ("qty_shipped", "Shp", 0.6 * inch),
+        ("uom", "UOM", 0.5 * inch),
+        ("weight", "Wt", 0.5 * inch),
+    ]
+
+    pdf.setFont("Helvetica-Bold", 11)
+    pdf.drawString(x0, y, "Shipment Lines")
+    y -= 0.18 * inch
+    pdf.setFont("Helvetica", 9)
+    x = x0
+    for _, title, width in columns:
+        pdf.drawString(x, y, title)
+        x += width
+    y -= 0.16 * inch
+    pdf.setStrokeColor(colors.grey)
+    pdf.line(x0, y, x0 + sum(width for _, _, width in columns), y)
+    y -= 0.08 * inch
+    pdf.setStrokeColor(colors.black)
+
+    # One text object for the whole table rather than one per cell.
+    text = pdf.beginText()
+    text.setFont("Helvetica", 9)
+    for line in lines[:max_rows]:
+        x = x0
+        for key, _, width in columns:
+            text.setTextOrigin(x, y)
+            text.textOut(str(line.get(key, ""))[:28])
+            x += width
+        y -= 0.16 * inch
+        if y < 1.1 * inch:
+            break
+    pdf.drawText(text)
+    return y
@@ -146,6 +146,13 @@ def _send_via_resend(to_email: str, subject: str, html: str) -> tuple[bool, str]
         return False, "resend package not installed (pip install resend)."
 
     resend_sdk.api_key = _cfg("RESEND_API_KEY")
+    if hasattr(resend_sdk, "RequestsClient"):
+        # The SDK waits 30s by default; a login request shouldn't.
+        from app.runtime_settings import get_web_server_settings
+
+        resend_sdk.default_http_client = resend_sdk.RequestsClient(
+            timeout=get_web_server_settings()["outbound_timeout_seconds"]
+        )
     from_addr = _cfg("OTP_EMAIL_FROM", _cfg("EMAIL_ADDRESS", "noreply@beisserlumber.com"))
     app_name = _cfg("OTP_APP_NAME", "Beisser Ops")
 
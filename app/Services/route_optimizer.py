@@ -0,0 +1,430 @@
+"""Stop sequencing and truck assignment for dispatch routes.
+
+Everything here works on a distance matrix whose node 0 is the branch yard
+and nodes 1..n are the stops:
+
+* ``distance_matrix()`` is great-circle (haversine) miles times
+  ``road_factor``, a circuity allowance that turns straight lines into an
+  approximation of road miles.  The factor scales every leg alike, so it
+  changes the reported miles and not the chosen order.
+* ``sequence_stops()`` builds a tour with nearest neighbour and improves it
+  with 2-opt and Or-opt moves (segments of 1-3 stops), both restricted to
+  each stop's nearest neighbours, until no move helps or the time budget
+  runs out.
+* ``assign_trucks()`` splits stops between trucks with Clarke-Wright
+  savings under a weight capacity, then sequences each truck's stops.
+
+When no yard is known the single-route optimizer puts a virtual node at
+distance 0 from every stop in its place, so the tour becomes the shortest
+open path through the stops.  Truck planning needs a real start point and
+falls back to the stops' centroid.
+
+``optimize_sequence()`` and ``plan_routes()`` wrap these for stop dicts
+(``lat``, ``lon``, ``total_weight``) and are what DispatchService uses.
+"""
+from __future__ import annotations
+
+import math
+import time
+from typing import Any
+
+from app.runtime_settings import get_route_optimization_settings
+
+EARTH_RADIUS_MILES = 3958.8
+NEIGHBOURS = 12
+SAVINGS_NEIGHBOURS = 25
+EPSILON = 1e-9
+
+
+def haversine_miles(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlam = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlam / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(1.0, math.sqrt(a)))
+
+
+def distance_matrix(points: list[tuple[float, float]], road_factor: float = 1.0) -> list[list[float]]:
+    """Symmetric matrix of approximate road miles between (lat, lon) points."""
+    n = len(points)
+    # Precompute the trig once per point rather than once per pair.
+    rad = [(math.radians(lat), math.radians(lon), math.cos(math.radians(lat))) for lat, lon in points]
+    matrix = [[0.0] * n for _ in range(n)]
+    scale = 2 * EARTH_RADIUS_MILES * road_factor
+    for i in range(n):
+        phi1, lam1, cos1 = rad[i]
+        row = matrix[i]
+        for j in range(i + 1, n):
+            phi2, lam2, cos2 = rad[j]
+            a = math.sin((phi2 - phi1) / 2) ** 2 + cos1 * cos2 * math.sin((lam2 - lam1) / 2) ** 2
+            row[j] = matrix[j][i] = scale * math.asin(min(1.0, math.sqrt(a)))
+    return matrix
+
+
+def tour_length(matrix: list[list[float]], tour: list[int], closed: bool = True) -> float:
+    """Length of *tour* (node indices); closed tours return to tour[0]."""
+    if len(tour) < 2:
+        return 0.0
+    total = sum(matrix[tour[k]][tour[k + 1]] for k in range(len(tour) - 1))
+    if closed:
+        total += matrix[tour[-1]][tour[0]]
+    return total
+
+
+def _neighbour_lists(matrix: list[list[float]], nodes: list[int], k: int) -> dict[int, list[int]]:
+    return {
+        a: sorted((b for b in nodes if b != a), key=matrix[a].__getitem__)[:k]
+        for a in nodes
+    }
+
+
+def _nearest_neighbour(matrix: list[list[float]], depot: int, nodes: list[int]) -> list[int]:
+    tour = [depot]
+    unvisited = set(nodes)
+    unvisited.discard(depot)
+    current = depot
+    while unvisited:
+        row = matrix[current]
+        current = min(unvisited, key=row.__getitem__)
+        unvisited.remove(current)
+        tour.append(current)
+    return tour
+
+
+def _two_opt_pass(matrix, tour, pos, neighbours, deadline) -> bool:
+    """One sweep of neighbour-list 2-opt over a closed tour with tour[0] fixed."""
+    m = len(tour)
+    improved = False
+    for i in range(m):
+        if time.perf_counter() > deadline:
+            break
+        for direction in (1, -1):
+            # Edge (a, b) where b follows (or precedes) a.
+            a = tour[i]
+            b = tour[(i + direction) % m]
+            d_ab = matrix[a][b]
+            for c in neighbours[a]:
+                d_ac = matrix[a][c]
+                if d_ac >= d_ab:
+                    break
+                j = pos[c]
+                d = tour[(j + direction) % m]
+                if c == b or d == a:
+                    continue
+                delta = d_ac + matrix[b][d] - d_ab - matrix[c][d]
+                if delta < -EPSILON:
+                    # Edges (i, i+1) and (j, j+1) going forward, or (i-1, i)
+                    # and (j-1, j) going backward; reversing between them
+                    # never moves tour[0].
+                    e1 = i if direction == 1 else (i - 1) % m
+                    e2 = j if direction == 1 else (j - 1) % m
+                    lo, hi = min(e1, e2), max(e1, e2)
+                    tour[lo + 1:hi + 1] = tour[lo + 1:hi + 1][::-1]
+                    for k in range(lo + 1, hi + 1):
+                        pos[tour[k]] = k
+                    improved = True
+                    a = tour[i]
+                    b = tour[(i + direction) % m]
+                    d_ab = matrix[a][b]
+                    break
+    return improved
+
+
+def _or_opt_pass(matrix, tour, pos, neighbours, deadline) -> bool:
+    """Move runs of 1-3 stops next to one of their neighbours, either way round."""
+    m = len(tour)
+    improved = False
+    for length in (1, 2, 3):
+        if m - 1 <= length:
+            break
+        i = 1
+        while i + length <= m:
+            if time.perf_counter() > deadline:
+                return improved
+            segment = tour[i:i + length]
+            first, last = segment[0], segment[-1]
+            prev_node = tour[i - 1]
+            next_node = tour[(i + length) % m]
+            gain = matrix[prev_node][first] + matrix[last][next_node] - matrix[prev_node][next_node]
+            best = None
+            for anchor in set(neighbours[first]) | set(neighbours[last]):
+                if anchor in segment:
+                    continue
+                k = pos[anchor]
+                for left, right in ((anchor, tour[(k + 1) % m]), (tour[(k - 1) % m], anchor)):
+                    if left in segment or right in segment:
+                        continue
+                    base = matrix[left][right]
+                    forward = matrix[left][first] + matrix[last][right] - base
+                    backward = matrix[left][last] + matrix[first][right] - base
+                    cost, reverse = (forward, False) if forward <= backward else (backward, True)
+                    if cost < gain - EPSILON and (best is None or cost < best[0]):
+                        best = (cost, left, reverse)
+            if best is None:
+                i += 1
+                continue
+            _, left, reverse = best
+            rest = tour[:i] + tour[i + length:]
+            insert_at = rest.index(left) + 1
+            moved = segment[::-1] if reverse else segment
+            tour[:] = rest[:insert_at] + moved + rest[insert_at:]
+            for k, node in enumerate(tour):
+                pos[node] = k
+            improved = True
+    return improved
+
+
+def sequence_stops(
+    matrix: list[list[float]],
+    nodes: list[int] | None = None,
+    depot: int = 0,
+    time_budget_ms: float = 1000,
+) -> dict[str, Any]:
+    """Visit order for *nodes* (default: every node but *depot*) as a closed
+    tour from *depot*.
+
+    Returns ``order`` (stop nodes, depot excluded), ``length``,
+    ``initial_length`` (nearest neighbour), ``iterations`` and ``converged``
+    (False when the budget ran out before a local optimum).
+    """
+    deadline = time.perf_counter() + time_budget_ms / 1000
+    if nodes is None:
+        nodes = [node for node in range(len(matrix)) if node != depot]
+    all_nodes = [depot] + [node for node in nodes if node != depot]
+    tour = _nearest_neighbour(matrix, depot, all_nodes)
+    initial = tour_length(matrix, tour)
+    iterations = 0
+    converged = True
+    if len(tour) > 3:
+        neighbours = _neighbour_lists(matrix, all_nodes, NEIGHBOURS)
+        pos = {node: k for k, node in enumerate(tour)}
+        while True:
+            iterations += 1
+            changed = _two_opt_pass(matrix, tour, pos, neighbours, deadline)
+            changed = _or_opt_pass(matrix, tour, pos, neighbours, deadline) or changed
+            if time.perf_counter() > deadline:
+                converged = False
+                break
+            if not changed:
+                break
+    return {
+        "order": tour[1:],
+        "length": tour_length(matrix, tour),
+        "initial_length": initial,
+        "iterations": iterations,
+        "converged": converged,
+    }
+
+
+def _savings_routes(matrix, nodes, weights, capacity, depot=0) -> list[list[int]]:
+    """Clarke-Wright parallel savings: merge routes end to end while it saves
+    distance and the merged load fits *capacity*."""
+    route_of = {node: [node] for node in nodes}
+    load = {node: weights[node] for node in nodes}
+    head = {node: node for node in nodes}  # route id = the node it started as
+    neighbours = _neighbour_lists(matrix, nodes, SAVINGS_NEIGHBOURS)
+    savings = []
+    for i in nodes:
+        for j in neighbours[i]:
+            if i < j:
+                saving = matrix[depot][i] + matrix[depot][j] - matrix[i][j]
+                if saving > EPSILON:
+                    savings.append((saving, i, j))
+    savings.sort(reverse=True)
+
+    for _saving, i, j in savings:
+        ri, rj = head[i], head[j]
+        if ri == rj or load[ri] + load[rj] > capacity:
+            continue
+        a, b = route_of[ri], route_of[rj]
+        # i and j must both be route ends; orient so a ends at i and b starts at j.
+        if a[-1] != i:
+            if a[0] != i:
+                continue
+            a.reverse()
+        if b[0] != j:
+            if b[-1] != j:
+                continue
+            b.reverse()
+        a.extend(b)
+        load[ri] += load.pop(rj)
+        del route_of[rj]
+        for node in b:
+            head[node] = ri
+    return list(route_of.values())
+
+
+def assign_trucks(
+    matrix: list[list[float]],
+    weights: list[float],
+    capacity: float,
+    trucks: int,
+    time_budget_ms: float = 2000,
+    depot: int = 0,
+) -> dict[str, Any]:
+    """Split nodes 1..n between at most *trucks* trucks of *capacity* each.
+
+    ``weights[node]`` is the node's load (the depot's is ignored).  Returns
+    ``routes`` (each a sequenced node list), ``lengths``, ``loads`` and
+    ``unassigned``: ``[(node, reason)]`` for stops heavier than a truck
+    (``over_capacity``) or left over once every truck is full (``no_capacity``).
+    """
+    started = time.perf_counter()
+    nodes = [node for node in range(len(matrix)) if node != depot]
+    unassigned = [(node, "over_capacity") for node in nodes if weights[node] > capacity]
+    nodes = [node for node in nodes if weights[node] <= capacity]
+
+    routes = _savings_routes(matrix, nodes, weights, capacity, depot) if nodes else []
+    routes.sort(key=lambda route: -sum(weights[node] for node in route))
+    kept, spill = routes[:trucks], [node for route in routes[trucks:] for node in route]
+    loads = [sum(weights[node] for node in route) for route in kept]
+
+    # Cheapest feasible insertion for stops from routes that didn't get a truck.
+    spill.sort(key=lambda node: -weights[node])
+    for node in spill:
+        best = None
+        for r, route in enumerate(kept):
+            if loads[r] + weights[node] > capacity:
+                continue
+            path = [depot] + route + [depot]
+            for k in range(len(path) - 1):
+                cost = matrix[path[k]][node] + matrix[node][path[k + 1]] - matrix[path[k]][path[k + 1]]
+                if best is None or cost < best[0]:
+                    best = (cost, r, k)
+        if best is None:
+            unassigned.append((node, "no_capacity"))
+            continue
+        _, r, k = best
+        kept[r].insert(k, node)
+        loads[r] += weights[node]
+
+    remaining_ms = max(50.0, time_budget_ms - (time.perf_counter() - started) * 1000)
+    total_stops = sum(len(route) for route in kept) or 1
+    sequenced, lengths, converged = [], [], True
+    for route in kept:
+        share = remaining_ms * len(route) / total_stops
+        result = sequence_stops(matrix, route, depot, share)
+        sequenced.append(result["order"])
+        lengths.append(result["length"])
+        converged = converged and result["converged"]
+    return {
+        "routes": sequenced,
+        "lengths": lengths,
+        "loads": loads,
+        "unassigned": unassigned,
+        "converged": converged,
+    }
+
+
+# ----------------------------------------------------------------------
+# Stop-dict wrappers
+# ----------------------------------------------------------------------
+
+def _located(stop: dict[str, Any]) -> bool:
+    return stop.get("lat") is not None and stop.get("lon") is not None
+
+
+def resolve_yard(branch_code: str | None, yard: dict[str, Any] | None = None) -> dict[str, Any] | None:
+    """{"lat", "lon", "source"} for an explicit *yard*, else the branch's
+    configured yard (DISPATCH_BRANCH_YARDS_JSON), else None."""
+    if yard and yard.get("lat") is not None and yard.get("lon") is not None:
+        return {"lat": float(yard["lat"]), "lon": float(yard["lon"]), "source": "request"}
+    configured = get_route_optimization_settings()["yards"].get((branch_code or "").strip().upper())
+    if configured:
+        return {**configured, "source": "branch"}
+    return None
+
+
+def optimize_sequence(
+    stops: list[dict[str, Any]],
+    yard: dict[str, Any] | None = None,
+    time_budget_ms: float | None = None,
+) -> dict[str, Any]:
+    """Best visiting order for *stops*.
+
+    Stops without coordinates keep their relative order after the located
+    ones.  Returns ``stops`` (reordered), ``unlocated``, ``miles`` and
+    ``miles_before`` (the given order), ``yard`` and solver stats.
+    """
+    settings = get_route_optimization_settings()
+    budget = settings["time_budget_ms"] if time_budget_ms is None else time_budget_ms
+    located = [stop for stop in stops if _located(stop)]
+    unlocated = [stop for stop in stops if not _located(stop)]
+
+    started = time.perf_counter()
+    points = [(float(stop["lat"]), float(stop["lon"])) for stop in located]
+    if yard:
+        matrix = distance_matrix([(yard["lat"], yard["lon"])] + points, settings["road_factor"])
+    else:
+        # Virtual start at distance 0 from everything: the tour is an open path.
+        matrix = distance_matrix([(0.0, 0.0)] + points, settings["road_factor"])
+        for k in range(len(matrix)):
+            matrix[0][k] = matrix[k][0] = 0.0
+    result = sequence_stops(matrix, time_budget_ms=budget)
+    given = list(range(len(matrix)))
+
+    return {
+        "stops": [located[node - 1] for node in result["order"]] + unlocated,
+        "unlocated": unlocated,
+        "miles": round(result["length"], 2),
+        "miles_before": round(tour_length(matrix, given), 2),
+        "miles_nearest_neighbour": round(result["initial_length"], 2),
+        "yard": yard,
+        "returns_to_yard": bool(yard),
+        "converged": result["converged"],
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def plan_routes(
+    stops: list[dict[str, Any]],
+    trucks: int,
+    capacity_lbs: float | None = None,
+    yard: dict[str, Any] | None = None,
+    time_budget_ms: float | None = None,
+) -> dict[str, Any]:
+    """Assign *stops* to up to *trucks* trucks by ``total_weight`` and
+    sequence each truck.  Without a *yard* the stops' centroid stands in."""
+    settings = get_route_optimization_settings()
+    capacity = settings["truck_capacity_lbs"] if capacity_lbs is None else float(capacity_lbs)
+    budget = settings["plan_time_budget_ms"] if time_budget_ms is None else time_budget_ms
+    located = [stop for stop in stops if _located(stop)]
+    unlocated = [stop for stop in stops if not _located(stop)]
+    if not yard and located:
+        yard = {
+            "lat": sum(float(stop["lat"]) for stop in located) / len(located),
+            "lon": sum(float(stop["lon"]) for stop in located) / len(located),
+            "source": "centroid",
+        }
+
+    started = time.perf_counter()
+    trucks_out: list[dict[str, Any]] = []
+    unassigned: list[dict[str, Any]] = []
+    converged = True
+    if located:
+        points = [(yard["lat"], yard["lon"])] + [(float(stop["lat"]), float(stop["lon"])) for stop in located]
+        matrix = distance_matrix(points, settings["road_factor"])
+        weights = [0.0] + [float(stop.get("total_weight") or 0) for stop in located]
+        result = assign_trucks(matrix, weights, capacity, max(1, trucks), budget)
+        converged = result["converged"]
+        for number, (order, length, load) in enumerate(
+            zip(result["routes"], result["lengths"], result["loads"]), start=1
+        ):
+            trucks_out.append({
+                "truck": number,
+                "stops": [located[node - 1] for node in order],
+                "total_weight": round(load, 2),
+                "miles": round(length, 2),
+            })
+        unassigned = [{**located[node - 1], "reason": reason} for node, reason in result["unassigned"]]
+
+    return {
+        "trucks": trucks_out,
+        "unassigned": unassigned,
+        "unlocated": unlocated,
+        "capacity_lbs": capacity,
+        "yard": yard,
+        "miles": round(sum(truck["miles"] for truck in trucks_out), 2),
+        "converged": converged,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
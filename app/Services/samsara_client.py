@@ -0,0 +1,364 @@
+"""Shared Samsara transport, vehicle metadata cache and location poller.
+
+One ``SamsaraClient`` per worker keeps a pooled ``requests.Session`` and
+honours 429 ``Retry-After`` by refusing calls until the window passes, so the
+poller and on-demand lookups never pile onto a rate-limited token.
+
+``SamsaraLocationPoller`` refreshes every vehicle's location once per
+``SAMSARA_CACHE_TTL`` on a daemon thread and records the positions in a
+``PositionRingBuffer``.  Live-vehicle requests read the buffer instead of
+calling Samsara.  Vehicle metadata (names, tags) rarely changes, so
+``VehicleMetaCache`` keeps it, with the branch inferred from it, for
+``SAMSARA_META_TTL_SECONDS`` and only fetches vehicles it hasn't seen.
+
+Every gunicorn worker asks for the thread, but a ``SharedLocationSnapshot``
+lock lets only one process per host poll.  It writes each poll to a JSON file
+that the other workers and the sync worker read instead of calling Samsara.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: every process polls for itself
+    fcntl = None
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+LOCATIONS_PAGE_SIZE = 512
+MAX_LOCATION_PAGES = 20
+META_BATCH_SIZE = 50
+
+
+class SamsaraRateLimited(requests.HTTPError):
+    """Samsara answered 429; no calls go out until ``retry_after`` seconds pass."""
+
+    def __init__(self, retry_after, response=None):
+        super().__init__(f"Samsara rate limit hit; retry in {retry_after:.0f}s", response=response)
+        self.retry_after = retry_after
+
+
+class SamsaraClient:
+    """Pooled, rate-aware HTTP client for the Samsara API."""
+
+    def __init__(self, api_token, base_url="https://api.samsara.com", pool_size=10, timeout=12, session=None):
+        self.api_token = api_token
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        if session is None:
+            session = requests.Session()
+            # Retry transient server errors; 429s are handled below so the
+            # Retry-After window applies to every caller, not just this request.
+            adapter = HTTPAdapter(
+                pool_connections=pool_size,
+                pool_maxsize=pool_size,
+                max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504),
+                                  allowed_methods=("GET",), raise_on_status=False,
+                                  respect_retry_after_header=False),
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        session.headers.update({"Authorization": f"Bearer {api_token}", "Content-Type": "application/json"})
+        self.session = session
+        self._blocked_until = 0.0
+        self.stats = {"requests": 0, "rate_limited": 0, "errors": 0}
+
+    def retry_after(self):
+        """Seconds left in the current rate-limit window (0 when calls may go out)."""
+        return max(0.0, self._blocked_until - time.monotonic())
+
+    def get(self, endpoint, params=None, timeout=None):
+        wait = self.retry_after()
+        if wait:
+            raise SamsaraRateLimited(wait)
+        self.stats["requests"] += 1
+        resp = self.session.get(f"{self.base_url}{endpoint}", params=params, timeout=timeout or self.timeout)
+        if resp.status_code == 429:
+            try:
+                retry_after = float(resp.headers.get("Retry-After") or 1)
+            except ValueError:
+                retry_after = 1.0
+            self._blocked_until = time.monotonic() + retry_after
+            self.stats["rate_limited"] += 1
+            raise SamsaraRateLimited(retry_after, response=resp)
+        if resp.status_code >= 400:
+            self.stats["errors"] += 1
+        resp.raise_for_status()
+        return resp.json()
+
+    def fetch_locations(self):
+        """Every vehicle's latest location, following pagination."""
+        rows = []
+        params = {"limit": LOCATIONS_PAGE_SIZE}
+        for _ in range(MAX_LOCATION_PAGES):
+            payload = self.get("/fleet/vehicles/locations", params=params)
+            page = payload.get("data") or payload.get("vehicles") or []
+            rows.extend(page if isinstance(page, list) else [])
+            pagination = payload.get("pagination") or {}
+            if not pagination.get("hasNextPage") or not pagination.get("endCursor"):
+                break
+            params = {"limit": LOCATIONS_PAGE_SIZE, "after": pagination["endCursor"]}
+        return rows
+
+    def fetch_vehicles(self, ids):
+        """{vehicle_id: vehicle} for *ids*, in batches of META_BATCH_SIZE."""
+        output = {}
+        for start in range(0, len(ids), META_BATCH_SIZE):
+            payload = self.get("/fleet/vehicles", params={"ids": ",".join(ids[start:start + META_BATCH_SIZE])})
+            for vehicle in payload.get("data") or payload.get("vehicles") or []:
+                vehicle_id = str(vehicle.get("id") or vehicle.get("vehicleId") or "")
+                if vehicle_id:
+                    output[vehicle_id] = vehicle
+        return output
+
+
+class VehicleMetaCache:
+    """Vehicle metadata and its inferred branch, kept for *ttl_seconds*."""
+
+    def __init__(self, client, ttl_seconds=3600):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self._entries = {}  # vehicle_id -> {"meta", "expires", "branch_name", "branch"}
+        self._lock = threading.Lock()
+
+    def get_many(self, ids):
+        now = time.monotonic()
+        with self._lock:
+            missing = [vid for vid in ids if vid not in self._entries or self._entries[vid]["expires"] <= now]
+        fetched = {}
+        if missing:
+            try:
+                fetched = self.client.fetch_vehicles(missing)
+            except Exception as exc:
+                # Keep serving what we had; the next poll asks again.
+                logger.warning("Samsara vehicle metadata fetch failed: %s", exc)
+                missing = []
+        with self._lock:
+            for vid in missing:
+                self._entries[vid] = {"meta": fetched.get(vid, {}), "expires": now + self.ttl_seconds,
+                                      "branch_name": None, "branch": None}
+            return {vid: self._entries[vid]["meta"] for vid in ids if vid in self._entries}
+
+    def get(self, vehicle_id):
+        entry = self._entries.get(vehicle_id)
+        return entry["meta"] if entry else {}
+
+    def branch_for(self, vehicle_id, name, infer):
+        """Branch inferred from the vehicle's name and tags, worked out once per
+        name and metadata refresh."""
+        entry = self._entries.get(vehicle_id)
+        if entry is None:
+            return infer(name, vehicle_id, {})
+        if entry["branch_name"] != name:
+            entry["branch"] = infer(name, vehicle_id, entry["meta"])
+            entry["branch_name"] = name
+        return entry["branch"]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class PositionRingBuffer:
+    """The last *history* positions of every vehicle in the latest poll."""
+
+    def __init__(self, history=20):
+        self.history = history
+        self._positions = {}  # vehicle_id -> deque of vehicle dicts, oldest first
+        self._current = ()
+        self._lock = threading.Lock()
+
+    def record(self, vehicles):
+        with self._lock:
+            for vehicle in vehicles:
+                trail = self._positions.get(vehicle["id"])
+                if trail is None:
+                    trail = self._positions[vehicle["id"]] = deque(maxlen=self.history)
+                if not trail or trail[-1].get("located_at") != vehicle.get("located_at") or not vehicle.get("located_at"):
+                    trail.append(vehicle)
+                else:
+                    trail[-1] = vehicle  # same fix, refreshed metadata
+            self._current = tuple(vehicle["id"] for vehicle in vehicles)
+            # Vehicles gone from the fleet drop out.
+            for vehicle_id in set(self._positions) - set(self._current):
+                del self._positions[vehicle_id]
+
+    def latest(self):
+        with self._lock:
+            return [self._positions[vid][-1] for vid in self._current if vid in self._positions]
+
+    def trail(self, vehicle_id):
+        with self._lock:
+            return list(self._positions.get(str(vehicle_id), ()))
+
+    def __len__(self):
+        return len(self._current)
+
+
+class SharedLocationSnapshot:
+    """The host's latest poll in a JSON file, plus a lock file held by the one
+    process whose thread keeps it current.  The OS drops the lock when that
+    process exits, so another worker can take over."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self._held = None
+
+    def claim(self):
+        """Take the host's poller lock if it is free; True while this process holds it."""
+        if fcntl is None or self._held is not None:
+            return True
+        handle = open(self.lock_path, "a")
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._held = handle
+        return True
+
+    def has_poller(self):
+        """Whether some process on this host holds the poller lock."""
+        if fcntl is None or self._held is not None:
+            return self._held is not None
+        with open(self.lock_path, "a") as handle:
+            try:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return True
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+        return False
+
+    def write(self, vehicles, fetched_at):
+        temp = self.path.with_name(f".{self.path.name}.{os.getpid()}")
+        temp.write_text(json.dumps({"vehicles": vehicles, "fetched_at": fetched_at.isoformat()}, default=str))
+        os.replace(temp, self.path)  # readers never see a partial file
+
+    def read(self):
+        """(vehicles, fetched_at) from the last poll written, or None."""
+        try:
+            body = json.loads(self.path.read_text())
+            return body["vehicles"], datetime.fromisoformat(body["fetched_at"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+
+class SamsaraLocationPoller:
+    """
+    Keeps a PositionRingBuffer current from Samsara.
+
+    ``start()`` polls on a daemon thread every *ttl_seconds*.  Without the
+    thread (serverless, scripts), ``snapshot()`` polls on demand once the
+    data is older than *ttl_seconds*; concurrent callers share that poll.
+
+    With a *shared* snapshot only the process holding its lock runs the
+    thread; every other process serves the holder's last poll and polls on
+    demand only when no holder is left.
+    """
+
+    def __init__(self, client, normalize, ttl_seconds=15, meta_ttl_seconds=3600, history=20, shared=None):
+        self.client = client
+        self.normalize = normalize  # (row, meta_cache) -> vehicle dict or None
+        self.ttl_seconds = ttl_seconds
+        self.meta = VehicleMetaCache(client, meta_ttl_seconds)
+        self.buffer = PositionRingBuffer(history)
+        self.fetched_at = None
+        self.last_error = None
+        self._polled = 0.0
+        self._poll_lock = threading.Lock()
+        self._thread = None
+        self._wants_thread = False
+        self.shared = shared
+        self.stats = {"polls": 0, "poll_errors": 0, "served": 0, "shared_served": 0, "last_poll_ms": 0}
+
+    def poll(self):
+        started = time.monotonic()
+        try:
+            rows = self.client.fetch_locations()
+            ids = list(dict.fromkeys(str(row.get("id")) for row in rows if row.get("id")))
+            self.meta.get_many(ids)
+            vehicles = [vehicle for vehicle in (self.normalize(row, self.meta) for row in rows) if vehicle]
+        except Exception as exc:
+            self.stats["poll_errors"] += 1
+            self.last_error = exc
+            raise
+        self.buffer.record(vehicles)
+        self.fetched_at = datetime.utcnow()
+        self.last_error = None
+        if self.shared is not None:
+            try:
+                self.shared.write(vehicles, self.fetched_at)
+            except OSError as exc:
+                logger.warning("Could not write the shared Samsara snapshot: %s", exc)
+        self._polled = time.monotonic()
+        self.stats["polls"] += 1
+        self.stats["last_poll_ms"] = int((time.monotonic() - started) * 1000)
+        return len(vehicles)
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def is_fresh(self):
+        return self.fetched_at is not None and time.monotonic() - self._polled < self.ttl_seconds
+
+    def snapshot(self):
+        """(vehicles, fetched_at) from the ring buffer, polling first if it's stale
+        and no background thread keeps it current (or nothing was polled yet).
+        Raises only when there is nothing to serve."""
+        if self.shared is not None and not self.is_running():
+            shared = self._shared_snapshot()
+            if shared is not None:
+                self.stats["shared_served"] += 1
+                return shared
+
+        def needs_poll():
+            return self.fetched_at is None or (not self.is_fresh() and not self.is_running())
+
+        if needs_poll():
+            with self._poll_lock:
+                if needs_poll():
+                    try:
+                        self.poll()
+                    except Exception:
+                        if self.fetched_at is None:
+                            raise
+        self.stats["served"] += 1
+        return self.buffer.latest(), self.fetched_at
+
+    def _shared_snapshot(self):
+        """The host poller's last poll, or None when this process should poll."""
+        shared = self.shared.read()
+        if shared is not None and (datetime.utcnow() - shared[1]).total_seconds() < 2 * self.ttl_seconds:
+            return shared
+        if self._wants_thread:
+            self.start()  # takes over when the host's poller has exited
+            return None if self.is_running() else shared
+        return shared if self.shared.has_poller() else None
+
+    def start(self):
+        with self._poll_lock:
+            if self.is_running():
+                return
+            self._wants_thread = True
+            if self.shared is not None and not self.shared.claim():
+                return  # another process on this host polls; snapshot() reads its file
+            self._thread = threading.Thread(target=self._run, name="samsara-poller", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as exc:
+                logger.warning("Samsara location poll failed: %s", exc)
+            time.sleep(max(self.ttl_seconds, self.client.retry_after()))
@@ -0,0 +1,146 @@
+"""A local stand-in for the Samsara API.
+
+Serves ``/fleet/vehicles/locations`` (paginated) and ``/fleet/vehicles`` from
+an in-memory fleet, counts requests per path, and can answer 429 on demand.
+Tests start it on a free port; for local work run it and point the app at it:
+
+    python -m app.Services.samsara_mock --port 8765
+    SAMSARA_BASE_URL=http://127.0.0.1:8765 SAMSARA_API_TOKEN=mock flask run
+"""
+import json
+import threading
+from collections import Counter
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def mock_fleet(count=5):
+    """*count* trucks around Grimes / Birchwood with branch tags."""
+    fleet = []
+    for n in range(1, count + 1):
+        branch = "20GR" if n % 2 else "25BW"
+        fleet.append({
+            "id": f"v-{n:03d}",
+            "name": f"Truck {n}",
+            "tags": [{"id": f"t-{branch}", "name": branch}],
+            "location": {
+                "latitude": 41.68 + n / 1000,
+                "longitude": -93.79 - n / 1000,
+                "heading": (n * 45) % 360,
+                "speed": 0 if n % 3 == 0 else 35,
+                "time": datetime.utcnow().isoformat() + "Z",
+                "reverseGeo": {"formattedLocation": f"{n} Main St, Grimes, IA"},
+            },
+        })
+    return fleet
+
+
+class MockSamsaraServer:
+    """Threaded HTTP server implementing the Samsara endpoints the app uses."""
+
+    def __init__(self, fleet=None, page_size=None, host="127.0.0.1", port=0):
+        self.fleet = fleet if fleet is not None else mock_fleet()
+        self.page_size = page_size
+        self.requests = Counter()
+        self.rate_limit_next = 0        # answer this many requests with 429
+        self.retry_after_seconds = 1
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def move(self, vehicle_id, latitude, longitude):
+        for vehicle in self.fleet:
+            if vehicle["id"] == vehicle_id:
+                vehicle["location"].update(
+                    latitude=latitude, longitude=longitude, time=datetime.utcnow().isoformat() + "Z",
+                )
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="samsara-mock", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _locations(self, query):
+        rows = [{key: vehicle[key] for key in ("id", "name", "location")} for vehicle in self.fleet]
+        size = self.page_size or int(query.get("limit", [len(rows) or 1])[0])
+        start = int(query.get("after", ["0"])[0])
+        page = rows[start:start + size]
+        has_next = start + size < len(rows)
+        return {"data": page, "pagination": {"endCursor": str(start + size) if has_next else "", "hasNextPage": has_next}}
+
+    def _vehicles(self, query):
+        ids = set(",".join(query.get("ids", [])).split(",")) - {""}
+        data = [
+            {key: vehicle[key] for key in ("id", "name", "tags")}
+            for vehicle in self.fleet
+            if not ids or vehicle["id"] in ids
+        ]
+        return {"data": data, "pagination": {"endCursor": "", "hasNextPage": False}}
+
+    def _handler(self):
+        server = self
+        routes = {"/fleet/vehicles/locations": self._locations, "/fleet/vehicles": self._vehicles}
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                server.requests[parsed.path] += 1
+                if server.rate_limit_next > 0:
+                    server.rate_limit_next -= 1
+                    return self._send(429, {"message": "rate limited"},
+                                      {"Retry-After": str(server.retry_after_seconds)})
+                if not self.headers.get("Authorization", "").startswith("Bearer "):
+                    return self._send(401, {"message": "missing token"})
+                route = routes.get(parsed.path)
+                if route is None:
+                    return self._send(404, {"message": "not found"})
+                return self._send(200, route(parse_qs(parsed.query)))
+
+            def _send(self, status, body, headers=None):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a mock Samsara API for local development.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--vehicles", type=int, default=5)
+    args = parser.parse_args()
+    server = MockSamsaraServer(fleet=mock_fleet(args.vehicles), port=args.port)
+    print(f"Mock Samsara API on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,24 @@
 import os
-import requests
-import time
+import threading
 from datetime import datetime
 
+from app.runtime_settings import get_samsara_settings
+
 
 class SamsaraService:
     """
     Integration service for Samsara Fleet Management API.
     Provides vehicle location tracking, driver info, and delivery status.
 
-    Requires SAMSARA_API_TOKEN environment variable to be set.
+    Requires SAMSARA_API_TOKEN environment variable to be set.  Every
+    instance shares one pooled client and one location poller per worker.
     API Docs: https://developers.samsara.com/reference
     """
 
     BASE_URL = 'https://api.samsara.com'
 
     def __init__(self):
-        self.api_token = os.environ.get('SAMSARA_API_TOKEN', '')
-        self.headers = {
-            'Authorization': f'Bearer {self.api_token}',
-            'Content-Type': 'application/json'
-        }
-        self._dispatch_cache = {'ts': 0.0, 'data': None}
+        self.api_token = get_samsara_settings()['api_token']
 
     def _get(self, endpoint, params=None):
         """Generic GET request to Samsara API."""
@@ -29,12 +26,7 @@ class SamsaraService:
             print("SamsaraService: No API token configured. Falling back to MOCK data.")
             return None
         try:
-            url = f"{self.BASE_URL}{endpoint}"
-            resp = requests.get(url, headers=self.headers, params=params, timeout=10)
-            if resp.status_code != 200:
-                print(f"Samsara API HTTP Error: {resp.status_code} - {resp.text}")
-            resp.raise_for_status()
-            return resp.json()
+            return get_samsara_client().get(endpoint, params=params)
         except Exception as exc:
             print(f"Samsara API Exception for {endpoint}: {exc}")
             return None
@@ -73,51 +65,6 @@ class SamsaraService:
         except Exception:
             return {}
 
-    def _dispatch_ttl(self):
-        try:
-            return int(os.environ.get('SAMSARA_CACHE_TTL') or '15')
-        except ValueError:
-            return 15
-
-    def _dispatch_fetch_locations(self, limit=200):
-        if not self.api_token:
-            raise ValueError("SAMSARA_API_TOKEN is not configured")
-        ttl = max(5, self._dispatch_ttl())
-        now = time.time()
-        if self._dispatch_cache['data'] is not None and now - self._dispatch_cache['ts'] < ttl:
-            return self._dispatch_cache['data']
-        url = 'https://api.samsara.com/fleet/vehicles/locations'
-        resp = requests.get(url, headers=self.headers, params={'limit': limit}, timeout=12)
-        resp.raise_for_status()
-        payload = resp.json()
-        self._dispatch_cache = {'ts': now, 'data': payload}
-        return payload
-
-    def _dispatch_fetch_vehicle_meta(self, ids):
-        if not ids or not self.api_token:
-            return {}
-        output = {}
-        try:
-            batch_size = 50
-            for i in range(0, len(ids), batch_size):
-                chunk = ids[i:i + batch_size]
-                resp = requests.get(
-                    'https://api.samsara.com/fleet/vehicles',
-                    headers=self.headers,
-                    params={'ids': ','.join(chunk)},
-                    timeout=12,
-                )
-                if resp.status_code >= 400:
-                    return output
-                data = resp.json().get('data') or resp.json().get('vehicles') or []
-                for vehicle in data:
-                    vehicle_id = str(vehicle.get('id') or vehicle.get('vehicleId') or '')
-                    if vehicle_id:
-                        output[vehicle_id] = vehicle
-        except Exception:
-            return output
-        return output
-
     def _infer_dispatch_branch(self, name, vehicle_id, meta):
         codes = {code.upper() for code in self._dispatch_branch_codes()}
         aliases = self._dispatch_branch_aliases()
@@ -153,6 +100,31 @@ class SamsaraService:
 
         return None
 
+    def _normalize_dispatch_vehicle(self, row, meta_cache):
+        """One location row as a live-vehicle dict, or None without a fix."""
+        loc = row.get('location') or {}
+        lat = loc.get('latitude')
+        lon = loc.get('longitude')
+        if lat is None or lon is None:
+            return None
+
+        vehicle_id = str(row.get('id') or '')
+        meta = meta_cache.get(vehicle_id)
+        name = row.get('name') or meta.get('name') or (meta.get('externalIds') or {}).get('shortId') or 'Vehicle'
+        reverse_geo = loc.get('reverseGeo') or {}
+        return {
+            'id': vehicle_id,
+            'name': name,
+            'branch': meta_cache.branch_for(vehicle_id, name, self._infer_dispatch_branch),
+            'lat': lat,
+            'lon': lon,
+            'heading': loc.get('heading'),
+            'speed': loc.get('speed'),
+            'located_at': loc.get('time'),
+            'address': reverse_geo.get('formattedLocation') or '',
+            'tags': [tag.get('name') for tag in (meta.get('tags') or []) if isinstance(tag, dict) and tag.get('name')],
+        }
+
     def get_dispatch_vehicle_payload(self, branch=None, limit=None):
         if not self.api_token:
             return {
@@ -162,60 +134,23 @@ class SamsaraService:
                 'warning': 'SAMSARA_API_TOKEN is not configured',
             }
 
+        import requests  # already loaded by the client; kept out of app start-up
+
         try:
-            raw = self._dispatch_fetch_locations(limit=limit or 200)
-            rows = raw.get('data') or raw.get('vehicles') or raw.get('items') or raw or []
-            if isinstance(rows, dict):
-                rows = rows.get('data') or []
-
-            ids = list({str(row.get('id') or '') for row in rows if row.get('id')})
-            meta_map = self._dispatch_fetch_vehicle_meta(ids)
-
-            vehicles = []
-            for row in rows:
-                loc = row.get('location') or {}
-                lat = loc.get('latitude')
-                lon = loc.get('longitude')
-                if lat is None or lon is None:
-                    continue
-
-                vehicle_id = str(row.get('id') or '')
-                meta = meta_map.get(vehicle_id, {})
-                name = row.get('name') or meta.get('name') or (meta.get('externalIds') or {}).get('shortId') or 'Vehicle'
-                reverse_geo = loc.get('reverseGeo') or {}
-                address = reverse_geo.get('formattedLocation') or ''
-                normalized = {
-                    'id': vehicle_id,
-                    'name': name,
-                    'branch': self._infer_dispatch_branch(name, vehicle_id, meta),
-                    'lat': lat,
-                    'lon': lon,
-                    'heading': loc.get('heading'),
-                    'speed': loc.get('speed'),
-                    'located_at': loc.get('time'),
-                    'address': address,
-                    'tags': [tag.get('name') for tag in (meta.get('tags') or []) if isinstance(tag, dict) and tag.get('name')],
-                }
-                vehicles.append(normalized)
+            vehicles, fetched_at = get_location_poller().snapshot()
 
             wanted_branch = (branch or '').upper()
             if wanted_branch:
                 vehicles = [vehicle for vehicle in vehicles if (vehicle.get('branch') or '').upper() == wanted_branch]
+            if limit:
+                vehicles = vehicles[:limit]
 
             return {
                 'vehicles': vehicles,
                 'count': len(vehicles),
-                'fetched_at': datetime.utcnow().isoformat() + 'Z',
+                'fetched_at': fetched_at.isoformat() + 'Z',
                 'source': 'samsara',
             }
-        except ValueError as exc:
-            # Missing API token — return the same shape as the no-token early return above
-            return {
-                'vehicles': [],
-                'count': 0,
-                'fetched_at': datetime.utcnow().isoformat() + 'Z',
-                'warning': str(exc),
-            }
         except requests.HTTPError as exc:
             return {
                 'vehicles': [],
@@ -392,3 +327,63 @@ class SamsaraService:
             {'id': '1004', 'name': 'GR'},
             {'id': '1005', 'name': 'BW'}
         ]
+
+
+_client = None
+_poller = None
+_lock = threading.Lock()
+
+
+def get_samsara_client():
+    """Return the worker's shared SamsaraClient, creating it on first use."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                from app.Services.samsara_client import SamsaraClient
+
+                settings = get_samsara_settings()
+                _client = SamsaraClient(
+                    settings['api_token'],
+                    base_url=settings['base_url'],
+                    pool_size=settings['pool_size'],
+                    timeout=settings['timeout_seconds'],
+                )
+    return _client
+
+
+def get_location_poller():
+    """Return the worker's shared SamsaraLocationPoller, creating it on first use."""
+    global _poller
+    if _poller is None:
+        client = get_samsara_client()
+        with _lock:
+            if _poller is None:
+                from app.Services.samsara_client import SamsaraLocationPoller, SharedLocationSnapshot
+
+                settings = get_samsara_settings()
+                _poller = SamsaraLocationPoller(
+                    client,
+                    SamsaraService()._normalize_dispatch_vehicle,
+                    ttl_seconds=settings['location_ttl_seconds'],
+                    meta_ttl_seconds=settings['meta_ttl_seconds'],
+                    history=settings['position_history'],
+                    shared=SharedLocationSnapshot(settings['snapshot_path']),
+                )
+    return _poller
+
+
+def init_samsara_poller():
+    """Start polling vehicle locations when a token is configured.
+
+    Called from gunicorn's post_worker_init hook in every worker; only the
+    first to take the host's snapshot lock starts a thread.  The other
+    workers, the sync worker and scripts read that worker's snapshot file, and
+    poll on demand through ``snapshot()`` only when no worker is polling.
+    """
+    settings = get_samsara_settings()
+    if not settings['poller_enabled'] or not settings['api_token']:
+        return None
+    poller = get_location_poller()
+    poller.start()
+    return poller
@@ -0,0 +1,525 @@
+from __future__ import annotations
+
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Iterable
+
+from sqlalchemy import DateTime, bindparam, delete, event, insert, inspect, text
+from sqlalchemy.exc import DBAPIError
+
+from app.Models.models import SearchDocument
+
+DOCUMENTS = SearchDocument.__table__
+
+# Letters and digits only: "SO-1234/a" indexes as "so 1234 a".  Underscores are
+# dropped too, which keeps every token safe inside LIKE patterns and tsqueries.
+TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def normalize(*values: Any) -> str:
+    """Lower-cased tokens of every non-empty value, space separated."""
+    return " ".join(
+        token
+        for value in values
+        if value not in (None, "")
+        for token in TOKEN_RE.findall(str(value).lower())
+    )
+
+
+def _clip(value: Any, length: int) -> str:
+    return str(value or "").strip()[:length]
+
+
+def _coerce_datetime(value: Any) -> datetime | None:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+@dataclass(frozen=True)
+class SearchSource:
+    """One entity type: the mirror/local query that feeds it and its row -> document mapping.
+
+    ``sql`` selects the source rows with an ``is_deleted`` column; ``{changed}``
+    is replaced by ``changed_column > :since`` (or ``1 = 1`` on a rebuild).
+    """
+    entity_type: str
+    table: str
+    sql: str
+    changed_column: str
+    build: Callable[[Any], dict[str, Any]]
+
+
+def _order(row) -> dict[str, Any]:
+    return {
+        "entity_key": f"{row.system_id}:{row.so_id}",
+        "system_id": row.system_id,
+        "title": f"SO #{row.so_id}",
+        "subtitle": row.cust_name or "Sales Order",
+        "target": row.so_id,
+        "keywords": (row.so_id, row.po_number),
+        "text": (row.so_id, row.cust_name, row.cust_code, row.po_number, row.reference),
+        "sort_at": row.expect_date,
+    }
+
+
+def _customer(row) -> dict[str, Any]:
+    return {
+        "entity_key": row.cust_key,
+        "system_id": None,
+        "title": row.cust_name or row.cust_code,
+        "subtitle": f"Customer #{row.cust_code}",
+        "target": (row.cust_code or "").strip(),
+        "keywords": (row.cust_code,),
+        "text": (row.cust_code, row.cust_name, row.phone),
+        "sort_at": None,
+    }
+
+
+def _shipto(row) -> dict[str, Any]:
+    address = ", ".join(part for part in (row.address_1, row.city, row.state) if part)
+    return {
+        "entity_key": f"{row.cust_key}:{row.seq_num}",
+        "system_id": None,
+        "title": row.shipto_name or address or f"Ship-to #{row.seq_num}",
+        "subtitle": " — ".join(part for part in (address, row.cust_name or row.cust_code) if part),
+        "target": (row.cust_code or row.cust_key or "").strip(),
+        "keywords": (row.cust_code,),
+        "text": (row.shipto_name, row.address_1, row.address_2, row.city, row.zip, row.cust_code, row.cust_name),
+        "sort_at": None,
+    }
+
+
+def _work_order(row) -> dict[str, Any]:
+    status = str(row.wo_status or "Open").title()
+    return {
+        "entity_key": str(row.id),
+        "system_id": row.branch_code,
+        "title": f"WO #{row.wo_id}",
+        "subtitle": f"SO {row.source_id} — {row.item_ptr or ''} — {status}",
+        "target": row.wo_id,
+        "keywords": (row.wo_id, row.source_id),
+        "text": (row.wo_id, row.source_id, row.item_ptr, row.department),
+        "sort_at": None,
+    }
+
+
+def _purchase_order(row) -> dict[str, Any]:
+    return {
+        "entity_key": f"{row.system_id}:{row.po_number}",
+        "system_id": row.system_id,
+        "title": f"PO #{row.po_number}",
+        "subtitle": row.supplier_name or row.supplier_code or "Purchase Order",
+        "target": row.po_number,
+        "keywords": (row.po_number,),
+        "text": (row.po_number, row.supplier_name, row.supplier_code, row.reference),
+        "sort_at": row.expect_date or row.order_date,
+    }
+
+
+def _pick(row) -> dict[str, Any]:
+    return {
+        "entity_key": str(row.id),
+        "system_id": row.branch_code,
+        "title": f"Pick — {row.name}",
+        "subtitle": f"SO {row.barcode_number}",
+        "target": row.barcode_number,
+        "keywords": (row.barcode_number,),
+        "text": (row.barcode_number, row.name),
+        # Completion time (None while in progress); the route renders it.
+        "sort_at": row.completed_time,
+    }
+
+
+SOURCES = (
+    SearchSource(
+        "order", "erp_mirror_so_header",
+        """
+        SELECT soh.system_id, soh.so_id, soh.po_number, soh.reference, soh.expect_date,
+               soh.is_deleted, c.cust_code, c.cust_name
+        FROM erp_mirror_so_header soh
+        LEFT JOIN erp_mirror_cust c ON TRIM(c.cust_key) = TRIM(soh.cust_key)
+        WHERE {changed}
+        """,
+        "soh.synced_at", _order,
+    ),
+    SearchSource(
+        "customer", "erp_mirror_cust",
+        """
+        SELECT c.cust_key, c.cust_code, c.cust_name, c.phone, c.is_deleted
+        FROM erp_mirror_cust c
+        WHERE {changed}
+        """,
+        "c.synced_at", _customer,
+    ),
+    SearchSource(
+        "shipto", "erp_mirror_cust_shipto",
+        """
+        SELECT cs.cust_key, cs.seq_num, cs.shipto_name, cs.address_1, cs.address_2, cs.city,
+               cs.state, cs.zip, cs.is_deleted, c.cust_code, c.cust_name
+        FROM erp_mirror_cust_shipto cs
+        LEFT JOIN erp_mirror_cust c ON TRIM(c.cust_key) = TRIM(cs.cust_key)
+        WHERE {changed}
+        """,
+        "cs.synced_at", _shipto,
+    ),
+    SearchSource(
+        "work_order", "erp_mirror_wo_header",
+        """
+        SELECT wo.id, wo.wo_id, wo.source_id, wo.item_ptr, wo.wo_status, wo.department,
+               wo.branch_code, wo.is_deleted
+        FROM erp_mirror_wo_header wo
+        WHERE {changed}
+        """,
+        "wo.synced_at", _work_order,
+    ),
+    SearchSource(
+        "po", "erp_mirror_po_header",
+        """
+        SELECT po.system_id, po.po_number, po.supplier_code, po.supplier_name, po.reference,
+               po.order_date, po.expect_date, po.is_deleted
+        FROM erp_mirror_po_header po
+        WHERE {changed}
+        """,
+        "po.synced_at", _purchase_order,
+    ),
+    SearchSource(
+        "pick", "pick",
+        """
+        SELECT p.id, p.barcode_number, p.completed_time, p.branch_code, ps.name,
+               false AS is_deleted
+        FROM pick p
+        JOIN pickster ps ON ps.id = p.picker_id
+        WHERE {changed}
+        """,
+        "COALESCE(p.completed_time, p.start_time)", _pick,
+    ),
+)
+SOURCES_BY_TYPE = {source.entity_type: source for source in SOURCES}
+ENTITY_TYPES = tuple(SOURCES_BY_TYPE)
+
+
+class SearchIndex:
+    """
+    The global search index (search_documents).
+
+    ``refresh()`` re-indexes mirror and pick rows changed since the last run
+    (the watermark lives in erp_sync_table_state like the mirror tables');
+    ``index_picks()`` applies local pick writes as they commit.  ``search()``
+    answers the search box with one ranked query: identifier exact / prefix
+    matches first, then full-text prefix matches (tsvector on PostgreSQL),
+    then plain substring matches, capped per entity type.
+    """
+
+    STATE_TABLE_NAME = "search_documents"
+    WATERMARK_OVERLAP = timedelta(minutes=2)
+    BATCH_SIZE = 1000
+
+    def __init__(self, engine=None) -> None:
+        if engine is None:
+            from app.extensions import db
+
+            engine = db.engine
+        self.engine = engine
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def is_ready(self) -> bool:
+        """True once a full build has completed."""
+        try:
+            with self.engine.connect() as conn:
+                value = conn.execute(
+                    text("SELECT last_success_at FROM erp_sync_table_state WHERE table_name = :table_name"),
+                    {"table_name": self.STATE_TABLE_NAME},
+                ).scalar()
+        except Exception:
+            return False
+        return value is not None
+
+    def search(self, query: str, limit: int = 15, per_type: int = 5, budget_ms: int = 250) -> dict[str, Any]:
+        """
+        Ranked hits for *query* as ``{"hits": [...], "timed_out": bool, "elapsed_ms": int}``.
+
+        On PostgreSQL the statement runs under ``statement_timeout = budget_ms``;
+        a cancelled search returns no hits with ``timed_out`` set rather than
+        holding up the search box.
+        """
+        started = time.perf_counter()
+        tokens = normalize(query).split()
+        if not tokens:
+            return {"hits": [], "timed_out": False, "elapsed_ms": 0}
+
+        phrase = " ".join(tokens)
+        params: dict[str, Any] = {
+            "exact": f"% {phrase} %",
+            "prefix": f"% {phrase}%",
+            "contains": f"%{phrase}%",
+            "per_type": per_type,
+            "limit": limit,
+        }
+        postgres = self.engine.dialect.name == "postgresql"
+        if postgres:
+            params["tsquery"] = " & ".join(f"{token}:*" for token in tokens)
+            matched = "d.search_vector @@ to_tsquery('simple', :tsquery)"
+            text_score = f"CASE WHEN {matched} THEN ts_rank(d.search_vector, to_tsquery('simple', :tsquery)) ELSE 0 END"
+        else:
+            token_clauses = []
+            for index, token in enumerate(tokens):
+                params[f"token_{index}"] = f"% {token}%"
+                token_clauses.append(f"(' ' || d.search_text) LIKE :token_{index}")
+            matched = " AND ".join(token_clauses)
+            text_score = f"CASE WHEN {matched} THEN 1 ELSE 0 END"
+
+        score = (
+            "(CASE WHEN (' ' || d.keywords || ' ') LIKE :exact THEN 4"
+            " WHEN (' ' || d.keywords) LIKE :prefix THEN 2 ELSE 0 END"
+            f" + {text_score})"
+        )
+        sql = f"""
+            SELECT entity_type, entity_key, system_id, title, subtitle, target, sort_at, score
+            FROM (
+                SELECT
+                    d.entity_type, d.entity_key, d.system_id, d.title, d.subtitle, d.target, d.sort_at,
+                    {score} AS score,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY d.entity_type
+                        ORDER BY {score} DESC, d.sort_at DESC NULLS LAST, d.id DESC
+                    ) AS type_rank
+                FROM search_documents d
+                WHERE ({matched}) OR d.search_text LIKE :contains
+            ) ranked
+            WHERE type_rank <= :per_type
+            ORDER BY score DESC, sort_at DESC NULLS LAST, entity_type, entity_key
+            LIMIT :limit
+        """
+        timed_out = False
+        hits: list[dict[str, Any]] = []
+        try:
+            with self.engine.begin() as conn:
+                if postgres:
+                    conn.execute(text(f"SET LOCAL statement_timeout = {int(budget_ms)}"))
+                statement = text(sql).columns(sort_at=DateTime)
+                hits = [dict(row) for row in conn.execute(statement, params).mappings()]
+        except DBAPIError as exc:
+            if not postgres or "statement timeout" not in str(exc.orig):
+                raise
+            timed_out = True
+        return {
+            "hits": hits,
+            "timed_out": timed_out,
+            "elapsed_ms": int((time.perf_counter() - started) * 1000),
+        }
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def refresh(self, rebuild: bool = False) -> dict[str, Any]:
+        """Re-index rows changed since the last run; a full rebuild on first run or on request."""
+        started = datetime.utcnow()
+        since = None if rebuild else self._load_watermark()
+        available = self._existing_sources()
+        documents = {}
+        for source in SOURCES:
+            if source.table not in available:
+                continue
+            documents[source.entity_type] = self._index_source(source, since)
+        duration_ms = int((datetime.utcnow() - started).total_seconds() * 1000)
+        self._record_state(started - self.WATERMARK_OVERLAP, sum(documents.values()), duration_ms)
+        return {
+            "mode": "rebuild" if since is None else "incremental",
+            "documents": documents,
+            "duration_ms": duration_ms,
+        }
+
+    def index_picks(self, pick_ids: Iterable[int] = (), deleted_ids: Iterable[int] = (),
+                    picker_ids: Iterable[int] = ()) -> int:
+        """Re-index picks after local writes: *pick_ids*, every pick of
+        *picker_ids* (a rename changes their titles); *deleted_ids* are removed."""
+        deleted_keys = sorted({str(pick_id) for pick_id in deleted_ids})
+        params = {
+            "pick_ids": sorted({int(pick_id) for pick_id in pick_ids}),
+            "picker_ids": sorted({int(picker_id) for picker_id in picker_ids}),
+        }
+        source = SOURCES_BY_TYPE["pick"]
+        statement = text(source.sql.format(changed="(p.id IN :pick_ids OR p.picker_id IN :picker_ids)")).bindparams(
+            bindparam("pick_ids", expanding=True), bindparam("picker_ids", expanding=True)
+        )
+        with self.engine.begin() as conn:
+            if deleted_keys:
+                conn.execute(delete(DOCUMENTS).where(
+                    DOCUMENTS.c.entity_type == "pick", DOCUMENTS.c.entity_key.in_(deleted_keys)
+                ))
+            if not (params["pick_ids"] or params["picker_ids"]):
+                return 0
+            return self._write(conn, source, conn.execute(statement, params).fetchall())
+
+    def _index_source(self, source: SearchSource, since: datetime | None) -> int:
+        changed = "1 = 1" if since is None else f"{source.changed_column} > :since"
+        statement = text(source.sql.format(changed=changed))
+        written = 0
+        with self.engine.begin() as conn:
+            if since is None:
+                conn.execute(delete(DOCUMENTS).where(DOCUMENTS.c.entity_type == source.entity_type))
+            result = conn.execution_options(stream_results=True, yield_per=self.BATCH_SIZE).execute(
+                statement, {"since": since} if since is not None else {}
+            )
+            for rows in result.partitions(self.BATCH_SIZE):
+                written += self._write(conn, source, rows, replace=since is not None)
+        return written
+
+    def _write(self, conn, source: SearchSource, rows, replace: bool = True) -> int:
+        now = datetime.utcnow()
+        live: dict[str, dict[str, Any]] = {}
+        stale: list[str] = []
+        for row in rows:
+            document = source.build(row)
+            key = _clip(document["entity_key"], 160)
+            if row.is_deleted:
+                stale.append(key)
+                live.pop(key, None)
+                continue
+            live[key] = {
+                "entity_type": source.entity_type,
+                "entity_key": key,
+                "system_id": document["system_id"],
+                "title": _clip(document["title"], 255),
+                "subtitle": _clip(document["subtitle"], 255),
+                "target": _clip(document["target"], 128),
+                "keywords": normalize(*document["keywords"])[:255],
+                "search_text": normalize(*document["text"]),
+                "sort_at": _coerce_datetime(document["sort_at"]),
+                "updated_at": now,
+            }
+        if replace and (live or stale):
+            keys = list(live) + stale
+            conn.execute(delete(DOCUMENTS).where(
+                DOCUMENTS.c.entity_type == source.entity_type, DOCUMENTS.c.entity_key.in_(keys)
+            ))
+        if live:
+            conn.execute(insert(DOCUMENTS), list(live.values()))
+        return len(live)
+
+    def _existing_sources(self) -> set[str]:
+        inspector = inspect(self.engine)
+        return {source.table for source in SOURCES if inspector.has_table(source.table)}
+
+    def _load_watermark(self) -> datetime | None:
+        try:
+            with self.engine.connect() as conn:
+                value = conn.execute(
+                    text(
+                        "SELECT last_source_updated_at FROM erp_sync_table_state "
+                        "WHERE table_name = :table_name AND last_success_at IS NOT NULL"
+                    ),
+                    {"table_name": self.STATE_TABLE_NAME},
+                ).scalar()
+        except Exception:
+            return None
+        return _coerce_datetime(value)
+
+    def _record_state(self, watermark: datetime, row_count: int, duration_ms: int) -> None:
+        now = datetime.utcnow()
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    """
+                    INSERT INTO erp_sync_table_state (
+                        table_name, family, strategy, last_status, last_success_at,
+                        last_source_updated_at, last_row_count, last_duration_ms
+                    ) VALUES (
+                        :table_name, 'master', 'incremental', 'success', :now,
+                        :watermark, :row_count, :duration_ms
+                    )
+                    ON CONFLICT (table_name) DO UPDATE SET
+                        last_status = 'success',
+                        last_success_at = :now,
+                        last_error = NULL,
+                        last_source_updated_at = :watermark,
+                        last_row_count = :row_count,
+                        last_duration_ms = :duration_ms
+                    """
+                ),
+                {
+                    "table_name": self.STATE_TABLE_NAME,
+                    "now": now,
+                    "watermark": watermark,
+                    "row_count": row_count,
+                    "duration_ms": duration_ms,
+                },
+            )
+
+
+def refresh_search_index(rebuild: bool = False) -> dict[str, Any]:
+    """Sync-worker entry point."""
+    result = SearchIndex().refresh(rebuild=rebuild)
+    counts = ", ".join(f"{name} {count}" for name, count in result["documents"].items())
+    print(f"[{datetime.now()}] Search index {result['mode']}: {counts or 'no sources'} in {result['duration_ms']}ms")
+    return result
+
+
+# ----------------------------------------------------------------------
+# Local writes
+# ----------------------------------------------------------------------
+
+def _collect_pick_changes(session, flush_context):
+    from app.Models.models import Pick, Pickster
+
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Pick):
+            kind = "deleted" if obj in session.deleted else "changed"
+        elif isinstance(obj, Pickster) and obj in session.dirty:
+            kind = "pickers"
+        else:
+            continue
+        if obj.id is not None:
+            pending = session.info.setdefault(
+                "search_index_picks", {"changed": set(), "deleted": set(), "pickers": set()}
+            )
+            pending[kind].add(obj.id)
+
+
+def _index_committed_picks(session):
+    pending = session.info.pop("search_index_picks", None)
+    if not pending:
+        return
+    try:
+        SearchIndex().index_picks(
+            pending["changed"] - pending["deleted"], pending["deleted"], pending["pickers"]
+        )
+    except Exception as exc:
+        # The sync worker's next refresh picks these up; never fail the write.
+        print(f"[{datetime.now()}] Search index update for picks failed: {exc}")
+
+
+def _discard_pick_changes(session, previous_transaction=None):
+    session.info.pop("search_index_picks", None)
+
+
+def init_search_index(session):
+    """Keep pick documents current as local pick writes commit."""
+    if event.contains(session, "after_commit", _index_committed_picks):
+        return
+    event.listen(session, "after_flush", _collect_pick_changes)
+    event.listen(session, "after_commit", _index_committed_picks)
+    event.listen(session, "after_soft_rollback", _discard_pick_changes)
+
+
+def main() -> None:
+    import argparse
+
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description="Build or refresh the global search index.")
+    parser.add_argument("--rebuild", action="store_true", help="Re-index every source row")
+    args = parser.parse_args()
+    with create_app().app_context():
+        refresh_search_index(rebuild=args.rebuild)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""Server-side spatial index over dispatch stops and live vehicle positions.
+
+The dispatch board used to download every stop in its date window plus the
+whole fleet and do all distance work in the browser.  This keeps both in a
+uniform lat/lon grid per worker so the API can answer radius, k-nearest and
+bounding-box queries directly.
+
+A grid rather than an R-tree: stops cluster around a handful of branches and
+vehicles move every poll.  Moving a point in a grid is a dict update, with
+no rebalancing, and ``GridIndex.sync()`` only touches the points that were
+added, moved, changed or dropped since the last load.
+
+* Vehicles are synced from the Samsara poller's snapshot whenever its
+  ``fetched_at`` changes.
+* Stops are indexed per (start, end, branch) scope from
+  ``get_enriched_dispatch_stops``.  A scope is reloaded and diffed once it is
+  ``SPATIAL_STOPS_REFRESH_SECONDS`` old, or sooner after the sync worker
+  announces a change (live-update notifications).  Local route assignment
+  changes every few seconds while dispatchers plan, so
+  ``route_assigned`` is overlaid from dispatch_route_stops at query time
+  instead of being part of the indexed payload.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterable
+
+from app.runtime_settings import get_spatial_index_settings
+from app.Services.route_optimizer import haversine_miles
+
+logger = logging.getLogger(__name__)
+
+MILES_PER_DEGREE_LAT = 69.0
+
+
+def _miles_per_degree_lon(lat: float) -> float:
+    return MILES_PER_DEGREE_LAT * max(math.cos(math.radians(min(abs(lat), 89.0))), 0.01)
+
+
+def _ring(centre_lat: int, centre_lon: int, ring: int) -> Iterable[tuple[int, int]]:
+    """Cells exactly *ring* steps (Chebyshev) from the centre cell."""
+    if ring == 0:
+        yield (centre_lat, centre_lon)
+        return
+    for lo in range(centre_lon - ring, centre_lon + ring + 1):
+        yield (centre_lat - ring, lo)
+        yield (centre_lat + ring, lo)
+    for la in range(centre_lat - ring + 1, centre_lat + ring):
+        yield (la, centre_lon - ring)
+        yield (la, centre_lon + ring)
+
+
+class GridIndex:
+    """Points keyed by id in square lat/lon cells of *cell_degrees*."""
+
+    def __init__(self, cell_degrees: float = 0.05):
+        self.cell_degrees = cell_degrees
+        self._points: dict[Any, tuple[float, float, Any]] = {}
+        self._cells: dict[tuple[int, int], set] = {}
+        self._lock = threading.RLock()
+
+    def _cell(self, lat: float, lon: float) -> tuple[int, int]:
+        return (math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees))
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def get(self, key) -> tuple[float, float, Any] | None:
+        return self._points.get(key)
+
+    def items(self) -> list[tuple[Any, float, float, Any]]:
+        with self._lock:
+            return [(key, lat, lon, item) for key, (lat, lon, item) in self._points.items()]
+
+    def upsert(self, key, lat: float, lon: float, item: Any = None) -> None:
+        with self._lock:
+            self._discard(key)
+            self._points[key] = (lat, lon, item)
+            self._cells.setdefault(self._cell(lat, lon), set()).add(key)
+
+    def remove(self, key) -> bool:
+        with self._lock:
+            return self._discard(key)
+
+    def _discard(self, key) -> bool:
+        previous = self._points.pop(key, None)
+        if previous is None:
+            return False
+        cell = self._cell(previous[0], previous[1])
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(key)
+            if not members:
+                del self._cells[cell]
+        return True
+
+    def sync(self, points: dict[Any, tuple[float, float, Any]]) -> dict[str, int]:
+        """Make the index hold exactly *points* ({key: (lat, lon, item)}),
+        touching only what differs from its current contents."""
+        counts = {"added": 0, "moved": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        with self._lock:
+            for key in [key for key in self._points if key not in points]:
+                self._discard(key)
+                counts["removed"] += 1
+            for key, (lat, lon, item) in points.items():
+                current = self._points.get(key)
+                if current is None:
+                    counts["added"] += 1
+                elif (current[0], current[1]) != (lat, lon):
+                    counts["moved"] += 1
+                elif current[2] != item:
+                    # Same cell: swap the payload in place.
+                    self._points[key] = (lat, lon, item)
+                    counts["updated"] += 1
+                    continue
+                else:
+                    counts["unchanged"] += 1
+                    continue
+                self.upsert(key, lat, lon, item)
+        return counts
+
+    def _cells_between(self, south, west, north, east) -> Iterable[set]:
+        lat_lo, lon_lo = self._cell(south, west)
+        lat_hi, lon_hi = self._cell(north, east)
+        if (lat_hi - lat_lo + 1) * (lon_hi - lon_lo + 1) > len(self._cells):
+            # A window wider than the occupied cells: walk those instead.
+            return [
+                members for (la, lo), members in self._cells.items()
+                if lat_lo <= la <= lat_hi and lon_lo <= lo <= lon_hi
+            ]
+        return [
+            self._cells[(la, lo)]
+            for la in range(lat_lo, lat_hi + 1)
+            for lo in range(lon_lo, lon_hi + 1)
+            if (la, lo) in self._cells
+        ]
+
+    def bbox(self, south: float, west: float, north: float, east: float,
+             predicate: Callable[[Any], bool] | None = None) -> list[tuple[Any, Any]]:
+        """[(key, item)] inside the box (edges included)."""
+        with self._lock:
+            found = []
+            for members in self._cells_between(south, west, north, east):
+                for key in members:
+                    lat, lon, item = self._points[key]
+                    if south <= lat <= north and west <= lon <= east and (predicate is None or predicate(item)):
+                        found.append((key, item))
+            return found
+
+    def within(self, lat: float, lon: float, miles: float,
+               predicate: Callable[[Any], bool] | None = None) -> list[tuple[float, Any, Any]]:
+        """[(distance_miles, key, item)] within *miles* of (lat, lon), nearest first."""
+        dlat = miles / MILES_PER_DEGREE_LAT
+        dlon = miles / _miles_per_degree_lon(abs(lat) + dlat)
+        with self._lock:
+            found = []
+            for members in self._cells_between(lat - dlat, lon - dlon, lat + dlat, lon + dlon):
+                for key in members:
+                    plat, plon, item = self._points[key]
+                    distance = haversine_miles(lat, lon, plat, plon)
+                    if distance <= miles and (predicate is None or predicate(item)):
+                        found.append((distance, key, item))
+        found.sort(key=lambda hit: hit[0])
+        return found
+
+    def nearest(self, lat: float, lon: float, k: int = 1, max_miles: float | None = None,
+                predicate: Callable[[Any], bool] | None = None) -> list[tuple[float, Any, Any]]:
+        """The *k* points nearest (lat, lon), searching rings of cells outwards."""
+        if k < 1:
+            return []
+        with self._lock:
+            if not self._cells:
+                return []
+            lat_cells = [cell[0] for cell in self._cells]
+            lon_cells = [cell[1] for cell in self._cells]
+            centre_lat, centre_lon = self._cell(lat, lon)
+            max_ring = max(
+                abs(centre_lat - min(lat_cells)), abs(centre_lat - max(lat_cells)),
+                abs(centre_lon - min(lon_cells)), abs(centre_lon - max(lon_cells)),
+            )
+            best: list[tuple[float, Any, Any]] = []
+            for ring in range(max_ring + 1):
+                for cell in _ring(centre_lat, centre_lon, ring):
+                    for key in self._cells.get(cell, ()):
+                        plat, plon, item = self._points[key]
+                        if predicate is not None and not predicate(item):
+                            continue
+                        best.append((haversine_miles(lat, lon, plat, plon), key, item))
+                best.sort(key=lambda hit: hit[0])
+                del best[k:]
+                # Anything not yet seen lies at least `ring` whole cells away.
+                reach = ring * self.cell_degrees * min(
+                    MILES_PER_DEGREE_LAT, _miles_per_degree_lon(abs(lat) + (ring + 1) * self.cell_degrees)
+                )
+                if max_miles is not None and reach > max_miles:
+                    break
+                if len(best) == k and best[-1][0] <= reach:
+                    break
+        if max_miles is not None:
+            best = [hit for hit in best if hit[0] <= max_miles]
+        return best
+
+
+class _StopScope:
+    def __init__(self, cell_degrees):
+        self.index = GridIndex(cell_degrees)
+        self.loaded_at = 0.0
+        self.dirty = True
+        self.branches: set[str] | None = None
+        self.lock = threading.Lock()
+
+
+def stop_key(stop: dict[str, Any]) -> str:
+    return f"{stop.get('id')}:{stop.get('shipment_num') or ''}"
+
+
+class DispatchSpatialIndex:
+    """One worker's stop scopes and vehicle grid."""
+
+    def __init__(self, load_stops: Callable[..., list[dict[str, Any]]], settings: dict[str, Any] | None = None):
+        self.settings = settings or get_spatial_index_settings()
+        self.load_stops = load_stops  # (start, end, branch) -> stop dicts with lat/lon
+        self.vehicles = GridIndex(self.settings["cell_degrees"])
+        self._vehicles_version = None
+        self._scopes: OrderedDict[tuple, _StopScope] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"stop_loads": 0, "stop_load_errors": 0, "vehicle_syncs": 0,
+                      "last_stop_sync": None, "last_vehicle_sync": None}
+
+    # -- vehicles ---------------------------------------------------------
+
+    def sync_vehicles(self, vehicles: list[dict[str, Any]], version=None) -> dict[str, int] | None:
+        """Index the poller's latest positions; a repeat of *version* is a no-op."""
+        if version is not None and version == self._vehicles_version:
+            return None
+        points = {
+            str(vehicle["id"]): (float(vehicle["lat"]), float(vehicle["lon"]), vehicle)
+            for vehicle in vehicles
+            if vehicle.get("id") is not None and vehicle.get("lat") is not None and vehicle.get("lon") is not None
+        }
+        counts = self.vehicles.sync(points)
+        self._vehicles_version = version
+        self.stats["vehicle_syncs"] += 1
+        self.stats["last_vehicle_sync"] = counts
+        return counts
+
+    # -- stops ------------------------------------------------------------
+
+    def stops(self, start, end, branch: str | None = None) -> GridIndex:
+        """The grid for one date window and branch, reloaded when stale."""
+        scope_key = (str(start), str(end), (branch or "").upper())
+        with self._lock:
+            scope = self._scopes.get(scope_key)
+            if scope is None:
+                scope = self._scopes[scope_key] = _StopScope(self.settings["cell_degrees"])
+                while len(self._scopes) > self.settings["max_scopes"]:
+                    self._scopes.popitem(last=False)
+            self._scopes.move_to_end(scope_key)
+
+        if self._is_stale(scope):
+            with scope.lock:
+                if self._is_stale(scope):
+                    self._reload(scope, start, end, branch)
+        return scope.index
+
+    def _is_stale(self, scope: _StopScope) -> bool:
+        return scope.dirty or time.monotonic() - scope.loaded_at > self.settings["stops_refresh_seconds"]
+
+    def _reload(self, scope: _StopScope, start, end, branch) -> None:
+        try:
+            rows = self.load_stops(start, end, branch)
+        except Exception as exc:
+            self.stats["stop_load_errors"] += 1
+            if scope.loaded_at:
+                logger.warning("Spatial index stop reload failed, serving the previous load: %s", exc)
+                return
+            raise
+        points = {}
+        for row in rows:
+            if row.get("lat") is None or row.get("lon") is None:
+                continue
+            # Assignment is overlaid per query; keep it out of the diff.
+            item = {k: v for k, v in row.items() if k not in ("route_assigned", "local_route_id", "local_route_name")}
+            points[stop_key(row)] = (float(row["lat"]), float(row["lon"]), item)
+        counts = scope.index.sync(points)
+        scope.branches = {row.get("branch") for row in rows if row.get("branch")}
+        scope.loaded_at = time.monotonic()
+        scope.dirty = False
+        self.stats["stop_loads"] += 1
+        self.stats["last_stop_sync"] = counts
+
+    def on_change(self, source: str, branches: set[str] | None) -> None:
+        """Live-update listener: mirror syncs mark the affected scopes stale."""
+        if source != "sync":
+            return
+        with self._lock:
+            for scope in self._scopes.values():
+                if branches is None or scope.branches is None or scope.branches & set(branches):
+                    scope.dirty = True
+
+    def describe(self) -> dict[str, Any]:
+        with self._lock:
+            scopes = [
+                {"start": key[0], "end": key[1], "branch": key[2] or None, "stops": len(scope.index),
+                 "age_seconds": round(time.monotonic() - scope.loaded_at, 1) if scope.loaded_at else None}
+                for key, scope in self._scopes.items()
+            ]
+        return {"vehicles": len(self.vehicles), "scopes": scopes, **self.stats}
+
+
+_index: DispatchSpatialIndex | None = None
+_index_lock = threading.Lock()
+
+
+def _load_enriched_stops(start, end, branch):
+    from app.Services.erp_service import ERPService
+
+    return ERPService().get_enriched_dispatch_stops(start=start, end=end, include_no_gps=False, branches=branch)
+
+
+def get_spatial_index() -> DispatchSpatialIndex:
+    """The worker's DispatchSpatialIndex, created (and subscribed to live
+    updates) on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = DispatchSpatialIndex(_load_enriched_stops)
+                try:
+                    from app.Services.live_updates import get_live_hub
+
+                    get_live_hub().broker.add_listener(index.on_change)
+                except Exception as exc:
+                    logger.warning("Spatial index is not subscribed to live updates: %s", exc)
+                _index = index
+    return _index
+
+
+def reset_spatial_index() -> None:
+    global _index
+    with _index_lock:
+        _index = None
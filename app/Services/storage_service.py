@@ -13,8 +13,6 @@ Requires env vars: R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY, R2_BUCKET, R2_ENDPOIN
 import mimetypes
 from datetime import datetime
 
-import boto3
-from botocore.config import Config as BotoConfig
 from flask import current_app
 
 
@@ -40,6 +38,14 @@ class StorageService:
                     'R2 storage is not configured. Set R2_ACCESS_KEY_ID, '
                     'R2_SECRET_ACCESS_KEY, R2_ENDPOINT_URL, and R2_BUCKET.'
                 )
+            # boto3 costs ~0.1s to import; only pay it once a file is touched.
+            import boto3
+            from botocore.config import Config as BotoConfig
+
+            from app.runtime_settings import get_web_server_settings
+
+            web = get_web_server_settings()
+
             self._client = boto3.client(
                 's3',
                 endpoint_url=current_app.config['R2_ENDPOINT_URL'],
@@ -48,6 +54,11 @@ class StorageService:
                 config=BotoConfig(
                     signature_version='s3v4',
                     retries={'max_attempts': 3, 'mode': 'adaptive'},
+                    # Bound how long an upload can hold a request thread, and
+                    # allow one pooled connection per concurrent request.
+                    connect_timeout=5,
+                    read_timeout=web['outbound_timeout_seconds'] * 3,
+                    max_pool_connections=max(10, web['concurrency']),
                 ),
             )
         return self._client
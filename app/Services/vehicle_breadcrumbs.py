@@ -0,0 +1,337 @@
+"""Vehicle breadcrumb history: every GPS fix the Samsara poller sees.
+
+``vehicle_breadcrumbs`` is append-only, keyed by (vehicle_id, recorded_at).
+On PostgreSQL it is range-partitioned by day; ``BreadcrumbStore.append``
+creates a day's partition the first time a fix for that day arrives, and
+retention drops whole partitions instead of deleting rows.
+
+Reads never scan a whole day:
+
+* ``track(vehicle, start, end)`` is a primary-key range scan, limited to the
+  partitions the range overlaps;
+* ``positions_at(instant)`` reads only the ``instant_lookback_minutes``
+  before the instant, found through the BRIN index on recorded_at, and keeps
+  each vehicle's latest fix in that window.
+
+``maintain()`` downsamples fixes older than ``downsample_after_days`` to one
+per vehicle per ``downsample_seconds``, a day at a time, and applies
+``retention_days``.
+
+    python -m app.Services.vehicle_breadcrumbs --maintain
+"""
+from __future__ import annotations
+
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import and_, func, select, text
+
+from app.Models.dispatch_models import VehicleBreadcrumb
+from app.runtime_settings import get_breadcrumb_settings
+
+BREADCRUMBS = VehicleBreadcrumb.__table__
+PARTITION_PREFIX = "vehicle_breadcrumbs_"
+
+
+def parse_located_at(value) -> datetime | None:
+    """Naive UTC datetime from a poller ``located_at`` (ISO 8601, usually ``...Z``)."""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _as_datetime(value):
+    # sqlite hands DATETIME columns back as text from raw SQL.
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _row_to_point(row) -> dict[str, Any]:
+    return {
+        "vehicle_id": row.vehicle_id,
+        "recorded_at": _as_datetime(row.recorded_at).isoformat() + "Z",
+        "lat": row.lat,
+        "lon": row.lon,
+        "heading": row.heading,
+        "speed": row.speed,
+        "branch": row.branch_code,
+    }
+
+
+class BreadcrumbStore:
+    """Append, query and age out vehicle breadcrumbs."""
+
+    def __init__(self, engine=None, settings=None) -> None:
+        if engine is None:
+            from app.extensions import db
+
+            engine = db.engine
+        self.engine = engine
+        self.settings = settings or get_breadcrumb_settings()
+        self._partitioned = None
+        self._partitions = set()  # day partitions known to exist
+        self._downsampled = set()  # days wholly past the cutoff, already thinned
+
+    # -- partitions --------------------------------------------------------
+
+    def is_partitioned(self, conn) -> bool:
+        if self._partitioned is None:
+            self._partitioned = conn.dialect.name == "postgresql" and conn.execute(
+                text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('vehicle_breadcrumbs')")
+            ).scalar() is True
+        return self._partitioned
+
+    def _ensure_partitions(self, conn, days) -> set[date]:
+        """Create missing day partitions in *conn*'s transaction.  Returns the
+        days created; the caller records them once that transaction commits."""
+        created = set()
+        for day in sorted(set(days) - self._partitions):
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {PARTITION_PREFIX}{day:%Y%m%d} "
+                "PARTITION OF vehicle_breadcrumbs "
+                f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+            ))
+            created.add(day)
+        return created
+
+    def partitions(self, conn) -> dict[date, str]:
+        rows = conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass('vehicle_breadcrumbs')"
+        )).scalars()
+        output = {}
+        for name in rows:
+            try:
+                output[datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d").date()] = name
+            except ValueError:
+                continue  # not one of ours
+        return output
+
+    # -- writes ------------------------------------------------------------
+
+    def append(self, vehicles) -> int:
+        """Record the fixes in *vehicles* (normalized poller dicts).  Fixes already
+        stored are skipped, so re-appending an unchanged poll is harmless.
+        Returns the number of fixes offered after dropping unusable ones."""
+        rows = {}
+        for vehicle in vehicles:
+            recorded_at = parse_located_at(vehicle.get("located_at"))
+            if not vehicle.get("id") or recorded_at is None or vehicle.get("lat") is None or vehicle.get("lon") is None:
+                continue
+            heading = vehicle.get("heading")
+            rows[(str(vehicle["id"]), recorded_at)] = {
+                "vehicle_id": str(vehicle["id"]),
+                "recorded_at": recorded_at,
+                "lat": float(vehicle["lat"]),
+                "lon": float(vehicle["lon"]),
+                "heading": int(heading) if heading is not None else None,
+                "speed": float(vehicle["speed"]) if vehicle.get("speed") is not None else None,
+                "branch_code": vehicle.get("branch"),
+            }
+        if not rows:
+            return 0
+        created = set()
+        with self.engine.begin() as conn:
+            if self.is_partitioned(conn):
+                created = self._ensure_partitions(conn, {key[1].date() for key in rows})
+            conn.execute(self._insert_ignoring_duplicates(conn), list(rows.values()))
+        # A failed insert rolls the CREATE TABLEs back with it.
+        self._partitions |= created
+        self._downsampled -= {key[1].date() for key in rows}
+        return len(rows)
+
+    @staticmethod
+    def _insert_ignoring_duplicates(conn):
+        if conn.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        elif conn.dialect.name == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            return BREADCRUMBS.insert().prefix_with("IGNORE")
+        return insert(BREADCRUMBS).on_conflict_do_nothing(index_elements=["vehicle_id", "recorded_at"])
+
+    # -- reads -------------------------------------------------------------
+
+    def track(self, vehicle_id, start: datetime, end: datetime) -> list[dict[str, Any]]:
+        """Fixes for one vehicle with start <= recorded_at < end, oldest first."""
+        query = (
+            BREADCRUMBS.select()
+            .where(and_(
+                BREADCRUMBS.c.vehicle_id == str(vehicle_id),
+                BREADCRUMBS.c.recorded_at >= start,
+                BREADCRUMBS.c.recorded_at < end,
+            ))
+            .order_by(BREADCRUMBS.c.recorded_at)
+        )
+        with self.engine.connect() as conn:
+            return [_row_to_point(row) for row in conn.execute(query)]
+
+    def positions_at(self, at: datetime, branch: str | None = None,
+                     lookback: timedelta | None = None) -> list[dict[str, Any]]:
+        """Each vehicle's latest fix at or before *at*, ignoring vehicles with no
+        fix in the *lookback* before it."""
+        lookback = lookback or timedelta(minutes=self.settings["instant_lookback_minutes"])
+        params = {"since": at - lookback, "at": at}
+        branch_filter = ""
+        if branch:
+            branch_filter = "WHERE b.branch_code = :branch "
+            params["branch"] = branch.upper()
+        sql = (
+            "SELECT b.vehicle_id, b.recorded_at, b.lat, b.lon, b.heading, b.speed, b.branch_code "
+            "FROM vehicle_breadcrumbs b "
+            "JOIN ("
+            "  SELECT vehicle_id, MAX(recorded_at) AS recorded_at "
+            "  FROM vehicle_breadcrumbs "
+            "  WHERE recorded_at > :since AND recorded_at <= :at "
+            "  GROUP BY vehicle_id"
+            ") latest ON latest.vehicle_id = b.vehicle_id AND latest.recorded_at = b.recorded_at "
+            f"{branch_filter}"
+            "ORDER BY b.vehicle_id"
+        )
+        with self.engine.connect() as conn:
+            return [_row_to_point(row) for row in conn.execute(text(sql), params)]
+
+    # -- ageing ------------------------------------------------------------
+
+    def downsample(self, now: datetime | None = None) -> int:
+        """Keep the first fix per vehicle per ``downsample_seconds`` bucket in
+        every day older than ``downsample_after_days``, one transaction per day.
+        Returns rows removed."""
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(days=self.settings["downsample_after_days"])
+        with self.engine.connect() as conn:
+            if self.is_partitioned(conn):
+                days = sorted(day for day in self.partitions(conn) if day <= cutoff.date())
+            else:
+                first = _as_datetime(conn.execute(
+                    select(func.min(BREADCRUMBS.c.recorded_at)).where(BREADCRUMBS.c.recorded_at < cutoff)
+                ).scalar())
+                days = [] if first is None else [
+                    first.date() + timedelta(days=n) for n in range((cutoff.date() - first.date()).days + 1)
+                ]
+        removed = 0
+        for day in days:
+            if day in self._downsampled:
+                continue
+            start = datetime.combine(day, datetime.min.time())
+            end = min(start + timedelta(days=1), cutoff)
+            removed += self._downsample_range(start, end)
+            if end < cutoff:
+                self._downsampled.add(day)
+        return removed
+
+    def _downsample_range(self, start: datetime, end: datetime) -> int:
+        with self.engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                bucket = "floor(extract(epoch FROM recorded_at) / :seconds)"
+            else:
+                bucket = "CAST(strftime('%s', recorded_at) AS INTEGER) / :seconds"
+            result = conn.execute(
+                text(
+                    "DELETE FROM vehicle_breadcrumbs "
+                    "WHERE recorded_at >= :start AND recorded_at < :end "
+                    "  AND (vehicle_id, recorded_at) IN ("
+                    "    SELECT vehicle_id, recorded_at FROM ("
+                    "      SELECT vehicle_id, recorded_at, row_number() OVER ("
+                    f"        PARTITION BY vehicle_id, {bucket} ORDER BY recorded_at"
+                    "      ) AS rn "
+                    "      FROM vehicle_breadcrumbs "
+                    "      WHERE recorded_at >= :start AND recorded_at < :end"
+                    "    ) ranked WHERE rn > 1"
+                    "  )"
+                ),
+                {"start": start, "end": end, "seconds": self.settings["downsample_seconds"]},
+            )
+            return result.rowcount or 0
+
+    def apply_retention(self, now: datetime | None = None) -> int:
+        """Remove fixes older than ``retention_days``: whole day partitions on
+        PostgreSQL, a DELETE elsewhere.  Returns partitions dropped or rows deleted."""
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(days=self.settings["retention_days"])
+        with self.engine.begin() as conn:
+            if not self.is_partitioned(conn):
+                result = conn.execute(
+                    BREADCRUMBS.delete().where(BREADCRUMBS.c.recorded_at < cutoff)
+                )
+                return result.rowcount or 0
+            dropped = 0
+            for day, name in sorted(self.partitions(conn).items()):
+                if day + timedelta(days=1) <= cutoff.date():
+                    conn.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+                    self._partitions.discard(day)
+                    self._downsampled.discard(day)
+                    dropped += 1
+            return dropped
+
+    def maintain(self, now: datetime | None = None) -> dict[str, Any]:
+        started = time.monotonic()
+        summary = {"downsampled": self.downsample(now), "expired": self.apply_retention(now)}
+        summary["duration_ms"] = int((time.monotonic() - started) * 1000)
+        return summary
+
+
+_store = None
+
+
+def get_breadcrumb_store() -> BreadcrumbStore:
+    global _store
+    if _store is None:
+        _store = BreadcrumbStore()
+    return _store
+
+
+def record_vehicle_breadcrumbs(poller=None, store=None) -> int:
+    """Sync-worker entry point: append the poller's latest fixes."""
+    settings = get_breadcrumb_settings()
+    if not settings["enabled"]:
+        return 0
+    if poller is None:
+        from app.runtime_settings import get_samsara_settings
+        from app.Services.samsara_service import get_location_poller
+
+        if not get_samsara_settings()["api_token"]:
+            return 0
+        poller = get_location_poller()
+    vehicles, _fetched_at = poller.snapshot()
+    return (store or get_breadcrumb_store()).append(vehicles)
+
+
+def maintain_vehicle_breadcrumbs(store=None, now: datetime | None = None) -> dict[str, Any]:
+    """Sync-worker entry point: downsampling and retention."""
+    result = (store or get_breadcrumb_store()).maintain(now)
+    if result["downsampled"] or result["expired"]:
+        print(
+            f"[{datetime.now()}] Vehicle breadcrumbs: downsampled {result['downsampled']} fixes, "
+            f"expired {result['expired']} in {result['duration_ms']}ms"
+        )
+    return result
+
+
+def main() -> None:
+    import argparse
+
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description="Record or maintain vehicle breadcrumb history.")
+    parser.add_argument("--maintain", action="store_true", help="Downsample and expire old breadcrumbs")
+    args = parser.parse_args()
+    with create_app().app_context():
+        if args.maintain:
+            maintain_vehicle_breadcrumbs()
+        else:
+            print(f"[{datetime.now()}] Recorded {record_vehicle_breadcrumbs()} vehicle fixes")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,9 @@
 import os
 
 from flask import Flask
-from flask_migrate import upgrade
-from .extensions import db, migrate
-from .Models.models import AppUser, CreditImage, CustomerNote, DashboardStats, ERPMirrorArOpen, ERPMirrorArOpenDetail, ERPMirrorCustomer, ERPMirrorCustomerShipTo, ERPMirrorItem, ERPMirrorItemBranch, ERPMirrorItemSupplier, ERPMirrorItemUomConv, ERPMirrorPickDetailNormalized, ERPMirrorPickHeaderNormalized, ERPMirrorPrintTransaction, ERPMirrorPrintTransactionDetail, ERPMirrorPurchaseCost, ERPMirrorPurchaseOrderDetail, ERPMirrorPurchaseOrderHeader, ERPMirrorPurchaseType, ERPMirrorPurchasingCostParameter, ERPMirrorPurchasingParameter, ERPMirrorReceivingDetail, ERPMirrorReceivingHeader, ERPMirrorReceivingStatus, ERPMirrorSalesOrderHeader, ERPMirrorSalesOrderLine, ERPMirrorShipmentHeader, ERPMirrorShipmentLine, ERPMirrorSuggestedPODetail, ERPMirrorSuggestedPOHeader, ERPMirrorSupplier, ERPSyncBatch, ERPSyncState, ERPSyncTableState, File, FileVersion, OTPCode, Pick, PickAssignment, PickTypes, Pickster, POSubmission, PurchasingActivity, PurchasingApproval, PurchasingAssignment, PurchasingDashboardSnapshot, PurchasingExceptionEvent, PurchasingNote, PurchasingTask, PurchasingWorkQueue, WorkOrder, WorkOrderAssignment  # noqa: F401
-from .Models.dispatch_models import DispatchRoute, DispatchRouteStop, DispatchDriver, DispatchTruckAssignment  # noqa: F401
+from .extensions import db
+from .Models.models import AppUser, AuditEvent, CreditImage, CustomerNote, DashboardStats, ERPMirrorArOpen, ERPMirrorArOpenDetail, ERPMirrorCustomer, ERPMirrorCustomerShipTo, ERPMirrorItem, ERPMirrorItemBranch, ERPMirrorItemSupplier, ERPMirrorItemUomConv, ERPMirrorPickDetailNormalized, ERPMirrorPickHeaderNormalized, ERPMirrorPrintTransaction, ERPMirrorPrintTransactionDetail, ERPMirrorPurchaseCost, ERPMirrorPurchaseOrderDetail, ERPMirrorPurchaseOrderHeader, ERPMirrorPurchaseType, ERPMirrorPurchasingCostParameter, ERPMirrorPurchasingParameter, ERPMirrorReceivingDetail, ERPMirrorReceivingHeader, ERPMirrorReceivingStatus, ERPMirrorSalesOrderHeader, ERPMirrorSalesOrderLine, ERPMirrorShipmentHeader, ERPMirrorShipmentLine, ERPMirrorSuggestedPODetail, ERPMirrorSuggestedPOHeader, ERPMirrorSupplier, ERPSyncBatch, ERPSyncState, ERPSyncTableState, File, FileVersion, OTPCode, Pick, PickAssignment, PickTypes, Pickster, POSubmission, PurchasingActivity, PurchasingApproval, PurchasingAssignment, PurchasingDashboardSnapshot, PurchasingExceptionEvent, PurchasingNote, PurchasingTask, PurchasingWorkQueue, WorkOrder, WorkOrderAssignment  # noqa: F401
+from .Models.dispatch_models import DispatchRoute, DispatchRouteStop, DispatchDriver, DispatchTruckAssignment, VehicleBreadcrumb  # noqa: F401
 from .Routes.main import main_bp as main_blueprint
 from .Routes.dispatch import dispatch_bp as dispatch_blueprint
 from .Routes.sales import sales_bp as sales_blueprint
@@ -12,7 +11,10 @@ from .Routes.auth import auth_bp as auth_blueprint
 from .Routes.files import files_bp as files_blueprint
 from .Routes.po import po_bp as po_blueprint
 from .Routes.purchasing import purchasing_bp as purchasing_blueprint
-from .runtime_settings import env_bool, is_fly_runtime
+from .Services.live_updates import init_live_updates
+from .Services.search_index import init_search_index
+from .runtime_settings import get_startup_settings, is_fly_runtime, project_root
+from .startup import LazyMigrateGroup, init_migrate, schema_is_current
 from .navigation import build_navigation, get_current_user_roles
 from .auth import get_current_user
 from .branch_utils import normalize_branch, sidebar_branch_choices, branch_label, expand_branch
@@ -87,6 +89,7 @@ def _run_migrations(app):
     The advisory lock is session-level: it is held for the lifetime of the
     connection, so we keep the connection open while upgrade() runs.
     """
+    from flask_migrate import upgrade
     from sqlalchemy import text
 
     # Try to grab an advisory lock (non-blocking).  If another machine
@@ -139,7 +142,10 @@ def create_app():
     app.config.from_object("config.Config")
     # Initialize other extensions
     db.init_app(app)
-    migrate.init_app(app, db)
+    # `flask db ...` imports Flask-Migrate (and Alembic) only when it runs.
+    app.cli.add_command(LazyMigrateGroup(app, db))
+    init_live_updates(app, db.session, (Pick, PickAssignment, AuditEvent, WorkOrderAssignment))
+    init_search_index(db.session)
     # Register Blueprints
     app.register_blueprint(main_blueprint)
     app.register_blueprint(dispatch_blueprint)
@@ -198,7 +204,7 @@ def create_app():
             "main.estimating_redirect", # simple redirect — no data exposed
             "dispatch.health",          # dispatch health check
         }
-        public_paths = {"/pick_tracker", "/api/smart_scan"}
+        public_paths = {"/pick_tracker", "/api/smart_scan", "/api/smart_scan/batch"}
         public_path_prefixes = (
             "/kiosk/",
             "/tv/",
@@ -226,11 +232,16 @@ def create_app():
 
     fly_runtime = is_fly_runtime()
 
-    default_run_migrations = True
-    run_migrations_on_start = env_bool("RUN_MIGRATIONS_ON_START", default_run_migrations)
-    if run_migrations_on_start:
+    startup_settings = get_startup_settings()
+    if startup_settings["run_migrations"]:
         with app.app_context():
-            _run_migrations(app)
+            if startup_settings["skip_current_migrations"] and schema_is_current(
+                db.engine, str(project_root() / "migrations"), startup_settings["heads_cache_path"]
+            ):
+                app.logger.info("Schema is at the migration head; skipping runtime migrations.")
+            else:
+                init_migrate(app, db)
+                _run_migrations(app)
     else:
         app.logger.info("Skipping runtime migrations on startup.")
 
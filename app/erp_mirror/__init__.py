@@ -1,11 +1,27 @@
 from .config import SyncFamily, SyncStrategy, TableSyncConfig
-from .framework import MirrorSyncFramework, SyncBatchResult, SyncTableResult
+from .digests import EntityDigestIndex, SyncDelta
+from .framework import (
+    MirrorSyncFramework,
+    PyodbcExtractor,
+    SyncBatchResult,
+    SyncTableResult,
+    build_source_query,
+)
+from .scheduler import MirrorSyncScheduler, SyncJob, family_cadences, jobs_from_configs
 
 __all__ = [
+    "EntityDigestIndex",
     "MirrorSyncFramework",
+    "MirrorSyncScheduler",
+    "PyodbcExtractor",
     "SyncBatchResult",
+    "SyncDelta",
     "SyncFamily",
+    "SyncJob",
     "SyncStrategy",
     "TableSyncConfig",
     "SyncTableResult",
+    "build_source_query",
+    "family_cadences",
+    "jobs_from_configs",
 ]
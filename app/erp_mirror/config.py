@@ -28,6 +28,6 @@ class TableSyncConfig:
     source_query: str
     source_updated_column: str | None = None
     delete_detection_enabled: bool = False
-    cadence_seconds: int = 60
+    cadence_seconds: int | None = None  # None: the family's cadence
     batch_size: int = 1000
     indexed_columns: tuple[str, ...] = field(default_factory=tuple)
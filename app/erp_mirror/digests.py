@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable, Iterable
+
+_SEPARATOR = b"\x1e"
+_DIGEST_MASK = (1 << 128) - 1
+
+
+def _clean(value: Any) -> str:
+    return str(value or "").strip()
+
+
+@dataclass(frozen=True, slots=True)
+class EntitySpec:
+    """How to key and branch-route one kind of row in the sync payload."""
+
+    key: Callable[[dict[str, Any]], Hashable]
+    branch: Callable[[dict[str, Any]], str]
+
+
+# Pick lines roll up to their sales order; one SO is one entity.
+ENTITY_SPECS: dict[str, EntitySpec] = {
+    "picks": EntitySpec(
+        key=lambda row: (_clean(row.get("system_id")), _clean(row.get("so_number"))),
+        branch=lambda row: _clean(row.get("system_id")),
+    ),
+    "work_orders": EntitySpec(
+        key=lambda row: _clean(row.get("wo_id")),
+        branch=lambda row: _clean(row.get("branch_code")),
+    ),
+    "kpis": EntitySpec(
+        key=lambda row: (_clean(row.get("branch")), _clean(row.get("date"))),
+        branch=lambda row: _clean(row.get("branch")),
+    ),
+}
+
+
+@dataclass(slots=True)
+class SyncDelta:
+    """Entities that changed since the last committed cycle, per payload kind."""
+
+    added: dict[str, list[Hashable]] = field(default_factory=dict)
+    changed: dict[str, list[Hashable]] = field(default_factory=dict)
+    removed: dict[str, list[Hashable]] = field(default_factory=dict)
+    affected_branches: dict[str, set[str]] = field(default_factory=dict)
+    fingerprint: str = ""
+    _snapshot: dict[str, dict[Hashable, tuple[bytes, str]]] = field(default_factory=dict, repr=False)
+
+    @property
+    def is_empty(self) -> bool:
+        return not any(self.added.values()) and not any(self.changed.values()) and not any(self.removed.values())
+
+    def branches(self, *kinds: str) -> set[str]:
+        """Branches touched by the given kinds (all kinds when none given)."""
+        selected = kinds or tuple(self.affected_branches)
+        result: set[str] = set()
+        for kind in selected:
+            result |= self.affected_branches.get(kind, set())
+        return result
+
+    def summary(self) -> dict[str, dict[str, int]]:
+        return {
+            kind: {
+                "added": len(self.added.get(kind, ())),
+                "changed": len(self.changed.get(kind, ())),
+                "removed": len(self.removed.get(kind, ())),
+            }
+            for kind in self._snapshot
+        }
+
+
+class EntityDigestIndex:
+    """Per-entity row digests kept between sync cycles.
+
+    ``diff()`` hashes each row once (no sorting or JSON round-trips), groups
+    the digests by entity key and compares them with the previous cycle.
+    ``commit()`` adopts the new digests once the delta has been pushed, so a
+    failed push is retried on the next cycle.
+    """
+
+    def __init__(self, specs: dict[str, EntitySpec] | None = None):
+        self.specs = specs or ENTITY_SPECS
+        self._entities: dict[str, dict[Hashable, tuple[bytes, str]]] = {}
+        self.fingerprint = ""
+
+    def __len__(self) -> int:
+        return sum(len(entities) for entities in self._entities.values())
+
+    @staticmethod
+    def _digest_rows(rows: Iterable[dict[str, Any]], spec: EntitySpec) -> dict[Hashable, tuple[bytes, str]]:
+        hashers: dict[Hashable, list] = {}
+        for row in rows:
+            key = spec.key(row)
+            entry = hashers.get(key)
+            if entry is None:
+                entry = hashers[key] = [hashlib.blake2b(digest_size=16), spec.branch(row)]
+            entry[0].update(repr(tuple(row.items())).encode("utf-8"))
+            entry[0].update(_SEPARATOR)
+        return {key: (hasher.digest(), branch) for key, (hasher, branch) in hashers.items()}
+
+    def diff(self, data: dict[str, list[dict[str, Any]]]) -> SyncDelta:
+        delta = SyncDelta()
+        total = 0
+        for kind, spec in self.specs.items():
+            current = self._digest_rows(data.get(kind) or [], spec)
+            previous = self._entities.get(kind, {})
+            added, changed, branches = [], [], set()
+            for key, (digest, branch) in current.items():
+                total += int.from_bytes(digest, "big")
+                old = previous.get(key)
+                if old is None:
+                    added.append(key)
+                    branches.add(branch)
+                elif old[0] != digest:
+                    changed.append(key)
+                    branches.add(branch)
+                    branches.add(old[1])
+            removed = [key for key in previous if key not in current]
+            branches.update(previous[key][1] for key in removed)
+            branches.discard("")
+
+            delta.added[kind] = added
+            delta.changed[kind] = changed
+            delta.removed[kind] = removed
+            delta.affected_branches[kind] = branches
+            delta._snapshot[kind] = current
+        # Order-independent sum of entity digests: equal payloads give equal fingerprints.
+        delta.fingerprint = format(total & _DIGEST_MASK, "032x")
+        return delta
+
+    def commit(self, delta: SyncDelta) -> None:
+        self._entities = delta._snapshot
+        self.fingerprint = delta.fingerprint
+
+    def reset(self) -> None:
+        self._entities = {}
+        self.fingerprint = ""
@@ -1,17 +1,30 @@
 from __future__ import annotations
 
+import hashlib
+import io
+import uuid
 from dataclasses import dataclass, field
-from datetime import datetime
-from typing import Any, Iterable, Protocol, Sequence
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Iterable, Iterator, Protocol
 
-from sqlalchemy import text
-from sqlalchemy.engine import Engine
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
 
-from .config import TableSyncConfig
+from .config import SyncStrategy, TableSyncConfig
+
+METADATA_COLUMNS = ("synced_at", "sync_batch_id", "is_deleted")
 
 
 class SqlServerExtractor(Protocol):
-    def fetch_rows(self, config: TableSyncConfig, *, watermark: datetime | None) -> Sequence[dict[str, Any]]:
+    def fetch_rows(self, config: TableSyncConfig, *, watermark: datetime | None) -> Iterable[dict[str, Any]]:
+        ...
+
+
+class SqlServerKeyExtractor(SqlServerExtractor, Protocol):
+    """Extractor that can also list every live natural key (for delete detection on incremental runs)."""
+
+    def fetch_keys(self, config: TableSyncConfig) -> Iterable[tuple]:
         ...
 
 
@@ -21,10 +34,13 @@ class SyncTableResult:
     extracted_rows: int = 0
     staged_rows: int = 0
     merged_rows: int = 0
+    inserted_rows: int = 0
+    updated_rows: int = 0
     deleted_rows: int = 0
     duration_ms: int = 0
     status: str = "pending"
     error: str | None = None
+    watermark: datetime | None = None
 
 
 @dataclass(slots=True)
@@ -36,9 +52,130 @@ class SyncBatchResult:
     table_results: list[SyncTableResult] = field(default_factory=list)
 
 
+def build_source_query(config: TableSyncConfig, watermark: datetime | None) -> tuple[str, list[Any]]:
+    """Wrap ``config.source_query`` with the watermark predicate for SQL Server extractors.
+
+    Uses ``>=`` so rows sharing the watermark timestamp are re-read; the merge
+    skips them when their fingerprint has not changed.
+    """
+    if watermark is None or not config.source_updated_column or config.strategy != SyncStrategy.INCREMENTAL:
+        return config.source_query, []
+    return (
+        f"SELECT * FROM ({config.source_query}) src WHERE src.{config.source_updated_column} >= ?",
+        [watermark],
+    )
+
+
+class PyodbcExtractor:
+    """Streams source rows from SQL Server with ``fetchmany(batch_size)``."""
+
+    def __init__(self, connect):
+        self._connect = connect
+
+    def fetch_rows(self, config: TableSyncConfig, *, watermark: datetime | None) -> Iterator[dict[str, Any]]:
+        sql, params = build_source_query(config, watermark)
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            columns = [column[0] for column in cursor.description]
+            while True:
+                chunk = cursor.fetchmany(config.batch_size)
+                if not chunk:
+                    break
+                for row in chunk:
+                    yield dict(zip(columns, row))
+        finally:
+            conn.close()
+
+    def fetch_keys(self, config: TableSyncConfig) -> Iterator[tuple]:
+        key_list = ", ".join(config.natural_key_columns)
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT DISTINCT {key_list} FROM ({config.source_query}) src")
+            while True:
+                chunk = cursor.fetchmany(config.batch_size)
+                if not chunk:
+                    break
+                for row in chunk:
+                    yield tuple(row)
+        finally:
+            conn.close()
+
+
+def _copy_literal(value: Any) -> str:
+    """Render one value for PostgreSQL COPY text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return format(value, "f")
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _batched(rows: Iterable[dict[str, Any]], size: int) -> Iterator[list[dict[str, Any]]]:
+    batch: list[dict[str, Any]] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
 class MirrorSyncFramework:
-    def __init__(self, engine: Engine):
+    """Incremental staging + upsert engine for ``erp_mirror_*`` tables.
+
+    Each table run streams extractor rows in ``batch_size`` chunks, loads a
+    chunk into the staging table (COPY on PostgreSQL), upserts it into the
+    target keyed on ``natural_key_columns`` and clears staging.  Rows whose
+    ``row_fingerprint`` is unchanged are skipped, so the inserted/updated
+    counts reflect real changes.
+    """
+
+    def __init__(self, engine: Engine, *, worker_name: str = "erp-sync"):
         self.engine = engine
+        self.worker_name = worker_name
+        self._column_cache: dict[str, tuple[str, ...]] = {}
+
+    @property
+    def _is_postgres(self) -> bool:
+        return self.engine.dialect.name == "postgresql"
+
+    # ------------------------------------------------------------------
+    # Orchestration
+    # ------------------------------------------------------------------
+
+    def run_batch(
+        self,
+        configs: Iterable[TableSyncConfig],
+        extractor: SqlServerExtractor,
+        *,
+        family: str | None = None,
+    ) -> SyncBatchResult:
+        batch = SyncBatchResult(batch_id=uuid.uuid4().hex, started_at=datetime.utcnow())
+        for config in configs:
+            try:
+                batch.table_results.append(self.run_table(config, extractor, batch_id=batch.batch_id))
+            except Exception as exc:
+                batch.table_results.append(
+                    SyncTableResult(table_name=config.table_name, status="error", error=str(exc))
+                )
+        batch.finished_at = datetime.utcnow()
+        batch.status = "error" if any(r.status == "error" for r in batch.table_results) else "success"
+        self.record_batch(batch, family=family)
+        return batch
 
     def run_table(
         self,
@@ -46,17 +183,47 @@ class MirrorSyncFramework:
         extractor: SqlServerExtractor,
         *,
         watermark: datetime | None = None,
+        batch_id: str | None = None,
     ) -> SyncTableResult:
         started = datetime.utcnow()
+        batch_id = batch_id or uuid.uuid4().hex
         result = SyncTableResult(table_name=config.table_name, status="running")
 
+        if watermark is None and config.strategy == SyncStrategy.INCREMENTAL:
+            watermark = self.load_watermark(config)
+        full_scan = watermark is None and config.strategy != SyncStrategy.WINDOWED
+        detect_deletes = config.delete_detection_enabled or config.strategy == SyncStrategy.REPLACE
+        key_fetcher = getattr(extractor, "fetch_keys", None)
+        track_keys = detect_deletes and full_scan
+        result.watermark = watermark
+
         try:
-            rows = list(extractor.fetch_rows(config, watermark=watermark))
-            result.extracted_rows = len(rows)
-            if rows:
-                self.stage_rows(config, rows)
-                result.staged_rows = len(rows)
-                result.merged_rows = self.merge_rows(config)
+            with self.engine.connect() as conn:
+                if track_keys or (detect_deletes and key_fetcher is not None):
+                    self._create_key_table(conn, config)
+
+                rows = extractor.fetch_rows(config, watermark=watermark)
+                for chunk in _batched(rows, max(1, config.batch_size)):
+                    result.extracted_rows += len(chunk)
+                    result.watermark = self._advance_watermark(config, chunk, result.watermark)
+                    with conn.begin():
+                        result.staged_rows += self.stage_rows(config, chunk, conn=conn)
+                        inserted, updated = self.merge_rows(config, conn=conn, batch_id=batch_id)
+                        if track_keys:
+                            self._copy_staged_keys(conn, config)
+                        self._clear_staging(conn, config)
+                    result.inserted_rows += inserted
+                    result.updated_rows += updated
+
+                if detect_deletes and not track_keys and key_fetcher is not None:
+                    with conn.begin():
+                        self._load_keys(conn, config, key_fetcher(config))
+                if track_keys or (detect_deletes and key_fetcher is not None):
+                    with conn.begin():
+                        result.deleted_rows = self.soft_delete_missing(config, conn=conn, batch_id=batch_id)
+                        conn.execute(text(f"DROP TABLE IF EXISTS {self._key_table(config)}"))
+
+            result.merged_rows = result.inserted_rows + result.updated_rows
             result.status = "success"
         except Exception as exc:
             result.status = "error"
@@ -64,63 +231,351 @@ class MirrorSyncFramework:
             raise
         finally:
             result.duration_ms = int((datetime.utcnow() - started).total_seconds() * 1000)
+            self.record_table_state(config, result, batch_id=batch_id)
 
         return result
 
-    def stage_rows(self, config: TableSyncConfig, rows: Iterable[dict[str, Any]]) -> None:
+    # ------------------------------------------------------------------
+    # Staging + merge
+    # ------------------------------------------------------------------
+
+    def stage_rows(
+        self,
+        config: TableSyncConfig,
+        rows: Iterable[dict[str, Any]],
+        *,
+        conn: Connection | None = None,
+    ) -> int:
         rows = list(rows)
         if not rows:
-            return
+            return 0
+        if conn is None:
+            with self.engine.begin() as own_conn:
+                return self.stage_rows(config, rows, conn=own_conn)
 
-        columns = list(rows[0].keys())
-        insert_sql = text(
+        columns = self._staging_load_columns(config, rows[0])
+        fingerprint = "row_fingerprint" in self._columns(config.staging_table_name) and "row_fingerprint" not in rows[0]
+        if fingerprint:
+            columns = [column for column in columns if column != "row_fingerprint"]
+            payload = [[row.get(column) for column in columns] for row in rows]
+            for values in payload:
+                values.append(self._fingerprint(values))
+            columns = columns + ["row_fingerprint"]
+        else:
+            payload = [[row.get(column) for column in columns] for row in rows]
+
+        cursor = conn.connection.cursor()
+        if self._is_postgres and hasattr(cursor, "copy_expert"):
+            buffer = io.StringIO()
+            for values in payload:
+                buffer.write("\t".join(_copy_literal(value) for value in values))
+                buffer.write("\n")
+            buffer.seek(0)
+            cursor.copy_expert(
+                f"COPY {config.staging_table_name} ({', '.join(columns)}) FROM STDIN",
+                buffer,
+            )
+        else:
+            conn.execute(
+                text(
+                    f"INSERT INTO {config.staging_table_name} ({', '.join(columns)}) "
+                    f"VALUES ({', '.join(f':{column}' for column in columns)})"
+                ),
+                [dict(zip(columns, values)) for values in payload],
+            )
+        return len(payload)
+
+    def merge_rows(
+        self,
+        config: TableSyncConfig,
+        *,
+        conn: Connection | None = None,
+        batch_id: str | None = None,
+    ) -> tuple[int, int]:
+        """Upsert staging into the target; return ``(inserted, updated)``."""
+        if conn is None:
+            with self.engine.begin() as own_conn:
+                return self.merge_rows(config, conn=own_conn, batch_id=batch_id)
+
+        target = config.table_name
+        target_columns = self._columns(target)
+        columns = self._merge_columns(config)
+        keys = config.natural_key_columns
+        key_match = " AND ".join(f"t.{column} = s.{column}" for column in keys)
+
+        staged = conn.execute(text(f"SELECT COUNT(*) FROM {config.staging_table_name}")).scalar() or 0
+        if not staged:
+            return 0, 0
+        existing = conn.execute(
+            text(
+                f"SELECT COUNT(*) FROM {config.staging_table_name} s "
+                f"WHERE EXISTS (SELECT 1 FROM {target} t WHERE {key_match})"
+            )
+        ).scalar() or 0
+
+        params: dict[str, Any] = {}
+        insert_columns = list(columns)
+        select_values = [f"s.{column}" for column in columns]
+        extra_assignments = []
+        if "synced_at" in target_columns and "synced_at" not in columns:
+            params["synced_at"] = datetime.utcnow()
+            insert_columns.append("synced_at")
+            select_values.append(":synced_at")
+            extra_assignments.append("synced_at = :synced_at")
+        if "sync_batch_id" in target_columns and "sync_batch_id" not in columns:
+            params["batch_id"] = batch_id
+            insert_columns.append("sync_batch_id")
+            select_values.append(":batch_id")
+            extra_assignments.append("sync_batch_id = :batch_id")
+        if "is_deleted" in target_columns and "is_deleted" not in columns:
+            insert_columns.append("is_deleted")
+            select_values.append("false")
+            extra_assignments.append("is_deleted = false")
+
+        assignments = [f"{column} = EXCLUDED.{column}" for column in columns if column not in keys]
+        assignments.extend(extra_assignments)
+        changed = []
+        if "row_fingerprint" in columns:
+            changed.append(f"{target}.row_fingerprint IS DISTINCT FROM EXCLUDED.row_fingerprint")
+            if "is_deleted" in target_columns:
+                changed.append(f"{target}.is_deleted")
+        where = f" WHERE {' OR '.join(changed)}" if changed else ""
+
+        upsert_sql = text(
             f"""
-            INSERT INTO {config.staging_table_name} ({", ".join(columns)})
-            VALUES ({", ".join(f":{column}" for column in columns)})
+            INSERT INTO {target} ({", ".join(insert_columns)})
+            SELECT {", ".join(select_values)} FROM {config.staging_table_name} s WHERE true
+            ON CONFLICT ({", ".join(keys)}) DO UPDATE SET {", ".join(assignments)}{where}
+            RETURNING 1
             """
         )
-        with self.engine.begin() as conn:
-            conn.execute(text(f"TRUNCATE TABLE {config.staging_table_name}"))
-            conn.execute(insert_sql, rows)
+        touched = len(conn.execute(upsert_sql, params).fetchall())
+        inserted = int(staged) - int(existing)
+        return inserted, max(0, touched - inserted)
 
-    def merge_rows(self, config: TableSyncConfig) -> int:
-        assignments = ", ".join(
-            f"{column} = source.{column}"
-            for column in self._merge_columns(config)
-            if column not in config.natural_key_columns
-        )
-        key_predicate = " AND ".join(
-            f"target.{column} = source.{column}" for column in config.natural_key_columns
+    def soft_delete_missing(
+        self,
+        config: TableSyncConfig,
+        *,
+        conn: Connection,
+        batch_id: str | None = None,
+    ) -> int:
+        """Flag target rows whose natural key is absent from the key table as deleted."""
+        target = config.table_name
+        target_columns = self._columns(target)
+        if "is_deleted" not in target_columns:
+            return 0
+        key_table = self._key_table(config)
+        key_match = " AND ".join(f"k.{column} = {target}.{column}" for column in config.natural_key_columns)
+        assignments = ["is_deleted = true"]
+        params: dict[str, Any] = {}
+        if "synced_at" in target_columns:
+            assignments.append("synced_at = :synced_at")
+            params["synced_at"] = datetime.utcnow()
+        if "sync_batch_id" in target_columns:
+            assignments.append("sync_batch_id = :batch_id")
+            params["batch_id"] = batch_id
+        result = conn.execute(
+            text(
+                f"UPDATE {target} SET {', '.join(assignments)} "
+                f"WHERE is_deleted = false AND NOT EXISTS (SELECT 1 FROM {key_table} k WHERE {key_match})"
+            ),
+            params,
         )
-        insert_columns = self._merge_columns(config)
-        insert_list = ", ".join(insert_columns)
-        insert_values = ", ".join(f"source.{column}" for column in insert_columns)
+        return int(result.rowcount or 0)
 
-        merge_sql = text(
-            f"""
-            MERGE INTO {config.table_name} AS target
-            USING {config.staging_table_name} AS source
-            ON {key_predicate}
-            WHEN MATCHED THEN
-                UPDATE SET {assignments}
-            WHEN NOT MATCHED THEN
-                INSERT ({insert_list})
-                VALUES ({insert_values});
+    # ------------------------------------------------------------------
+    # Watermarks + bookkeeping (ERPSyncTableState / ERPSyncBatch)
+    # ------------------------------------------------------------------
+
+    def load_watermark(self, config: TableSyncConfig) -> datetime | None:
+        if not config.source_updated_column:
+            return None
+        try:
+            with self.engine.connect() as conn:
+                value = conn.execute(
+                    text(
+                        "SELECT last_source_updated_at FROM erp_sync_table_state "
+                        "WHERE table_name = :table_name"
+                    ),
+                    {"table_name": config.table_name},
+                ).scalar()
+        except Exception:
+            return None
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        return value
+
+    def record_table_state(self, config: TableSyncConfig, result: SyncTableResult, *, batch_id: str) -> None:
+        now = datetime.utcnow()
+        success = result.status == "success"
+        params = {
+            "table_name": config.table_name,
+            "family": config.family.value,
+            "strategy": config.strategy.value,
+            "batch_id": batch_id,
+            "status": result.status,
+            "success_at": now if success else None,
+            "error_at": None if success else now,
+            "error": result.error,
+            "watermark": result.watermark if success else None,
+            "row_count": result.merged_rows + result.deleted_rows,
+            "duration_ms": result.duration_ms,
+        }
+        sql = text(
+            """
+            INSERT INTO erp_sync_table_state (
+                table_name, family, strategy, last_batch_id, last_status, last_success_at,
+                last_error_at, last_error, last_source_updated_at, last_row_count, last_duration_ms
+            ) VALUES (
+                :table_name, :family, :strategy, :batch_id, :status, :success_at,
+                :error_at, :error, :watermark, :row_count, :duration_ms
+            )
+            ON CONFLICT (table_name) DO UPDATE SET
+                family = EXCLUDED.family,
+                strategy = EXCLUDED.strategy,
+                last_batch_id = EXCLUDED.last_batch_id,
+                last_status = EXCLUDED.last_status,
+                last_success_at = COALESCE(EXCLUDED.last_success_at, erp_sync_table_state.last_success_at),
+                last_error_at = COALESCE(EXCLUDED.last_error_at, erp_sync_table_state.last_error_at),
+                last_error = EXCLUDED.last_error,
+                last_source_updated_at = COALESCE(EXCLUDED.last_source_updated_at, erp_sync_table_state.last_source_updated_at),
+                last_row_count = EXCLUDED.last_row_count,
+                last_duration_ms = EXCLUDED.last_duration_ms
             """
         )
-        with self.engine.begin() as conn:
-            conn.execute(merge_sql)
-        return 0
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(sql, params)
+        except Exception as exc:
+            print(f"[{datetime.now()}] Failed to record sync state for {config.table_name}: {exc}")
+
+    def record_batch(self, batch: SyncBatchResult, *, family: str | None = None) -> None:
+        results = batch.table_results
+        errors = [f"{r.table_name}: {r.error}" for r in results if r.error]
+        params = {
+            "batch_id": batch.batch_id,
+            "worker_name": self.worker_name,
+            "started_at": batch.started_at,
+            "finished_at": batch.finished_at,
+            "status": batch.status,
+            "family": family,
+            "table_count": len(results),
+            "rows_extracted": sum(r.extracted_rows for r in results),
+            "rows_staged": sum(r.staged_rows for r in results),
+            "rows_upserted": sum(r.merged_rows for r in results),
+            "rows_deleted": sum(r.deleted_rows for r in results),
+            "duration_ms": int(((batch.finished_at or batch.started_at) - batch.started_at).total_seconds() * 1000),
+            "error_message": "; ".join(errors) or None,
+        }
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(
+                    text(
+                        """
+                        INSERT INTO erp_sync_batches (
+                            batch_id, worker_name, started_at, finished_at, status, family, table_count,
+                            rows_extracted, rows_staged, rows_upserted, rows_deleted, duration_ms, error_message
+                        ) VALUES (
+                            :batch_id, :worker_name, :started_at, :finished_at, :status, :family, :table_count,
+                            :rows_extracted, :rows_staged, :rows_upserted, :rows_deleted, :duration_ms, :error_message
+                        )
+                        """
+                    ),
+                    params,
+                )
+        except Exception as exc:
+            print(f"[{datetime.now()}] Failed to record sync batch {batch.batch_id}: {exc}")
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    def _columns(self, table_name: str) -> tuple[str, ...]:
+        """Writable column names for *table_name*, looked up once per framework instance.
+
+        Generated columns (e.g. the ``*_norm`` join keys) are computed by the
+        database and never written by the merge.
+        """
+        cached = self._column_cache.get(table_name)
+        if cached is None:
+            schema, _, name = table_name.rpartition(".")
+            cached = tuple(
+                column["name"]
+                for column in inspect(self.engine).get_columns(name, schema=schema or None)
+                if not column.get("computed")
+            )
+            self._column_cache[table_name] = cached
+        return cached
+
+    def _staging_load_columns(self, config: TableSyncConfig, sample_row: dict[str, Any]) -> list[str]:
+        return [column for column in self._columns(config.staging_table_name) if column in sample_row or column == "row_fingerprint"]
 
     def _merge_columns(self, config: TableSyncConfig) -> list[str]:
-        inspector_sql = text(
-            """
-            SELECT column_name
-            FROM information_schema.columns
-            WHERE table_name = :table_name
-            ORDER BY ordinal_position
-            """
+        target_columns = set(self._columns(config.table_name))
+        return [
+            column
+            for column in self._columns(config.staging_table_name)
+            if column in target_columns and column != "id"
+        ]
+
+    @staticmethod
+    def _fingerprint(values: list[Any]) -> str:
+        encoded = "\x1f".join("" if value is None else str(value) for value in values)
+        return hashlib.md5(encoded.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _advance_watermark(
+        config: TableSyncConfig,
+        rows: list[dict[str, Any]],
+        current: datetime | None,
+    ) -> datetime | None:
+        column = config.source_updated_column
+        if not column:
+            return current
+        values = [row.get(column) for row in rows if row.get(column) is not None]
+        if not values:
+            return current
+        latest = max(values)
+        return latest if current is None or latest > current else current
+
+    def _clear_staging(self, conn: Connection, config: TableSyncConfig) -> None:
+        if self._is_postgres:
+            conn.execute(text(f"TRUNCATE TABLE {config.staging_table_name}"))
+        else:
+            conn.execute(text(f"DELETE FROM {config.staging_table_name}"))
+
+    @staticmethod
+    def _key_table(config: TableSyncConfig) -> str:
+        return f"tmp_sync_keys_{config.table_name.rpartition('.')[2]}"
+
+    def _create_key_table(self, conn: Connection, config: TableSyncConfig) -> None:
+        key_table = self._key_table(config)
+        key_list = ", ".join(config.natural_key_columns)
+        with conn.begin():
+            conn.execute(text(f"DROP TABLE IF EXISTS {key_table}"))
+            conn.execute(
+                text(f"CREATE TEMPORARY TABLE {key_table} AS SELECT {key_list} FROM {config.table_name} WHERE 1 = 0")
+            )
+
+    def _copy_staged_keys(self, conn: Connection, config: TableSyncConfig) -> None:
+        key_list = ", ".join(config.natural_key_columns)
+        conn.execute(
+            text(f"INSERT INTO {self._key_table(config)} ({key_list}) SELECT {key_list} FROM {config.staging_table_name}")
+        )
+
+    def _load_keys(self, conn: Connection, config: TableSyncConfig, keys: Iterable[tuple]) -> None:
+        columns = config.natural_key_columns
+        key_table = self._key_table(config)
+        insert_sql = text(
+            f"INSERT INTO {key_table} ({', '.join(columns)}) VALUES ({', '.join(f':{column}' for column in columns)})"
         )
-        with self.engine.begin() as conn:
-            rows = conn.execute(inspector_sql, {"table_name": config.staging_table_name}).fetchall()
-        return [row[0] for row in rows]
+        for chunk in _batched((dict(zip(columns, key)) for key in keys), max(1, config.batch_size)):
+            cursor = conn.connection.cursor()
+            if self._is_postgres and hasattr(cursor, "copy_expert"):
+                buffer = io.StringIO(
+                    "".join("\t".join(_copy_literal(row[column]) for column in columns) + "\n" for row in chunk)
+                )
+                cursor.copy_expert(f"COPY {key_table} ({', '.join(columns)}) FROM STDIN", buffer)
+            else:
+                conn.execute(insert_sql, chunk)
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Iterable
+
+from .config import SyncFamily, TableSyncConfig
+from .framework import MirrorSyncFramework, SqlServerExtractor
+
+# Lower runs first when several jobs are due in the same tick.
+FAMILY_PRIORITY = {
+    SyncFamily.OPERATIONAL: 0,
+    SyncFamily.DOCUMENT: 1,
+    SyncFamily.AR: 2,
+    SyncFamily.MASTER: 3,
+}
+
+
+def family_cadences(settings: dict) -> dict[SyncFamily, int]:
+    """Map ``get_mirror_sync_settings()`` cadences onto sync families."""
+    return {
+        SyncFamily.MASTER: settings["master_cadence_seconds"],
+        SyncFamily.OPERATIONAL: settings["operational_cadence_seconds"],
+        SyncFamily.AR: settings["ar_cadence_seconds"],
+        SyncFamily.DOCUMENT: settings["document_cadence_seconds"],
+    }
+
+
+@dataclass(slots=True)
+class SyncJob:
+    name: str
+    family: SyncFamily
+    cadence_seconds: float | None  # None: the scheduler's cadence for the family
+    run: Callable[[], Any]
+    next_due: float = 0.0
+    running: Future | None = None
+    consecutive_failures: int = 0
+    last_started_at: float | None = None
+    last_success_at: float | None = None
+    last_duration_ms: int | None = None
+    last_error: str | None = None
+    runs: int = 0
+    skipped: int = 0
+
+    @property
+    def priority(self) -> int:
+        return FAMILY_PRIORITY.get(self.family, len(FAMILY_PRIORITY))
+
+
+def jobs_from_configs(
+    framework: MirrorSyncFramework,
+    extractor: SqlServerExtractor,
+    configs: Iterable[TableSyncConfig],
+    cadences: dict[SyncFamily, int] | None = None,
+) -> list[SyncJob]:
+    """One job per table, on the table's own ``cadence_seconds`` if it sets
+    one and otherwise on its family's cadence."""
+    cadences = cadences or {}
+    return [
+        SyncJob(
+            name=config.table_name,
+            family=config.family,
+            cadence_seconds=config.cadence_seconds or cadences.get(config.family),
+            run=lambda config=config: framework.run_table(config, extractor),
+        )
+        for config in configs
+    ]
+
+
+class MirrorSyncScheduler:
+    """Runs sync jobs on independent cadences over a bounded thread pool.
+
+    Operational jobs are submitted first when the pool is short of slots, a job
+    whose previous run is still in flight is skipped rather than queued, and a
+    failing job backs off exponentially (capped) before its next attempt.  A
+    small random jitter spreads jobs that share a cadence.  Jobs without a
+    cadence of their own run on ``family_cadences[job.family]``.
+    """
+
+    def __init__(
+        self,
+        jobs: Iterable[SyncJob],
+        *,
+        family_cadences: dict[SyncFamily, int] | None = None,
+        max_workers: int = 4,
+        jitter_ratio: float = 0.1,
+        max_backoff_seconds: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+        rng: random.Random | None = None,
+    ):
+        self.max_workers = max(1, int(max_workers))
+        self.jitter_ratio = max(0.0, float(jitter_ratio))
+        self.max_backoff_seconds = max_backoff_seconds
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="mirror-sync")
+        self._started_at = clock()
+        self._jobs: dict[str, SyncJob] = {}
+        for job in jobs:
+            if not job.cadence_seconds:
+                job.cadence_seconds = (family_cadences or {}).get(job.family)
+            if not job.cadence_seconds:
+                raise ValueError(f"Sync job {job.name} has no cadence and no {job.family.value} family cadence.")
+            job.next_due = self._started_at
+            self._jobs[job.name] = job
+
+    @property
+    def jobs(self) -> list[SyncJob]:
+        return list(self._jobs.values())
+
+    def _jitter(self, seconds: float) -> float:
+        return seconds * self.jitter_ratio * self._rng.random()
+
+    def _in_flight(self) -> int:
+        return sum(1 for job in self._jobs.values() if job.running is not None and not job.running.done())
+
+    def tick(self) -> list[str]:
+        """Submit every due job that has a free slot; return the submitted job names."""
+        now = self._clock()
+        submitted = []
+        with self._lock:
+            due = sorted(
+                (job for job in self._jobs.values() if job.next_due <= now),
+                key=lambda job: (job.priority, job.next_due),
+            )
+            slots = self.max_workers - self._in_flight()
+            for job in due:
+                if job.running is not None and not job.running.done():
+                    job.skipped += 1
+                    job.next_due = now + job.cadence_seconds
+                    continue
+                if slots <= 0:
+                    break
+                job.last_started_at = now
+                job.next_due = now + job.cadence_seconds + self._jitter(job.cadence_seconds)
+                job.running = self._executor.submit(self._run_job, job)
+                submitted.append(job.name)
+                slots -= 1
+        return submitted
+
+    def _run_job(self, job: SyncJob) -> None:
+        started = self._clock()
+        error = None
+        try:
+            job.run()
+        except Exception as exc:
+            error = exc
+            print(f"[{datetime.now()}] Mirror sync job {job.name} failed: {exc}")
+        finished = self._clock()
+        with self._lock:
+            job.runs += 1
+            job.last_duration_ms = int((finished - started) * 1000)
+            if error is None:
+                job.consecutive_failures = 0
+                job.last_error = None
+                job.last_success_at = finished
+            else:
+                job.consecutive_failures += 1
+                job.last_error = str(error)
+                backoff = min(self.max_backoff_seconds, job.cadence_seconds * (2 ** job.consecutive_failures))
+                job.next_due = finished + backoff + self._jitter(job.cadence_seconds)
+
+    def seconds_until_next(self) -> float:
+        now = self._clock()
+        with self._lock:
+            pending = [job.next_due for job in self._jobs.values()]
+        if not pending:
+            return 1.0
+        return max(0.0, min(pending) - now)
+
+    def run_forever(self, stop_event: threading.Event | None = None, *, max_sleep_seconds: float = 1.0) -> None:
+        stop_event = stop_event or threading.Event()
+        try:
+            while not stop_event.is_set():
+                self.tick()
+                stop_event.wait(min(max_sleep_seconds, max(0.05, self.seconds_until_next())))
+        finally:
+            self.shutdown()
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+    def family_lag(self) -> dict[str, dict[str, Any]]:
+        """Per-family lag: seconds since each family's stalest job last succeeded."""
+        now = self._clock()
+        lag: dict[str, dict[str, Any]] = {}
+        with self._lock:
+            for job in self._jobs.values():
+                since = job.last_success_at if job.last_success_at is not None else self._started_at
+                entry = lag.setdefault(
+                    job.family.value,
+                    {"lag_seconds": 0.0, "stalest_job": None, "failing_jobs": [], "running_jobs": []},
+                )
+                job_lag = round(now - since, 3)
+                if entry["stalest_job"] is None or job_lag > entry["lag_seconds"]:
+                    entry["lag_seconds"] = job_lag
+                    entry["stalest_job"] = job.name
+                if job.consecutive_failures:
+                    entry["failing_jobs"].append(job.name)
+                if job.running is not None and not job.running.done():
+                    entry["running_jobs"].append(job.name)
+        return lag
@@ -1,6 +1,6 @@
 # extensions.py
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 
+# Flask-Migrate is registered on demand by app.startup.init_migrate: importing
+# it loads Alembic, which most boots no longer need.
 db = SQLAlchemy()
-migrate = Migrate()
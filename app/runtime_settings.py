@@ -1,4 +1,6 @@
+import json
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -34,6 +36,16 @@ def env_int(name: str, default: int) -> int:
         return default
 
 
+def env_float(name: str, default: float) -> float:
+    raw = os.environ.get(name)
+    if raw in (None, ""):
+        return default
+    try:
+        return float(raw)
+    except (TypeError, ValueError):
+        return default
+
+
 def is_fly_runtime() -> bool:
     return any(
         (os.environ.get(name) or "").strip()
@@ -77,7 +89,10 @@ def get_sqlalchemy_engine_options(url: str | None, *, serverless_default: bool =
             "pool_pre_ping": True,
         }
 
-    pool_size = max(1, env_int("DB_POOL_SIZE", 5))
+    # One connection per request a worker can serve at once (capped for
+    # gevent), plus two for the background refresh threads.
+    web = get_web_server_settings()
+    pool_size = max(1, env_int("DB_POOL_SIZE", min(web["concurrency"], 16) + 2))
     max_overflow = max(0, env_int("DB_MAX_OVERFLOW", 5))
     pool_timeout = max(5, env_int("DB_POOL_TIMEOUT", 30))
     pool_recycle = max(60, env_int("DB_POOL_RECYCLE", 300))
@@ -92,6 +107,39 @@ def get_sqlalchemy_engine_options(url: str | None, *, serverless_default: bool =
     }
 
 
+def get_web_server_settings() -> dict:
+    """gunicorn worker profile (see gunicorn.conf.py).
+
+    ``gthread`` (default) serves ``WEB_THREADS`` requests per worker on real
+    threads, so a slow mirror query or Samsara call only holds its own thread.
+    ``gevent`` serves up to ``WEB_WORKER_CONNECTIONS`` cooperatively and needs
+    the optional gevent/psycogreen packages.  ``sync`` is one request at a time.
+    """
+    worker_class = (os.environ.get("WEB_WORKER_CLASS") or "gthread").strip().lower()
+    threads = max(1, env_int("WEB_THREADS", 8))
+    worker_connections = max(1, env_int("WEB_WORKER_CONNECTIONS", 100))
+    if worker_class == "gthread":
+        concurrency = threads
+    elif worker_class == "gevent":
+        concurrency = worker_connections
+    else:
+        concurrency = 1
+    return {
+        "worker_class": worker_class,
+        "workers": max(1, env_int("WEB_CONCURRENCY", 2)),
+        "threads": threads,
+        "worker_connections": worker_connections,
+        "concurrency": concurrency,
+        "timeout": max(10, env_int("WEB_TIMEOUT", 60)),
+        "graceful_timeout": max(5, env_int("WEB_GRACEFUL_TIMEOUT", 30)),
+        "keepalive": max(1, env_int("WEB_KEEPALIVE", 5)),
+        # Upper bound for outbound HTTP made while serving a request (R2, Resend, Graph).
+        "outbound_timeout_seconds": max(1, env_int("OUTBOUND_TIMEOUT_SECONDS", 10)),
+        # Postgres/pgbouncer connection limit to check the pool against (0 = unchecked).
+        "db_max_connections": max(0, env_int("DB_MAX_CONNECTIONS", 0)),
+    }
+
+
 def get_sync_settings() -> dict:
     return {
         "database_url": get_database_url(),
@@ -109,13 +157,185 @@ def get_mirror_sync_settings() -> dict:
         "operational_cadence_seconds": max(3, env_int("SYNC_OPERATIONAL_CADENCE_SECONDS", 5)),
         "ar_cadence_seconds": max(30, env_int("SYNC_AR_CADENCE_SECONDS", 300)),
         "document_cadence_seconds": max(30, env_int("SYNC_DOCUMENT_CADENCE_SECONDS", 300)),
+        "delivery_facts_cadence_seconds": max(30, env_int("SYNC_DELIVERY_FACTS_CADENCE_SECONDS", 120)),
+        "search_index_cadence_seconds": max(10, env_int("SYNC_SEARCH_INDEX_CADENCE_SECONDS", 60)),
+        "dashboard_tiles_cadence_seconds": max(5, env_int("SYNC_DASHBOARD_TILES_CADENCE_SECONDS", 30)),
+        "geocode_cadence_seconds": max(10, env_int("SYNC_GEOCODE_CADENCE_SECONDS", 60)),
+        "breadcrumbs_cadence_seconds": max(5, env_int("SYNC_BREADCRUMBS_CADENCE_SECONDS", 15)),
+        "breadcrumbs_maintenance_cadence_seconds": max(300, env_int("SYNC_BREADCRUMBS_MAINTENANCE_CADENCE_SECONDS", 3600)),
         "batch_size": max(100, env_int("SYNC_BATCH_SIZE", 1000)),
+        "max_workers": max(1, env_int("SYNC_MAX_WORKERS", 4)),
+        "jitter_percent": max(0, env_int("SYNC_JITTER_PERCENT", 10)),
+        "max_backoff_seconds": max(5, env_int("SYNC_MAX_BACKOFF_SECONDS", 300)),
         "staging_schema": os.environ.get("MIRROR_STAGING_SCHEMA", "public"),
         "worker_name": os.environ.get("SYNC_WORKER_NAME", "erp-sync"),
         "worker_mode": os.environ.get("SYNC_WORKER_MODE", "pi"),
     }
 
 
+def get_query_cache_settings() -> dict:
+    return {
+        "backend": (os.environ.get("ERP_CACHE_BACKEND") or "memory").strip().lower(),
+        "redis_url": (os.environ.get("ERP_CACHE_REDIS_URL") or os.environ.get("REDIS_URL") or "").strip(),
+        "max_entries": max(16, env_int("ERP_CACHE_MAX_ENTRIES", 512)),
+        "default_ttl_seconds": max(1, env_int("ERP_CACHE_TTL_SECONDS", 60)),
+        "load_timeout_seconds": max(1, env_int("ERP_CACHE_LOAD_TIMEOUT_SECONDS", 30)),
+    }
+
+
+def get_search_settings() -> dict:
+    return {
+        "latency_budget_ms": max(20, env_int("SEARCH_LATENCY_BUDGET_MS", 250)),
+        "max_results": max(1, env_int("SEARCH_MAX_RESULTS", 15)),
+        "max_per_type": max(1, env_int("SEARCH_MAX_PER_TYPE", 5)),
+    }
+
+
+def get_geocoding_settings() -> dict:
+    return {
+        "batch_size": max(1, env_int("GEOCODE_BATCH_SIZE", 500)),
+        "remote_enabled": env_bool("GEOCODE_REMOTE_ENABLED", True),
+        # Nominatim's usage policy allows one request per second.
+        "remote_min_interval_ms": max(0, env_int("GEOCODE_REMOTE_MIN_INTERVAL_MS", 1100)),
+        "remote_concurrency": max(1, env_int("GEOCODE_REMOTE_CONCURRENCY", 2)),
+        "remote_max_per_run": max(0, env_int("GEOCODE_REMOTE_MAX_PER_RUN", 50)),
+        "negative_ttl_days": max(1, env_int("GEOCODE_NEGATIVE_TTL_DAYS", 30)),
+        "error_retry_hours": max(1, env_int("GEOCODE_ERROR_RETRY_HOURS", 6)),
+        "user_agent": os.environ.get("GEOCODE_USER_AGENT", "WH-Tracker/1.0 (dispatch geocoder)"),
+    }
+
+
+def get_dashboard_stats_settings() -> dict:
+    return {
+        # Older precomputed tiles mean the sync worker is down; query live instead.
+        "max_age_seconds": max(30, env_int("DASHBOARD_STATS_MAX_AGE_SECONDS", 300)),
+    }
+
+
+def get_samsara_settings() -> dict:
+    return {
+        "api_token": (os.environ.get("SAMSARA_API_TOKEN") or "").strip(),
+        "base_url": (os.environ.get("SAMSARA_BASE_URL") or "https://api.samsara.com").rstrip("/"),
+        "location_ttl_seconds": max(5, env_int("SAMSARA_CACHE_TTL", 15)),
+        "meta_ttl_seconds": max(60, env_int("SAMSARA_META_TTL_SECONDS", 3600)),
+        "position_history": max(1, env_int("SAMSARA_POSITION_HISTORY", 20)),
+        "pool_size": max(1, env_int("SAMSARA_POOL_SIZE", 10)),
+        "timeout_seconds": max(1, env_int("SAMSARA_TIMEOUT_SECONDS", 12)),
+        # Serverless workers don't keep threads between requests; they poll on demand instead.
+        "poller_enabled": env_bool("SAMSARA_POLLER_ENABLED", not os.environ.get("VERCEL")),
+        # One process per host polls; the others read its latest poll from this file.
+        "snapshot_path": os.environ.get("SAMSARA_SNAPSHOT_PATH")
+        or os.path.join(tempfile.gettempdir(), "wh_tracker_samsara_locations.json"),
+    }
+
+
+def get_breadcrumb_settings() -> dict:
+    return {
+        "enabled": env_bool("VEHICLE_BREADCRUMBS_ENABLED", True),
+        "retention_days": max(1, env_int("VEHICLE_BREADCRUMBS_RETENTION_DAYS", 90)),
+        # Past this age a track keeps one fix per vehicle per downsample_seconds.
+        "downsample_after_days": max(1, env_int("VEHICLE_BREADCRUMBS_DOWNSAMPLE_AFTER_DAYS", 7)),
+        "downsample_seconds": max(1, env_int("VEHICLE_BREADCRUMBS_DOWNSAMPLE_SECONDS", 60)),
+        # How far back "positions at an instant" looks for each vehicle's last fix.
+        "instant_lookback_minutes": max(1, env_int("VEHICLE_BREADCRUMBS_LOOKBACK_MINUTES", 10)),
+    }
+
+
+def _branch_yards() -> dict:
+    """DISPATCH_BRANCH_YARDS_JSON: {"20GR": {"lat": .., "lon": ..}} or {"20GR": [lat, lon]}."""
+    try:
+        raw = json.loads(os.environ.get("DISPATCH_BRANCH_YARDS_JSON") or "{}")
+    except ValueError:
+        return {}
+    yards = {}
+    for code, value in (raw.items() if isinstance(raw, dict) else []):
+        try:
+            lat, lon = (value["lat"], value["lon"]) if isinstance(value, dict) else value
+            yards[str(code).strip().upper()] = {"lat": float(lat), "lon": float(lon)}
+        except (KeyError, TypeError, ValueError):
+            continue
+    return yards
+
+
+def get_route_optimization_settings() -> dict:
+    return {
+        "yards": _branch_yards(),
+        # Road miles per straight-line mile; only scales the reported distances.
+        "road_factor": max(1.0, env_float("ROUTE_ROAD_FACTOR", 1.3)),
+        "time_budget_ms": max(10, env_int("ROUTE_OPTIMIZE_BUDGET_MS", 1000)),
+        "plan_time_budget_ms": max(10, env_int("ROUTE_PLAN_BUDGET_MS", 3000)),
+        "truck_capacity_lbs": max(1.0, env_float("ROUTE_TRUCK_CAPACITY_LBS", 24000)),
+        "max_trucks": max(1, env_int("ROUTE_PLAN_MAX_TRUCKS", 20)),
+    }
+
+
+def get_spatial_index_settings() -> dict:
+    return {
+        # 0.05 degrees is about 3.5 miles north-south and 2.5 east-west in Iowa.
+        "cell_degrees": min(1.0, max(0.005, env_float("SPATIAL_CELL_DEGREES", 0.05))),
+        "stops_refresh_seconds": max(5, env_int("SPATIAL_STOPS_REFRESH_SECONDS", 60)),
+        "max_scopes": max(1, env_int("SPATIAL_MAX_SCOPES", 8)),
+        "viewport_limit": max(1, env_int("SPATIAL_VIEWPORT_LIMIT", 2000)),
+    }
+
+
+def get_manifest_settings() -> dict:
+    return {
+        "max_items": max(1, env_int("MANIFEST_MAX_ITEMS", 250)),
+        "logo_path": os.environ.get("LOGO_PATH") or r"C:\Users\amcgrean\python\dd\beisser_logo_full_color_CMYK (print).png",
+        # Process-pool rendering for large manifests; 0 or 1 (the default)
+        # renders in the request thread.  Every web worker gets its own pool,
+        # so N workers start WEB_CONCURRENCY x N extra interpreters.
+        "workers": max(0, env_int("MANIFEST_WORKERS", 1)),
+        "parallel_min_pages": max(1, env_int("MANIFEST_PARALLEL_MIN_PAGES", 60)),
+        "batch_pages": max(1, env_int("MANIFEST_BATCH_PAGES", 25)),
+        # Rendered manifests spill from memory to a temp file past this size.
+        "spool_bytes": max(0, env_int("MANIFEST_SPOOL_MB", 8)) * 1024 * 1024,
+    }
+
+
+def get_startup_settings() -> dict:
+    return {
+        "run_migrations": env_bool("RUN_MIGRATIONS_ON_START", True),
+        # Compare alembic_version with the migration scripts' head first and
+        # only load Alembic when they differ.
+        "skip_current_migrations": env_bool("MIGRATIONS_SKIP_WHEN_CURRENT", True),
+        "heads_cache_path": os.environ.get("MIGRATION_HEADS_CACHE")
+        or os.path.join(tempfile.gettempdir(), "wh_tracker_alembic_heads.json"),
+    }
+
+
+def get_so_attribute_index_settings() -> dict:
+    return {
+        # Background threads don't outlive a serverless request; look up on demand there.
+        "enabled": env_bool("SO_ATTRIBUTE_INDEX_ENABLED", not os.environ.get("VERCEL")),
+        "refresh_seconds": max(5, env_int("SO_ATTRIBUTE_INDEX_REFRESH_SECONDS", 30)),
+    }
+
+
+def get_live_update_settings() -> dict:
+    web = get_web_server_settings()
+    # Every open stream holds one of the worker's request slots: keep half of
+    # them free by default and never hand out the last one.  A sync worker has
+    # only the one, so its cap is 0.
+    concurrency = web["concurrency"]
+    max_streams = min(env_int("LIVE_UPDATES_MAX_STREAMS", concurrency // 2), concurrency - 1)
+    return {
+        "backend": (os.environ.get("LIVE_UPDATES_BACKEND") or "memory").strip().lower(),
+        "database_url": normalize_database_url(
+            (os.environ.get("LIVE_UPDATES_DATABASE_URL") or "").strip() or get_database_url()
+        ),
+        "min_refresh_seconds": max(1, env_int("LIVE_UPDATES_MIN_REFRESH_SECONDS", 2)),
+        "idle_refresh_seconds": max(10, env_int("LIVE_UPDATES_IDLE_REFRESH_SECONDS", 60)),
+        "heartbeat_seconds": max(5, env_int("LIVE_UPDATES_HEARTBEAT_SECONDS", 15)),
+        "max_stream_seconds": max(30, env_int("LIVE_UPDATES_MAX_STREAM_SECONDS", 300)),
+        # A stream holds its worker for the whole connection, so only threaded
+        # and cooperative workers serve them; under sync workers screens poll.
+        "streams_enabled": web["worker_class"] in ("gthread", "gevent") and max_streams > 0,
+        "max_streams_per_worker": max(0, max_streams),
+    }
+
+
 def get_sql_server_settings() -> dict:
     dsn = (os.environ.get("SQLSERVER_DSN") or "").strip()
     if dsn:
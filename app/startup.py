@@ -0,0 +1,133 @@
+"""Cold-start helpers for create_app().
+
+Fly stops idle machines, so a cold start happens on a real request.  Two
+things used to dominate it: importing Flask-Migrate (which imports Alembic)
+and running ``upgrade()`` under an advisory lock on every boot.
+
+* ``migration_heads()`` reads the head revision(s) straight from the
+  migration scripts, without Alembic, and caches them on disk keyed by the
+  versions directory's file names, sizes and mtimes.
+* ``schema_is_current()`` compares them with ``alembic_version`` in one
+  query.  create_app() only loads Alembic and migrates when they differ.
+* ``LazyMigrateGroup`` keeps ``flask db ...`` working while Flask-Migrate
+  is only imported once a ``db`` command actually runs.
+"""
+import ast
+import hashlib
+import json
+import os
+import re
+
+import click
+from sqlalchemy import text
+
+_REVISION_RE = re.compile(r"^revision\s*(?::\s*str\s*)?=\s*(.+)$", re.MULTILINE)
+_DOWN_REVISION_RE = re.compile(r"^down_revision\s*(?::[^=]+)?=\s*(.+)$", re.MULTILINE)
+
+
+def _versions_fingerprint(versions_dir):
+    digest = hashlib.sha1()
+    for name in sorted(os.listdir(versions_dir)):
+        if name.endswith(".py"):
+            stat = os.stat(os.path.join(versions_dir, name))
+            digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def _literal(source):
+    try:
+        return ast.literal_eval(source.split("#", 1)[0].strip())
+    except (ValueError, SyntaxError):
+        return None
+
+
+def _scan_heads(versions_dir):
+    revisions, parents = set(), set()
+    for name in os.listdir(versions_dir):
+        if not name.endswith(".py"):
+            continue
+        with open(os.path.join(versions_dir, name), encoding="utf-8") as handle:
+            source = handle.read()
+        revision = _REVISION_RE.search(source)
+        if revision is None:
+            continue
+        revisions.add(_literal(revision.group(1)))
+        down = _DOWN_REVISION_RE.search(source)
+        down_value = _literal(down.group(1)) if down else None
+        if isinstance(down_value, str):
+            parents.add(down_value)
+        elif isinstance(down_value, (tuple, list)):
+            parents.update(down_value)
+    return sorted(rev for rev in revisions - parents if rev)
+
+
+def migration_heads(migrations_dir, cache_path=None):
+    """Head revision ids of the migration scripts in *migrations_dir*."""
+    versions_dir = os.path.join(migrations_dir, "versions")
+    fingerprint = _versions_fingerprint(versions_dir)
+    if cache_path:
+        try:
+            with open(cache_path, encoding="utf-8") as handle:
+                cached = json.load(handle)
+            if cached.get("fingerprint") == fingerprint:
+                return cached["heads"]
+        except (OSError, ValueError, KeyError):
+            pass
+    heads = _scan_heads(versions_dir)
+    if cache_path:
+        try:
+            with open(cache_path, "w", encoding="utf-8") as handle:
+                json.dump({"fingerprint": fingerprint, "heads": heads}, handle)
+        except OSError:
+            pass  # read-only filesystem (serverless): scan again next boot
+    return heads
+
+
+def schema_is_current(engine, migrations_dir, cache_path=None):
+    """True when alembic_version holds exactly the scripts' head revision(s).
+    Any error reading it counts as "not current" so the normal migration path
+    (with its recovery logic) runs."""
+    try:
+        heads = migration_heads(migrations_dir, cache_path)
+        with engine.connect() as conn:
+            versions = [row[0] for row in conn.execute(text("SELECT version_num FROM alembic_version"))]
+    except Exception:
+        return False
+    return bool(heads) and sorted(versions) == heads
+
+
+def init_migrate(app, db):
+    """Register Flask-Migrate on *app* (imports Alembic)."""
+    if "migrate" not in app.extensions:
+        from flask_migrate import Migrate
+
+        Migrate(app, db)
+
+
+class LazyMigrateGroup(click.Group):
+    """Stand-in for Flask-Migrate's ``db`` command group that imports it on first use.
+
+    Only ``flask --help`` sees the stand-in.  Running ``flask db ...`` builds
+    its context from the real group, so the group's own options and callback
+    (which set ``g.directory`` and ``g.x_arg``) run as usual.
+    """
+
+    def __init__(self, app, db):
+        super().__init__(name="db", help="Perform database migrations.")
+        self._app = app
+        self._db = db
+
+    def _real_group(self):
+        init_migrate(self._app, self._db)
+        from flask_migrate.cli import db as db_cli_group
+
+        return db_cli_group
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        return self._real_group().make_context(info_name, args, parent=parent, **extra)
+
+    def list_commands(self, ctx):
+        return self._real_group().list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self._real_group().get_command(ctx, name)
@@ -6,6 +6,8 @@ const DEFAULTS = {
   colors: { K: '#2ca02c', S: '#1f77b4', B: '#ff7f0e', CM: '#d62728' }
 };
 const SKEY = 'dispatch_settings_v1';
+// Matches the server's MANIFEST_MAX_ITEMS default.
+const MANIFEST_MAX_ITEMS = 250;
 
 function loadSettings() {
   try {
@@ -155,8 +157,8 @@ function loadSettings() {
   }
 
   function updateManifestButton() {
-    manifestBtn.disabled = !(selection.size >= 1 && selection.size <= 10);
-    manifestBtn.textContent = `Create Manifest PDF (${selection.size}/10)`;
+    manifestBtn.disabled = !(selection.size >= 1 && selection.size <= MANIFEST_MAX_ITEMS);
+    manifestBtn.textContent = `Create Manifest PDF (${selection.size}/${MANIFEST_MAX_ITEMS})`;
   }
 
   function setRowSelected(id, isSelected) {
@@ -169,7 +171,7 @@ function loadSettings() {
 
   function toggleSelectionById(id) {
     if (selection.has(id)) selection.delete(id);
-    else if (selection.size < 10) selection.add(id);
+    else if (selection.size < MANIFEST_MAX_ITEMS) selection.add(id);
     setRowSelected(id, selection.has(id));
     updateManifestButton();
   }
@@ -35,6 +35,30 @@ export function loadStops(params) {
   return fetchJSON(`${BASE}/api/stops?${qs}`);
 }
 
+// Stops inside the map's visible bounds (a Leaflet LatLngBounds or [s, w, n, e]).
+export function loadViewportStops(params) {
+  const b = params.bounds;
+  const bbox = Array.isArray(b) ? b : [b.getSouth(), b.getWest(), b.getNorth(), b.getEast()];
+  const qs = new URLSearchParams({ bbox: bbox.map(v => Number(v).toFixed(5)).join(',') });
+  if (params.start) qs.set('start', params.start);
+  if (params.end) qs.set('end', params.end);
+  if (params.branch) qs.set('branch', params.branch);
+  if (params.unassigned) qs.set('unassigned', '1');
+  if (params.limit) qs.set('limit', params.limit);
+  return fetchJSON(`${BASE}/api/stops/viewport?${qs}`);
+}
+
+// ── Spatial ──
+// kind: 'stops' | 'vehicles'; params: lat/lon, near_vehicle or near_stop,
+// plus radius_miles or k, start/end/branch, unassigned.
+export function spatialQuery(kind, params) {
+  const qs = new URLSearchParams();
+  Object.entries(params || {}).forEach(([key, value]) => {
+    if (value !== undefined && value !== null && value !== '') qs.set(key, value === true ? '1' : value);
+  });
+  return fetchJSON(`${BASE}/api/spatial/${kind}?${qs}`);
+}
+
 // ── KPIs ──
 export function loadKPIs(date, branch) {
   const qs = new URLSearchParams();
@@ -0,0 +1,94 @@
+// Server-sent live updates: feed snapshots/diffs (TV boards) and "changed"
+// pings (dashboards that fetch their own data). Falls back to polling while
+// the stream is down or EventSource is unavailable, and for good when the
+// server answers 204 (sync gunicorn workers don't serve streams).
+(function (global) {
+    'use strict';
+
+    function connect(url, handlers, options) {
+        options = options || {};
+        var fallbackMs = options.fallbackMs || 60000;
+        var fallbackTimer = null;
+
+        function startFallback() {
+            if (!fallbackTimer && handlers.fallback) {
+                fallbackTimer = setInterval(handlers.fallback, fallbackMs);
+            }
+        }
+
+        function stopFallback() {
+            if (fallbackTimer) {
+                clearInterval(fallbackTimer);
+                fallbackTimer = null;
+            }
+        }
+
+        if (!global.EventSource) {
+            startFallback();
+            return null;
+        }
+
+        var source = new EventSource(url);
+        source.addEventListener('open', stopFallback);
+        // EventSource reconnects by itself; poll until it does.
+        source.addEventListener('error', startFallback);
+        ['snapshot', 'diff', 'changed', 'ping'].forEach(function (name) {
+            source.addEventListener(name, function (event) {
+                if (handlers.message) handlers.message(name);
+                if (handlers[name]) handlers[name](JSON.parse(event.data || '{}'));
+            });
+        });
+        return source;
+    }
+
+    // Re-run `refresh` whenever the server says something changed (bursts are
+    // coalesced), or every `fallbackMs` while the stream is down.
+    function onChange(url, refresh, options) {
+        options = options || {};
+        var debounceMs = options.debounceMs || 1000;
+        var timer = null;
+        return connect(url, {
+            changed: function () {
+                clearTimeout(timer);
+                timer = setTimeout(refresh, debounceMs);
+            },
+            fallback: refresh,
+        }, options);
+    }
+
+    // Client-side copy of a feed: apply snapshot/diff events, read rows in order.
+    function FeedState() {
+        this.rows = {};
+        this.order = [];
+        this.version = 0;
+    }
+
+    FeedState.prototype.apply = function (name, data) {
+        var self = this;
+        var changed = {};
+        if (name === 'snapshot') {
+            self.rows = {};
+            (data.rows || []).forEach(function (row) {
+                self.rows[row.key] = row;
+                changed[row.key] = true;
+            });
+            self.order = (data.rows || []).map(function (row) { return row.key; });
+        } else {
+            (data.upsert || []).forEach(function (row) {
+                self.rows[row.key] = row;
+                changed[row.key] = true;
+            });
+            (data.remove || []).forEach(function (key) { delete self.rows[key]; });
+            self.order = data.order || self.order;
+        }
+        self.version = data.version || self.version;
+        return changed;
+    };
+
+    FeedState.prototype.list = function () {
+        var self = this;
+        return self.order.map(function (key) { return self.rows[key]; }).filter(Boolean);
+    };
+
+    global.LiveUpdates = { connect: connect, onChange: onChange, FeedState: FeedState };
+})(window);
@@ -0,0 +1,157 @@
+// Kiosk scan queue: every scan is written to IndexedDB first and replayed in
+// order through /api/smart_scan/batch, so scans taken while the yard Wi-Fi is
+// down are kept and applied with the time they were captured. Each scan has a
+// client_id the server records, which makes replaying a batch safe.
+(function (global) {
+    'use strict';
+
+    var DB_NAME = 'wh-tracker-kiosk';
+    var STORE = 'scans';
+    var BATCH_URL = '/api/smart_scan/batch';
+    var BATCH_SIZE = 200;  // SMART_SCAN_BATCH_LIMIT on the server
+
+    var dbPromise = null;
+    var memoryQueue = [];  // used when IndexedDB is unavailable (private mode, old browsers)
+    var flushing = null;
+    var listeners = [];
+
+    function openDb() {
+        if (!global.indexedDB) return Promise.resolve(null);
+        if (!dbPromise) {
+            dbPromise = new Promise(function (resolve) {
+                var req = global.indexedDB.open(DB_NAME, 1);
+                req.onupgradeneeded = function () {
+                    // Auto-increment keys keep the store in scan order.
+                    req.result.createObjectStore(STORE, { keyPath: 'seq', autoIncrement: true });
+                };
+                req.onsuccess = function () { resolve(req.result); };
+                req.onerror = function () { resolve(null); };
+            });
+        }
+        return dbPromise;
+    }
+
+    function request(req) {
+        return new Promise(function (resolve, reject) {
+            req.onsuccess = function () { resolve(req.result); };
+            req.onerror = function () { reject(req.error); };
+        });
+    }
+
+    function withStore(mode, fn) {
+        return openDb().then(function (db) {
+            if (!db) return fn(null);
+            return fn(db.transaction(STORE, mode).objectStore(STORE));
+        });
+    }
+
+    function newClientId() {
+        var random = Math.random().toString(36).slice(2, 10);
+        return 'scan-' + Date.now().toString(36) + '-' + random;
+    }
+
+    function enqueue(scan) {
+        var entry = {
+            client_id: newClientId(),
+            picker_id: scan.picker_id,
+            barcode: scan.barcode,
+            scanned_at: new Date().toISOString(),
+        };
+        return withStore('readwrite', function (store) {
+            if (!store) {
+                memoryQueue.push(entry);
+                return entry;
+            }
+            return request(store.add(entry)).then(function () { return entry; });
+        });
+    }
+
+    function pending() {
+        return withStore('readonly', function (store) {
+            if (!store) return memoryQueue.slice();
+            return request(store.getAll());
+        });
+    }
+
+    function remove(entries) {
+        var done = {};
+        entries.forEach(function (entry) { done[entry.client_id] = true; });
+        return withStore('readwrite', function (store) {
+            if (!store) {
+                memoryQueue = memoryQueue.filter(function (entry) { return !done[entry.client_id]; });
+                return null;
+            }
+            return Promise.all(entries.map(function (entry) { return request(store.delete(entry.seq)); }));
+        });
+    }
+
+    function postBatch(entries) {
+        var scans = entries.map(function (entry) {
+            return {
+                client_id: entry.client_id,
+                picker_id: entry.picker_id,
+                barcode: entry.barcode,
+                scanned_at: entry.scanned_at,
+            };
+        });
+        return fetch(BATCH_URL, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ scans: scans }),
+        }).then(function (resp) {
+            if (!resp.ok) throw new Error('Scan upload failed (' + resp.status + ')');
+            return resp.json();
+        });
+    }
+
+    // Send queued scans oldest first. Scans the server answered for are removed
+    // and reported to listeners; on a network or server error they stay queued.
+    function flush() {
+        if (flushing) return flushing;
+        var results = {};
+        function next() {
+            return pending().then(function (entries) {
+                if (!entries.length) return results;
+                var batch = entries.slice(0, BATCH_SIZE);
+                return postBatch(batch).then(function (data) {
+                    (data.results || []).forEach(function (result) {
+                        results[result.client_id] = result;
+                        listeners.forEach(function (fn) { fn(result); });
+                    });
+                    return remove(batch).then(next);
+                });
+            });
+        }
+        flushing = next().then(function (value) {
+            flushing = null;
+            return value;
+        }, function (err) {
+            flushing = null;
+            throw err;
+        });
+        return flushing;
+    }
+
+    function onResult(fn) {
+        listeners.push(fn);
+    }
+
+    // Replay anything left over from a previous page, then whenever the
+    // connection comes back and every `intervalMs` as a safety net.
+    function start(options) {
+        options = options || {};
+        var intervalMs = options.intervalMs || 30000;
+        function attempt() { flush().catch(function () {}); }
+        global.addEventListener('online', attempt);
+        setInterval(attempt, intervalMs);
+        attempt();
+    }
+
+    global.ScanQueue = {
+        enqueue: enqueue,
+        flush: flush,
+        pending: pending,
+        onResult: onResult,
+        start: start,
+    };
+})(window);
@@ -0,0 +1,77 @@
+"""gunicorn settings for the web app (Dockerfile / fly.toml: `gunicorn -c gunicorn.conf.py run:app`).
+
+The worker profile comes from app.runtime_settings.get_web_server_settings():
+
+    WEB_WORKER_CLASS=gthread  WEB_CONCURRENCY=2  WEB_THREADS=8     (default)
+    WEB_WORKER_CLASS=gevent   WEB_WORKER_CONNECTIONS=100           (needs gevent, psycogreen)
+    WEB_WORKER_CLASS=sync     WEB_CONCURRENCY=1                    (the old behaviour)
+
+Each worker gets its own SQLAlchemy pool sized from the same settings
+(get_sqlalchemy_engine_options), so the database sees at most
+workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections from this machine.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.runtime_settings import (  # noqa: E402
+    get_database_url,
+    get_sqlalchemy_engine_options,
+    get_web_server_settings,
+    load_tracker_env,
+)
+
+load_tracker_env()
+_web = get_web_server_settings()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+worker_class = _web["worker_class"]
+workers = _web["workers"]
+threads = _web["threads"]
+worker_connections = _web["worker_connections"]
+timeout = _web["timeout"]
+graceful_timeout = _web["graceful_timeout"]
+keepalive = _web["keepalive"]
+accesslog = os.environ.get("WEB_ACCESS_LOG") or None
+errorlog = "-"
+
+
+def on_starting(server):
+    server.log.info(
+        "Worker profile: %s x %d (%d concurrent requests each)", worker_class, workers, _web["concurrency"],
+    )
+    options = get_sqlalchemy_engine_options(get_database_url())
+    if "pool_size" not in options:
+        return  # NullPool or a non-PostgreSQL database: nothing to size
+    per_worker = options["pool_size"] + options["max_overflow"]
+    total = per_worker * workers
+    server.log.info("DB pool: up to %d connections per worker, %d total", per_worker, total)
+    if _web["db_max_connections"] and total > _web["db_max_connections"]:
+        server.log.warning(
+            "DB pools can open %d connections, over DB_MAX_CONNECTIONS=%d; lower DB_POOL_SIZE or WEB_CONCURRENCY",
+            total, _web["db_max_connections"],
+        )
+
+
+def post_worker_init(worker):
+    # Per-worker background threads start here rather than in create_app(), so
+    # the sync worker, scripts and `flask` commands never start them.
+    from app.Services.erp.so_attributes import init_so_attribute_index
+    from app.Services.samsara_service import init_samsara_poller
+
+    init_so_attribute_index()
+    init_samsara_poller()
+
+
+def post_fork(server, worker):
+    if worker_class != "gevent":
+        return
+    # gevent's worker has patched sockets; psycopg2 needs its wait callback
+    # swapped too, or every query blocks the whole worker.
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        server.log.warning("psycogreen is not installed; PostgreSQL queries will block gevent workers")
+        return
+    patch_psycopg()
@@ -0,0 +1,63 @@
+"""dashboard_stats v2: precomputed workcenter tiles and version tokens
+
+Revision ID: a0b1c2d3e4f5
+Revises: z9a0b1c2d3e4
+Create Date: 2026-04-08 00:00:00.000000
+
+The sync worker now precomputes every workcenter tile, so the homepage reads
+them in one query instead of fanning out to the ERP mirror per page view.
+
+- dashboard_stats: sales_open_orders, sales_orders_today, todays_deliveries,
+  picks_completed_today (per branch) and stats_version.  stats_version is
+  bumped whenever a row's values change.
+- dashboard_scope_stats: tiles that aren't per branch — ('all', '*') and one
+  ('rep', rep_id) row per sales rep.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+revision = 'a0b1c2d3e4f5'
+down_revision = 'z9a0b1c2d3e4'
+branch_labels = None
+depends_on = None
+
+
+BRANCH_COLUMNS = [
+    ('sales_open_orders', sa.Integer(), {}),
+    ('sales_orders_today', sa.Integer(), {}),
+    ('todays_deliveries', sa.Integer(), {}),
+    ('picks_completed_today', sa.Integer(), {}),
+    ('stats_version', sa.Integer(), {'nullable': False, 'server_default': '0'}),
+]
+
+
+def upgrade():
+    inspector = inspect(op.get_bind())
+    columns = {col['name'] for col in inspector.get_columns('dashboard_stats')}
+    for name, type_, options in BRANCH_COLUMNS:
+        if name not in columns:
+            op.add_column('dashboard_stats', sa.Column(name, type_, nullable=options.get('nullable', True),
+                                                       server_default=options.get('server_default')))
+
+    if not inspector.has_table('dashboard_scope_stats'):
+        op.create_table(
+            'dashboard_scope_stats',
+            sa.Column('scope', sa.String(16), primary_key=True),
+            sa.Column('scope_key', sa.String(64), primary_key=True),
+            sa.Column('sales_open_orders', sa.Integer(), nullable=True),
+            sa.Column('sales_orders_today', sa.Integer(), nullable=True),
+            sa.Column('picks_completed_today', sa.Integer(), nullable=True),
+            sa.Column('total_pickers', sa.Integer(), nullable=True),
+            sa.Column('active_pickers', sa.Integer(), nullable=True),
+            sa.Column('pending_po_reviews', sa.Integer(), nullable=True),
+            sa.Column('stats_version', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        )
+
+
+def downgrade():
+    op.drop_table('dashboard_scope_stats')
+    for name, _type, _options in reversed(BRANCH_COLUMNS):
+        op.drop_column('dashboard_stats', name)
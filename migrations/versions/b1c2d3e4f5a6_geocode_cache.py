@@ -0,0 +1,47 @@
+"""geocode_cache and a pending-geocode index on erp_mirror_cust_shipto
+
+Revision ID: b1c2d3e4f5a6
+Revises: a0b1c2d3e4f5
+Create Date: 2026-04-10 00:00:00.000000
+
+Ship-to geocoding moved to its own pipeline.  Addresses the local index can't
+resolve go to the remote geocoder once; the answer, including "no result",
+is kept in geocode_cache keyed by the normalized address.  The partial index
+lets the pipeline find ship-tos still waiting for coordinates without
+scanning the whole table.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+revision = 'b1c2d3e4f5a6'
+down_revision = 'a0b1c2d3e4f5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    if not inspector.has_table('geocode_cache'):
+        op.create_table(
+            'geocode_cache',
+            sa.Column('address_key', sa.String(512), primary_key=True),
+            sa.Column('lat', sa.Numeric(9, 6), nullable=True),
+            sa.Column('lon', sa.Numeric(9, 6), nullable=True),
+            sa.Column('source', sa.String(64), nullable=False),
+            sa.Column('fetched_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        )
+
+    if bind.dialect.name == 'postgresql':
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_erp_mirror_cust_shipto_geocode_pending "
+            "ON erp_mirror_cust_shipto (id) WHERE lat IS NULL"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_erp_mirror_cust_shipto_geocode_pending")
+    op.drop_table('geocode_cache')
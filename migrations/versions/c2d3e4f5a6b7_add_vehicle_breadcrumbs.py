@@ -0,0 +1,64 @@
+"""vehicle_breadcrumbs: day-partitioned GPS history from the Samsara poller
+
+Revision ID: c2d3e4f5a6b7
+Revises: b1c2d3e4f5a6
+Create Date: 2026-04-12 00:00:00.000000
+
+On PostgreSQL the table is range-partitioned by day on recorded_at.  Daily
+partitions (vehicle_breadcrumbs_YYYYMMDD) are created on demand by
+BreadcrumbStore and dropped by its retention pass.  The BRIN index on
+recorded_at is declared on the parent, so every partition gets one.
+Other databases get a plain table with the same columns.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+revision = 'c2d3e4f5a6b7'
+down_revision = 'b1c2d3e4f5a6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if inspect(bind).has_table('vehicle_breadcrumbs'):
+        return
+    if bind.dialect.name == 'postgresql':
+        op.execute(
+            """
+            CREATE TABLE vehicle_breadcrumbs (
+                vehicle_id VARCHAR(128) NOT NULL,
+                recorded_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+                lat DOUBLE PRECISION NOT NULL,
+                lon DOUBLE PRECISION NOT NULL,
+                heading SMALLINT,
+                speed DOUBLE PRECISION,
+                branch_code VARCHAR(32),
+                PRIMARY KEY (vehicle_id, recorded_at)
+            ) PARTITION BY RANGE (recorded_at)
+            """
+        )
+        op.execute(
+            "CREATE INDEX ix_vehicle_breadcrumbs_recorded_at "
+            "ON vehicle_breadcrumbs USING brin (recorded_at)"
+        )
+        return
+
+    op.create_table(
+        'vehicle_breadcrumbs',
+        sa.Column('vehicle_id', sa.String(128), primary_key=True),
+        sa.Column('recorded_at', sa.DateTime(), primary_key=True),
+        sa.Column('lat', sa.Float(), nullable=False),
+        sa.Column('lon', sa.Float(), nullable=False),
+        sa.Column('heading', sa.SmallInteger(), nullable=True),
+        sa.Column('speed', sa.Float(), nullable=True),
+        sa.Column('branch_code', sa.String(32), nullable=True),
+    )
+    op.create_index('ix_vehicle_breadcrumbs_recorded_at', 'vehicle_breadcrumbs', ['recorded_at'])
+
+
+def downgrade():
+    # Dropping the parent drops every daily partition with it.
+    op.drop_table('vehicle_breadcrumbs')
@@ -0,0 +1,162 @@
+"""Add erp_open_pick_lines materialized view (open-pick read model)
+
+Revision ID: u4v5w6x7y8z9
+Revises: t3u4v5w6x7y8
+Create Date: 2026-04-02 00:00:00.000000
+
+One row per open pick line with the shipment and pick-print rollups already
+applied and customer/ship-to joins resolved.  The sync worker refreshes it
+CONCURRENTLY each operational cycle; get_open_picks, get_open_picks_count and
+get_delivery_count read from it instead of rebuilding the CTEs per request.
+
+The shipment and pick-print rollups, joins and status/sale-type predicates
+are copied from the live get_open_picks query, and values are stored as that
+query returns them (no case or date normalisation).  The view keeps every
+K/P/S line plus lines whose expect/ship/invoice date is within a day of
+CURRENT_DATE, and adds expect_day/ship_day/invoice_day so readers can apply
+the exact "today" filter with the application clock between refreshes.
+
+Indexes:
+- (system_id, so_id, sequence) UNIQUE — required by REFRESH CONCURRENTLY
+  (DISTINCT ON guards against duplicate TRIM() customer matches)
+- (system_id, handling_code, so_id) INCLUDE (status + days)
+                                      — index-only branch/handling counts
+"""
+from alembic import op
+
+
+revision = 'u4v5w6x7y8z9'
+down_revision = 't3u4v5w6x7y8'
+branch_labels = None
+depends_on = None
+
+
+OPEN_PICK_LINES_SQL = """
+CREATE MATERIALIZED VIEW IF NOT EXISTS erp_open_pick_lines AS
+WITH shipment_rollup AS (
+    SELECT
+        sh.system_id,
+        sh.so_id,
+        MAX(sh.status_flag) AS status_flag,
+        MAX(sh.invoice_date) AS invoice_date,
+        MAX(sh.ship_date) AS ship_date,
+        MAX(sh.ship_via) AS ship_via,
+        MAX(sh.driver) AS driver,
+        MAX(sh.route_id_char) AS route_id_char,
+        MAX(sh.loaded_time) AS loaded_time,
+        MAX(sh.loaded_date) AS loaded_date,
+        MAX(sh.status_flag_delivery) AS status_flag_delivery
+    FROM erp_mirror_shipments_header sh
+    WHERE sh.is_deleted = false
+      AND (
+        sh.invoice_date >= CURRENT_DATE - INTERVAL '180 days'
+        OR sh.ship_date    >= CURRENT_DATE - INTERVAL '180 days'
+        OR UPPER(COALESCE(sh.status_flag, '')) NOT IN ('C', 'X')
+      )
+    GROUP BY sh.system_id, sh.so_id
+),
+pick_rollup AS (
+    SELECT
+        pd.system_id,
+        pd.tran_id AS so_id,
+        MAX(ph.created_date) AS created_date,
+        MAX(ph.created_time) AS created_time
+    FROM erp_mirror_pick_header ph
+    JOIN erp_mirror_pick_detail pd
+        ON ph.pick_id = pd.pick_id
+       AND ph.system_id = pd.system_id
+    WHERE ph.is_deleted = false
+      AND pd.is_deleted = false
+      AND UPPER(COALESCE(ph.print_status, '')) = 'PICK TICKET'
+      AND UPPER(COALESCE(pd.tran_type, '')) = 'SO'
+      AND ph.created_date >= CURRENT_DATE - INTERVAL '30 days'
+    GROUP BY pd.system_id, pd.tran_id
+)
+SELECT DISTINCT ON (soh.system_id, soh.so_id, sod.sequence)
+    soh.system_id,
+    soh.so_id,
+    sod.sequence,
+    ib.handling_code,
+    soh.so_status,
+    soh.expect_date,
+    sh.ship_date,
+    sh.invoice_date,
+    CAST(soh.expect_date AS DATE) AS expect_day,
+    CAST(sh.ship_date AS DATE) AS ship_day,
+    CAST(sh.invoice_date AS DATE) AS invoice_day,
+    i.item,
+    i.description,
+    sod.qty_ordered,
+    c.cust_name,
+    cs.address_1,
+    cs.city,
+    soh.reference,
+    soh.sale_type,
+    sh.status_flag,
+    sh.ship_via,
+    sh.driver,
+    sh.route_id_char AS route,
+    ph.created_time AS pick_printed_time,
+    ph.created_date AS pick_printed_date,
+    sh.loaded_time,
+    sh.loaded_date,
+    sh.status_flag_delivery,
+    NOW() AS refreshed_at
+FROM erp_mirror_so_detail sod
+JOIN erp_mirror_so_header soh
+    ON soh.system_id = sod.system_id
+   AND soh.so_id = sod.so_id
+LEFT JOIN erp_mirror_item i
+    ON i.item_ptr = sod.item_ptr
+   AND i.is_deleted = false
+LEFT JOIN erp_mirror_item_branch ib
+    ON ib.system_id = sod.system_id
+   AND ib.item_ptr = sod.item_ptr
+   AND ib.is_deleted = false
+LEFT JOIN erp_mirror_cust c
+    ON TRIM(CAST(c.cust_key AS TEXT)) = TRIM(CAST(soh.cust_key AS TEXT))
+LEFT JOIN erp_mirror_cust_shipto cs
+    ON TRIM(CAST(cs.cust_key AS TEXT)) = TRIM(CAST(soh.cust_key AS TEXT))
+   AND TRIM(CAST(cs.seq_num AS TEXT)) = TRIM(CAST(soh.shipto_seq_num AS TEXT))
+LEFT JOIN shipment_rollup sh
+    ON sh.system_id = soh.system_id
+   AND sh.so_id = soh.so_id
+LEFT JOIN pick_rollup ph
+    ON ph.system_id = soh.system_id
+   AND ph.so_id = soh.so_id
+WHERE soh.is_deleted = false
+  AND sod.is_deleted = false
+  AND UPPER(COALESCE(soh.so_status, '')) != 'C'
+  AND (
+    (UPPER(COALESCE(soh.so_status, '')) IN ('K', 'P', 'S'))
+    OR CAST(soh.expect_date AS DATE) BETWEEN CURRENT_DATE - 1 AND CURRENT_DATE + 1
+    OR CAST(sh.ship_date AS DATE) BETWEEN CURRENT_DATE - 1 AND CURRENT_DATE + 1
+    OR CAST(sh.invoice_date AS DATE) BETWEEN CURRENT_DATE - 1 AND CURRENT_DATE + 1
+  )
+  AND UPPER(COALESCE(soh.sale_type, '')) NOT IN ('DIRECT', 'WILLCALL', 'XINSTALL', 'HOLD')
+ORDER BY soh.system_id, soh.so_id, sod.sequence
+WITH DATA
+"""
+
+OPEN_PICK_LINES_INDEXES = (
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_open_pick_lines_key "
+    "ON erp_open_pick_lines (system_id, so_id, sequence)",
+    "CREATE INDEX IF NOT EXISTS ix_open_pick_lines_branch_handling "
+    "ON erp_open_pick_lines (system_id, handling_code, so_id) "
+    "INCLUDE (so_status, expect_day, ship_day, invoice_day)",
+)
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute(OPEN_PICK_LINES_SQL)
+    for statement in OPEN_PICK_LINES_INDEXES:
+        op.execute(statement)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS erp_open_pick_lines")
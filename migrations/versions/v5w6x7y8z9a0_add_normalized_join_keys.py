@@ -0,0 +1,70 @@
+"""Add normalized join-key columns to so_header, cust and cust_shipto
+
+Revision ID: v5w6x7y8z9a0
+Revises: u4v5w6x7y8z9
+Create Date: 2026-04-03 00:00:00.000000
+
+The ERP mixins joined these tables with TRIM(CAST(... AS TEXT)) on both
+sides, which no b-tree index can serve.  Stored generated columns hold the
+trimmed keys, so every sync write keeps them current without worker changes,
+and plain composite indexes cover the joins.
+
+Columns / indexes added:
+- erp_mirror_so_header:   cust_key_norm, shipto_seq_norm  (cust_key_norm, shipto_seq_norm)
+- erp_mirror_cust:        cust_key_norm, cust_code_norm   (cust_key_norm), (cust_code_norm)
+- erp_mirror_cust_shipto: cust_key_norm, seq_num_norm     (cust_key_norm, seq_num_norm)
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+revision = 'v5w6x7y8z9a0'
+down_revision = 'u4v5w6x7y8z9'
+branch_labels = None
+depends_on = None
+
+
+_COLUMNS = (
+    ('erp_mirror_so_header', 'cust_key_norm', 64, 'TRIM(cust_key)'),
+    ('erp_mirror_so_header', 'shipto_seq_norm', 32, 'TRIM(shipto_seq_num)'),
+    ('erp_mirror_cust', 'cust_key_norm', 64, 'TRIM(cust_key)'),
+    ('erp_mirror_cust', 'cust_code_norm', 64, 'TRIM(cust_code)'),
+    ('erp_mirror_cust_shipto', 'cust_key_norm', 64, 'TRIM(cust_key)'),
+    ('erp_mirror_cust_shipto', 'seq_num_norm', 32, 'TRIM(seq_num)'),
+)
+
+_INDEXES = (
+    ('ix_erp_mirror_so_header_cust_norm', 'erp_mirror_so_header', ['cust_key_norm', 'shipto_seq_norm']),
+    ('ix_erp_mirror_cust_key_norm', 'erp_mirror_cust', ['cust_key_norm']),
+    ('ix_erp_mirror_cust_code_norm', 'erp_mirror_cust', ['cust_code_norm']),
+    ('ix_erp_mirror_cust_shipto_norm_key', 'erp_mirror_cust_shipto', ['cust_key_norm', 'seq_num_norm']),
+)
+
+
+def _table_columns(table_name: str) -> set[str]:
+    try:
+        return {column["name"] for column in inspect(op.get_bind()).get_columns(table_name)}
+    except Exception:
+        return set()
+
+
+def upgrade():
+    for table_name, column_name, length, expression in _COLUMNS:
+        if column_name in _table_columns(table_name):
+            continue
+        op.add_column(
+            table_name,
+            sa.Column(column_name, sa.String(length), sa.Computed(expression, persisted=True)),
+        )
+
+    for index_name, table_name, columns in _INDEXES:
+        op.create_index(index_name, table_name, columns, unique=False, if_not_exists=True)
+
+
+def downgrade():
+    for index_name, table_name, _columns in reversed(_INDEXES):
+        op.drop_index(index_name, table_name=table_name, if_exists=True)
+    for table_name, column_name, _length, _expression in reversed(_COLUMNS):
+        if column_name in _table_columns(table_name):
+            op.drop_column(table_name, column_name)
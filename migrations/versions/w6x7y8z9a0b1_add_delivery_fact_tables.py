@@ -0,0 +1,80 @@
+"""Add delivery reporting fact + daily rollup tables
+
+Revision ID: w6x7y8z9a0b1
+Revises: v5w6x7y8z9a0
+Create Date: 2026-04-04 00:00:00.000000
+
+erp_delivery_order_facts holds one row per delivered order with the
+DeliveryReportingService rules applied (sale type group, ship-via bucket,
+same-day flags, piece counts).  erp_delivery_daily_rollups sums those per
+store / ship date / sale type group / ship-via bucket, which is the grain the
+dashboard windows and trends aggregate from.
+
+Both are maintained by DeliveryFactStore: after each sync only ship dates
+touched by changed mirror rows are deleted and rebuilt.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+revision = 'w6x7y8z9a0b1'
+down_revision = 'v5w6x7y8z9a0'
+branch_labels = None
+depends_on = None
+
+
+def _table_exists(name):
+    return inspect(op.get_bind()).has_table(name)
+
+
+def upgrade():
+    if not _table_exists('erp_delivery_order_facts'):
+        op.create_table(
+            'erp_delivery_order_facts',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('store', sa.String(length=32), nullable=False),
+            sa.Column('ship_date', sa.Date(), nullable=False),
+            sa.Column('so_id', sa.String(length=64), nullable=False),
+            sa.Column('sale_type', sa.String(length=64), nullable=False),
+            sa.Column('sale_type_group', sa.String(length=64), nullable=False),
+            sa.Column('ship_via', sa.String(length=128), nullable=False),
+            sa.Column('ship_via_bucket', sa.String(length=128), nullable=False),
+            sa.Column('order_date', sa.Date(), nullable=True),
+            sa.Column('order_time', sa.Time(), nullable=True),
+            sa.Column('same_day_flag', sa.Boolean(), nullable=False, server_default=sa.false()),
+            sa.Column('same_day_after_noon_flag', sa.Boolean(), nullable=False, server_default=sa.false()),
+            sa.Column('shipped_line_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('unique_item_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('total_shipped_qty', sa.Float(), nullable=False, server_default='0'),
+            sa.Column('reference_piece_count', sa.Float(), nullable=False, server_default='0'),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_erp_delivery_order_facts_date_store', 'erp_delivery_order_facts', ['ship_date', 'store', 'so_id'], unique=False)
+        op.create_index('ix_erp_delivery_order_facts_store_so', 'erp_delivery_order_facts', ['store', 'so_id'], unique=False)
+
+    if not _table_exists('erp_delivery_daily_rollups'):
+        op.create_table(
+            'erp_delivery_daily_rollups',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('store', sa.String(length=32), nullable=False),
+            sa.Column('ship_date', sa.Date(), nullable=False),
+            sa.Column('sale_type_group', sa.String(length=64), nullable=False),
+            sa.Column('ship_via_bucket', sa.String(length=128), nullable=False),
+            sa.Column('delivered_orders', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('same_day_delivered_orders', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('same_day_after_noon_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('total_shipped_qty', sa.Float(), nullable=False, server_default='0'),
+            sa.Column('reference_piece_count', sa.Float(), nullable=False, server_default='0'),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('ship_date', 'store', 'sale_type_group', 'ship_via_bucket', name='uq_erp_delivery_daily_rollups_key'),
+        )
+
+
+def downgrade():
+    if _table_exists('erp_delivery_daily_rollups'):
+        op.drop_table('erp_delivery_daily_rollups')
+    if _table_exists('erp_delivery_order_facts'):
+        op.drop_index('ix_erp_delivery_order_facts_store_so', table_name='erp_delivery_order_facts')
+        op.drop_index('ix_erp_delivery_order_facts_date_store', table_name='erp_delivery_order_facts')
+        op.drop_table('erp_delivery_order_facts')
@@ -0,0 +1,83 @@
+"""Add keyset, trigram and expression indexes for the sales order lists
+
+Revision ID: x7y8z9a0b1c2
+Revises: w6x7y8z9a0b1
+Create Date: 2026-04-05 00:00:00.000000
+
+get_sales_order_status / get_sales_customer_orders pick each page from
+erp_mirror_so_header alone, ordered by (expect_date, system_id, so_id) DESC,
+and resume from a cursor instead of OFFSET.  These indexes match that order
+and the exact filter expressions the SalesMixin builds, so the planner can use
+them without rewriting the predicates.
+
+Indexes added:
+- erp_mirror_so_header: (expect_date DESC NULLS LAST, system_id DESC, so_id DESC)
+                        WHERE is_deleted = false          — keyset walk, all statuses
+- erp_mirror_so_header: same keys WHERE is_deleted = false AND
+                        UPPER(COALESCE(so_status, '')) = 'O'  — default open-orders list
+- erp_mirror_so_header: UPPER(COALESCE(so_status, '')), UPPER(COALESCE(sale_type, '')),
+                        COALESCE(salesperson, ''), COALESCE(order_writer, '')
+- erp_mirror_so_header: COALESCE(po_number, ''), COALESCE(reference, '')  (gin_trgm)
+- erp_mirror_cust:      COALESCE(cust_name, ''), COALESCE(cust_code, '')  (gin_trgm)
+
+so_id ILIKE is served by the existing ix_so_header_so_id_trgm.  Line counts
+are probed per page row through uq_erp_mirror_so_detail_key.
+"""
+from alembic import op
+from sqlalchemy import inspect
+
+
+revision = 'x7y8z9a0b1c2'
+down_revision = 'w6x7y8z9a0b1'
+branch_labels = None
+depends_on = None
+
+
+KEYSET_COLUMNS = "expect_date DESC NULLS LAST, system_id DESC, so_id DESC"
+
+INDEXES = [
+    ("ix_so_header_keyset", "erp_mirror_so_header",
+     f"({KEYSET_COLUMNS}) WHERE is_deleted = false"),
+    ("ix_so_header_open_keyset", "erp_mirror_so_header",
+     f"({KEYSET_COLUMNS}) WHERE is_deleted = false AND UPPER(COALESCE(so_status, '')) = 'O'"),
+    ("ix_so_header_status_expr", "erp_mirror_so_header",
+     "((UPPER(COALESCE(so_status, ''))))"),
+    ("ix_so_header_sale_type_expr", "erp_mirror_so_header",
+     "((UPPER(COALESCE(sale_type, ''))))"),
+    ("ix_so_header_salesperson_expr", "erp_mirror_so_header",
+     "((COALESCE(salesperson, '')))"),
+    ("ix_so_header_po_number_trgm", "erp_mirror_so_header",
+     "USING gin ((COALESCE(po_number, '')) gin_trgm_ops)"),
+    ("ix_so_header_reference_trgm", "erp_mirror_so_header",
+     "USING gin ((COALESCE(reference, '')) gin_trgm_ops)"),
+    ("ix_cust_name_coalesce_trgm", "erp_mirror_cust",
+     "USING gin ((COALESCE(cust_name, '')) gin_trgm_ops)"),
+    ("ix_cust_code_coalesce_trgm", "erp_mirror_cust",
+     "USING gin ((COALESCE(cust_code, '')) gin_trgm_ops)"),
+]
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, definition in INDEXES:
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} {definition}")
+
+    # order_writer is optional on older mirrors (see _has_order_writer_column)
+    columns = {col['name'] for col in inspect(bind).get_columns('erp_mirror_so_header')}
+    if 'order_writer' in columns:
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_so_header_order_writer_expr "
+            "ON erp_mirror_so_header ((COALESCE(order_writer, '')))"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute("DROP INDEX IF EXISTS ix_so_header_order_writer_expr")
+    for name, _table, _definition in reversed(INDEXES):
+        op.execute(f"DROP INDEX IF EXISTS {name}")
@@ -0,0 +1,66 @@
+"""Add search_documents (global search index)
+
+Revision ID: y8z9a0b1c2d3
+Revises: x7y8z9a0b1c2
+Create Date: 2026-04-06 00:00:00.000000
+
+One row per searchable sales order, customer, ship-to, work order, PO and
+pick, maintained by SearchIndex (sync worker + local pick writes).  The
+global search box queries this table once instead of running the order,
+work order and pick searches one after another.
+
+On PostgreSQL:
+- search_vector tsvector GENERATED from search_text ('simple' config)
+                                     — GIN, ranked prefix matching (tok:*)
+- search_text gin_trgm_ops           — substring matches inside identifiers
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+revision = 'y8z9a0b1c2d3'
+down_revision = 'x7y8z9a0b1c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if not inspect(bind).has_table('search_documents'):
+        op.create_table(
+            'search_documents',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('entity_type', sa.String(16), nullable=False),
+            sa.Column('entity_key', sa.String(160), nullable=False),
+            sa.Column('system_id', sa.String(32), nullable=True),
+            sa.Column('title', sa.String(255), nullable=False),
+            sa.Column('subtitle', sa.String(255), nullable=True),
+            sa.Column('target', sa.String(128), nullable=True),
+            sa.Column('keywords', sa.String(255), nullable=False, server_default=''),
+            sa.Column('search_text', sa.Text(), nullable=False, server_default=''),
+            sa.Column('sort_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+            sa.UniqueConstraint('entity_type', 'entity_key', name='uq_search_documents_entity'),
+        )
+
+    if bind.dialect.name != 'postgresql':
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(
+        "ALTER TABLE search_documents ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('simple', search_text)) STORED"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_search_documents_vector "
+        "ON search_documents USING gin (search_vector)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_search_documents_text_trgm "
+        "ON search_documents USING gin (search_text gin_trgm_ops)"
+    )
+
+
+def downgrade():
+    op.drop_table('search_documents')
@@ -0,0 +1,34 @@
+"""Add audit_events.client_scan_id for kiosk scan replay
+
+Revision ID: z9a0b1c2d3e4
+Revises: y8z9a0b1c2d3
+Create Date: 2026-04-07 00:00:00.000000
+
+Kiosks queue scans offline and replay them through /api/smart_scan/batch.
+Each scan carries a client-generated id that is stored on the AuditEvent it
+produces; the unique index lets a replayed batch skip scans that were already
+applied, even when two replays race.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+revision = 'z9a0b1c2d3e4'
+down_revision = 'y8z9a0b1c2d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {col['name'] for col in inspect(op.get_bind()).get_columns('audit_events')}
+    if 'client_scan_id' not in columns:
+        op.add_column('audit_events', sa.Column('client_scan_id', sa.String(64), nullable=True))
+        op.create_index(
+            'ix_audit_events_client_scan_id', 'audit_events', ['client_scan_id'], unique=True
+        )
+
+
+def downgrade():
+    op.drop_index('ix_audit_events_client_scan_id', table_name='audit_events')
+    op.drop_column('audit_events', 'client_scan_id')
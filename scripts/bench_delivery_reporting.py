@@ -0,0 +1,215 @@
+"""
+bench_delivery_reporting.py
+---------------------------
+Benchmark the delivery dashboard aggregation on a synthetic 12-month data set:
+the single-pass columnar engine (DeliveryReportingService) against the
+previous per-window / per-store / per-day list filtering, asserting both
+produce the same payload.
+
+Usage:
+    cd /path/to/WH-Tracker
+    python scripts/bench_delivery_reporting.py [--orders-per-day 150] [--repeat 3]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time as timer
+from collections import defaultdict
+from datetime import date, time, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.Services import delivery_aggregation  # noqa: E402
+from app.Services.delivery_reporting_service import DeliveryReportingService  # noqa: E402
+
+SALE_TYPES = ["Delivery", "Add On", "Transfer", "Credit", "WillCall", "Special Order", "Quote"]
+SHIP_VIAS = ["FORK NEEDED", "SMALL TRUCK", "DUMP LOAD", "GR_VAN", "VAN", "WILL CALL", "UPS", "Unknown"]
+
+
+def synthetic_rows(service, orders_per_day, seed=11):
+    """Normalized order rows shaped like _fetch_order_rows() output."""
+    rng = random.Random(seed)
+    today = date.today()
+    start = service._window_start("12m")
+    rows = []
+    so_id = 100000
+    day = start
+    while day <= today:
+        for _ in range(rng.randint(orders_per_day // 2, orders_per_day)):
+            so_id += 1
+            store = rng.choice(service.STORE_CODES)
+            sale_type = rng.choice(SALE_TYPES)
+            group = service._normalize_sale_type_group(sale_type)
+            ship_via = rng.choice(SHIP_VIAS)
+            order_date = day - timedelta(days=rng.choice((0, 0, 0, 1, 2, 7)))
+            order_time = time(rng.randint(6, 17), rng.choice((0, 15, 30, 45)))
+            same_day = order_date == day
+            rows.append({
+                "store": store,
+                "ship_date": day,
+                "so_id": str(so_id),
+                "sale_type": sale_type,
+                "sale_type_group": group,
+                "ship_via": ship_via,
+                "ship_via_bucket": service._bucket_ship_via(store, sale_type, group, ship_via),
+                "order_date": order_date,
+                "order_time": order_time,
+                "same_day_flag": same_day,
+                "same_day_after_noon_flag": same_day and order_time >= time(12, 0),
+                "shipped_line_count": rng.randint(1, 30),
+                "unique_item_count": rng.randint(1, 20),
+                "total_shipped_qty": round(rng.uniform(1, 500), 2),
+                "reference_piece_count": float(rng.randint(0, 400)),
+            })
+        day += timedelta(days=1)
+    rows.sort(key=lambda row: (row["ship_date"], row["store"], row["so_id"]), reverse=True)
+    return rows
+
+
+# ----------------------------------------------------------------------
+# Previous implementation: every window / group / trend re-filters rows.
+# ----------------------------------------------------------------------
+
+def legacy_metric_block(service, rows):
+    delivered = len(rows)
+    same_day = sum(1 for row in rows if row["same_day_flag"])
+    after_noon = sum(1 for row in rows if row["same_day_after_noon_flag"])
+    return {
+        "delivered_orders": delivered,
+        "same_day_delivered_orders": same_day,
+        "same_day_delivery_pct": service._pct(same_day, delivered),
+        "same_day_after_noon_count": after_noon,
+        "after_noon_share_of_same_day_deliveries": service._pct(after_noon, same_day),
+        "total_shipped_qty": round(sum(row["total_shipped_qty"] for row in rows), 2),
+        "reference_piece_count": round(sum(row["reference_piece_count"] for row in rows), 2),
+    }
+
+
+def legacy_group_metrics(service, rows, keys):
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[tuple(row[key] for key in keys)].append(row)
+    results = []
+    for key_values, group_rows in grouped.items():
+        payload = dict(zip(keys, key_values))
+        payload.update(legacy_metric_block(service, group_rows))
+        results.append(payload)
+    return sorted(results, key=lambda item: tuple(str(item[key]) for key in keys))
+
+
+def legacy_window(service, rows, start_date, detail_limit):
+    window_rows = [row for row in rows if row["ship_date"] and row["ship_date"] >= start_date]
+    sorted_rows = sorted(window_rows, key=lambda item: (item["ship_date"], item["store"], item["so_id"]), reverse=True)
+    comparison = []
+    for store in service.STORE_CODES:
+        metrics = legacy_metric_block(service, [row for row in window_rows if row["store"] == store])
+        metrics["store"] = store
+        comparison.append(metrics)
+    combined = legacy_metric_block(service, window_rows)
+    combined["store"] = "Combined"
+    comparison.append(combined)
+    return {
+        "summary": legacy_metric_block(service, window_rows),
+        "store_comparison": comparison,
+        "sale_type_totals": legacy_group_metrics(service, window_rows, ("sale_type_group",)),
+        "sale_type_totals_by_store": legacy_group_metrics(service, window_rows, ("store", "sale_type_group")),
+        "sale_type_ship_via_totals": legacy_group_metrics(service, window_rows, ("sale_type_group", "ship_via_bucket")),
+        "sale_type_ship_via_totals_by_store": legacy_group_metrics(service, window_rows, ("store", "sale_type_group", "ship_via_bucket")),
+        "detail_total_count": len(sorted_rows),
+        "details": [service._serialize_detail_row(row) for row in sorted_rows[: max(1, min(detail_limit, 1000))]],
+    }
+
+
+def legacy_daily(service, rows, start_date, end_date):
+    by_store_day = defaultdict(list)
+    for row in rows:
+        if row["ship_date"] and start_date <= row["ship_date"] <= end_date:
+            by_store_day[(row["store"], row["ship_date"])].append(row)
+    trend, cursor = [], start_date
+    while cursor <= end_date:
+        for store in service.STORE_CODES:
+            trend.append({"date": cursor.isoformat(), "store": store,
+                          **legacy_metric_block(service, by_store_day.get((store, cursor), []))})
+        cursor += timedelta(days=1)
+    return trend
+
+
+def legacy_monthly(service, rows, start_date, end_date):
+    by_store_month = defaultdict(list)
+    for row in rows:
+        if row["ship_date"] and row["ship_date"] >= start_date:
+            by_store_month[(row["store"], row["ship_date"].replace(day=1))].append(row)
+    trend = []
+    current, final = service._month_floor(start_date), service._month_floor(end_date)
+    while current <= final:
+        for store in service.STORE_CODES:
+            trend.append({"month": current.strftime("%Y-%m"), "label": current.strftime("%b %Y"), "store": store,
+                          **legacy_metric_block(service, by_store_month.get((store, current), []))})
+        current = service._shift_months(current, 1)
+    return trend
+
+
+def legacy_payload(service, rows, sale_type, detail_limit):
+    today = date.today()
+    start_30d = today - timedelta(days=29)
+    start_12m = service._month_floor(service._shift_months(today, -11))
+    filtered = service._filter_sale_type(rows, sale_type)
+    return {
+        "stores": list(service.STORE_CODES),
+        "sale_type_filter": service._normalize_sale_type_filter(sale_type),
+        "available_sale_types": service._available_sale_types(rows),
+        "windows": {
+            "30d": legacy_window(service, filtered, start_30d, detail_limit),
+            "12m": legacy_window(service, filtered, start_12m, detail_limit),
+        },
+        "trends": {
+            "daily_30d": legacy_daily(service, filtered, start_30d, today),
+            "monthly_12m": legacy_monthly(service, filtered, start_12m, today),
+        },
+    }
+
+
+def columnar_payload(service, sale_type, detail_limit):
+    payload = service.get_dashboard_payload(sale_type=sale_type, detail_limit=detail_limit)
+    for key in ("generated_at", "metric_definitions"):
+        payload.pop(key)
+    return payload
+
+
+def _best_of(func, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        started = timer.perf_counter()
+        result = func()
+        elapsed = timer.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders-per-day", type=int, default=150)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--detail-limit", type=int, default=250)
+    args = parser.parse_args()
+
+    service = DeliveryReportingService()
+    rows = synthetic_rows(service, args.orders_per_day)
+    service._require_central_db = lambda: None
+    service._fact_store = lambda: None
+    service._fetch_order_rows = lambda: rows
+
+    engine = "numpy" if delivery_aggregation._numpy() is not None else "pure Python"
+    print(f"{len(rows)} orders over 12 months; columnar engine: {engine}")
+    for sale_type in ("all", "Delivery"):
+        old, old_s = _best_of(lambda: legacy_payload(service, rows, sale_type, args.detail_limit), args.repeat)
+        new, new_s = _best_of(lambda: columnar_payload(service, sale_type, args.detail_limit), args.repeat)
+        assert new == old, f"columnar payload differs from the previous implementation (sale_type={sale_type})"
+        print(f"  sale_type={sale_type:<9} previous {old_s * 1000:8.1f} ms   columnar {new_s * 1000:8.1f} ms   "
+              f"{old_s / max(new_s, 1e-9):5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+bench_geocoding.py
+------------------
+Benchmark GeocodingService over a recorded address set: one address at a time
+(geocode_address) versus one geocode_addresses() batch, plus the old full-pool
+fuzzy scan when the in-memory index is loaded.
+
+Usage:
+    cd /path/to/WH-Tracker
+
+    # Record ship-to addresses from the mirror (DATABASE_URL) into a CSV
+    python scripts/bench_geocoding.py record --out shipto_addresses.csv --limit 5000
+
+    # Benchmark against a compiled index (or --geojson for the in-memory index)
+    python scripts/bench_geocoding.py run --addresses shipto_addresses.csv --index source.geocode.sqlite
+
+    # No data handy: build a throwaway index and address set
+    python scripts/bench_geocoding.py run --synthetic 3000
+"""
+
+import argparse
+import csv
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from rapidfuzz import fuzz  # noqa: E402
+
+from app.Services.geocoding_index import build_index  # noqa: E402
+from app.Services.geocoding_service import POBOX_RE, GeocodingService  # noqa: E402
+
+STREETS = ["Main", "Maple", "Oak", "Elm", "Walnut", "Cedar", "Prairie View", "Ridge", "Lincoln", "Park"]
+SUFFIXES = ["St", "Ave", "Dr", "Ct", "Ln"]
+CITIES = [("Ames", "50010"), ("Ankeny", "50023"), ("Grimes", "50111"), ("Urbandale", "50322"), ("Waukee", "50263")]
+
+
+def record(args):
+    from sqlalchemy import create_engine, text
+
+    from app.runtime_settings import get_database_url, load_tracker_env
+
+    load_tracker_env()
+    engine = create_engine(get_database_url())
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(
+                "SELECT address_1, city, zip FROM erp_mirror_cust_shipto "
+                "WHERE is_deleted = false AND address_1 IS NOT NULL LIMIT :n"
+            ),
+            {"n": args.limit},
+        ).all()
+    with open(args.out, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["address", "city", "zip"])
+        writer.writerows(rows)
+    print(f"Recorded {len(rows)} addresses to {args.out}")
+
+
+def synthetic(count, workdir):
+    """Write a synthetic source.geojson.gz and a matching address mix (exact / typo / miss)."""
+    rng = random.Random(7)
+    features, points = [], []
+    for city, zip_code in CITIES:
+        for street in STREETS:
+            for suffix in SUFFIXES:
+                for number in range(100, 100 + count // 10, 2):
+                    full = f"{number} {street} {suffix}"
+                    features.append({
+                        "type": "Feature",
+                        "properties": {"full": full, "city": city, "postcode": zip_code},
+                        "geometry": {"type": "Point", "coordinates": [-93.6 + rng.random(), 41.6 + rng.random()]},
+                    })
+                    points.append((number, street, suffix, city, zip_code))
+    source = workdir / "source.geojson.gz"
+    with gzip.open(source, "wt", encoding="utf-8") as f:
+        for feature in features:
+            f.write(json.dumps(feature) + "\n")
+
+    addresses = []
+    for _ in range(count):
+        number, street, suffix, city, zip_code = rng.choice(points)
+        roll = rng.random()
+        if roll < 0.4:
+            addresses.append((f"{number} {street} {suffix}", city, zip_code))
+        elif roll < 0.7:
+            addresses.append((f"{number} {street}", city, zip_code))  # fuzzy_zip
+        elif roll < 0.85:
+            addresses.append((f"{number} {street} {suffix}", city, "00000"))  # fuzzy_city
+        else:
+            addresses.append((f"{number + 1} {street} {suffix}", city, zip_code))  # miss
+    return source, addresses
+
+
+def legacy_geocode(geocoder, address, city, zip_code):
+    """The pre-batch algorithm: score every key in the ZIP / city pool one by one."""
+    if not address or POBOX_RE.search(address):
+        return None, None, "invalid_or_pobox"
+    zip5 = geocoder._norm_zip(zip_code)
+    job_key = geocoder._make_key(address, city, "IA", zip5)
+    job_hn = geocoder._leading_housenumber(address)
+    job_core = geocoder._street_core(address)
+    job_tok = set(job_core.split())
+    if job_key in geocoder.exact_idx:
+        rec = geocoder.exact_idx[job_key][0]
+        return rec[3], rec[4], "exact"
+    for pool, status in ((geocoder.by_zip_idx.get(zip5, []), "fuzzy_zip"),
+                         (geocoder.by_city_idx.get(geocoder._norm_city(city), []), "fuzzy_city")):
+        best = None
+        for key in pool:
+            rec = geocoder.exact_idx[key][0]
+            if rec[5] != job_hn: continue
+            c_sim = fuzz.token_set_ratio(job_core, rec[6])
+            if c_sim < 88: continue
+            cand_tok = set(rec[6].split())
+            if int(round(100 * len(job_tok & cand_tok) / (len(job_tok | cand_tok) or 1))) < 50: continue
+            if best is None or c_sim > best[0]:
+                best = (c_sim, rec)
+        if best and best[0] >= 90:
+            return best[1][3], best[1][4], status
+    return None, None, "failed"
+
+
+def _timed(label, func, count):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<22} {elapsed:8.3f}s  {1000 * elapsed / max(count, 1):8.3f} ms/address")
+    return result, elapsed
+
+
+def run(args):
+    workdir = Path(tempfile.mkdtemp(prefix="geocode-bench-"))
+    if args.synthetic:
+        geojson, addresses = synthetic(args.synthetic, workdir)
+        index = workdir / "source.geocode.sqlite"
+        build_index(geojson, index)
+    else:
+        with open(args.addresses, newline="") as f:
+            addresses = [(row["address"], row["city"], row["zip"]) for row in csv.DictReader(f)]
+        geojson, index = args.geojson, args.index
+
+    print(f"{len(addresses)} addresses")
+    runs = []
+    if index:
+        runs.append(("compiled index", GeocodingService(geojson_path=geojson, index_path=index)))
+    if geojson:
+        runs.append(("in-memory index", GeocodingService(geojson_path=geojson, index_path=workdir / "none.sqlite")))
+
+    for label, geocoder in runs:
+        print(f"{label}:")
+        singles, single_s = _timed("geocode_address loop", lambda: [geocoder.geocode_address(*a) for a in addresses], len(addresses))
+        batch, batch_s = _timed("geocode_addresses", lambda: geocoder.geocode_addresses(addresses), len(addresses))
+        assert batch == singles, "batch and single-address results differ"
+        if geocoder.index is None:
+            legacy, legacy_s = _timed("full-pool scan (old)", lambda: [legacy_geocode(geocoder, *a) for a in addresses], len(addresses))
+            assert legacy == batch, "batch results differ from the full-pool scan"
+            print(f"  batch vs full-pool scan {legacy_s / max(batch_s, 1e-9):.1f}x")
+        print(f"  batch vs loop {single_s / max(batch_s, 1e-9):.1f}x; statuses {dict(Counter(r[2] for r in batch))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("record", help="dump ship-to addresses from the mirror to CSV")
+    rec.add_argument("--out", default="shipto_addresses.csv")
+    rec.add_argument("--limit", type=int, default=5000)
+    bench = sub.add_parser("run", help="time single vs batch geocoding")
+    bench.add_argument("--addresses", help="CSV with address,city,zip columns")
+    bench.add_argument("--index", help="compiled index (python -m app.Services.geocoding_index)")
+    bench.add_argument("--geojson", help="source.geojson(.gz) for the in-memory index and full-pool baseline")
+    bench.add_argument("--synthetic", type=int, help="generate N synthetic addresses instead of --addresses")
+    args = parser.parse_args()
+    if args.command == "record":
+        record(args)
+    elif not args.synthetic and not args.addresses:
+        parser.error("run needs --addresses or --synthetic")
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+bench_manifest_pdf.py
+---------------------
+Benchmark dispatch manifest rendering in pages per second, serial and with
+the process pool, on synthetic orders with a full lines table.
+
+The first serial pass is cold: QR matrices and the logo aren't cached yet.
+The parallel passes include the pool's start-up on the first run only; the
+pool and its workers' caches are reused after that, as in the web worker.
+
+Usage:
+    cd /path/to/WH-Tracker
+
+    # Default sizes: 10, 100, 250 pages; workers from MANIFEST_WORKERS
+    python scripts/bench_manifest_pdf.py
+
+    # Fixed worker count and batch size, with a logo
+    LOGO_PATH=app/static/img/logo.png python scripts/bench_manifest_pdf.py --sizes 100 500 --workers 4 --batch-pages 25
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.runtime_settings import get_manifest_settings  # noqa: E402
+from app.Services import manifest_pdf  # noqa: E402
+
+
+def synthetic_items(count, rng, lines_per_order=12):
+    return [
+        {
+            "id": str(1200000 + rng.randrange(800000)),
+            "doc_kind": rng.choice(["so", "cm"]),
+            "so_status": "K",
+            "branch": rng.choice(["20GR", "25BW", "10FD", "40CV"]),
+            "route_id": rng.randrange(1, 40),
+            "shipment_num": rng.randrange(1, 4),
+            "driver": "Driver %d" % rng.randrange(30),
+            "expected_date": "2026-05-04",
+            "shipto_name": "Customer %d" % rng.randrange(5000),
+            "address": "%d Main St, Ankeny IA 50023" % rng.randrange(100, 9999),
+            "lines": [
+                {
+                    "line_no": n,
+                    "item_id": "ITEM%05d" % rng.randrange(99999),
+                    "item_description": "2x4x8 SPF #2 Stud",
+                    "qty_ordered": rng.randrange(1, 200),
+                    "qty_shipped": rng.randrange(1, 200),
+                    "uom": "EA",
+                    "weight": rng.randrange(1, 500),
+                }
+                for n in range(1, lines_per_order + 1)
+            ],
+        }
+        for _ in range(count)
+    ]
+
+
+def timed(items, settings):
+    started = time.perf_counter()
+    handle = manifest_pdf.render_manifest_pdf(items, settings)
+    elapsed = time.perf_counter() - started
+    size = len(handle.read())
+    handle.close()
+    return len(items) / elapsed, size
+
+
+def main():
+    defaults = get_manifest_settings()
+    parser = argparse.ArgumentParser(description="Benchmark manifest PDF rendering.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 250])
+    parser.add_argument("--workers", type=int, default=defaults["workers"])
+    parser.add_argument("--batch-pages", type=int, default=defaults["batch_pages"])
+    parser.add_argument("--runs", type=int, default=3, help="Warm runs per mode")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    serial = dict(defaults, workers=0)
+    parallel = dict(defaults, workers=args.workers, batch_pages=args.batch_pages, parallel_min_pages=1)
+    merge = "pypdf" if manifest_pdf.PdfWriter is not None else "none (pypdf not installed)"
+    print(f"workers={args.workers} batch={args.batch_pages} merge={merge} cpus={os.cpu_count()}")
+
+    for count in args.sizes:
+        items = synthetic_items(count, rng)
+        manifest_pdf._qr_runs.cache_clear()
+        cold, size = timed(items, serial)
+        warm = max(timed(items, serial)[0] for _ in range(args.runs))
+        line = f"{count:5d} pages  {size / 1024:7.0f} KB  serial cold {cold:6.0f} p/s  warm {warm:6.0f} p/s"
+        if manifest_pdf._can_parallelize(count, parallel):
+            first = timed(items, parallel)[0]
+            best = max(timed(items, parallel)[0] for _ in range(args.runs))
+            line += f"  parallel first {first:6.0f} p/s  warm {best:6.0f} p/s"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+bench_route_optimizer.py
+------------------------
+Benchmark the route optimizer on synthetic stop sets: single-truck
+sequencing (given order vs nearest neighbour vs 2-opt/Or-opt) and multi-truck
+planning under a weight capacity.
+
+Stops are scattered around a yard in a mix of town clusters and rural
+points, with shipment weights drawn from a wide range, so the numbers look
+like a branch's day rather than a uniform square.
+
+Usage:
+    cd /path/to/WH-Tracker
+
+    # Default sizes: 50, 100, 200, 500 stops
+    python scripts/bench_route_optimizer.py
+
+    # Bigger time budget, fixed truck count and capacity
+    python scripts/bench_route_optimizer.py --sizes 100 500 --budget-ms 3000 --trucks 12 --capacity-lbs 20000
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.Services.route_optimizer import (  # noqa: E402
+    assign_trucks,
+    distance_matrix,
+    sequence_stops,
+    tour_length,
+)
+
+YARD = (41.6880, -93.7910)  # central Iowa
+
+
+def synthetic_stops(count, rng, radius_miles=45, towns=8):
+    """[(lat, lon, weight)]: ~70% in town clusters, the rest spread out."""
+    def offset(max_miles):
+        distance = max_miles * math.sqrt(rng.random())
+        bearing = rng.uniform(0, 2 * math.pi)
+        return (
+            distance * math.cos(bearing) / 69.0,
+            distance * math.sin(bearing) / (69.0 * math.cos(math.radians(YARD[0]))),
+        )
+
+    centres = []
+    for _ in range(towns):
+        dlat, dlon = offset(radius_miles)
+        centres.append((YARD[0] + dlat, YARD[1] + dlon))
+    stops = []
+    for _ in range(count):
+        if rng.random() < 0.7:
+            base = rng.choice(centres)
+            dlat, dlon = offset(4)
+        else:
+            base = YARD
+            dlat, dlon = offset(radius_miles)
+        weight = rng.choice([rng.uniform(50, 600), rng.uniform(600, 3000), rng.uniform(3000, 9000)])
+        stops.append((base[0] + dlat, base[1] + dlon, weight))
+    return stops
+
+
+def bench_size(count, args, rng):
+    stops = synthetic_stops(count, rng)
+    started = time.perf_counter()
+    matrix = distance_matrix([YARD] + [(lat, lon) for lat, lon, _w in stops], args.road_factor)
+    matrix_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    result = sequence_stops(matrix, time_budget_ms=args.budget_ms)
+    sequence_ms = (time.perf_counter() - started) * 1000
+    given = tour_length(matrix, list(range(count + 1)))
+
+    weights = [0.0] + [w for _lat, _lon, w in stops]
+    trucks = args.trucks or max(1, math.ceil(sum(weights) / args.capacity_lbs * 1.15))
+    started = time.perf_counter()
+    plan = assign_trucks(matrix, weights, args.capacity_lbs, trucks, args.plan_budget_ms)
+    plan_ms = (time.perf_counter() - started) * 1000
+
+    print(f"\n{count} stops (matrix {matrix_ms:.0f}ms)")
+    print(f"  sequence: given {given:8.0f} mi  nearest-neighbour {result['initial_length']:7.0f} mi  "
+          f"2-opt/Or-opt {result['length']:7.0f} mi  "
+          f"({(1 - result['length'] / result['initial_length']) * 100:4.1f}% under NN)  "
+          f"{sequence_ms:6.0f}ms  {'converged' if result['converged'] else 'budget hit'}")
+    loads = plan["loads"] or [0]
+    print(f"  plan:     {len(plan['routes'])}/{trucks} trucks  {sum(plan['lengths']):8.0f} mi  "
+          f"load {min(loads):.0f}-{max(loads):.0f} lbs of {args.capacity_lbs:.0f}  "
+          f"{len(plan['unassigned'])} unassigned  {plan_ms:6.0f}ms")
+    return sequence_ms, plan_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark route sequencing and truck planning.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 100, 200, 500])
+    parser.add_argument("--budget-ms", type=float, default=1000, help="Sequencing time budget")
+    parser.add_argument("--plan-budget-ms", type=float, default=3000, help="Truck planning time budget")
+    parser.add_argument("--capacity-lbs", type=float, default=24000)
+    parser.add_argument("--trucks", type=int, default=0, help="Trucks available (default: enough for the weight + 15%%)")
+    parser.add_argument("--road-factor", type=float, default=1.3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for count in args.sizes:
+        bench_size(count, args, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+load_test.py
+------------
+Closed-loop load test for the board and dashboard endpoints, and a side-by-side
+comparison of gunicorn worker profiles.
+
+`run` drives an already running server: N concurrent clients each request the
+next path as soon as the last one returns, for --duration seconds.
+`compare` starts gunicorn once per profile (using gunicorn.conf.py and the
+WEB_* settings), runs the same load against each and prints the throughput.
+
+Pass --db-latency-ms to `compare` to add that much delay to every SQL
+statement in the server under test.  Against a local database this mimics the
+round trip to the hosted Postgres, which is what a slow board request spends
+its time waiting on.
+
+Usage:
+    cd /path/to/WH-Tracker
+
+    # Against a running server (mint a session for user 1 with the app's SECRET_KEY)
+    python scripts/load_test.py run --base-url http://127.0.0.1:8080 --user-id 1 --secret-key "$SECRET_KEY"
+
+    # Old single sync worker vs the gthread profile, on the configured DATABASE_URL
+    python scripts/load_test.py compare --profiles sync:1 gthread:2x8 --db-latency-ms 20
+
+    # No database handy: throwaway SQLite with the schema created
+    python scripts/load_test.py compare --sqlite --db-latency-ms 20
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+DEFAULT_PATHS = ["/api/board/orders", "/api/dashboard?period=today", "/api/dashboard?period=week"]
+
+
+def wsgi_app():
+    """gunicorn factory for `compare`: the real app plus optional SQL latency."""
+    from sqlalchemy import event
+
+    from app import create_app
+    from app.extensions import db
+
+    app = create_app()
+    latency = float(os.environ.get("LOADTEST_DB_LATENCY_MS") or 0) / 1000
+    with app.app_context():
+        if db.engine.dialect.name == "sqlite":
+            event.listen(db.engine, "connect", _sqlite_pg_aggregates)
+            db.engine.dispose()  # reconnect so pooled connections get them too
+        if latency:
+            @event.listens_for(db.engine, "before_cursor_execute")
+            def _round_trip(*_args):
+                time.sleep(latency)
+    return app
+
+
+class _BoolOr:
+    def __init__(self):
+        self.value = False
+
+    def step(self, value):
+        self.value = self.value or bool(value)
+
+    def finalize(self):
+        return self.value
+
+
+class _BoolAnd:
+    def __init__(self):
+        self.value = True
+
+    def step(self, value):
+        self.value = self.value and bool(value)
+
+    def finalize(self):
+        return self.value
+
+
+def _sqlite_pg_aggregates(dbapi_connection, _record):
+    # The board queries use PostgreSQL's bool_or/bool_and.
+    dbapi_connection.create_aggregate("bool_or", 1, _BoolOr)
+    dbapi_connection.create_aggregate("bool_and", 1, _BoolAnd)
+
+
+def create_schema(database_url):
+    """Create every model's table (SQLite runs; the migrations are PostgreSQL-only)."""
+    from sqlalchemy import create_engine
+
+    import app.Models.dispatch_models  # noqa: F401
+    import app.Models.models  # noqa: F401
+    from app.extensions import db
+
+    db.metadata.create_all(create_engine(database_url))
+
+
+def session_cookie(secret_key, user_id):
+    from flask import Flask
+    from flask.sessions import SecureCookieSessionInterface
+
+    app = Flask(__name__)
+    app.secret_key = secret_key
+    return SecureCookieSessionInterface().get_signing_serializer(app).dumps({"user_id": user_id})
+
+
+def run_load(base_url, paths, concurrency, duration, cookie=None, timeout=30):
+    """{path: {"latencies": [s], "errors": n}} from *concurrency* clients over *duration* seconds."""
+    import requests
+
+    results = defaultdict(lambda: {"latencies": [], "errors": 0})
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(offset):
+        session = requests.Session()
+        if cookie:
+            session.cookies.set("session", cookie)
+        n = offset
+        while time.monotonic() < deadline:
+            path = paths[n % len(paths)]
+            n += 1
+            started = time.monotonic()
+            try:
+                # Redirects (e.g. to the login page) count as errors.
+                ok = 200 <= session.get(base_url + path, timeout=timeout, allow_redirects=False).status_code < 300
+            except requests.RequestException:
+                ok = False
+            elapsed = time.monotonic() - started
+            with lock:
+                if ok:
+                    results[path]["latencies"].append(elapsed)
+                else:
+                    results[path]["errors"] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return dict(results)
+
+
+def summarize(results, duration):
+    rows = []
+    for path, data in sorted(results.items()):
+        latencies = sorted(data["latencies"])
+        if latencies:
+            p50 = latencies[len(latencies) // 2] * 1000
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000
+        else:
+            p50 = p95 = 0.0
+        rows.append((path, len(latencies) / duration, p50, p95, data["errors"]))
+    return rows
+
+
+def print_summary(rows, title):
+    print(f"\n{title}")
+    print(f"  {'path':<34} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+    for path, rps, p50, p95, errors in rows:
+        print(f"  {path:<34} {rps:8.1f} {p50:8.0f} {p95:8.0f} {errors:7d}")
+    print(f"  {'total':<34} {sum(r[1] for r in rows):8.1f}")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _parse_profile(spec):
+    """'sync:1' -> sync x1; 'gthread:2x8' -> 2 workers x 8 threads; 'gevent:2x100'."""
+    worker_class, _, shape = spec.partition(":")
+    workers, _, per_worker = (shape or "1").partition("x")
+    env = {"WEB_WORKER_CLASS": worker_class, "WEB_CONCURRENCY": workers or "1"}
+    if per_worker:
+        env["WEB_THREADS" if worker_class == "gthread" else "WEB_WORKER_CONNECTIONS"] = per_worker
+    return env
+
+
+def start_server(profile_env, args, port):
+    env = dict(os.environ, **profile_env, PORT=str(port), RUN_MIGRATIONS_ON_START="false",
+               SAMSARA_POLLER_ENABLED="false", SO_ATTRIBUTE_INDEX_ENABLED="false",
+               LOADTEST_DB_LATENCY_MS=str(args.db_latency_ms))
+    if args.sqlite:
+        env["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "loadtest.db")
+        create_schema(env["DATABASE_URL"])
+    cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}",
+           "--pythonpath", os.path.join(ROOT, "scripts"), "load_test:wsgi_app()"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    import requests
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"gunicorn exited with {proc.returncode} for {profile_env}")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/healthz", timeout=1).ok:
+                return proc
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    proc.terminate()
+    raise SystemExit(f"gunicorn did not become healthy for {profile_env}")
+
+
+def cmd_run(args):
+    cookie = session_cookie(args.secret_key, args.user_id) if args.user_id and args.secret_key else None
+    results = run_load(args.base_url.rstrip("/"), args.paths, args.concurrency, args.duration, cookie)
+    print_summary(summarize(results, args.duration), f"{args.concurrency} clients x {args.duration}s")
+
+
+def cmd_compare(args):
+    # The servers share our environment, so their SECRET_KEY is known here.
+    from app.runtime_settings import load_tracker_env
+
+    load_tracker_env()
+    cookie = session_cookie(os.environ.get("SECRET_KEY", "dev_default_secret_key_12345"), args.user_id or 1)
+    totals = []
+    for spec in args.profiles:
+        port = _free_port()
+        proc = start_server(_parse_profile(spec), args, port)
+        try:
+            run_load(f"http://127.0.0.1:{port}", args.paths, args.concurrency, min(2, args.duration), cookie)  # warm
+            results = run_load(f"http://127.0.0.1:{port}", args.paths, args.concurrency, args.duration, cookie)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+        rows = summarize(results, args.duration)
+        print_summary(rows, f"{spec}: {args.concurrency} clients x {args.duration}s, "
+                            f"{args.db_latency_ms}ms per SQL statement")
+        totals.append((spec, sum(r[1] for r in rows), statistics.mean([r[3] for r in rows]) if rows else 0))
+
+    baseline = totals[0][1] or 1
+    print("\nThroughput")
+    for spec, rps, p95 in totals:
+        print(f"  {spec:<16} {rps:8.1f} req/s  x{rps / baseline:4.1f}  (mean p95 {p95:.0f}ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test board and dashboard endpoints.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--paths", nargs="+", default=DEFAULT_PATHS)
+    common.add_argument("--concurrency", type=int, default=16, help="Concurrent clients")
+    common.add_argument("--duration", type=float, default=10, help="Seconds of load per run")
+    common.add_argument("--user-id", type=int, help="Send a signed session for this user (AUTH_REQUIRED)")
+
+    run = sub.add_parser("run", parents=[common], help="Load an already running server")
+    run.add_argument("--base-url", required=True)
+    run.add_argument("--secret-key", help="The server's SECRET_KEY, to sign the --user-id session")
+    run.set_defaults(func=cmd_run)
+
+    compare = sub.add_parser("compare", parents=[common], help="Start gunicorn per profile and compare")
+    compare.add_argument("--profiles", nargs="+", default=["sync:1", "gthread:2x8"],
+                         help="worker_class:workers[xthreads|xconnections]")
+    compare.add_argument("--db-latency-ms", type=float, default=0, help="Delay added to every SQL statement")
+    compare.add_argument("--sqlite", action="store_true", help="Use a throwaway SQLite database with the schema")
+    compare.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+profile_startup.py
+------------------
+Measure how long `from app import create_app; create_app()` takes in a fresh
+interpreter, break the import time down by package, and fail when start-up is
+over budget or pulls in a module that should load on first use.
+
+Each timing run is its own process, so nothing is warm.  One extra run under
+`python -X importtime` gives the per-package breakdown.
+
+Usage:
+    cd /path/to/WH-Tracker
+
+    # Local check against a throwaway SQLite database
+    python scripts/profile_startup.py
+
+    # CI gate: exit 1 over 1.5s median or if a deferred module is imported
+    python scripts/profile_startup.py --budget-ms 1500 --runs 5
+
+    # Include the migration check against a real database
+    DATABASE_URL=postgresql://... python scripts/profile_startup.py --with-migrations
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Loaded on first use; importing any of them during create_app() is a regression.
+DEFERRED_MODULES = ("alembic", "boto3", "reportlab", "qrcode", "msal", "pillow_heif", "rapidfuzz", "numpy")
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app()
+done = time.perf_counter()
+print("STARTUP " + json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "create_app_ms": (done - imported) * 1000,
+    "loaded": sorted(name for name in %r if name in sys.modules),
+}))
+""" % (DEFERRED_MODULES,)
+
+
+def child_env(args):
+    env = dict(os.environ)
+    if args.database_url:
+        env["DATABASE_URL"] = args.database_url
+    elif not env.get("DATABASE_URL"):
+        env["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "startup.db")
+    if not args.with_migrations:
+        env["RUN_MIGRATIONS_ON_START"] = "false"
+    # Background pollers and indexes start threads, not start-up work.
+    env.setdefault("SAMSARA_POLLER_ENABLED", "false")
+    env.setdefault("SO_ATTRIBUTE_INDEX_ENABLED", "false")
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    return env
+
+
+def run_child(env, importtime=False):
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", CHILD]
+    proc = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True)
+    result = None
+    for line in proc.stdout.splitlines():
+        if line.startswith("STARTUP "):
+            result = json.loads(line[len("STARTUP "):])
+    if proc.returncode != 0 or result is None:
+        sys.stderr.write(proc.stderr[-4000:])
+        raise SystemExit(f"create_app() failed (exit {proc.returncode})")
+    return result, proc.stderr
+
+
+def parse_importtime(stderr):
+    """[(module, self_us, cumulative_us)] from `-X importtime` output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            rows.append((parts[2].strip(), int(parts[0]), int(parts[1])))
+        except (IndexError, ValueError):
+            continue  # the header line
+    return rows
+
+
+def print_breakdown(rows, top):
+    by_package = defaultdict(int)
+    for module, self_us, _cumulative in rows:
+        by_package[module.split(".")[0]] += self_us
+    total = sum(by_package.values())
+    print(f"\nImport time by top-level package (self time, {total / 1000:.0f}ms total under -X importtime):")
+    for package, self_us in sorted(by_package.items(), key=lambda kv: -kv[1])[:top]:
+        print(f"  {package:<28} {self_us / 1000:8.1f}ms  {self_us * 100 / total:5.1f}%")
+
+    app_modules = [(module, cumulative) for module, _self, cumulative in rows if module.startswith("app.")]
+    print("\nSlowest app modules (cumulative, includes what they import):")
+    for module, cumulative_us in sorted(app_modules, key=lambda item: -item[1])[:top]:
+        print(f"  {module:<44} {cumulative_us / 1000:8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile app start-up and enforce a time budget.")
+    parser.add_argument("--runs", type=int, default=3, help="Timed cold starts (the median is checked)")
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("STARTUP_BUDGET_MS", 0) or 0),
+                        help="Fail when the median start-up exceeds this (0 = report only)")
+    parser.add_argument("--top", type=int, default=15, help="Rows per breakdown table")
+    parser.add_argument("--database-url", help="Database for create_app() (default: throwaway SQLite)")
+    parser.add_argument("--with-migrations", action="store_true",
+                        help="Leave RUN_MIGRATIONS_ON_START alone so the schema-head check is timed too")
+    args = parser.parse_args()
+
+    env = child_env(args)
+    results = [run_child(env)[0] for _ in range(max(1, args.runs))]
+    _, stderr = run_child(env, importtime=True)
+    print_breakdown(parse_importtime(stderr), args.top)
+
+    totals = [r["import_ms"] + r["create_app_ms"] for r in results]
+    median = statistics.median(totals)
+    print(f"\nCold start over {len(results)} runs: median {median:.0f}ms "
+          f"(import {statistics.median(r['import_ms'] for r in results):.0f}ms, "
+          f"create_app {statistics.median(r['create_app_ms'] for r in results):.0f}ms), "
+          f"min {min(totals):.0f}ms, max {max(totals):.0f}ms")
+
+    failures = []
+    loaded = sorted({name for r in results for name in r["loaded"]})
+    if loaded:
+        failures.append(f"deferred modules imported at start-up: {', '.join(loaded)}")
+    if args.budget_ms and median > args.budget_ms:
+        failures.append(f"median start-up {median:.0f}ms is over the {args.budget_ms:.0f}ms budget")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,14 @@
-import hashlib
 import json
 import os
 import sys
-import time
 from datetime import datetime, date
 from pathlib import Path
 
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 
-from app.runtime_settings import get_sync_settings, load_tracker_env
+from app.erp_mirror.digests import EntityDigestIndex
+from app.runtime_settings import get_mirror_sync_settings, get_sync_settings, load_tracker_env
 
 load_tracker_env()
 
@@ -20,6 +19,7 @@ class LocalSync:
         from app.Services.geocoding_service import GeocodingService
 
         self.settings = get_sync_settings()
+        self.mirror_settings = get_mirror_sync_settings()
         self.database_url = self.settings["database_url"]
         self.sync_interval = self.settings["interval_seconds"]
         self.change_monitoring = self.settings["change_monitoring"]
@@ -35,6 +35,8 @@ class LocalSync:
         self.Session = None
         self.last_payload_hash = None
         self.last_change_token = None
+        self.scheduler = None
+        self.digests = EntityDigestIndex()
 
         if not self.database_url:
             raise RuntimeError(
@@ -94,19 +96,6 @@ class LocalSync:
             "kpis": kpis,
         }
 
-    def _serialize(self, value):
-        if isinstance(value, dict):
-            return {str(k): self._serialize(v) for k, v in sorted(value.items(), key=lambda item: str(item[0]))}
-        if isinstance(value, (list, tuple)):
-            normalized = [self._serialize(v) for v in value]
-            return sorted(
-                normalized,
-                key=lambda item: json.dumps(item, sort_keys=True, default=str) if isinstance(item, (dict, list)) else str(item),
-            )
-        if isinstance(value, datetime):
-            return value.isoformat()
-        return value
-
     def _counts(self, data):
         return {
             "picks": len(data.get("picks", [])),
@@ -114,12 +103,7 @@ class LocalSync:
             "kpis": len(data.get("kpis", [])),
         }
 
-    def _payload_hash(self, data):
-        payload = self._serialize(data)
-        encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
-        return hashlib.sha256(encoded).hexdigest()
-
-    def _status_payload(self, *, status, counts, payload_hash, push_reason, last_error=None):
+    def _status_payload(self, *, status, counts, payload_hash, push_reason, last_error=None, delta=None):
         if status in ("success", "noop"):
             self.last_payload_hash = payload_hash
             self.last_change_token = payload_hash[:12]
@@ -137,6 +121,8 @@ class LocalSync:
             "last_payload_hash": self.last_payload_hash or payload_hash,
             "last_push_reason": push_reason,
             "counts": counts,
+            "family_lag": self.scheduler.family_lag() if self.scheduler else {},
+            "delta": delta.summary() if delta is not None else {},
         }
 
     def _coerce_date(self, value):
@@ -189,29 +175,40 @@ class LocalSync:
             print(f"[{datetime.now()}] Failed to persist sync status: {e}")
 
     def push_to_cloud(self, data):
-        payload_hash = self._payload_hash(data)
+        delta = self.digests.diff(data)
+        payload_hash = delta.fingerprint
         counts = self._counts(data)
-        sync_started_at = datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
 
-        if self.change_monitoring and payload_hash == self.last_payload_hash:
+        if self.change_monitoring and delta.is_empty:
+            # Nothing to recompute, but the unchanged rows are still current as of this cycle.
+            stamped = self._update_dashboard_stats(data, branches=set())
             status = self._status_payload(
-                status="noop",
+                status="noop" if stamped else "error",
                 counts=counts,
                 payload_hash=payload_hash,
-                push_reason="no_changes_detected",
+                push_reason="no_changes_detected" if stamped else "push_failed",
+                last_error=None if stamped else "dashboard_stats update failed",
+                delta=delta,
             )
             self.record_status(status)
             print(f"[{datetime.now()}] No ERP changes detected. Recorded heartbeat only.")
             return status
 
         try:
-            self.push_direct_to_db(data)
+            branches = delta.branches("picks", "work_orders") if self.change_monitoring else None
+            pushed = self.push_direct_to_db(data, branches=branches)
+            if pushed:
+                # Keep the old digests on failure so the same branches are retried next cycle.
+                self.digests.commit(delta)
+                self.notify_live_screens(branches)
 
             status = self._status_payload(
-                status="success",
+                status="success" if pushed else "error",
                 counts=counts,
                 payload_hash=payload_hash,
-                push_reason="changes_pushed",
+                push_reason="changes_pushed" if pushed else "push_failed",
+                last_error=None if pushed else "dashboard_stats update failed",
+                delta=delta,
             )
             self.record_status(status)
             return status
@@ -222,13 +219,30 @@ class LocalSync:
                 payload_hash=payload_hash,
                 push_reason="push_failed",
                 last_error=str(e),
+                delta=delta,
             )
             self.record_status(status)
             raise
 
-    def _update_dashboard_stats(self, data):
+    def notify_live_screens(self, branches=None):
+        """Wake the web workers' live-update hubs (Postgres LISTEN/NOTIFY) so
+        TV boards and dashboards refresh only the branches that changed."""
+        from app.Services.live_updates import notify_change
+
+        try:
+            notify_change(self.engine, "sync", branches)
+        except Exception as e:
+            print(f"[{datetime.now()}] Failed to notify live screens: {e}")
+
+    def _update_dashboard_stats(self, data, branches=None):
         """Compute per-branch dashboard counts from already-fetched ERP data and
-        upsert one row per branch into dashboard_stats."""
+        upsert one row per branch into dashboard_stats.
+
+        When *branches* is given only those branches are recomputed; a branch
+        whose picks and work orders all disappeared is written back as zero.
+        Every row's updated_at is stamped either way, since the rows that were
+        not recomputed are still current as of this cycle.
+        """
         picks = data.get("picks", [])
         work_orders = data.get("work_orders", [])
 
@@ -237,7 +251,7 @@ class LocalSync:
         branch_handling = {}   # system_id -> {handling_code -> set of (system_id, so_id)}
         for p in picks:
             sid = str(p.get('system_id', '') or '').strip()
-            if not sid:
+            if not sid or (branches is not None and sid not in branches):
                 continue
             key = (sid, str(p.get('so_number', '')))
             branch_seen_sos.setdefault(sid, set()).add(key)
@@ -248,10 +262,12 @@ class LocalSync:
         branch_wo = {}
         for wo in work_orders:
             sid = str(wo.get('branch_code', '') or '').strip()
-            if sid:
+            if sid and (branches is None or sid in branches):
                 branch_wo[sid] = branch_wo.get(sid, 0) + 1
 
         all_branches = set(branch_seen_sos.keys()) | set(branch_wo.keys())
+        if branches is not None:
+            all_branches |= set(branches)
         now = datetime.utcnow()
 
         try:
@@ -265,9 +281,14 @@ class LocalSync:
                 self.db_session.execute(
                     text(
                         "INSERT INTO dashboard_stats "
-                        "  (system_id, open_picks, handling_breakdown_json, open_work_orders, updated_at) "
-                        "VALUES (:sid, :picks, :breakdown, :wo, :ts) "
+                        "  (system_id, open_picks, handling_breakdown_json, open_work_orders, updated_at, stats_version) "
+                        "VALUES (:sid, :picks, :breakdown, :wo, :ts, 1) "
                         "ON CONFLICT (system_id) DO UPDATE SET "
+                        "  stats_version = dashboard_stats.stats_version + CASE WHEN "
+                        "    dashboard_stats.open_picks IS DISTINCT FROM excluded.open_picks "
+                        "    OR dashboard_stats.handling_breakdown_json IS DISTINCT FROM excluded.handling_breakdown_json "
+                        "    OR dashboard_stats.open_work_orders IS DISTINCT FROM excluded.open_work_orders "
+                        "    THEN 1 ELSE 0 END, "
                         "  open_picks = :picks, "
                         "  handling_breakdown_json = :breakdown, "
                         "  open_work_orders = :wo, "
@@ -281,126 +302,184 @@ class LocalSync:
                         "ts": now,
                     },
                 )
+            self.db_session.execute(text("UPDATE dashboard_stats SET updated_at = :ts"), {"ts": now})
             self.db_session.commit()
             total = sum(len(s) for s in branch_seen_sos.values())
-            print(f"[{datetime.now()}] Dashboard stats updated: {total} picks across {len(all_branches)} branches")
+            if all_branches:
+                print(f"[{datetime.now()}] Dashboard stats updated: {total} picks across {len(all_branches)} branches")
+            return True
         except Exception as e:
             self.db_session.rollback()
             print(f"[{datetime.now()}] Failed to update dashboard_stats: {e}")
+            return False
 
-    def push_direct_to_db(self, data):
+    def push_direct_to_db(self, data, branches=None):
         # Legacy direct mirror tables are retired.
         # Now updates pre-computed dashboard stats and records heartbeat.
 
         print(f"[{datetime.now()}] Pushing dashboard stats and heartbeat...")
         try:
-            self._update_dashboard_stats(data)
+            stats_updated = self._update_dashboard_stats(data, branches=branches)
             self.db_session.commit()
             print(f"[{datetime.now()}] Heartbeat recorded.")
+            return stats_updated
         except Exception:
             self.db_session.rollback()
             raise
 
-    def geocode_pending_shiptos(self, batch_size=10):
+    def geocode_pending_shiptos(self, batch_size=None):
         """Geocode erp_mirror_cust_shipto records that have no lat/lon yet.
 
-        Uses Nominatim (OpenStreetMap) — free, no API key required.
-        Nominatim requires ≤1 req/sec; we sleep 1.1s between calls.
-        Processes `batch_size` records per invocation so we don't block the loop.
+        Addresses are resolved against the local GeocodingService index first;
+        only misses go to Nominatim, rate limited and cached (see
+        app.Services.geocoding_pipeline).
         """
-        import requests as _req
+        from app.Services.geocoding_pipeline import refresh_shipto_geocodes
 
         try:
-            rows = self.db_session.execute(
-                text(
-                    "SELECT id, address_1, city, state, zip "
-                    "FROM erp_mirror_cust_shipto "
-                    "WHERE lat IS NULL AND (address_1 IS NOT NULL OR city IS NOT NULL) "
-                    "LIMIT :n"
-                ),
-                {"n": batch_size},
-            ).fetchall()
+            refresh_shipto_geocodes(engine=self.engine, geocoder=self.geocoder, batch_size=batch_size)
         except Exception as exc:
-            print(f"[{datetime.now()}] geocode_pending_shiptos: query failed: {exc}")
-            return
+            print(f"[{datetime.now()}] geocode_pending_shiptos failed: {exc}")
 
-        if not rows:
+    def refresh_read_models(self):
+        """Refresh the open-pick read model so this cycle's readers see current
+        mirror data.  CONCURRENTLY keeps it readable during the refresh."""
+        if self.engine is None or self.engine.dialect.name != "postgresql":
             return
-
-        print(f"[{datetime.now()}] Geocoding {len(rows)} pending ship-to records...")
-        updated = 0
-        for row in rows:
-            parts = [p for p in [row.address_1, row.city, row.state, row.zip] if p and str(p).strip()]
-            if not parts:
-                continue
-            query = ", ".join(str(p).strip() for p in parts)
-            try:
-                resp = _req.get(
-                    "https://nominatim.openstreetmap.org/search",
-                    params={"q": query, "format": "json", "limit": 1},
-                    headers={"User-Agent": "WH-Tracker/1.0 (dispatch geocoder)"},
-                    timeout=10,
-                )
-                resp.raise_for_status()
-                results = resp.json()
-                if results:
-                    lat = float(results[0]["lat"])
-                    lon = float(results[0]["lon"])
-                    self.db_session.execute(
-                        text(
-                            "UPDATE erp_mirror_cust_shipto "
-                            "SET lat=:lat, lon=:lon, geocoded_at=:ts, geocode_source='nominatim' "
-                            "WHERE id=:id"
-                        ),
-                        {"lat": lat, "lon": lon, "ts": datetime.utcnow(), "id": row.id},
-                    )
-                    updated += 1
-                else:
-                    # Mark as attempted so we don't retry in a tight loop
-                    self.db_session.execute(
-                        text(
-                            "UPDATE erp_mirror_cust_shipto "
-                            "SET geocoded_at=:ts, geocode_source='nominatim_no_result' "
-                            "WHERE id=:id"
-                        ),
-                        {"ts": datetime.utcnow(), "id": row.id},
-                    )
-            except Exception as exc:
-                print(f"[{datetime.now()}] Nominatim error for id={row.id} ({query!r}): {exc}")
-
-            time.sleep(1.1)  # Nominatim rate limit: 1 req/sec
-
         try:
-            self.db_session.commit()
-            print(f"[{datetime.now()}] Geocoded {updated}/{len(rows)} ship-to records.")
+            with self.engine.begin() as conn:
+                exists = conn.execute(text("SELECT to_regclass('erp_open_pick_lines')")).scalar()
+                if exists:
+                    conn.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY erp_open_pick_lines"))
         except Exception as exc:
-            self.db_session.rollback()
-            print(f"[{datetime.now()}] geocode_pending_shiptos: commit failed: {exc}")
+            print(f"[{datetime.now()}] Failed to refresh erp_open_pick_lines: {exc}")
 
-    def run(self):
-        print("Starting Local ERP Sync Service with change monitoring...")
-        while True:
-            started_at = datetime.utcnow()
-            try:
-                data = self.fetch_local_data()
-                self.push_to_cloud(data)
-                self.geocode_pending_shiptos(batch_size=10)
-            except Exception as e:
-                error_payload = self._status_payload(
-                    status="error",
-                    counts={"picks": 0, "work_orders": 0, "kpis": 0},
-                    payload_hash=self.last_payload_hash or "",
-                    push_reason="cycle_failed",
-                    last_error=str(e),
-                )
-                self.record_status(error_payload)
-                print(f"[{datetime.now()}] Sync cycle failed: {e}")
+    def refresh_delivery_facts(self):
+        """Rebuild delivery reporting facts for ship dates touched since the last run."""
+        from app.Services.delivery_facts import refresh_delivery_facts
+
+        refresh_delivery_facts()
+
+    def refresh_search_index(self):
+        """Re-index search documents for mirror rows and picks changed since the last run."""
+        from app.Services.search_index import refresh_search_index
+
+        refresh_search_index()
+
+    def refresh_dashboard_tiles(self):
+        """Precompute the workcenter tiles the homepage reads in one query."""
+        from app.Services.dashboard_stats import refresh_dashboard_tiles
+
+        refresh_dashboard_tiles()
+
+    def record_vehicle_breadcrumbs(self):
+        """Append the latest Samsara fixes to the vehicle breadcrumb history."""
+        from app.Services.vehicle_breadcrumbs import record_vehicle_breadcrumbs
+
+        record_vehicle_breadcrumbs()
 
-            elapsed = max(0.0, (datetime.utcnow() - started_at).total_seconds())
-            sleep_seconds = max(0.0, self.sync_interval - elapsed)
-            print(f"[{datetime.now()}] Sleeping for {sleep_seconds:.1f} seconds...")
-            time.sleep(sleep_seconds)
+    def maintain_vehicle_breadcrumbs(self):
+        """Downsample and expire old vehicle breadcrumbs."""
+        from app.Services.vehicle_breadcrumbs import maintain_vehicle_breadcrumbs
 
+        maintain_vehicle_breadcrumbs()
+
+    def run_operational_cycle(self):
+        try:
+            self.refresh_read_models()
+            data = self.fetch_local_data()
+            self.push_to_cloud(data)
+        except Exception as e:
+            error_payload = self._status_payload(
+                status="error",
+                counts={"picks": 0, "work_orders": 0, "kpis": 0},
+                payload_hash=self.last_payload_hash or "",
+                push_reason="cycle_failed",
+                last_error=str(e),
+            )
+            self.record_status(error_payload)
+            print(f"[{datetime.now()}] Sync cycle failed: {e}")
+            raise
+
+    def build_scheduler(self, extra_jobs=()):
+        """Schedule the operational snapshot, ship-to geocoding and any mirror
+        table jobs on their own cadences so slow work cannot delay pick updates.
+        Extra jobs without a cadence run on their family's SYNC_*_CADENCE_SECONDS."""
+        from flask import current_app, has_app_context
+
+        from app.erp_mirror import MirrorSyncScheduler, SyncFamily, SyncJob, family_cadences
+
+        app = current_app._get_current_object() if has_app_context() else None
+
+        def in_app_context(func):
+            if app is None:
+                return func
+
+            def wrapped():
+                with app.app_context():
+                    return func()
+            return wrapped
+
+        jobs = [
+            SyncJob(
+                name="operational_snapshot",
+                family=SyncFamily.OPERATIONAL,
+                cadence_seconds=self.sync_interval,
+                run=in_app_context(self.run_operational_cycle),
+            ),
+            SyncJob(
+                name="geocode_shiptos",
+                family=SyncFamily.MASTER,
+                cadence_seconds=self.mirror_settings["geocode_cadence_seconds"],
+                run=in_app_context(self.geocode_pending_shiptos),
+            ),
+            SyncJob(
+                name="delivery_facts",
+                family=SyncFamily.MASTER,
+                cadence_seconds=self.mirror_settings["delivery_facts_cadence_seconds"],
+                run=in_app_context(self.refresh_delivery_facts),
+            ),
+            SyncJob(
+                name="search_index",
+                family=SyncFamily.MASTER,
+                cadence_seconds=self.mirror_settings["search_index_cadence_seconds"],
+                run=in_app_context(self.refresh_search_index),
+            ),
+            SyncJob(
+                name="dashboard_tiles",
+                family=SyncFamily.OPERATIONAL,
+                cadence_seconds=self.mirror_settings["dashboard_tiles_cadence_seconds"],
+                run=in_app_context(self.refresh_dashboard_tiles),
+            ),
+            SyncJob(
+                name="vehicle_breadcrumbs",
+                family=SyncFamily.OPERATIONAL,
+                cadence_seconds=self.mirror_settings["breadcrumbs_cadence_seconds"],
+                run=in_app_context(self.record_vehicle_breadcrumbs),
+            ),
+            SyncJob(
+                name="vehicle_breadcrumbs_maintenance",
+                family=SyncFamily.MASTER,
+                cadence_seconds=self.mirror_settings["breadcrumbs_maintenance_cadence_seconds"],
+                run=in_app_context(self.maintain_vehicle_breadcrumbs),
+            ),
+        ]
+        for job in extra_jobs:
+            job.run = in_app_context(job.run)
+            jobs.append(job)
+
+        return MirrorSyncScheduler(
+            jobs,
+            family_cadences=family_cadences(self.mirror_settings),
+            max_workers=self.mirror_settings["max_workers"],
+            jitter_ratio=self.mirror_settings["jitter_percent"] / 100,
+            max_backoff_seconds=self.mirror_settings["max_backoff_seconds"],
+        )
+
+    def run(self, extra_jobs=()):
+        print("Starting Local ERP Sync Service with change monitoring...")
+        self.scheduler = self.build_scheduler(extra_jobs)
+        self.scheduler.run_forever()
 
 if __name__ == "__main__":
     import argparse
@@ -416,8 +495,12 @@ if __name__ == "__main__":
             syncer = LocalSync()
             if args.once:
                 print(f"[{datetime.now()}] Running single sync cycle...")
+                syncer.refresh_read_models()
                 data = syncer.fetch_local_data()
                 syncer.push_to_cloud(data)
+                syncer.refresh_delivery_facts()
+                syncer.refresh_search_index()
+                syncer.refresh_dashboard_tiles()
                 print(f"[{datetime.now()}] Single sync cycle complete.")
             else:
                 syncer.run()
@@ -0,0 +1,232 @@
+from datetime import datetime, timedelta
+
+from flask import Flask
+from sqlalchemy import create_engine, event, text
+
+from app.extensions import db
+from app.Models.models import (
+    DashboardScopeStats,
+    DashboardStats,
+    ERPMirrorSalesOrderHeader,
+    ERPSyncState,
+    Pick,
+    Pickster,
+    POSubmission,
+)
+from app.Routes.main import main_bp
+from app.Routes.main import picks as picks_routes
+from app.Services.dashboard_stats import DashboardStatsBuilder, read_workcenter_tiles
+from app.Services.erp.base import ERPServiceBase
+from app.Services.erp.query_cache import reset_query_cache
+from app.Services.erp_service import ERPService
+
+APP_TABLES = [
+    DashboardScopeStats.__table__, DashboardStats.__table__, ERPSyncState.__table__, Pick.__table__, Pickster.__table__,
+    POSubmission.__table__,
+]
+
+
+class StubERP:
+    def __init__(self):
+        self.sales = {
+            "all": {"open_orders_count": 7, "total_orders_today": 3},
+            "branches": {"20GR": {"open_orders_count": 5, "total_orders_today": 2},
+                         "25BW": {"open_orders_count": 2, "total_orders_today": 1}},
+            "reps": {"AMY": {"open_orders_count": 4, "total_orders_today": 1},
+                     "BOB": {"open_orders_count": 3, "total_orders_today": 2}},
+        }
+        self.deliveries = {"20GR": 6, "25BW": 1}
+
+    def get_sales_hub_metrics_grouped(self):
+        return self.sales
+
+    def get_delivery_counts_by_branch(self):
+        return self.deliveries
+
+
+def _app_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    db.metadata.create_all(engine, tables=APP_TABLES)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(Pickster.__table__.insert(), [
+            {"id": 1, "name": "Dana", "user_type": "picker"},
+            {"id": 2, "name": "Lee", "user_type": None},
+            {"id": 3, "name": "Sam", "user_type": "driver"},
+        ])
+        conn.execute(Pick.__table__.insert(), [
+            {"barcode_number": "1", "picker_id": 1, "branch_code": "20GR", "start_time": now, "completed_time": now},
+            {"barcode_number": "2", "picker_id": 2, "branch_code": "25BW", "start_time": now, "completed_time": now},
+            {"barcode_number": "3", "picker_id": 1, "branch_code": "20GR", "start_time": now, "completed_time": None},
+            {"barcode_number": "4", "picker_id": 2, "branch_code": "20GR", "start_time": now - timedelta(days=2),
+             "completed_time": now - timedelta(days=2)},
+        ])
+        conn.execute(POSubmission.__table__.insert(), [
+            {"id": "a", "po_number": "1", "image_urls": [], "status": "pending"},
+            {"id": "b", "po_number": "2", "image_urls": [], "status": "reviewed"},
+        ])
+        conn.execute(DashboardStats.__table__.insert(), [
+            {"system_id": "20GR", "open_picks": 4, "open_work_orders": 2, "updated_at": now,
+             "handling_breakdown_json": '{"DOOR1": 3, "EWP": 1}'},
+            {"system_id": "25BW", "open_picks": 1, "open_work_orders": 0, "updated_at": now,
+             "handling_breakdown_json": '{"EWP": 1}'},
+        ])
+        conn.execute(ERPSyncState.__table__.insert(), [
+            {"worker_name": "erp-sync", "last_heartbeat_at": now, "last_success_at": now, "last_status": "noop"},
+        ])
+    return engine
+
+
+def _versions(engine):
+    with engine.connect() as conn:
+        branches = dict(conn.execute(text("SELECT system_id, stats_version FROM dashboard_stats")).all())
+        scopes = dict(conn.execute(text("SELECT scope_key, stats_version FROM dashboard_scope_stats")).all())
+    return branches, scopes
+
+
+def test_grouped_sales_metrics_cover_every_scope_in_one_query(monkeypatch, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'mirror.db'}")
+    ERPMirrorSalesOrderHeader.metadata.create_all(engine, tables=[ERPMirrorSalesOrderHeader.__table__])
+    today = datetime.combine(datetime.now().date(), datetime.min.time()) + timedelta(hours=9)
+    with engine.begin() as conn:
+        conn.execute(ERPMirrorSalesOrderHeader.__table__.insert(), [
+            {"system_id": "20GR", "so_id": "1", "so_status": "O", "salesperson": "AMY", "order_writer": "BOB",
+             "expect_date": today, "is_deleted": False},
+            {"system_id": "20GR", "so_id": "2", "so_status": "O", "salesperson": "AMY", "order_writer": "AMY",
+             "expect_date": today + timedelta(days=3), "is_deleted": False},
+            {"system_id": "25BW", "so_id": "3", "so_status": "I", "salesperson": "BOB", "order_writer": None,
+             "expect_date": today, "is_deleted": False},
+            {"system_id": "25BW", "so_id": "4", "so_status": "O", "salesperson": "BOB", "order_writer": None,
+             "expect_date": today, "is_deleted": True},
+        ])
+    monkeypatch.setattr(ERPServiceBase, "_mirror_engine", staticmethod(lambda: engine))
+    reset_query_cache()
+    service = ERPService()
+    service.central_db_mode = True
+
+    assert service.get_sales_hub_metrics_grouped() == {
+        "all": {"open_orders_count": 2, "total_orders_today": 2},
+        "branches": {"20GR": {"open_orders_count": 2, "total_orders_today": 1},
+                     "25BW": {"open_orders_count": 0, "total_orders_today": 1}},
+        "reps": {"AMY": {"open_orders_count": 2, "total_orders_today": 1},
+                 "BOB": {"open_orders_count": 1, "total_orders_today": 2}},
+    }
+
+
+def test_builder_bumps_versions_only_for_changed_rows(tmp_path):
+    engine = _app_engine(tmp_path)
+    erp = StubERP()
+    builder = DashboardStatsBuilder(erp=erp, engine=engine)
+
+    assert builder.refresh()["changed"] == 5
+    assert _versions(engine) == ({"20GR": 1, "25BW": 1}, {"*": 1, "AMY": 1, "BOB": 1})
+    tiles = read_workcenter_tiles("DSM", "AMY", engine=engine)
+    assert {key: tiles[key] for key in ("sales_open_orders", "sales_orders_today", "open_picks", "handling_breakdown",
+                                        "open_work_orders", "todays_deliveries", "picks_completed_today",
+                                        "total_pickers", "active_pickers", "pending_po_reviews")} == {
+        "sales_open_orders": 4, "sales_orders_today": 1, "open_picks": 5, "handling_breakdown": {"DOOR1": 3, "EWP": 2},
+        "open_work_orders": 2, "todays_deliveries": 7, "picks_completed_today": 2,
+        "total_pickers": 2, "active_pickers": 1, "pending_po_reviews": 1,
+    }
+    assert read_workcenter_tiles("25BW", "", engine=engine)["sales_open_orders"] == 7
+    assert read_workcenter_tiles(None, "ZED", engine=engine)["sales_open_orders"] == 0
+
+    assert builder.refresh()["changed"] == 0
+    assert _versions(engine) == ({"20GR": 1, "25BW": 1}, {"*": 1, "AMY": 1, "BOB": 1})
+
+    erp.deliveries = {"20GR": 6}
+    del erp.sales["reps"]["BOB"]
+    assert builder.refresh()["changed"] == 2
+    assert _versions(engine) == ({"20GR": 1, "25BW": 2}, {"*": 1, "AMY": 1})
+    assert read_workcenter_tiles("25BW", "", engine=engine)["todays_deliveries"] == 0
+
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE dashboard_scope_stats SET updated_at = :old"),
+                     {"old": datetime.utcnow() - timedelta(hours=1)})
+    assert read_workcenter_tiles(None, "", engine=engine) is None
+
+
+def test_stale_sync_heartbeat_falls_back_to_live_queries(tmp_path):
+    engine = _app_engine(tmp_path)
+    DashboardStatsBuilder(erp=StubERP(), engine=engine).refresh()
+    old = datetime.utcnow() - timedelta(hours=1)
+    with engine.begin() as conn:
+        # An old branch row is fine while sync_erp keeps succeeding: it only rewrites changed branches.
+        conn.execute(text("UPDATE dashboard_stats SET updated_at = :old WHERE system_id = '25BW'"), {"old": old})
+    assert read_workcenter_tiles(None, "", engine=engine)["open_picks"] == 5
+    assert read_workcenter_tiles("25BW", "", engine=engine)["open_picks"] == 1
+
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE erp_sync_state SET last_heartbeat_at = :now, last_success_at = :old"),
+                     {"now": datetime.utcnow(), "old": old})
+    assert read_workcenter_tiles("20GR", "", engine=engine) is None
+    assert read_workcenter_tiles(None, "", engine=engine) is None
+
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM erp_sync_state"))
+    assert read_workcenter_tiles("20GR", "", engine=engine) is None
+
+
+def test_new_branch_row_merges_with_a_concurrent_sync_erp_insert(tmp_path):
+    engine = _app_engine(tmp_path)
+    erp = StubERP()
+    erp.deliveries["40CV"] = 2
+    inserted = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def sync_erp_inserts(conn, cursor, statement, parameters, context, executemany):
+        # sync_erp writes 40CV's pick counts between the builder's read and its insert.
+        if not inserted and statement.lstrip().startswith("INSERT INTO dashboard_stats"):
+            inserted.append(True)
+            conn.connection.cursor().execute(
+                "INSERT INTO dashboard_stats (system_id, open_picks, open_work_orders, updated_at, stats_version) "
+                "VALUES ('40CV', 9, 1, ?, 1)", (datetime.utcnow().isoformat(" "),),
+            )
+
+    DashboardStatsBuilder(erp=erp, engine=engine).refresh()
+    with engine.connect() as conn:
+        row = conn.execute(text("SELECT open_picks, open_work_orders, todays_deliveries, stats_version "
+                                "FROM dashboard_stats WHERE system_id = '40CV'")).one()
+    assert inserted and tuple(row) == (9, 1, 2, 2)
+
+
+def test_workcenter_reads_tiles_once_and_answers_304(monkeypatch, tmp_path):
+    app = Flask(__name__)
+    app.secret_key = "test"
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'app.db'}"
+    db.init_app(app)
+    app.register_blueprint(main_bp)
+    rendered = []
+    monkeypatch.setattr(picks_routes, "render_template", lambda name, **ctx: rendered.append(ctx["data"]) or "page")
+    monkeypatch.setattr(ERPService, "get_sales_hub_metrics", lambda self, rep_id="": {"open_orders_count": 9,
+                                                                                       "total_orders_today": 8})
+    with app.app_context():
+        _app_engine(tmp_path)
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = 7
+        sess["user_roles"] = ["sales"]
+        sess["user_rep_id"] = "AMY"
+
+    # No tiles yet: each tile is queried live and the page isn't cacheable.
+    response = client.get("/")
+    assert response.status_code == 200 and response.headers.get("ETag") is None
+    assert rendered[-1]["sales"] == {"open_orders": 9, "shipping_today": 8}
+
+    with app.app_context():
+        DashboardStatsBuilder(erp=StubERP(), engine=db.engine).refresh()
+    response = client.get("/")
+    etag = response.headers["ETag"]
+    assert rendered[-1]["sales"] == {"open_orders": 4, "shipping_today": 1}
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+    assert client.get("/", headers={"If-None-Match": etag}).status_code == 304
+    assert len(rendered) == 2
+
+    erp = StubERP()
+    erp.sales["reps"]["AMY"]["open_orders_count"] = 5
+    with app.app_context():
+        DashboardStatsBuilder(erp=erp, engine=db.engine).refresh()
+    response = client.get("/", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["ETag"] != etag
+    assert rendered[-1]["sales"] == {"open_orders": 5, "shipping_today": 1}
@@ -0,0 +1,102 @@
+import random
+from collections import defaultdict
+from datetime import date, timedelta
+
+import pytest
+
+from app.Services import delivery_aggregation
+from app.Services.delivery_aggregation import DeliveryColumns, aggregate
+from app.Services.delivery_facts import ROLLUP_MEASURES
+from app.Services.delivery_reporting_service import DeliveryReportingService
+
+TODAY = date(2026, 3, 15)
+START_30D = TODAY - timedelta(days=29)
+START_12M = date(2025, 4, 1)
+
+
+def _orders(count=400, seed=3):
+    rng = random.Random(seed)
+    rows = []
+    for so_id in range(count):
+        same_day = rng.random() < 0.5
+        rows.append({
+            "store": rng.choice(("20GR", "25BW", "10FD", "40CV")),
+            "ship_date": None if so_id % 97 == 0 else START_12M + timedelta(days=rng.randint(-20, 360)),
+            "so_id": str(so_id),
+            "sale_type_group": rng.choice(("Delivery", "Credit", "Will Call")),
+            "ship_via_bucket": rng.choice(("Van", "Flat Bed", "UPS")),
+            "same_day_flag": same_day,
+            "same_day_after_noon_flag": same_day and rng.random() < 0.5,
+            "total_shipped_qty": rng.randint(1, 400) / 4,
+            "reference_piece_count": float(rng.randint(0, 50)),
+        })
+    return rows
+
+
+def _brute(rows, measures, predicate):
+    sums = [0] * 5
+    for row in rows:
+        if row["ship_date"] and predicate(row):
+            for index, value in enumerate(measures(row)):
+                sums[index] += value
+    return sums
+
+
+def _run(rows, measures):
+    return aggregate(
+        DeliveryColumns(rows, measures),
+        windows={"30d": START_30D, "12m": START_12M},
+        daily_range=(START_30D, TODAY),
+        monthly_start=START_12M,
+    )
+
+
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_single_pass_matches_filtering_each_group(monkeypatch, use_numpy):
+    if use_numpy and delivery_aggregation._numpy() is None:
+        pytest.skip("numpy not installed")
+    if not use_numpy:
+        monkeypatch.setattr(delivery_aggregation, "np", None)
+    service = DeliveryReportingService.__new__(DeliveryReportingService)
+    rows = _orders()
+    result = _run(rows, service._row_measures)
+
+    for name, start in (("30d", START_30D), ("12m", START_12M)):
+        totals = result.windows[name]
+        in_window = lambda row, start=start: row["ship_date"] >= start  # noqa: E731
+        assert totals.total == _brute(rows, service._row_measures, in_window)
+        for (store, group, bucket), sums in totals.by_store_group_bucket.items():
+            assert sums == _brute(rows, service._row_measures, lambda row: in_window(row) and (
+                row["store"], row["sale_type_group"], row["ship_via_bucket"]) == (store, group, bucket))
+        for (group,), sums in totals.by_group.items():
+            assert sums == _brute(rows, service._row_measures, lambda row: in_window(row) and row["sale_type_group"] == group)
+
+    for (store, day), sums in result.daily.items():
+        assert START_30D.toordinal() <= day <= TODAY.toordinal()
+        assert sums == _brute(rows, service._row_measures, lambda row: (row["store"], row["ship_date"].toordinal()) == (store, day))
+    assert sum(sums[0] for sums in result.monthly.values()) == result.windows["12m"].total[0]
+    assert ("20GR", (2025, 3)) not in result.monthly
+
+
+def test_rollup_rows_aggregate_like_the_orders_they_sum():
+    service = DeliveryReportingService.__new__(DeliveryReportingService)
+    orders = [row for row in _orders() if row["ship_date"]]
+    rollups = defaultdict(lambda: [0] * 5)
+    for row in orders:
+        key = (row["store"], row["ship_date"], row["sale_type_group"], row["ship_via_bucket"])
+        for index, value in enumerate(service._row_measures(row)):
+            rollups[key][index] += value
+    rollup_rows = [
+        dict(zip(("store", "ship_date", "sale_type_group", "ship_via_bucket"), key),
+             **dict(zip(ROLLUP_MEASURES, sums)))
+        for key, sums in rollups.items()
+    ]
+
+    from_orders = _run(orders, service._row_measures)
+    from_rollups = _run(rollup_rows, service._row_measures)
+    for name in ("30d", "12m"):
+        assert from_rollups.windows[name].total[:3] == from_orders.windows[name].total[:3]
+        assert from_rollups.windows[name].by_store_group.keys() == from_orders.windows[name].by_store_group.keys()
+    assert from_rollups.daily.keys() == from_orders.daily.keys()
+    assert {key: sums[0] for key, sums in from_rollups.monthly.items()} == {key: sums[0] for key, sums in from_orders.monthly.items()}
+
@@ -0,0 +1,130 @@
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+from app.Models.models import (
+    DeliveryDailyRollup,
+    DeliveryOrderFact,
+    ERPMirrorItem,
+    ERPMirrorSalesOrderHeader,
+    ERPMirrorShipmentHeader,
+    ERPMirrorShipmentLine,
+    ERPSyncTableState,
+)
+from app.Services.delivery_facts import DeliveryFactStore
+from app.Services.delivery_reporting_service import DeliveryReportingService
+from app.Services.erp.base import ERPServiceBase
+
+TODAY = date.today()
+HOUR_AGO = datetime.utcnow() - timedelta(hours=1)
+TABLES = [
+    ERPMirrorItem.__table__, ERPMirrorSalesOrderHeader.__table__, ERPMirrorShipmentHeader.__table__,
+    ERPMirrorShipmentLine.__table__, ERPSyncTableState.__table__, DeliveryOrderFact.__table__,
+    DeliveryDailyRollup.__table__,
+]
+ORDERS = [
+    # store, so_id, sale_type, ship_via, created days ago, created_time, ship days ago, [(item, qty)]
+    ("20GR", "100", "Delivery", "FORK NEEDED", 0, "13:30:00", 0, [("I1", 10), ("I2", 4)]),
+    ("20GR", "101", "WillCall", "WILL CALL", 0, "08:00:00", 0, [("I1", 2)]),
+    ("25BW", "200", "Add On", "VAN", 2, "09:15:00", 1, [("I2", 6)]),
+    ("25BW", "201", "Credit", "", 5, None, 5, [("I3", 3)]),
+    ("10FD", "300", "Transfer", "SEMI-NO FORK", 40, "15:00:00", 40, [("I1", 1), ("I3", 8)]),
+    ("40CV", "400", "Delivery", "GR_VAN", 200, "12:00:00", 199, [("I2", 5)]),
+    ("40CV", "401", "Direct", "VAN", 3, None, 3, [("I1", 9)]),
+]
+
+
+def _days_ago(days):
+    return datetime.combine(TODAY - timedelta(days=days), datetime.min.time())
+
+
+def _service(monkeypatch, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'mirror.db'}")
+    DeliveryOrderFact.metadata.create_all(engine, tables=TABLES)
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE erp_mirror_so_header ADD COLUMN created_time TEXT"))
+        conn.execute(ERPMirrorItem.__table__.insert(), [
+            {"item_ptr": "I1", "item": "2X4", "stocking_uom": "EA", "synced_at": HOUR_AGO},
+            {"item_ptr": "I2", "item": "OSB", "stocking_uom": "PCS", "synced_at": HOUR_AGO},
+            {"item_ptr": "I3", "item": "NAILS", "stocking_uom": "LB", "synced_at": HOUR_AGO},
+        ])
+        for store, so_id, sale_type, ship_via, created, created_time, shipped, lines in ORDERS:
+            conn.execute(ERPMirrorSalesOrderHeader.__table__.insert(), {
+                "system_id": store, "so_id": so_id, "sale_type": sale_type, "ship_via": ship_via,
+                "created_date": _days_ago(created), "synced_at": HOUR_AGO,
+            })
+            conn.execute(text("UPDATE erp_mirror_so_header SET created_time = :t WHERE so_id = :so"), {"t": created_time, "so": so_id})
+            conn.execute(ERPMirrorShipmentHeader.__table__.insert(), {
+                "system_id": store, "so_id": so_id, "shipment_num": "1", "ship_date": _days_ago(shipped),
+                "ship_via": ship_via or None, "synced_at": HOUR_AGO,
+            })
+            conn.execute(ERPMirrorShipmentLine.__table__.insert(), [
+                {"system_id": store, "so_id": so_id, "shipment_num": "1", "line_no": n, "item_ptr": item,
+                 "qty_shipped": qty, "synced_at": HOUR_AGO}
+                for n, (item, qty) in enumerate(lines, start=1)
+            ])
+    monkeypatch.setattr(ERPServiceBase, "_mirror_engine", staticmethod(lambda: engine))
+    monkeypatch.setattr(ERPServiceBase, "_mirror_columns_cache", {})
+    service = DeliveryReportingService()
+    service.erp.central_db_mode = True
+    return service, engine
+
+
+def _live_payload(service, monkeypatch, **kwargs):
+    with monkeypatch.context() as patch:
+        patch.setattr(service, "_fact_store", lambda: None)
+        payload = service.get_dashboard_payload(**kwargs)
+    payload.pop("generated_at")
+    return payload
+
+
+def test_rollup_payload_matches_live_query(monkeypatch, tmp_path):
+    service, _engine = _service(monkeypatch, tmp_path)
+    assert service._fact_store() is None
+
+    live = _live_payload(service, monkeypatch)
+    assert live["windows"]["12m"]["summary"]["delivered_orders"] == 6  # Direct excluded
+    assert live["windows"]["30d"]["summary"]["same_day_after_noon_count"] == 1
+
+    with monkeypatch.context() as patch:
+        # The rebuild writes rows as the cursor yields them, never the whole list.
+        patch.setattr(service, "_fetch_order_rows", None)
+        result = DeliveryFactStore(service).refresh()
+    assert result["mode"] == "rebuild" and result["fact_rows"] == 6
+    assert service._fact_store() is not None
+
+    for sale_type in ("all", "Delivery", "Will Call"):
+        facts = service.get_dashboard_payload(sale_type=sale_type)
+        facts.pop("generated_at")
+        assert facts == _live_payload(service, monkeypatch, sale_type=sale_type)
+
+    exported = service.get_export_rows(window="12m")
+    with monkeypatch.context() as patch:
+        patch.setattr(service, "_fact_store", lambda: None)
+        assert exported == service.get_export_rows(window="12m")
+
+
+def test_refresh_rebuilds_only_changed_ship_dates(monkeypatch, tmp_path):
+    service, engine = _service(monkeypatch, tmp_path)
+    store = DeliveryFactStore(service)
+    store.refresh()
+
+    idle = store.refresh()
+    assert (idle["mode"], idle["ship_dates"], idle["fact_rows"]) == ("incremental", 0, 0)
+
+    # SO 201 moves from 5 days ago to 2 days ago: both days are rebuilt.
+    with engine.begin() as conn:
+        conn.execute(
+            text("UPDATE erp_mirror_shipments_header SET ship_date = :d, synced_at = :now WHERE so_id = '201'"),
+            {"d": _days_ago(2), "now": datetime.utcnow()},
+        )
+    result = store.refresh()
+    assert result["mode"] == "incremental"
+    assert result["ship_dates"] == 2
+    assert result["fact_rows"] == 1
+
+    rows = {(row["store"], row["so_id"]): row["ship_date"] for row in store.order_rows(TODAY - timedelta(days=400))}
+    assert rows[("25BW", "201")] == TODAY - timedelta(days=2)
+    payload = service.get_dashboard_payload()
+    payload.pop("generated_at")
+    assert payload == _live_payload(service, monkeypatch)
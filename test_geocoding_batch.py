@@ -0,0 +1,60 @@
+import gzip
+import json
+
+import pytest
+
+pytest.importorskip("rapidfuzz")
+
+from app.Services.geocoding_index import build_index  # noqa: E402
+from app.Services.geocoding_service import GeocodingService  # noqa: E402
+
+
+def _point(full, city, zip_code, lon, lat):
+    return {
+        "type": "Feature",
+        "properties": {"full": full, "city": city, "postcode": zip_code},
+        "geometry": {"type": "Point", "coordinates": [lon, lat]},
+    }
+
+
+FEATURES = [
+    _point("123 Main St", "Ames", "50010", -93.61, 42.03),
+    _point("123 Maple Ave", "Ames", "50010", -93.62, 42.04),
+    _point("123 Oak St", "Ames", "50014", -93.63, 42.05),
+    _point("77 Elm Ct", "Grimes", "50111", -93.79, 41.68),
+]
+
+ADDRESSES = [
+    ("123 Main St", "Ames", "50010"),         # exact
+    ("123 Main", "Ames", "50010"),            # fuzzy_zip
+    ("123 Oak", "Ames", "99999"),             # wrong zip -> fuzzy_city
+    ("124 Main St", "Ames", "50010"),         # other house number
+    ("PO Box 12", "Ames", "50010"),
+    ("", "Ames", "50010"),
+    ("77 Elm", "Grimes", "50111"),
+]
+
+
+@pytest.fixture(params=["compiled", "in_memory"])
+def geocoder(request, tmp_path):
+    source = tmp_path / "source.geojson.gz"
+    with gzip.open(source, "wt", encoding="utf-8") as f:
+        json.dump({"type": "FeatureCollection", "features": FEATURES}, f)
+    index_path = tmp_path / "source.geocode.sqlite"
+    if request.param == "compiled":
+        build_index(source, index_path)
+    return GeocodingService(geojson_path=source, index_path=index_path)
+
+
+def test_batch_matches_single_address_semantics(geocoder):
+    batch = geocoder.geocode_addresses(ADDRESSES)
+    assert [status for _, _, status in batch] == [
+        "exact", "fuzzy_zip", "fuzzy_city", "failed", "invalid_or_pobox", "invalid_or_pobox", "fuzzy_zip",
+    ]
+    assert batch[1][:2] == (42.03, -93.61)
+    assert batch == [geocoder.geocode_address(*address) for address in ADDRESSES]
+
+
+def test_batch_without_index_reports_not_loaded(tmp_path):
+    geocoder = GeocodingService(geojson_path=None, index_path=tmp_path / "missing.sqlite")
+    assert geocoder.geocode_addresses(ADDRESSES[:2]) == [(None, None, "not_loaded")] * 2
@@ -0,0 +1,80 @@
+import gzip
+import json
+import threading
+
+import pytest
+
+from app.Services.geocoding_index import GeocodeIndex, build_index, make_key, street_core
+
+
+def _point(full, city, zip_code, lon, lat):
+    return {
+        "type": "Feature",
+        "properties": {"full": full, "city": city, "postcode": zip_code},
+        "geometry": {"type": "Point", "coordinates": [lon, lat]},
+    }
+
+
+FEATURES = [
+    _point("123 North Main Street", "Ames", "50010", -93.61, 42.03),
+    _point("123 N Main St", "Ames", "50010", -93.0, 42.0),  # same key: first point wins
+    _point("125 Main St", "Ames", "50010", -93.62, 42.04),
+    _point("123 Maple Avenue", "Ames", "50014", -93.63, 42.05),
+    _point("9 Elm Ct", "Grimes", "", -93.79, 41.68),
+    {"type": "Feature", "properties": {"full": "1 Line"}, "geometry": {"type": "LineString", "coordinates": [[0, 0], [1, 1]]}},
+]
+
+
+@pytest.fixture(params=["collection", "lines"])
+def index_path(request, tmp_path):
+    source = tmp_path / "source.geojson.gz"
+    with gzip.open(source, "wt", encoding="utf-8") as f:
+        if request.param == "collection":
+            json.dump({"type": "FeatureCollection", "features": FEATURES}, f, indent=2)
+        else:
+            f.writelines(json.dumps(feat) + "\n" for feat in FEATURES)
+    output = tmp_path / "source.geocode.sqlite"
+    assert build_index(source, output, batch_size=2) == 5
+    return output
+
+
+def test_exact_lookup_uses_precomputed_keys(index_path):
+    index = GeocodeIndex(index_path)
+    rec = index.exact(make_key("123 North Main Street", "ames", "IA", "50010-1234"))
+    assert rec[3:5] == (42.03, -93.61)
+    assert rec[5:] == ("123", street_core("123 North Main Street"))
+    assert index.metadata()["features"] == "5"
+    assert index.exact("missing") is None
+
+
+def test_postings_block_by_zip_or_city_and_house_number(index_path):
+    index = GeocodeIndex(index_path)
+    assert [rec[0] for rec in index.zip_candidates("50010", "123")] == ["123 North Main Street"]
+    assert [rec[0] for rec in index.city_candidates("AMES", "123")] == ["123 North Main Street", "123 Maple Avenue"]
+    assert index.zip_candidates("", "9") == []
+    assert [rec[0] for rec in index.city_candidates("GRIMES", "9")] == ["9 Elm Ct"]
+
+
+def test_index_is_readable_from_many_threads(index_path):
+    index = GeocodeIndex(index_path)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(len(index.city_candidates("AMES", "123"))))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [2, 2, 2, 2]
+
+
+def test_geocoding_service_reads_compiled_index_lazily(index_path):
+    pytest.importorskip("rapidfuzz")
+    from app.Services.geocoding_service import GeocodingService
+
+    geocoder = GeocodingService(index_path=index_path)
+    assert geocoder.is_loaded and geocoder.exact_idx == {}
+    assert geocoder.geocode_address("123 N Main St", "Ames", "50010") == (42.03, -93.61, "exact")
+    assert geocoder.geocode_address("123 Main", "Ames", "50010")[2] == "fuzzy_zip"
+    assert geocoder.geocode_address("PO Box 5", "Ames", "50010")[2] == "invalid_or_pobox"
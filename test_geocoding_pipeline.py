@@ -0,0 +1,160 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+from app.Models.models import ERPMirrorCustomerShipTo, GeocodeCacheEntry
+from app.Services.geocoding_index import make_key
+from app.Services.geocoding_pipeline import AsyncRateLimiter, ShiptoGeocoder
+
+SHIPTOS = ERPMirrorCustomerShipTo.__table__
+SETTINGS = {
+    "batch_size": 100, "remote_enabled": True, "remote_min_interval_ms": 0, "remote_concurrency": 2,
+    "remote_max_per_run": 10, "negative_ttl_days": 30, "error_retry_hours": 6, "user_agent": "test",
+}
+
+
+class StubLocalIndex:
+    """Knows one street; everything else is a local miss."""
+
+    def __init__(self):
+        self.calls = []
+
+    def geocode_addresses(self, addresses):
+        self.calls.append(list(addresses))
+        return [(41.6, -93.6, "exact") if address == "100 Main St" else (None, None, "failed")
+                for address, _city, _zip in addresses]
+
+
+class StubFetcher:
+    source = "nominatim"
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.queries = []
+
+    def fetch(self, query):
+        self.queries.append(query)
+        answer = self.answers[query.split(",")[0]]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+def _shipto(shipto_id, address, city="Ames", zip_code="50010"):
+    return {"id": shipto_id, "cust_key": f"C{shipto_id}", "seq_num": "1", "address_1": address, "city": city,
+            "state": "IA", "zip": zip_code, "is_deleted": False}
+
+
+def _engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'mirror.db'}")
+    ERPMirrorCustomerShipTo.metadata.create_all(engine, tables=[SHIPTOS, GeocodeCacheEntry.__table__])
+    with engine.begin() as conn:
+        conn.execute(SHIPTOS.insert(), [
+            _shipto(1, "100 Main St"),
+            _shipto(2, "100  main street"),    # same normalized address as 1
+            _shipto(3, "5 Oak Ave"),           # remote hit
+            _shipto(4, "9 Nowhere Rd"),        # remote: no result
+            _shipto(5, "9 NOWHERE ROAD"),
+            _shipto(6, "12 Cached Ln"),        # answered by geocode_cache
+            _shipto(7, "8 Flaky Ct"),          # remote error: retried after error_retry_hours
+        ])
+        conn.execute(GeocodeCacheEntry.__table__.insert(), [
+            {"address_key": make_key("12 Cached Ln", "Ames", "IA", "50010"), "lat": 42.0, "lon": -93.0,
+             "source": "nominatim", "fetched_at": datetime.utcnow() - timedelta(days=400)},
+        ])
+    return engine
+
+
+def _shiptos(engine):
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT id, lat, lon, geocode_source, geocoded_at FROM erp_mirror_cust_shipto"))
+        return {row.id: (row.lat and float(row.lat), row.lon and float(row.lon), row.geocode_source,
+                         row.geocoded_at is not None) for row in rows}
+
+
+def test_addresses_resolve_local_first_and_each_miss_is_fetched_once(tmp_path):
+    engine = _engine(tmp_path)
+    local = StubLocalIndex()
+    fetcher = StubFetcher({"5 Oak Ave": (42.1, -93.2), "9 Nowhere Rd": None, "8 Flaky Ct": OSError("timeout")})
+    pipeline = ShiptoGeocoder(engine=engine, geocoder=local, fetcher=fetcher, settings=SETTINGS)
+
+    summary = pipeline.run()
+    assert {key: summary[key] for key in ("rows", "addresses", "local", "cached", "remote", "no_result", "errors",
+                                          "updated")} == {
+        "rows": 7, "addresses": 5, "local": 1, "cached": 1, "remote": 1, "no_result": 1, "errors": 1, "updated": 4,
+    }
+    assert len(local.calls) == 1
+    assert sorted(fetcher.queries) == ["5 Oak Ave, Ames, IA, 50010", "8 Flaky Ct, Ames, IA, 50010",
+                                       "9 Nowhere Rd, Ames, IA, 50010"]
+    assert _shiptos(engine) == {
+        1: (41.6, -93.6, "local_exact", True),
+        2: (41.6, -93.6, "local_exact", True),
+        3: (42.1, -93.2, "nominatim", True),
+        4: (None, None, "nominatim_no_result", True),
+        5: (None, None, "nominatim_no_result", True),
+        6: (42.0, -93.0, "nominatim", True),
+        7: (None, None, "nominatim_error", True),
+    }
+
+    # The failed fetch backs off instead of taking the remote budget every run.
+    fetcher.queries.clear()
+    assert pipeline.run()["addresses"] == 0
+    assert fetcher.queries == []
+
+    # Only the ship-to whose fetch failed is pending once the backoff passes.
+    fetcher.answers["8 Flaky Ct"] = (41.9, -93.9)
+    summary = pipeline.run(now=datetime.utcnow() + timedelta(hours=7))
+    assert (summary["addresses"], summary["remote"]) == (1, 1)
+    assert _shiptos(engine)[7] == (41.9, -93.9, "nominatim", True)
+
+    # A new ship-to at a known-bad address is answered from the negative cache.
+    with engine.begin() as conn:
+        conn.execute(SHIPTOS.insert(), [_shipto(8, "9 Nowhere Road")])
+    fetcher.queries.clear()
+    summary = pipeline.run()
+    assert (summary["cached"], fetcher.queries) == (1, [])
+    assert _shiptos(engine)[8] == (None, None, "nominatim_no_result", True)
+
+
+def test_negative_results_are_retried_after_their_ttl(tmp_path):
+    engine = _engine(tmp_path)
+    fetcher = StubFetcher({"5 Oak Ave": (42.1, -93.2), "9 Nowhere Rd": None, "8 Flaky Ct": None})
+    pipeline = ShiptoGeocoder(engine=engine, geocoder=StubLocalIndex(), fetcher=fetcher, settings=SETTINGS)
+    pipeline.run()
+
+    fetcher.queries.clear()
+    fetcher.answers["9 Nowhere Rd"] = (41.5, -93.5)
+    summary = pipeline.run(now=datetime.utcnow() + timedelta(days=31))
+    assert (summary["remote"], summary["no_result"]) == (1, 1)
+    assert sorted(fetcher.queries) == ["8 Flaky Ct, Ames, IA, 50010", "9 Nowhere Rd, Ames, IA, 50010"]
+    assert _shiptos(engine)[5][:2] == (41.5, -93.5)
+
+
+def test_remote_budget_defers_the_rest(tmp_path):
+    engine = _engine(tmp_path)
+    fetcher = StubFetcher({"5 Oak Ave": (42.1, -93.2), "9 Nowhere Rd": None, "8 Flaky Ct": None})
+    pipeline = ShiptoGeocoder(engine=engine, geocoder=StubLocalIndex(), fetcher=fetcher,
+                              settings={**SETTINGS, "remote_max_per_run": 1})
+
+    assert (pipeline.run()["deferred"], len(fetcher.queries)) == (2, 1)
+    assert pipeline.run()["deferred"] == 1
+    assert pipeline.run()["deferred"] == 0
+    assert len(fetcher.queries) == 3
+
+
+def test_rate_limiter_spaces_request_starts():
+    async def starts():
+        limiter = AsyncRateLimiter(0.05)
+        stamps = []
+
+        async def one():
+            await limiter.wait()
+            stamps.append(time.monotonic())
+
+        await asyncio.gather(*(one() for _ in range(3)))
+        return stamps
+
+    stamps = sorted(asyncio.run(starts()))
+    assert all(later - earlier >= 0.045 for earlier, later in zip(stamps, stamps[1:]))
@@ -0,0 +1,206 @@
+from flask import Flask
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.Models.models import Pick, PickTypes, Pickster
+from app.Routes.main import main_bp
+from app.runtime_settings import get_live_update_settings
+from app.Services import live_updates
+from app.Services.live_updates import LiveFeed, LiveUpdateHub, decode_change, encode_change, sse_stream
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def _drain(subscription):
+    events = []
+    while (item := subscription.get(timeout=0)) is not None:
+        events.append(item)
+    return events
+
+
+def _hub(clock):
+    return LiveUpdateHub(min_refresh_seconds=2, idle_refresh_seconds=60, clock=clock, start_thread=False)
+
+
+def test_feed_diff_only_reports_changed_rows():
+    rows = [{"so": "1", "lines": 2}, {"so": "2", "lines": 1}]
+    feed = LiveFeed("open_so_summary:20GR", lambda: [dict(r) for r in rows], key=lambda r: r["so"])
+
+    assert [r["key"] for r in feed.refresh()["upsert"]] == ["1", "2"]
+    assert feed.refresh() is None
+
+    rows[1]["lines"] = 5
+    rows.append({"so": "3", "lines": 1})
+    del rows[0]
+    diff = feed.refresh()
+    assert [r["key"] for r in diff["upsert"]] == ["2", "3"]
+    assert diff["remove"] == ["1"]
+    assert diff["order"] == ["2", "3"]
+    assert feed.snapshot()["version"] == 2
+
+
+def test_one_upstream_query_fans_out_to_every_screen():
+    clock = FakeClock()
+    hub = _hub(clock)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return [{"so_number": "100", "line_count": len(calls)}]
+
+    screens = [hub.subscribe("open_so_summary:20GR", loader=loader, key=lambda r: r["so_number"]) for _ in range(3)]
+    assert hub.refresh_due() == 1
+    assert len(calls) == 1
+    assert all(_drain(s)[0][0] == "snapshot" for s in screens)
+
+    hub.publish("local", {"40CV"})  # other branch: nothing to do
+    clock.now += 5
+    assert hub.refresh_due() == 0
+
+    hub.publish("sync", {"20GR"})
+    hub.publish("local", {"20GR"})
+    clock.now += 2
+    assert hub.refresh_due() == 1
+    assert len(calls) == 2
+    for screen in screens:
+        (event, diff), = _drain(screen)
+        assert event == "diff" and diff["upsert"][0]["line_count"] == 2
+
+    late = hub.subscribe("open_so_summary:20GR", loader=loader, key=lambda r: r["so_number"])
+    assert _drain(late)[0][0] == "snapshot"  # served from the current snapshot, no query
+    assert len(calls) == 2
+
+
+def test_unchanged_refresh_sends_nothing_and_refresh_is_rate_limited():
+    clock = FakeClock()
+    hub = _hub(clock)
+    screen = hub.subscribe("open_so_summary:DSM", loader=lambda: [{"so_number": "1"}], key=lambda r: r["so_number"])
+    hub.refresh_due()
+    _drain(screen)
+
+    hub.publish("sync", {"25BW"})  # DSM covers 20GR + 25BW
+    assert hub.refresh_due() == 0  # within min_refresh_seconds
+    clock.now += 2
+    assert hub.refresh_due() == 1
+    assert _drain(screen) == []
+    assert hub.stats()["diffs_sent"] == 0
+
+
+def test_signal_screens_get_pings_for_their_branch_only():
+    hub = _hub(FakeClock())
+    grimes = hub.subscribe("signal:20GR")
+    everything = hub.subscribe("signal:all")
+    hub.publish("local", {"40CV"})
+    assert _drain(grimes) == []
+    assert _drain(everything) == [("changed", {"source": "local", "branches": ["40CV"]})]
+    hub.publish("sync", None)
+    assert _drain(grimes) == [("changed", {"source": "sync", "branches": None})]
+
+
+def test_sse_stream_frames_and_unsubscribes_when_done():
+    clock = FakeClock()
+    hub = _hub(clock)
+    screen = hub.subscribe("open_so_summary:20GR", loader=lambda: [{"so_number": "1"}], key=lambda r: r["so_number"])
+    hub.refresh_due()
+    frames = sse_stream(screen, heartbeat_seconds=0, max_seconds=1, clock=clock)
+    assert next(frames) == "retry: 5000\n\n"
+    snapshot = next(frames)
+    assert snapshot.startswith("id: 1\nevent: snapshot\ndata: ")
+    assert next(frames) == "event: ping\ndata: {}\n\n"
+    clock.now += 1
+    assert list(frames) == []
+    assert hub.stats()["feeds"] == 0 and hub.stats()["subscribers"] == 0
+
+
+def test_streams_over_the_cap_are_told_to_come_back_later():
+    clock = FakeClock()
+    hub = LiveUpdateHub(min_refresh_seconds=2, idle_refresh_seconds=60, clock=clock, start_thread=False,
+                        max_streams=1)
+    first = sse_stream(hub.subscribe("signal:20GR"), heartbeat_seconds=0, max_seconds=1, clock=clock)
+    assert next(first) == "retry: 5000\n\n"
+
+    hub.publish("sync", ["20GR"])
+    busy = sse_stream(hub.subscribe("signal:20GR"), busy_retry_ms=30000, clock=clock)
+    assert list(busy) == ["retry: 30000\n\n"]
+    assert hub.stats()["streams"] == 1 and hub.stats()["streams_refused"] == 1
+
+    first.close()
+    assert hub.stats()["streams"] == 0 and hub.stats()["subscribers"] == 0
+
+
+def test_stream_cap_leaves_a_request_slot_free(monkeypatch):
+    monkeypatch.setenv("WEB_WORKER_CLASS", "gthread")
+    monkeypatch.setenv("WEB_THREADS", "8")
+    assert get_live_update_settings()["max_streams_per_worker"] == 4
+    monkeypatch.setenv("LIVE_UPDATES_MAX_STREAMS", "20")
+    assert get_live_update_settings()["max_streams_per_worker"] == 7
+
+    monkeypatch.setenv("WEB_WORKER_CLASS", "sync")
+    settings = get_live_update_settings()
+    assert settings["max_streams_per_worker"] == 0 and not settings["streams_enabled"]
+
+    hub = LiveUpdateHub(start_thread=False, max_streams=settings["max_streams_per_worker"])
+    assert list(sse_stream(hub.subscribe("signal:20GR"), busy_retry_ms=30000)) == ["retry: 30000\n\n"]
+    assert hub.stats()["streams_refused"] == 1
+
+
+def test_change_payload_round_trips():
+    assert decode_change(encode_change("sync", {"25BW", "20GR"})) == ("sync", {"20GR", "25BW"})
+    assert decode_change(encode_change("local")) == ("local", None)
+    assert decode_change("not json") == ("unknown", None)
+
+
+def test_committed_pick_writes_publish_their_branch(monkeypatch, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'tracker.db'}")
+    Pick.metadata.create_all(engine, tables=[Pickster.__table__, PickTypes.__table__, Pick.__table__])
+    Session = sessionmaker(bind=engine)
+    hub = _hub(FakeClock())
+    monkeypatch.setattr(live_updates, "_hub", hub)
+    monkeypatch.setattr(live_updates, "_tracked_models", ())
+    live_updates.init_live_updates(None, Session, (Pick,))
+    screen = hub.subscribe("signal:all")
+
+    session = Session()
+    picker = Pickster(name="Sam")
+    session.add(picker)
+    session.commit()
+    assert _drain(screen) == []  # untracked model
+
+    session.add(Pick(barcode_number="123", picker_id=picker.id, branch_code="20GR"))
+    session.flush()
+    session.rollback()
+    assert _drain(screen) == []
+
+    session.add(Pick(barcode_number="124", picker_id=picker.id, branch_code="20GR"))
+    session.commit()
+    assert _drain(screen) == [("changed", {"source": "local", "branches": ["20GR"]})]
+
+    session.add(Pick(barcode_number="125", picker_id=picker.id, branch_code="25BW"))
+    session.add(Pick(barcode_number="126", picker_id=picker.id, branch_code=None))
+    session.commit()
+    assert _drain(screen) == [("changed", {"source": "local", "branches": None})]
+    session.close()
+
+
+def test_sync_workers_get_no_stream_and_fall_back_to_polling(monkeypatch):
+    hub = _hub(FakeClock())
+    monkeypatch.setattr(live_updates, "_hub", hub)
+    app = Flask(__name__)
+    app.register_blueprint(main_bp)
+    client = app.test_client()
+
+    monkeypatch.setenv("WEB_WORKER_CLASS", "sync")
+    response = client.get("/tv/20GR/events")
+    assert response.status_code == 204  # EventSource gives up; the page keeps its meta refresh
+    assert hub.stats()["subscribers"] == 0
+
+    monkeypatch.setenv("WEB_WORKER_CLASS", "gthread")
+    response = client.get("/tv/20GR/events")
+    assert response.status_code == 200 and response.mimetype == "text/event-stream"
+    response.close()
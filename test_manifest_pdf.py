@@ -0,0 +1,132 @@
+from io import BytesIO
+
+import pytest
+import qrcode
+from flask import Flask
+from PIL import Image
+
+from app.runtime_settings import get_manifest_settings
+from app.Services import manifest_pdf
+
+pypdf = pytest.importorskip("pypdf")
+
+
+def _items(count):
+    return [
+        {
+            "id": str(1300000 + n),
+            "doc_kind": "so",
+            "branch": "20GR",
+            "shipto_name": f"Customer {n}",
+            "lines": [{"line_no": 1, "item_id": f"ITEM{n}", "qty_ordered": 4, "uom": "EA"}],
+        }
+        for n in range(1, count + 1)
+    ]
+
+
+def _settings(**overrides):
+    return {**get_manifest_settings(), "workers": 0, "logo_path": "", **overrides}
+
+
+def _pages(handle):
+    reader = pypdf.PdfReader(BytesIO(handle.read()))
+    handle.close()
+    return [page.extract_text() for page in reader.pages]
+
+
+def test_qr_runs_rebuild_the_qrcode_matrix():
+    manifest_pdf._qr_runs.cache_clear()
+    size, runs = manifest_pdf._qr_runs("SO:1300001")
+    code = qrcode.QRCode(border=4)
+    code.add_data("SO:1300001")
+    code.make(fit=True)
+
+    rebuilt = [[False] * size for _ in range(size)]
+    for row, col, length in runs:
+        rebuilt[row][col:col + length] = [True] * length
+    assert rebuilt == code.get_matrix()
+    assert manifest_pdf._qr_runs("SO:1300001") == (size, runs)
+    assert manifest_pdf._qr_runs.cache_info().hits == 1
+
+
+def test_serial_render_numbers_pages_and_decodes_the_logo_once(tmp_path):
+    logo = tmp_path / "logo.png"
+    Image.new("RGB", (60, 20), (200, 30, 30)).save(logo)
+    manifest_pdf._load_logo.cache_clear()
+    settings = _settings(logo_path=str(logo))
+
+    pages = _pages(manifest_pdf.render_manifest_pdf(_items(3), settings))
+    assert len(pages) == 3
+    assert "Order: 1300002" in pages[1] and "ITEM2" in pages[1] and "Page 2 of 3" in pages[1]
+    assert all("Dispatch Manifest" in page for page in pages)
+
+    handle = manifest_pdf.render_manifest_pdf(_items(3), settings)
+    data = handle.read()
+    handle.close()
+    assert manifest_pdf._load_logo.cache_info().misses == 1
+    # Embedded once, in the header form every page draws.
+    assert data.count(b"/Subtype /Image") == 1
+
+
+def test_parallel_render_keeps_page_order():
+    settings = _settings(workers=2, batch_pages=2, parallel_min_pages=1)
+    assert manifest_pdf._can_parallelize(5, settings)
+    try:
+        pages = _pages(manifest_pdf.render_manifest_pdf(_items(5), settings))
+        assert manifest_pdf._pool is not None  # a failed pool falls back to serial and drops it
+    finally:
+        manifest_pdf._reset_pool()
+
+    assert len(pages) == 5
+    for number, page in enumerate(pages, start=1):
+        assert f"Order: {1300000 + number}" in page and f"Page {number} of 5" in page
+
+
+def test_manifest_workers_default_to_serial(monkeypatch):
+    monkeypatch.delenv("MANIFEST_WORKERS", raising=False)
+    settings = get_manifest_settings()
+    assert settings["workers"] == 1
+    assert not manifest_pdf._can_parallelize(500, {**settings, "parallel_min_pages": 1})
+
+
+def test_failed_render_keeps_the_shared_pool(monkeypatch):
+    settings = _settings(workers=2, batch_pages=2, parallel_min_pages=1)
+    try:
+        pool = manifest_pdf._get_pool(2)
+
+        def merge_fails(batches, output):
+            list(batches)
+            raise ValueError("bad batch")
+
+        monkeypatch.setattr(manifest_pdf, "_merge_batches", merge_fails)
+        pages = _pages(manifest_pdf.render_manifest_pdf(_items(5), settings))
+        assert len(pages) == 5  # rendered serially instead
+        # Another request's batches could still be running on it.
+        assert manifest_pdf._pool is pool
+        assert pool.submit(int, "7").result(timeout=30) == 7
+    finally:
+        manifest_pdf._reset_pool()
+
+
+def test_manifest_endpoint_streams_and_applies_the_item_cap(monkeypatch):
+    import app.auth
+    from app.Routes.dispatch import dispatch_bp
+
+    monkeypatch.setattr(app.auth, "is_authenticated", lambda: True)
+    monkeypatch.setenv("MANIFEST_MAX_ITEMS", "120")
+    monkeypatch.setenv("MANIFEST_WORKERS", "0")
+    monkeypatch.setenv("LOGO_PATH", "")
+    flask_app = Flask(__name__)
+    flask_app.register_blueprint(dispatch_bp)
+    client = flask_app.test_client()
+
+    response = client.post("/dispatch/api/manifest", json={"items": _items(110)})
+    assert response.status_code == 200 and response.mimetype == "application/pdf"
+    assert response.is_streamed
+    body = response.get_data()
+    assert body.startswith(b"%PDF") and int(response.headers["Content-Length"]) == len(body)
+    assert "dispatch-manifest.pdf" in response.headers["Content-Disposition"]
+    assert len(pypdf.PdfReader(BytesIO(body)).pages) == 110
+
+    assert client.post("/dispatch/api/manifest", json={"items": _items(121)}).status_code == 400
+    assert client.post("/dispatch/api/manifest", json={"items": ["1300001"]}).status_code == 400
@@ -0,0 +1,130 @@
+import json
+import os
+import re
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from app.Models.models import ERPMirrorCustomer, ERPMirrorCustomerShipTo, ERPMirrorSalesOrderHeader
+from app.Services.erp.base import ERPServiceBase
+from app.Services.erp.query_cache import reset_query_cache
+from app.Services.erp_service import ERPService
+
+MIRROR_TABLES = ("erp_mirror_cust", "erp_mirror_cust_shipto", "erp_mirror_so_header")
+
+
+def sequential_scans(conn, sql, params=None):
+    """Tables (or aliases on SQLite) the planner reads with a full scan."""
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SET LOCAL enable_seqscan = off"))
+        plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params or {}).scalar()
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        scanned, stack = set(), [plan[0]["Plan"]]
+        while stack:
+            node = stack.pop()
+            if node.get("Node Type") == "Seq Scan":
+                scanned.add(node.get("Relation Name"))
+            stack.extend(node.get("Plans", []))
+        return scanned
+    rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params or {}).all()
+    return {
+        match.group(1)
+        for row in rows
+        if (match := re.match(r"SCAN (\w+)(?! USING (?:COVERING )?INDEX)", row[-1]))
+    }
+
+
+def _engine(url):
+    engine = create_engine(url)
+    tables = [ERPMirrorCustomer.__table__, ERPMirrorCustomerShipTo.__table__, ERPMirrorSalesOrderHeader.__table__]
+    ERPMirrorCustomer.metadata.create_all(engine, tables=tables)
+    with engine.begin() as conn:
+        # get_customer_details reads the mirror's terms column, which the model doesn't declare.
+        if "terms" not in {column["name"] for column in inspect(conn).get_columns("erp_mirror_cust")}:
+            conn.execute(text("ALTER TABLE erp_mirror_cust ADD COLUMN terms VARCHAR(64)"))
+    return engine
+
+
+def _service(monkeypatch, engine):
+    monkeypatch.setattr(ERPServiceBase, "_mirror_engine", staticmethod(lambda: engine))
+    monkeypatch.setattr(ERPServiceBase, "_mirror_columns_cache", {})
+    reset_query_cache()
+    service = ERPService()
+    service.central_db_mode = True
+    return service
+
+
+def _join_sql(service):
+    return f"""
+        SELECT soh.so_id, c.cust_name, cs.city
+        FROM erp_mirror_so_header soh
+        LEFT JOIN erp_mirror_cust c ON {service._cust_join_clause()}
+        LEFT JOIN erp_mirror_cust_shipto cs ON {service._shipto_join_clause()}
+        WHERE soh.system_id = :branch
+    """
+
+
+def _seed(engine):
+    with engine.begin() as conn:
+        conn.execute(
+            ERPMirrorCustomer.__table__.insert(),
+            [{"cust_key": f" C{i} ", "cust_code": f"C{i} ", "cust_name": f"Cust {i}"} for i in range(20)],
+        )
+        conn.execute(
+            ERPMirrorCustomerShipTo.__table__.insert(),
+            [{"cust_key": f"C{i}", "seq_num": " 1", "city": "Ames"} for i in range(20)],
+        )
+        conn.execute(
+            ERPMirrorSalesOrderHeader.__table__.insert(),
+            [
+                {"system_id": "20GR", "so_id": str(i), "cust_key": f"C{i % 20}", "shipto_seq_num": "1"}
+                for i in range(50)
+            ],
+        )
+
+
+def test_norm_columns_are_generated_on_write(monkeypatch, tmp_path):
+    engine = _engine(f"sqlite:///{tmp_path / 'mirror.db'}")
+    _seed(engine)
+    service = _service(monkeypatch, engine)
+    with engine.connect() as conn:
+        rows = conn.execute(text(_join_sql(service)), {"branch": "20GR"}).all()
+    assert len(rows) == 50
+    assert all(row.cust_name and row.city == "Ames" for row in rows)
+    assert [row["seq_num"] for row in service.get_customer_ship_to_addresses(" C3")] == [" 1"]
+
+
+def test_customer_joins_use_indexes(monkeypatch, tmp_path):
+    engine = _engine(f"sqlite:///{tmp_path / 'mirror.db'}")
+    _seed(engine)
+    service = _service(monkeypatch, engine)
+    assert service._cust_join_clause() == "c.cust_key_norm = soh.cust_key_norm"
+    with engine.connect() as conn:
+        assert sequential_scans(conn, _join_sql(service), {"branch": "20GR"}) <= {"soh"}
+
+
+def test_trim_fallback_is_what_the_harness_catches(monkeypatch, tmp_path):
+    engine = _engine(f"sqlite:///{tmp_path / 'mirror.db'}")
+    service = _service(monkeypatch, engine)
+    monkeypatch.setattr(ERPService, "_has_join_key_columns", lambda self: False)
+    with engine.connect() as conn:
+        scanned = sequential_scans(conn, _join_sql(service), {"branch": "20GR"})
+    assert "TRIM(CAST(c.cust_key AS TEXT))" in service._cust_join_clause()
+    assert {"c", "cs"} <= scanned
+
+
+@pytest.mark.skipif(
+    not os.environ.get("TEST_DATABASE_URL", "").startswith("postgresql"),
+    reason="set TEST_DATABASE_URL to a scratch Postgres database to check real plans",
+)
+def test_postgres_plans_avoid_seq_scans_on_customer_tables(monkeypatch):
+    engine = _engine(os.environ["TEST_DATABASE_URL"])
+    service = _service(monkeypatch, engine)
+    captured = []
+    monkeypatch.setattr(service, "_mirror_query", lambda sql, params=None, **kw: captured.append((sql, params)) or [])
+    service.get_customer_details("C3")
+    service.get_customer_ship_to_addresses("C3")
+    captured.append((_join_sql(service), {"branch": "20GR"}))
+    with engine.begin() as conn:
+        for sql, params in captured:
+            assert not sequential_scans(conn, sql, params) & set(MIRROR_TABLES), sql
@@ -0,0 +1,44 @@
+from sqlalchemy import create_engine, text
+
+from app.Services.erp.base import ERPServiceBase
+from app.Services.erp_service import ERPService
+
+
+def _service(monkeypatch, tmp_path, count=50):
+    engine = create_engine(f"sqlite:///{tmp_path / 'mirror.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE erp_mirror_so_header (system_id TEXT, so_id INTEGER, address_1 TEXT, city TEXT)"))
+        conn.execute(
+            text("INSERT INTO erp_mirror_so_header VALUES ('20GR', :so_id, :address_1, 'Ames')"),
+            [{"so_id": i, "address_1": f"{i} Main"} for i in range(count)],
+        )
+    monkeypatch.setattr(ERPServiceBase, "_mirror_engine", staticmethod(lambda: engine))
+    service = ERPService()
+    service.central_db_mode = True
+    return service, engine
+
+
+def test_stream_yields_attribute_rows_in_batches(monkeypatch, tmp_path):
+    service, engine = _service(monkeypatch, tmp_path)
+    rows = service._mirror_stream(
+        "SELECT so_id, address_1 FROM erp_mirror_so_header WHERE system_id IN :ids ORDER BY so_id",
+        {"ids": ["20GR"]},
+        expanding={"ids"},
+        batch_size=7,
+    )
+    first = next(rows)
+    assert (first.so_id, first.address_1) == (0, "0 Main")
+    assert sum(1 for _ in rows) == 49
+    assert engine.pool.checkedout() == 0
+
+
+def test_stream_row_factory_and_early_close_release_connection(monkeypatch, tmp_path):
+    service, engine = _service(monkeypatch, tmp_path)
+    rows = service._mirror_stream(
+        "SELECT so_id, city FROM erp_mirror_so_header ORDER BY so_id",
+        row_factory=tuple,
+    )
+    assert next(rows) == (0, "Ames")
+    assert engine.pool.checkedout() == 1
+    rows.close()
+    assert engine.pool.checkedout() == 0
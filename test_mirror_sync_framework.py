@@ -0,0 +1,157 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+from app.erp_mirror import MirrorSyncFramework, SyncFamily, SyncStrategy, TableSyncConfig, build_source_query
+
+BASE = datetime(2026, 1, 1, 8, 0, 0)
+
+
+def _engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'mirror.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE erp_mirror_cust (id INTEGER PRIMARY KEY, cust_key TEXT NOT NULL UNIQUE, "
+            "name TEXT, source_updated_at TIMESTAMP, synced_at TIMESTAMP, sync_batch_id TEXT, "
+            "row_fingerprint TEXT, is_deleted BOOLEAN NOT NULL DEFAULT 0)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE stg_cust (cust_key TEXT, name TEXT, source_updated_at TIMESTAMP, row_fingerprint TEXT)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE erp_sync_table_state (id INTEGER PRIMARY KEY, table_name TEXT UNIQUE, family TEXT, "
+            "strategy TEXT, last_batch_id TEXT, last_status TEXT, last_success_at TIMESTAMP, "
+            "last_error_at TIMESTAMP, last_error TEXT, last_source_updated_at TIMESTAMP, "
+            "last_row_count INTEGER, last_duration_ms INTEGER)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE erp_sync_batches (id INTEGER PRIMARY KEY, batch_id TEXT UNIQUE, worker_name TEXT, "
+            "started_at TIMESTAMP, finished_at TIMESTAMP, status TEXT, family TEXT, table_count INTEGER, "
+            "rows_extracted INTEGER, rows_staged INTEGER, rows_upserted INTEGER, rows_deleted INTEGER, "
+            "duration_ms INTEGER, error_message TEXT)"
+        ))
+    return engine
+
+
+class FakeExtractor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.watermarks = []
+
+    def fetch_rows(self, config, *, watermark):
+        self.watermarks.append(watermark)
+        for row in self.rows:
+            if watermark is None or row["source_updated_at"] >= watermark:
+                yield dict(row)
+
+
+def _config(**overrides):
+    values = dict(
+        table_name="erp_mirror_cust",
+        staging_table_name="stg_cust",
+        family=SyncFamily.MASTER,
+        strategy=SyncStrategy.INCREMENTAL,
+        natural_key_columns=("cust_key",),
+        source_query="SELECT cust_key, name, update_date AS source_updated_at FROM cust",
+        source_updated_column="source_updated_at",
+        delete_detection_enabled=True,
+        batch_size=2,
+    )
+    values.update(overrides)
+    return TableSyncConfig(**values)
+
+
+def _rows(count):
+    return [
+        {"cust_key": f"C{i}", "name": f"Customer {i}", "source_updated_at": BASE + timedelta(minutes=i)}
+        for i in range(count)
+    ]
+
+
+def test_first_run_inserts_in_batches_and_records_state(tmp_path):
+    engine = _engine(tmp_path)
+    framework = MirrorSyncFramework(engine, worker_name="test")
+    batch = framework.run_batch([_config()], FakeExtractor(_rows(5)), family="master")
+
+    result = batch.table_results[0]
+    assert batch.status == "success"
+    assert (result.extracted_rows, result.staged_rows, result.inserted_rows, result.updated_rows) == (5, 5, 5, 0)
+    assert result.watermark == BASE + timedelta(minutes=4)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM stg_cust")).scalar() == 0
+        assert conn.execute(text("SELECT COUNT(*) FROM erp_mirror_cust WHERE row_fingerprint IS NOT NULL")).scalar() == 5
+        assert conn.execute(text("SELECT rows_upserted FROM erp_sync_batches")).scalar() == 5
+        assert conn.execute(text("SELECT last_status FROM erp_sync_table_state")).scalar() == "success"
+
+
+def test_incremental_run_uses_watermark_and_counts_real_changes(tmp_path):
+    engine = _engine(tmp_path)
+    framework = MirrorSyncFramework(engine)
+    rows = _rows(4)
+    framework.run_table(_config(), FakeExtractor(rows))
+
+    rows[3]["name"] = "Renamed"  # same timestamp as the watermark: re-read, changed
+    rows.append({"cust_key": "C9", "name": "New", "source_updated_at": BASE + timedelta(minutes=9)})
+    extractor = FakeExtractor(rows)
+    result = framework.run_table(_config(), extractor)
+
+    assert extractor.watermarks == [BASE + timedelta(minutes=3)]
+    assert (result.extracted_rows, result.inserted_rows, result.updated_rows) == (2, 1, 1)
+    assert result.deleted_rows == 0  # incremental run without fetch_keys cannot see deletes
+
+
+def test_unchanged_rows_are_not_counted_as_updates(tmp_path):
+    engine = _engine(tmp_path)
+    framework = MirrorSyncFramework(engine)
+    config = _config(strategy=SyncStrategy.FULL_REFRESH)
+    framework.run_table(config, FakeExtractor(_rows(3)))
+    result = framework.run_table(config, FakeExtractor(_rows(3)))
+    assert (result.inserted_rows, result.updated_rows, result.deleted_rows) == (0, 0, 0)
+
+
+def test_full_refresh_soft_deletes_missing_keys(tmp_path):
+    engine = _engine(tmp_path)
+    framework = MirrorSyncFramework(engine)
+    config = _config(strategy=SyncStrategy.FULL_REFRESH)
+    framework.run_table(config, FakeExtractor(_rows(4)))
+    result = framework.run_table(config, FakeExtractor(_rows(2)))
+
+    assert result.deleted_rows == 2
+    with engine.connect() as conn:
+        deleted = conn.execute(text("SELECT cust_key FROM erp_mirror_cust WHERE is_deleted ORDER BY cust_key")).scalars().all()
+    assert deleted == ["C2", "C3"]
+
+    result = framework.run_table(config, FakeExtractor(_rows(4)))
+    assert (result.inserted_rows, result.updated_rows, result.deleted_rows) == (0, 2, 0)
+
+
+def test_build_source_query_adds_watermark_predicate():
+    sql, params = build_source_query(_config(), BASE)
+    assert sql.endswith("src.source_updated_at >= ?")
+    assert params == [BASE]
+    assert build_source_query(_config(strategy=SyncStrategy.FULL_REFRESH), BASE)[1] == []
+
+
+class FailingExtractor(FakeExtractor):
+    def fetch_rows(self, config, *, watermark):
+        self.watermarks.append(watermark)
+        raise RuntimeError("source unavailable")
+        yield
+
+
+def test_failed_run_keeps_the_last_good_watermark(tmp_path):
+    engine = _engine(tmp_path)
+    framework = MirrorSyncFramework(engine)
+    framework.run_table(_config(), FakeExtractor(_rows(4)))
+
+    try:
+        framework.run_table(_config(), FailingExtractor([]))
+    except RuntimeError:
+        pass
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT last_status FROM erp_sync_table_state")).scalar() == "error"
+
+    extractor = FakeExtractor(_rows(4))
+    result = framework.run_table(_config(), extractor)
+    assert extractor.watermarks == [BASE + timedelta(minutes=3)]
+    assert result.extracted_rows == 1
@@ -0,0 +1,155 @@
+import random
+import threading
+
+import pytest
+
+from app.erp_mirror import MirrorSyncScheduler, SyncFamily, SyncJob
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _scheduler(jobs, clock, **kwargs):
+    kwargs.setdefault("jitter_ratio", 0)
+    return MirrorSyncScheduler(jobs, clock=clock, rng=random.Random(1), **kwargs)
+
+
+def _wait(scheduler):
+    for job in scheduler.jobs:
+        if job.running is not None:
+            job.running.result(timeout=5)
+
+
+def test_operational_jobs_go_first_when_pool_is_full():
+    clock = FakeClock()
+    jobs = [
+        SyncJob("ar_open", SyncFamily.AR, 300, lambda: None),
+        SyncJob("cust", SyncFamily.MASTER, 300, lambda: None),
+        SyncJob("picks", SyncFamily.OPERATIONAL, 5, lambda: None),
+    ]
+    scheduler = _scheduler(jobs, clock, max_workers=1)
+    assert scheduler.tick() == ["picks"]
+    _wait(scheduler)
+    assert scheduler.tick() == ["ar_open"]
+    scheduler.shutdown()
+
+
+def test_each_job_runs_on_its_own_cadence_and_slow_jobs_are_skipped():
+    clock = FakeClock()
+    release = threading.Event()
+    jobs = [
+        SyncJob("picks", SyncFamily.OPERATIONAL, 5, lambda: None),
+        SyncJob("ar_open", SyncFamily.AR, 10, lambda: release.wait(5)),
+    ]
+    scheduler = _scheduler(jobs, clock, max_workers=2)
+    assert sorted(scheduler.tick()) == ["ar_open", "picks"]
+
+    clock.now += 5
+    jobs[0].running.result(timeout=5)
+    assert scheduler.tick() == ["picks"]
+
+    clock.now += 5  # AR is due again but still running
+    jobs[0].running.result(timeout=5)
+    assert scheduler.tick() == ["picks"]
+    assert jobs[1].skipped == 1
+    assert scheduler.family_lag()["ar"]["running_jobs"] == ["ar_open"]
+
+    release.set()
+    scheduler.shutdown()
+
+
+def test_failures_back_off_and_reset_after_success():
+    clock = FakeClock()
+    outcomes = [RuntimeError("boom"), RuntimeError("boom"), None]
+
+    def flaky():
+        outcome = outcomes.pop(0)
+        if outcome:
+            raise outcome
+
+    job = SyncJob("so_header", SyncFamily.OPERATIONAL, 5, flaky)
+    scheduler = _scheduler([job], clock, max_backoff_seconds=15)
+
+    scheduler.tick()
+    _wait(scheduler)
+    assert job.consecutive_failures == 1
+    assert job.next_due == clock.now + 10
+    assert scheduler.family_lag()["operational"]["failing_jobs"] == ["so_header"]
+
+    clock.now += 10
+    scheduler.tick()
+    _wait(scheduler)
+    assert job.next_due == clock.now + 15  # capped
+
+    clock.now += 15
+    scheduler.tick()
+    _wait(scheduler)
+    assert job.consecutive_failures == 0
+    assert job.last_error is None
+    assert scheduler.family_lag()["operational"]["lag_seconds"] == 0
+    scheduler.shutdown()
+
+
+def test_jitter_delays_next_run_within_ratio():
+    clock = FakeClock()
+    job = SyncJob("cust", SyncFamily.MASTER, 100, lambda: None)
+    scheduler = MirrorSyncScheduler([job], clock=clock, jitter_ratio=0.2, rng=random.Random(3))
+    scheduler.tick()
+    _wait(scheduler)
+    assert clock.now + 100 <= job.next_due <= clock.now + 120
+    scheduler.shutdown()
+
+
+def test_jobs_without_a_cadence_run_on_their_family_cadence(monkeypatch):
+    from app.erp_mirror import SyncStrategy, TableSyncConfig, family_cadences, jobs_from_configs
+    from app.runtime_settings import get_mirror_sync_settings
+    from sync_erp import LocalSync
+
+    monkeypatch.setenv("SYNC_MASTER_CADENCE_SECONDS", "900")
+    monkeypatch.setenv("SYNC_OPERATIONAL_CADENCE_SECONDS", "7")
+    monkeypatch.setenv("SYNC_AR_CADENCE_SECONDS", "120")
+    monkeypatch.setenv("SYNC_DOCUMENT_CADENCE_SECONDS", "45")
+    settings = get_mirror_sync_settings()
+    cadences = family_cadences(settings)
+
+    def config(name, family, **extra):
+        return TableSyncConfig(name, f"stg_{name}", family, SyncStrategy.INCREMENTAL, ("id",), "select 1", **extra)
+
+    configs = [
+        config("erp_mirror_cust", SyncFamily.MASTER),
+        config("erp_mirror_so_header", SyncFamily.OPERATIONAL),
+        config("erp_mirror_aropen", SyncFamily.AR),
+        config("erp_mirror_doc", SyncFamily.DOCUMENT),
+        config("erp_mirror_item", SyncFamily.MASTER, cadence_seconds=60),
+    ]
+    clock = FakeClock()
+    scheduler = _scheduler(jobs_from_configs(None, None, configs, cadences), clock, max_workers=8)
+    expected = {
+        "erp_mirror_cust": 900,
+        "erp_mirror_so_header": 7,
+        "erp_mirror_aropen": 120,
+        "erp_mirror_doc": 45,
+        "erp_mirror_item": 60,
+    }
+    assert {job.name: job.cadence_seconds for job in scheduler.jobs} == expected
+    scheduler.shutdown()
+
+    # The sync worker fills in family cadences for extra jobs that don't set one.
+    syncer = LocalSync.__new__(LocalSync)
+    syncer.mirror_settings = settings
+    syncer.sync_interval = 5
+    extra = [SyncJob(name, family, None, lambda: None) for name, family in
+             [("ar_open", SyncFamily.AR), ("doc_lines", SyncFamily.DOCUMENT), ("customers", SyncFamily.MASTER)]]
+    scheduler = syncer.build_scheduler(extra)
+    intervals = {job.name: job.cadence_seconds for job in scheduler.jobs}
+    assert intervals["ar_open"] == 120 and intervals["doc_lines"] == 45 and intervals["customers"] == 900
+    assert intervals["operational_snapshot"] == 5
+    scheduler.shutdown()
+
+    with pytest.raises(ValueError, match="orphan"):
+        MirrorSyncScheduler([SyncJob("orphan", SyncFamily.AR, None, lambda: None)])
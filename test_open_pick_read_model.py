@@ -0,0 +1,214 @@
+import importlib.util
+import os
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.Models.models import (
+    ERPMirrorCustomer,
+    ERPMirrorCustomerShipTo,
+    ERPMirrorItem,
+    ERPMirrorItemBranch,
+    ERPMirrorPickDetailNormalized,
+    ERPMirrorPickHeaderNormalized,
+    ERPMirrorSalesOrderHeader,
+    ERPMirrorSalesOrderLine,
+    ERPMirrorShipmentHeader,
+)
+from app.Services.erp.base import ERPServiceBase
+from app.Services.erp.query_cache import reset_query_cache
+from app.Services.erp_service import ERPService
+
+TODAY = date.today()
+COLUMNS = (
+    "system_id, so_id, sequence, handling_code, so_status, expect_date, ship_date, invoice_date, "
+    "expect_day, ship_day, invoice_day, item, "
+    "description, qty_ordered, cust_name, address_1, city, reference, sale_type, status_flag, ship_via, "
+    "driver, route, pick_printed_time, pick_printed_date, loaded_time, loaded_date, status_flag_delivery"
+)
+
+
+def _line(system_id, so_id, sequence, handling_code, so_status, expect_date=None, invoice_date=None):
+    return {
+        "system_id": system_id, "so_id": so_id, "sequence": sequence, "handling_code": handling_code,
+        "so_status": so_status, "expect_date": expect_date, "ship_date": None, "invoice_date": invoice_date,
+        "expect_day": expect_date, "ship_day": None, "invoice_day": invoice_date,
+        "item": "2X4", "description": "Stud", "qty_ordered": 3, "cust_name": "Acme", "address_1": "1 Main",
+        "city": "Ames", "reference": "", "sale_type": "DELIVERY", "status_flag": None, "ship_via": None,
+        "driver": None, "route": None, "pick_printed_time": None, "pick_printed_date": None,
+        "loaded_time": None, "loaded_date": None, "status_flag_delivery": None,
+    }
+
+
+def _service(monkeypatch, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'mirror.db'}")
+    yesterday = (TODAY - timedelta(days=1)).isoformat()
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE TABLE erp_open_pick_lines ({COLUMNS})"))
+        conn.execute(
+            text(f"INSERT INTO erp_open_pick_lines ({COLUMNS}) VALUES ({', '.join(':' + c.strip() for c in COLUMNS.split(','))})"),
+            [
+                _line("20GR", "100", 1, "LUMBER", "K", TODAY.isoformat()),
+                _line("20GR", "100", 2, "DOOR", "K", TODAY.isoformat()),
+                _line("25BW", "200", 1, None, "p", yesterday),
+                _line("25BW", "300", 1, "LUMBER", "I", yesterday, invoice_date=yesterday),  # slack row, not today
+                _line("20GR", "400", 1, "LUMBER", "O", (TODAY + timedelta(days=1)).isoformat()),
+            ],
+        )
+    monkeypatch.setattr(ERPServiceBase, "_mirror_engine", staticmethod(lambda: engine))
+    monkeypatch.setattr(ERPServiceBase, "_mirror_columns_cache", {})
+    reset_query_cache()
+    service = ERPService()
+    service.central_db_mode = True
+    monkeypatch.setattr(service, "_get_local_pick_states", lambda so_numbers=None: {})
+    return service
+
+
+def test_open_picks_are_served_from_read_model(monkeypatch, tmp_path):
+    service = _service(monkeypatch, tmp_path)
+    picks = service.get_open_picks()
+    assert [(p["system_id"], p["so_number"], p["sequence"]) for p in picks] == [
+        ("20GR", "100", 2), ("20GR", "100", 1), ("25BW", "200", 1),
+    ]
+    assert picks[2]["handling_code"] is None
+    assert picks[2]["so_status"] == "p"  # returned as the ERP stores it, like the live query
+    assert picks[0]["local_pick_state"] == "Pick Printed"
+
+
+def test_counts_use_read_model(monkeypatch, tmp_path):
+    service = _service(monkeypatch, tmp_path)
+    counts = service.get_open_picks_count()
+    assert counts == {"total": 2, "handling_breakdown": {"DOOR": 1, "LUMBER": 1, "—": 1}}
+    assert service.get_delivery_count() == 2
+    assert service.get_delivery_count("25BW") == 1
+    reset_query_cache()
+
+
+def test_missing_read_model_is_not_inspected_on_every_call(monkeypatch, tmp_path):
+    service = _service(monkeypatch, tmp_path)
+    inspected = []
+
+    def no_read_model(table_name):
+        inspected.append(table_name)
+        return tuple()
+
+    with monkeypatch.context() as patch:
+        patch.setattr(ERPServiceBase, "_mirror_columns", staticmethod(no_read_model))
+        assert not service._open_pick_read_model_ready()
+        assert not service._open_pick_read_model_ready()
+    assert inspected == ["erp_open_pick_lines"]
+
+    reset_query_cache()  # the negative result expires
+    assert service._open_pick_read_model_ready()
+    reset_query_cache()
+
+
+MIRROR_MODELS = (
+    ERPMirrorCustomer, ERPMirrorCustomerShipTo, ERPMirrorItem, ERPMirrorItemBranch,
+    ERPMirrorSalesOrderHeader, ERPMirrorSalesOrderLine, ERPMirrorShipmentHeader,
+    ERPMirrorPickHeaderNormalized, ERPMirrorPickDetailNormalized,
+)
+
+
+def _migration():
+    path = Path(__file__).parent / "migrations" / "versions" / "u4v5w6x7y8z9_add_open_pick_lines_read_model.py"
+    spec = importlib.util.spec_from_file_location("open_pick_lines_migration", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _seed_mirror(conn):
+    now = datetime.combine(TODAY, datetime.min.time()).replace(hour=9)
+    old = now - timedelta(days=200)
+    conn.execute(ERPMirrorItem.__table__.insert(), [
+        {"item_ptr": "1", "item": "2X4", "description": "Stud"},
+        {"item_ptr": "2", "item": "DOOR36", "description": "Door"},
+    ])
+    conn.execute(ERPMirrorItemBranch.__table__.insert(), [
+        {"system_id": "20GR", "item_ptr": "1", "handling_code": "lumber"},
+        {"system_id": "20GR", "item_ptr": "2", "handling_code": "DOOR "},
+    ])
+    conn.execute(ERPMirrorCustomer.__table__.insert(), [{"cust_key": "C1", "cust_code": "C1", "cust_name": "Acme"}])
+    conn.execute(ERPMirrorCustomerShipTo.__table__.insert(), [
+        {"cust_key": "C1", "seq_num": "1", "address_1": "1 Main", "city": "Ames"},
+    ])
+    headers = [
+        ("1", "K", "DELIVERY", now),
+        ("2", "k", "delivery", None),
+        ("3", "I", "DELIVERY", None),
+        ("4", "O", "DELIVERY", now),
+        ("5", "O", "DELIVERY", now + timedelta(days=5)),
+        ("6", "K", "WILLCALL", now),
+        ("7", "C", "DELIVERY", now),
+    ]
+    conn.execute(ERPMirrorSalesOrderHeader.__table__.insert(), [
+        {"system_id": "20GR", "so_id": so_id, "so_status": status, "sale_type": sale_type, "cust_key": "C1",
+         "shipto_seq_num": "1", "reference": "", "expect_date": expect}
+        for so_id, status, sale_type, expect in headers
+    ])
+    conn.execute(ERPMirrorSalesOrderLine.__table__.insert(), [
+        {"system_id": "20GR", "so_id": so_id, "sequence": seq, "item_ptr": str(seq), "qty_ordered": 3}
+        for so_id, *_ in headers for seq in (1, 2)
+    ])
+    conn.execute(ERPMirrorShipmentHeader.__table__.insert(), [
+        {"system_id": "20GR", "so_id": "3", "shipment_num": "1", "status_flag": "I", "invoice_date": now},
+        # Closed 200 days ago: outside the live query's shipment window.
+        {"system_id": "20GR", "so_id": "4", "shipment_num": "1", "status_flag": "C", "ship_date": old,
+         "invoice_date": old, "driver": "Old Driver"},
+    ])
+    conn.execute(ERPMirrorPickHeaderNormalized.__table__.insert(), [
+        {"pick_id": "P1", "system_id": "20GR", "created_date": now, "created_time": "08:00", "print_status": "Pick Ticket"},
+        # Later reprints that aren't pick tickets must not move the printed time.
+        {"pick_id": "P2", "system_id": "20GR", "created_date": now, "created_time": "11:00", "print_status": "Pack List"},
+        {"pick_id": "P3", "system_id": "20GR", "created_date": now, "created_time": "10:00", "print_status": None},
+    ])
+    conn.execute(ERPMirrorPickDetailNormalized.__table__.insert(), [
+        {"pick_id": "P1", "system_id": "20GR", "tran_type": "SO", "tran_id": "1", "sequence": 1},
+        {"pick_id": "P2", "system_id": "20GR", "tran_type": "SO", "tran_id": "1", "sequence": 1},
+        {"pick_id": "P3", "system_id": "20GR", "tran_type": "SO", "tran_id": "2", "sequence": 1},
+    ])
+
+
+@pytest.mark.skipif(
+    not os.environ.get("TEST_DATABASE_URL", "").startswith("postgresql"),
+    reason="set TEST_DATABASE_URL to a scratch Postgres database to build the materialized view",
+)
+def test_read_model_matches_live_query(monkeypatch):
+    migration = _migration()
+    engine = create_engine(os.environ["TEST_DATABASE_URL"])
+    tables = [model.__table__ for model in MIRROR_MODELS]
+    with engine.begin() as conn:
+        conn.execute(text("DROP MATERIALIZED VIEW IF EXISTS erp_open_pick_lines"))
+    ERPMirrorCustomer.metadata.drop_all(engine, tables=tables)
+    ERPMirrorCustomer.metadata.create_all(engine, tables=tables)
+    with engine.begin() as conn:
+        _seed_mirror(conn)
+        conn.execute(text(migration.OPEN_PICK_LINES_SQL))
+        for statement in migration.OPEN_PICK_LINES_INDEXES:
+            conn.execute(text(statement))
+
+    monkeypatch.setattr(ERPServiceBase, "_mirror_engine", staticmethod(lambda: engine))
+    service = ERPService()
+    service.central_db_mode = True
+    monkeypatch.setattr(service, "_get_local_pick_states", lambda so_numbers=None: {})
+
+    def snapshot(read_model):
+        monkeypatch.setattr(ERPServiceBase, "_mirror_columns_cache", {})
+        monkeypatch.setattr(service, "_open_pick_read_model_ready", lambda: read_model)
+        reset_query_cache()
+        picks = sorted(service.get_open_picks(), key=lambda p: (p["so_number"], p["sequence"]))
+        return picks, service.get_open_picks_count(), service.get_delivery_count(), service.get_delivery_counts_by_branch()
+
+    try:
+        from_view, live = snapshot(True), snapshot(False)
+        assert {p["so_number"] for p in live[0]} == {"1", "2", "3", "4"}
+        assert from_view == live
+    finally:
+        reset_query_cache()
+        with engine.begin() as conn:
+            conn.execute(text("DROP MATERIALIZED VIEW IF EXISTS erp_open_pick_lines"))
+        ERPMirrorCustomer.metadata.drop_all(engine, tables=tables)
+        engine.dispose()
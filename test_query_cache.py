@@ -0,0 +1,129 @@
+import threading
+import time
+
+import pytest
+
+from app.Services.erp.query_cache import InProcessCacheBackend, QueryCache, get_query_cache, reset_query_cache
+from app.Services.erp_service import ERPService
+
+
+def test_lru_evicts_oldest_and_counts_evictions():
+    cache = QueryCache(InProcessCacheBackend(max_entries=2), default_ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # touch a so b is least recently used
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 3
+    assert stats["misses"] == 1
+
+
+def test_per_key_ttl_expires_entries():
+    cache = QueryCache(InProcessCacheBackend(), default_ttl=60)
+    cache.set("short", "x", ttl=0.01)
+    cache.set("long", "y")
+    time.sleep(0.02)
+    assert cache.get("short") is None
+    assert cache.get("long") == "y"
+
+
+def test_cached_values_are_detached_from_callers():
+    cache = QueryCache(InProcessCacheBackend(), default_ttl=60)
+    rows = [{"so_number": "1"}]
+    cache.set("rows", rows)
+    rows[0]["assigned_picker"] = "leak"
+
+    first = cache.get("rows")
+    first[0]["assigned_picker"] = "other"
+    assert cache.get("rows") == [{"so_number": "1"}]
+
+
+def test_single_flight_runs_loader_once_for_concurrent_misses():
+    cache = QueryCache(InProcessCacheBackend(), default_ttl=60)
+    calls = []
+    gate = threading.Event()
+
+    def loader():
+        calls.append(1)
+        gate.wait(1)
+        return {"total": 5}
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_load("k", loader)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    gate.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{"total": 5}] * 5
+    assert cache.stats()["coalesced"] == 4
+
+
+def test_erp_service_instances_share_cache(monkeypatch):
+    reset_query_cache()
+    calls = []
+
+    def fake_query(self, sql, params=None, expanding=None):
+        calls.append(sql)
+        return [{"cnt": 7}]
+
+    monkeypatch.setattr(ERPService, "_mirror_query", fake_query)
+    for _ in range(3):
+        service = ERPService()
+        service.central_db_mode = True
+        assert service.get_open_work_orders_count() == 7
+
+    assert len(calls) == 1
+    reset_query_cache()
+
+
+def test_erp_cache_ttl_setting_sets_default_expiry(monkeypatch):
+    monkeypatch.setattr(ERPService, "_mirror_query", lambda self, sql, params=None, expanding=None: [{"cnt": 7}])
+
+    for ttl in (7, 120):
+        monkeypatch.setenv("ERP_CACHE_TTL_SECONDS", str(ttl))
+        monkeypatch.setenv("ERP_CACHE_BACKEND", "memory")
+        reset_query_cache()
+        service = ERPService()
+        service.central_db_mode = True
+        service.get_open_work_orders_count()  # no per-key TTL
+        service._cached("short_lived", lambda: 1, ttl=30)
+
+        entries = get_query_cache().backend._entries
+        now = time.monotonic()
+        assert entries["central:open_wo_count"][0] - now == pytest.approx(ttl, abs=1)
+        assert entries["central:short_lived"][0] - now == pytest.approx(30, abs=1)
+    reset_query_cache()
+
+
+def test_failed_legacy_counts_fall_back_without_being_cached(monkeypatch):
+    reset_query_cache()
+    attempts = []
+
+    def broken_connection(self):
+        attempts.append(True)
+        raise ConnectionError("ERP unreachable")
+
+    monkeypatch.setattr(ERPService, "get_connection", broken_connection)
+    service = ERPService()
+    service.central_db_mode = False
+    service.allow_legacy_erp_fallback = True
+    for _ in range(2):
+        assert service.get_open_picks_count() == {"total": 0, "handling_breakdown": {}}
+        assert service.get_open_work_orders_count() == 0
+        assert service.get_delivery_count("20GR") == 0
+
+    assert len(attempts) == 6
+    assert get_query_cache().stats()["entries"] == 0
+    reset_query_cache()
@@ -0,0 +1,148 @@
+import random
+from datetime import date
+
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+import app.Models.models  # noqa: F401  (app_users, referenced by dispatch_routes)
+from app.extensions import db
+from app.Models.dispatch_models import DispatchRoute, DispatchRouteStop
+from app.Services.dispatch_service import DispatchService
+from app.Services.route_optimizer import (
+    assign_trucks,
+    distance_matrix,
+    haversine_miles,
+    optimize_sequence,
+    sequence_stops,
+    tour_length,
+)
+
+YARD = {"lat": 41.60, "lon": -93.60}
+
+
+def _line_stops(count, rng):
+    # Stops due east of the yard, one every 0.05 degrees, handed over shuffled.
+    stops = [{"so_id": str(k), "lat": 41.60, "lon": -93.60 + 0.05 * k} for k in range(1, count + 1)]
+    rng.shuffle(stops)
+    return stops
+
+
+def test_haversine_and_matrix_agree():
+    # One degree of longitude on the equator.
+    assert haversine_miles(0, 0, 0, 1) == pytest.approx(69.09, abs=0.01)
+    matrix = distance_matrix([(41.6, -93.6), (41.7, -93.5), (42.0, -91.5)], road_factor=1.3)
+    assert matrix[0][2] == pytest.approx(haversine_miles(41.6, -93.6, 42.0, -91.5) * 1.3)
+    assert matrix[2][0] == matrix[0][2] and matrix[1][1] == 0.0
+
+
+def test_sequence_finds_the_straight_line_out_and_back():
+    rng = random.Random(3)
+    stops = _line_stops(40, rng)
+    result = optimize_sequence(stops, YARD, time_budget_ms=2000)
+
+    lons = [stop["lon"] for stop in result["stops"]]
+    assert lons in (sorted(lons), sorted(lons, reverse=True))
+    span = haversine_miles(41.60, -93.60, 41.60, -93.60 + 0.05 * 40) * 1.3
+    assert result["miles"] == pytest.approx(2 * span, abs=0.01)
+    assert result["miles"] < result["miles_before"]
+
+
+def test_without_a_yard_the_route_is_an_open_path_and_unlocated_stops_trail():
+    rng = random.Random(5)
+    stops = _line_stops(12, rng) + [{"so_id": "nogps", "lat": None, "lon": None}]
+    result = optimize_sequence(stops, None)
+
+    assert result["returns_to_yard"] is False
+    assert result["stops"][-1]["so_id"] == "nogps"
+    assert [stop["so_id"] for stop in result["unlocated"]] == ["nogps"]
+    span = haversine_miles(41.60, -93.55, 41.60, -93.60 + 0.05 * 12) * 1.3
+    assert result["miles"] == pytest.approx(span, abs=0.01)
+
+
+def test_two_opt_improves_nearest_neighbour_on_random_stops():
+    rng = random.Random(11)
+    points = [(41.6, -93.6)] + [(41.6 + rng.uniform(-0.6, 0.6), -93.6 + rng.uniform(-0.8, 0.8)) for _ in range(150)]
+    matrix = distance_matrix(points)
+    result = sequence_stops(matrix, time_budget_ms=5000)
+
+    assert sorted(result["order"]) == list(range(1, 151))
+    assert result["converged"]
+    assert result["length"] == pytest.approx(tour_length(matrix, [0] + result["order"]))
+    assert result["length"] < result["initial_length"]
+
+
+def test_assign_trucks_respects_capacity_and_truck_count():
+    rng = random.Random(2)
+    points = [(41.6, -93.6)] + [(41.6 + rng.uniform(-0.4, 0.4), -93.6 + rng.uniform(-0.4, 0.4)) for _ in range(60)]
+    matrix = distance_matrix(points)
+    weights = [0.0] + [1000.0] * 59 + [30000.0]
+
+    result = assign_trucks(matrix, weights, capacity=10000, trucks=4)
+    assert len(result["routes"]) == 4
+    assert all(load <= 10000 for load in result["loads"])
+    assert all(sum(weights[node] for node in route) == load for route, load in zip(result["routes"], result["loads"]))
+    reasons = dict(result["unassigned"])
+    assert reasons.pop(60) == "over_capacity"
+    # 59 one-ton stops, four ten-ton trucks: 40 fit, the rest wait.
+    assert len(reasons) == 19 and set(reasons.values()) == {"no_capacity"}
+    placed = sorted(node for route in result["routes"] for node in route)
+    assert placed == sorted(set(range(1, 60)) - set(reasons))
+
+
+def test_optimize_route_applies_the_new_sequence(tmp_path):
+    flask_app = Flask(__name__)
+    flask_app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'app.db'}"
+    db.init_app(flask_app)
+    rng = random.Random(9)
+    stops = _line_stops(8, rng)
+
+    with flask_app.app_context():
+        db.metadata.create_all(db.engine, tables=[DispatchRoute.__table__, DispatchRouteStop.__table__])
+        service = DispatchService()
+        route = service.create_route(date(2026, 5, 4), "North", "20GR")
+        service.add_stops_to_route(route["id"], [{"so_id": stop["so_id"]} for stop in stops])
+        locations = {stop["so_id"]: {"lat": stop["lat"], "lon": stop["lon"]} for stop in stops}
+
+        preview = service.optimize_route(route["id"], lambda so_ids: locations, yard=YARD)
+        saved = [s.so_id for s in DispatchRouteStop.query.filter_by(route_id=route["id"]).order_by("sequence")]
+        assert saved == [stop["so_id"] for stop in stops]  # preview only
+
+        result = service.optimize_route(route["id"], lambda so_ids: locations, apply=True, yard=YARD)
+        assert [s["so_id"] for s in result["stops"]] == [s["so_id"] for s in preview["stops"]]
+        saved = [s.so_id for s in DispatchRouteStop.query.filter_by(route_id=route["id"]).order_by("sequence")]
+        assert saved == [s["so_id"] for s in result["stops"]]
+        assert sorted(saved, key=int) in (saved, saved[::-1])
+
+        assert service.optimize_route(999, lambda so_ids: {}) is None
+
+
+def test_plan_routes_saves_every_truck_in_one_transaction(tmp_path):
+    flask_app = Flask(__name__)
+    flask_app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'app.db'}"
+    db.init_app(flask_app)
+    stops = [{"id": stop["so_id"], "lat": stop["lat"], "lon": stop["lon"], "total_weight": 100}
+             for stop in _line_stops(6, random.Random(4))]
+
+    with flask_app.app_context():
+        db.metadata.create_all(db.engine, tables=[DispatchRoute.__table__, DispatchRouteStop.__table__])
+        service = DispatchService()
+
+        def fail_on_last_stop(mapper, connection, target):
+            if target.so_id == "6":
+                raise RuntimeError("insert failed")
+
+        event.listen(DispatchRouteStop, "before_insert", fail_on_last_stop)
+        try:
+            with pytest.raises(RuntimeError):
+                service.plan_routes(date(2026, 5, 4), "20GR", stops, trucks=2, capacity_lbs=300, yard=YARD, apply=True)
+        finally:
+            event.remove(DispatchRouteStop, "before_insert", fail_on_last_stop)
+        assert DispatchRoute.query.count() == 0 and DispatchRouteStop.query.count() == 0
+
+        result = service.plan_routes(date(2026, 5, 4), "20GR", stops, trucks=2, capacity_lbs=300, yard=YARD, apply=True)
+        routes = {route.id: route for route in DispatchRoute.query.all()}
+        assert sorted(route.route_name for route in routes.values()) == ["Auto 1", "Auto 2"]
+        for truck in result["trucks"]:
+            saved = [(stop.so_id, stop.sequence) for stop in routes[truck["route_id"]].stops]
+            assert saved == [(stop["so_id"], seq) for seq, stop in enumerate(truck["stops"], start=1)]
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+
+from app.Models.models import (
+    ERPMirrorCustomer,
+    ERPMirrorCustomerShipTo,
+    ERPMirrorItemBranch,
+    ERPMirrorSalesOrderHeader,
+    ERPMirrorSalesOrderLine,
+)
+from app.Services.erp.base import ERPServiceBase
+from app.Services.erp.query_cache import reset_query_cache
+from app.Services.erp_service import ERPService
+
+START = datetime(2026, 3, 1)
+TABLES = [
+    ERPMirrorCustomer.__table__, ERPMirrorCustomerShipTo.__table__, ERPMirrorItemBranch.__table__,
+    ERPMirrorSalesOrderHeader.__table__, ERPMirrorSalesOrderLine.__table__,
+]
+
+
+def _service(monkeypatch, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'mirror.db'}")
+    ERPMirrorSalesOrderHeader.metadata.create_all(engine, tables=TABLES)
+    headers, lines = [], []
+    for n in range(23):
+        system_id = ("20GR", "25BW")[n % 2]
+        # Several orders share an expect date and a few have none, so ties and NULLs cross page edges.
+        expect_date = None if n % 7 == 3 else START + timedelta(days=n // 3)
+        headers.append({
+            "system_id": system_id, "so_id": str(1000 + n), "so_status": "O" if n % 5 else "I",
+            "cust_key": "C1" if n % 3 else "C2", "shipto_seq_num": "1", "expect_date": expect_date,
+            "sale_type": "DELIVERY", "is_deleted": n == 20,
+        })
+        lines.extend({"system_id": system_id, "so_id": str(1000 + n), "sequence": seq} for seq in range(1, n % 4 + 2))
+    with engine.begin() as conn:
+        conn.execute(ERPMirrorCustomer.__table__.insert(), [
+            {"cust_key": "C1", "cust_code": "ACME", "cust_name": "Acme Lumber"},
+            {"cust_key": "C2", "cust_code": "BETA", "cust_name": "Beta Build"},
+        ])
+        conn.execute(ERPMirrorCustomerShipTo.__table__.insert(), [
+            {"cust_key": "C1", "seq_num": "1", "address_1": "1 Main", "city": "Ames"},
+        ])
+        conn.execute(ERPMirrorSalesOrderHeader.__table__.insert(), headers)
+        conn.execute(ERPMirrorSalesOrderLine.__table__.insert(), lines)
+    monkeypatch.setattr(ERPServiceBase, "_mirror_engine", staticmethod(lambda: engine))
+    monkeypatch.setattr(ERPServiceBase, "_mirror_columns_cache", {})
+    reset_query_cache()
+    service = ERPService()
+    service.central_db_mode = True
+    return service
+
+
+def _walk(fetch, limit):
+    pages, cursor = [], ""
+    while True:
+        rows = fetch(limit=limit, cursor=cursor)
+        pages.append([row["so_number"] for row in rows])
+        if len(rows) < limit:
+            return pages
+        cursor = ERPService.encode_order_cursor(rows[-1])
+        assert cursor
+
+
+def test_cursor_pages_match_offset_pages(monkeypatch, tmp_path):
+    service = _service(monkeypatch, tmp_path)
+    everything = service.get_sales_order_status(open_only=False, limit=100)
+    assert len(everything) == 22
+    expected = sorted(
+        everything,
+        key=lambda row: (row["expect_date"] is not None, str(row["expect_date"]), row["system_id"], row["so_number"]),
+        reverse=True,
+    )
+    assert [row["so_number"] for row in everything] == [row["so_number"] for row in expected]
+
+    by_cursor = _walk(lambda **kw: service.get_sales_order_status(open_only=False, **kw), limit=5)
+    by_offset = [
+        [row["so_number"] for row in service.get_sales_order_status(open_only=False, limit=5, page=page)]
+        for page in range(1, len(by_cursor) + 1)
+    ]
+    assert by_cursor == by_offset
+    assert sum(by_cursor, []) == [row["so_number"] for row in everything]
+
+    row = next(row for row in everything if row["so_number"] == "1006")
+    assert (row["line_count"], row["customer_code"], row["address"]) == (3, "BETA", "")
+    row = next(row for row in everything if row["so_number"] == "1005")
+    assert (row["line_count"], row["customer_name"], row["address"]) == (2, "Acme Lumber", "1 Main, Ames")
+
+
+def test_filters_and_customer_history_use_the_same_keyset(monkeypatch, tmp_path):
+    service = _service(monkeypatch, tmp_path)
+    open_rows = service.get_sales_order_status(limit=100)
+    assert all(row["so_status"] == "O" for row in open_rows)
+
+    window = service.get_sales_order_status(open_only=False, limit=100, date_from="2026-03-02", date_to="2026-03-03")
+    assert {row["expect_date"][:10] for row in window} == {"2026-03-02", "2026-03-03"}
+
+    acme = service.get_sales_order_status(open_only=False, limit=100, customer_code="ACME")
+    assert acme and all(row["customer_code"] == "ACME" for row in acme)
+
+    history = _walk(lambda **kw: service.get_sales_customer_orders("", **kw), limit=4)
+    assert sum(history, []) == [row["so_number"] for row in service.get_sales_order_status(open_only=False, limit=100)]
+
+
+def test_malformed_cursor_falls_back_to_page():
+    assert ERPService._decode_order_cursor("not-a-cursor") is None
+    assert ERPService._decode_order_cursor("") is None
+    token = ERPService.encode_order_cursor({"system_id": "20GR", "so_number": "1001", "expect_date": None})
+    assert ERPService._decode_order_cursor(token) == (None, "20GR", "1001")
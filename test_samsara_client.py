@@ -0,0 +1,102 @@
+from datetime import timedelta
+
+import pytest
+
+from app.Services import samsara_service
+from app.Services.samsara_client import (
+    SamsaraClient,
+    SamsaraLocationPoller,
+    SamsaraRateLimited,
+    SharedLocationSnapshot,
+)
+from app.Services.samsara_mock import MockSamsaraServer, mock_fleet
+from app.Services.samsara_service import SamsaraService
+
+
+@pytest.fixture
+def mock_samsara(monkeypatch, tmp_path):
+    with MockSamsaraServer(fleet=mock_fleet(5), page_size=2) as server:
+        monkeypatch.setenv("SAMSARA_API_TOKEN", "test-token")
+        monkeypatch.setenv("SAMSARA_SNAPSHOT_PATH", str(tmp_path / "locations.json"))
+        monkeypatch.setenv("SAMSARA_BASE_URL", server.url)
+        monkeypatch.setenv("SAMSARA_CACHE_TTL", "60")
+        monkeypatch.setattr(samsara_service, "_client", None)
+        monkeypatch.setattr(samsara_service, "_poller", None)
+        yield server
+
+
+def test_live_vehicles_are_served_from_the_shared_poller(mock_samsara):
+    payload = SamsaraService().get_dispatch_vehicle_payload()
+    assert payload["count"] == 5 and payload["source"] == "samsara"
+    assert {vehicle["id"]: vehicle["branch"] for vehicle in payload["vehicles"]} == {
+        "v-001": "20GR", "v-002": "25BW", "v-003": "20GR", "v-004": "25BW", "v-005": "20GR",
+    }
+    # Three location pages of two, one metadata batch.
+    assert mock_samsara.requests == {"/fleet/vehicles/locations": 3, "/fleet/vehicles": 1}
+
+    # Other instances and branch filters read the same buffer until the TTL passes.
+    assert SamsaraService().get_dispatch_vehicle_payload(branch="25bw")["count"] == 2
+    assert SamsaraService().get_dispatch_vehicle_payload(limit=1)["count"] == 1
+    assert mock_samsara.requests == {"/fleet/vehicles/locations": 3, "/fleet/vehicles": 1}
+
+    # Later polls re-read locations only; metadata is cached.
+    poller = samsara_service.get_location_poller()
+    mock_samsara.move("v-001", 41.7, -93.8)
+    poller.poll()
+    assert mock_samsara.requests == {"/fleet/vehicles/locations": 6, "/fleet/vehicles": 1}
+    assert [(p["lat"], p["lon"]) for p in poller.buffer.trail("v-001")][-1] == (41.7, -93.8)
+    assert len(poller.buffer.trail("v-001")) == 2
+    assert len(poller.buffer.trail("v-002")) == 1
+
+
+def test_rate_limit_window_blocks_calls_and_stale_positions_are_served(mock_samsara):
+    client = SamsaraClient("test-token", base_url=mock_samsara.url)
+    poller = SamsaraLocationPoller(client, SamsaraService()._normalize_dispatch_vehicle, ttl_seconds=0)
+    vehicles, fetched_at = poller.snapshot()
+    assert len(vehicles) == 5
+
+    mock_samsara.rate_limit_next = 1
+    mock_samsara.retry_after_seconds = 30
+    before = sum(mock_samsara.requests.values())
+    assert poller.snapshot() == (vehicles, fetched_at)
+    assert client.retry_after() > 25 and client.stats["rate_limited"] == 1
+    with pytest.raises(SamsaraRateLimited):
+        client.get("/fleet/vehicles")
+    # Nothing else reached the server while the window is open.
+    assert sum(mock_samsara.requests.values()) == before + 1
+
+
+def test_payload_reports_errors_when_nothing_was_polled(mock_samsara):
+    mock_samsara.rate_limit_next = 1
+    payload = SamsaraService().get_dispatch_vehicle_payload()
+    assert (payload["count"], payload["error"], payload["status"]) == (0, "samsara_http_error", 429)
+
+
+def test_one_process_per_host_polls_and_the_others_read_its_snapshot(mock_samsara, tmp_path):
+    client = SamsaraClient("test-token", base_url=mock_samsara.url)
+
+    def poller():
+        shared = SharedLocationSnapshot(tmp_path / "host.json")
+        return SamsaraLocationPoller(client, SamsaraService()._normalize_dispatch_vehicle, ttl_seconds=60,
+                                     shared=shared)
+
+    leader, web_worker, sync_worker = poller(), poller(), poller()
+    assert leader.shared.claim()
+    leader.poll()
+    polled = dict(mock_samsara.requests)
+
+    web_worker.start()  # the lock is taken: no second thread
+    assert not web_worker.is_running()
+    vehicles, fetched_at = web_worker.snapshot()
+    assert len(vehicles) == 5 and fetched_at == leader.fetched_at
+    assert sync_worker.snapshot()[1] == leader.fetched_at
+    # A stale file is still served while its poller holds the lock.
+    leader.shared.write(vehicles, fetched_at - timedelta(minutes=5))
+    assert sync_worker.snapshot()[1] == fetched_at - timedelta(minutes=5)
+    assert mock_samsara.requests == polled
+
+    # The polling worker exits: the next web worker to read takes over the lock.
+    leader.shared._held.close()
+    web_worker._run = lambda: None
+    web_worker.snapshot()
+    assert web_worker.shared._held is not None and sync_worker.shared.has_poller()
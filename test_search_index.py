@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.Models.models import (
+    ERPMirrorCustomer,
+    ERPMirrorCustomerShipTo,
+    ERPMirrorPurchaseOrderHeader,
+    ERPMirrorSalesOrderHeader,
+    ERPSyncTableState,
+    Pick,
+    PickTypes,
+    Pickster,
+    SearchDocument,
+    WorkOrder,
+)
+from app.Services import search_index
+from app.Services.search_index import SearchIndex, normalize
+
+HOUR_AGO = datetime.utcnow() - timedelta(hours=1)
+TABLES = [
+    ERPMirrorCustomer.__table__, ERPMirrorCustomerShipTo.__table__, ERPMirrorPurchaseOrderHeader.__table__,
+    ERPMirrorSalesOrderHeader.__table__, ERPSyncTableState.__table__, Pick.__table__, PickTypes.__table__,
+    Pickster.__table__, SearchDocument.__table__, WorkOrder.__table__,
+]
+
+
+def _index(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    SearchDocument.metadata.create_all(engine, tables=TABLES)
+    with engine.begin() as conn:
+        conn.execute(ERPMirrorCustomer.__table__.insert(), [
+            {"cust_key": "C1", "cust_code": "ACME", "cust_name": "Acme Lumber", "synced_at": HOUR_AGO},
+            {"cust_key": "C2", "cust_code": "BOLT", "cust_name": "Bolt Builders", "synced_at": HOUR_AGO},
+        ])
+        conn.execute(ERPMirrorCustomerShipTo.__table__.insert(), [
+            {"cust_key": "C1", "seq_num": "1", "shipto_name": "Acme Yard", "address_1": "12 Elm St",
+             "city": "Ames", "synced_at": HOUR_AGO},
+        ])
+        conn.execute(ERPMirrorSalesOrderHeader.__table__.insert(), [
+            {"system_id": "20GR", "so_id": "1234", "cust_key": "C1", "po_number": "JOB-77",
+             "expect_date": HOUR_AGO, "synced_at": HOUR_AGO},
+        ])
+        conn.execute(ERPMirrorSalesOrderHeader.__table__.insert(), [
+            {"system_id": "20GR", "so_id": "51234", "cust_key": "C2", "synced_at": HOUR_AGO, "is_deleted": False},
+            {"system_id": "25BW", "so_id": "12345", "cust_key": "C2", "synced_at": HOUR_AGO, "is_deleted": False},
+            {"system_id": "25BW", "so_id": "9999", "cust_key": "C2", "synced_at": HOUR_AGO, "is_deleted": True},
+        ])
+        conn.execute(WorkOrder.__table__.insert(), [
+            {"wo_id": "W88", "source_id": "1234", "item_ptr": "DOOR", "synced_at": HOUR_AGO, "is_deleted": False},
+        ])
+        conn.execute(ERPMirrorPurchaseOrderHeader.__table__.insert(), [
+            {"system_id": "20GR", "po_number": "PO500", "supplier_name": "Acme Mills", "synced_at": HOUR_AGO},
+        ])
+        conn.execute(Pickster.__table__.insert(), [{"id": 1, "name": "Dana"}])
+        conn.execute(Pick.__table__.insert(), [
+            {"id": 1, "barcode_number": "1234", "picker_id": 1, "start_time": HOUR_AGO, "completed_time": HOUR_AGO},
+        ])
+    return SearchIndex(engine), engine
+
+
+def _titles(index, query, **kwargs):
+    return [(hit["entity_type"], hit["title"]) for hit in index.search(query, **kwargs)["hits"]]
+
+
+def test_one_ranked_query_returns_typed_hits(tmp_path):
+    index, _engine = _index(tmp_path)
+    assert not index.is_ready()
+    result = index.refresh()
+    assert result["mode"] == "rebuild"
+    assert result["documents"] == {"order": 3, "customer": 2, "shipto": 1, "work_order": 1, "po": 1, "pick": 1}
+    assert index.is_ready()
+
+    hits = _titles(index, "1234")
+    # Exact identifiers first, then identifier prefixes, then substring matches.
+    assert hits[:4] == [("order", "SO #1234"), ("pick", "Pick — Dana"), ("work_order", "WO #W88"), ("order", "SO #12345")]
+    assert hits[-1] == ("order", "SO #51234")
+    assert ("order", "SO #9999") not in _titles(index, "9999")
+
+    assert set(_titles(index, "acm")) == {
+        ("customer", "Acme Lumber"), ("shipto", "Acme Yard"), ("order", "SO #1234"), ("po", "PO #PO500"),
+    }
+    assert _titles(index, "acme elm") == [("shipto", "Acme Yard")]
+    assert _titles(index, "job 77") == [("order", "SO #1234")]
+    assert len(_titles(index, "bolt", per_type=1)) == 2  # customer + one of its orders
+    assert index.search("  --  ") == {"hits": [], "timed_out": False, "elapsed_ms": 0}
+
+
+def test_refresh_is_incremental_and_local_pick_writes_are_indexed(tmp_path, monkeypatch):
+    index, engine = _index(tmp_path)
+    index.refresh()
+    idle = index.refresh()
+    assert idle["mode"] == "incremental" and sum(idle["documents"].values()) == 0
+
+    with engine.begin() as conn:
+        conn.execute(
+            ERPMirrorSalesOrderHeader.__table__.update()
+            .where(ERPMirrorSalesOrderHeader.__table__.c.so_id == "12345")
+            .values(is_deleted=True, synced_at=datetime.utcnow())
+        )
+        conn.execute(
+            ERPMirrorCustomer.__table__.update()
+            .where(ERPMirrorCustomer.__table__.c.cust_key == "C2")
+            .values(cust_name="Bolt & Sons", synced_at=datetime.utcnow())
+        )
+    result = index.refresh()
+    assert result["documents"]["customer"] == 1 and result["documents"]["order"] == 0
+    assert ("order", "SO #12345") not in _titles(index, "12345")
+    assert _titles(index, "sons") == [("customer", "Bolt & Sons")]
+
+    Session = sessionmaker(bind=engine)
+    monkeypatch.setattr(search_index, "SearchIndex", lambda: SearchIndex(engine))
+    search_index.init_search_index(Session)
+    try:
+        session = Session()
+        session.add(Pick(barcode_number="777", picker_id=1))
+        session.commit()
+        assert _titles(index, "777") == [("pick", "Pick — Dana")]
+
+        session.get(Pickster, 1).name = "Dana R"
+        session.commit()
+        assert {title for _kind, title in _titles(index, "dana")} == {"Pick — Dana R"}
+
+        session.delete(session.query(Pick).filter_by(barcode_number="777").one())
+        session.commit()
+        assert _titles(index, "777") == []
+        session.close()
+    finally:
+        for name, handler in (
+            ("after_flush", search_index._collect_pick_changes),
+            ("after_commit", search_index._index_committed_picks),
+            ("after_soft_rollback", search_index._discard_pick_changes),
+        ):
+            event.remove(Session, name, handler)
+
+
+def test_normalize_splits_identifiers():
+    assert normalize("SO-1234/a", None, "", "Acme_Lumber") == "so 1234 a acme lumber"
@@ -0,0 +1,163 @@
+from datetime import datetime, timedelta
+
+from flask import Flask
+from sqlalchemy import create_engine
+
+from app.extensions import db
+from app.Models.models import (
+    AuditEvent,
+    ERPMirrorItemBranch,
+    ERPMirrorSalesOrderHeader,
+    ERPMirrorSalesOrderLine,
+    Pick,
+    PickTypes,
+    Pickster,
+)
+from app.Routes.main import main_bp
+from app.Services.erp.base import ERPServiceBase
+from app.Services.erp.query_cache import reset_query_cache
+from app.Services.erp_service import ERPService
+
+MIRROR_TABLES = [ERPMirrorItemBranch.__table__, ERPMirrorSalesOrderHeader.__table__, ERPMirrorSalesOrderLine.__table__]
+APP_TABLES = [AuditEvent.__table__, Pick.__table__, PickTypes.__table__, Pickster.__table__]
+
+
+def _mirror(monkeypatch, tmp_path):
+    url = f"sqlite:///{tmp_path / 'mirror.db'}"
+    engine = create_engine(url)
+    ERPMirrorSalesOrderHeader.metadata.create_all(engine, tables=MIRROR_TABLES)
+    with engine.begin() as conn:
+        conn.execute(ERPMirrorSalesOrderHeader.__table__.insert(), [
+            {"system_id": "20GR", "so_id": "100", "sale_type": "willcall", "is_deleted": False},
+            {"system_id": "20GR", "so_id": "200", "sale_type": "DELIVERY", "is_deleted": False},
+            {"system_id": "20GR", "so_id": "300", "sale_type": "DELIVERY", "is_deleted": False},
+            {"system_id": "25BW", "so_id": "400", "sale_type": "WILLCALL", "is_deleted": True},
+        ])
+        conn.execute(ERPMirrorItemBranch.__table__.insert(), [
+            {"system_id": "20GR", "item_ptr": "D1", "handling_code": "door1"},
+            {"system_id": "20GR", "item_ptr": "E1", "handling_code": "EWP"},
+            {"system_id": "20GR", "item_ptr": "M1", "handling_code": "MILLWORK"},
+            {"system_id": "20GR", "item_ptr": "X1", "handling_code": ""},
+        ])
+        conn.execute(ERPMirrorSalesOrderLine.__table__.insert(), [
+            {"system_id": "20GR", "so_id": "200", "sequence": 1, "item_ptr": "D1"},
+            {"system_id": "20GR", "so_id": "200", "sequence": 2, "item_ptr": "D1"},
+            {"system_id": "20GR", "so_id": "200", "sequence": 3, "item_ptr": "E1"},
+            {"system_id": "20GR", "so_id": "200", "sequence": 4, "item_ptr": "X1"},
+            {"system_id": "20GR", "so_id": "300", "sequence": 1, "item_ptr": "M1"},
+            {"system_id": "20GR", "so_id": "300", "sequence": 2, "item_ptr": "E1"},
+        ])
+    monkeypatch.setenv("CENTRAL_DB_URL", url)
+    monkeypatch.setattr(ERPServiceBase, "_mirror_engine", staticmethod(lambda: engine))
+    reset_query_cache()
+    return engine
+
+
+def _client(monkeypatch, tmp_path):
+    _mirror(monkeypatch, tmp_path)
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'app.db'}"
+    db.init_app(app)
+    app.register_blueprint(main_bp)
+    with app.app_context():
+        db.metadata.create_all(db.engine, tables=APP_TABLES)
+        db.session.add_all([Pickster(id=1, name="Dana", branch_code="20GR"), Pickster(id=2, name="Lee")])
+        db.session.commit()
+    return app, app.test_client()
+
+
+def test_scan_attributes_resolve_in_one_query(monkeypatch, tmp_path):
+    _mirror(monkeypatch, tmp_path)
+    service = ERPService()
+    service.central_db_mode = True
+
+    assert service.get_so_scan_attributes(["100", "200", "300", "400", "999"]) == {
+        "100": {"sale_type": "WILLCALL", "handling_code": None},
+        "200": {"sale_type": "DELIVERY", "handling_code": "DOOR1"},
+        # One line each: ties go to the first code alphabetically.
+        "300": {"sale_type": "DELIVERY", "handling_code": "EWP"},
+    }
+    assert service.get_so_scan_attributes([]) == {}
+
+
+def test_batch_applies_scans_in_order_and_skips_replays(monkeypatch, tmp_path):
+    app, client = _client(monkeypatch, tmp_path)
+    started = datetime.utcnow() - timedelta(minutes=30)
+    scans = [
+        {"client_id": "a", "picker_id": 1, "barcode": "0000200-001", "scanned_at": started.isoformat() + "Z"},
+        {"client_id": "b", "picker_id": 1, "barcode": "100", "scanned_at": started.isoformat()},
+        {"client_id": "c", "picker_id": 1, "barcode": "200"},
+        {"client_id": "d", "picker_id": 9, "barcode": "300"},
+        {"client_id": "e", "picker_id": 2, "barcode": "12AB"},
+        {"client_id": "f", "picker_id": 2, "barcode": "555", "scanned_at": "2999-01-01T00:00:00"},
+    ]
+
+    response = client.post("/api/smart_scan/batch", json={"scans": scans})
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert [(r["client_id"], r["status"], r.get("action")) for r in results] == [
+        ("a", "ok", "started"),
+        ("b", "ok", "will_call_completed"),
+        ("c", "ok", "completed"),
+        ("d", "error", None),
+        ("e", "error", None),
+        ("f", "ok", "started"),
+    ]
+    assert results[0]["pick_type"] == "Door 1"
+    assert results[0]["pick_id"] == results[2]["pick_id"]
+    assert results[5]["pick_type"] == "Yard"
+
+    with app.app_context():
+        door_pick = db.session.get(Pick, results[0]["pick_id"])
+        assert (door_pick.barcode_number, door_pick.shipment_num) == ("200", "001")
+        assert door_pick.start_time == started
+        assert door_pick.completed_time > started
+        assert db.session.get(Pick, results[5]["pick_id"]).start_time <= datetime.utcnow()
+        assert sorted(e.client_scan_id for e in AuditEvent.query.all()) == ["a", "b", "c", "f"]
+
+    replay = client.post("/api/smart_scan/batch", json={"scans": scans[:3] + [
+        {"client_id": "g", "picker_id": 2, "barcode": "555"},
+    ]}).get_json()["results"]
+    assert [r["status"] for r in replay] == ["duplicate", "duplicate", "duplicate", "ok"]
+    assert replay[0]["pick_id"] == results[0]["pick_id"]
+    assert (replay[3]["action"], replay[3]["pick_id"]) == ("completed", results[5]["pick_id"])
+    with app.app_context():
+        assert Pick.query.count() == 3
+
+
+def test_single_scan_uses_shared_state_machine(monkeypatch, tmp_path):
+    _app, client = _client(monkeypatch, tmp_path)
+
+    first = client.post("/api/smart_scan", json={"picker_id": 1, "barcode": "300"}).get_json()
+    second = client.post("/api/smart_scan", json={"picker_id": 1, "barcode": "300"}).get_json()
+
+    assert (first["action"], first["pick_type"]) == ("started", "EWP")
+    assert (second["action"], second["pick_id"]) == ("completed", first["pick_id"])
+    assert client.post("/api/smart_scan", json={"picker_id": 1, "barcode": "x"}).status_code == 400
+    assert client.post("/api/smart_scan/batch", json={"scans": []}).status_code == 400
+
+
+def test_scans_that_start_a_pick_get_their_erp_type_even_with_another_open_pick(monkeypatch, tmp_path):
+    app, client = _client(monkeypatch, tmp_path)
+    with app.app_context():
+        db.session.add_all([
+            Pick(barcode_number="200", picker_id=2, pick_type_id=1, branch_code="25BW",
+                 start_time=datetime.utcnow() - timedelta(minutes=5)),
+            Pick(barcode_number="100", picker_id=1, pick_type_id=1, branch_code="20GR",
+                 start_time=datetime.utcnow() - timedelta(minutes=5)),
+        ])
+        db.session.commit()
+
+    results = client.post("/api/smart_scan/batch", json={"scans": [
+        # Open in 25BW only, so a 20GR picker starts a new pick.
+        {"client_id": "a", "picker_id": 1, "barcode": "200"},
+        # Completes the open pick, then the rescan is a new will call.
+        {"client_id": "b", "picker_id": 1, "barcode": "100"},
+        {"client_id": "c", "picker_id": 1, "barcode": "100"},
+    ]}).get_json()["results"]
+
+    assert [(r["action"], r["pick_type"]) for r in results] == [
+        ("started", "Door 1"),
+        ("completed", "Yard"),
+        ("will_call_completed", "Will Call"),
+    ]
@@ -0,0 +1,128 @@
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+
+from app.Models.models import ERPMirrorItemBranch, ERPMirrorSalesOrderHeader, ERPMirrorSalesOrderLine
+from app.Services.erp import so_attributes
+from app.Services.erp.base import ERPServiceBase
+from app.Services.erp.query_cache import reset_query_cache
+from app.Services.erp.so_attributes import SOAttributeIndex, SOAttributes
+from app.Services.erp_service import ERPService
+
+TABLES = [ERPMirrorItemBranch.__table__, ERPMirrorSalesOrderHeader.__table__, ERPMirrorSalesOrderLine.__table__]
+DAY_AGO = datetime.utcnow() - timedelta(days=1)
+
+HEADERS = ERPMirrorSalesOrderHeader.__table__
+ITEMS = ERPMirrorItemBranch.__table__
+LINES = ERPMirrorSalesOrderLine.__table__
+
+
+def _engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'mirror.db'}")
+    ERPMirrorSalesOrderHeader.metadata.create_all(engine, tables=TABLES)
+    with engine.begin() as conn:
+        conn.execute(HEADERS.insert(), [
+            {"system_id": "20GR", "so_id": "100", "so_status": "O", "sale_type": "WillCall", "branch_code": "20GR",
+             "synced_at": DAY_AGO, "is_deleted": False},
+            {"system_id": "20GR", "so_id": "200", "so_status": "K", "sale_type": "DELIVERY", "branch_code": "20GR",
+             "synced_at": DAY_AGO, "is_deleted": False},
+            {"system_id": "25BW", "so_id": "200", "so_status": "O", "sale_type": "DELIVERY", "branch_code": "25BW",
+             "synced_at": DAY_AGO, "is_deleted": False},
+            {"system_id": "20GR", "so_id": "300", "so_status": "I", "sale_type": "DELIVERY", "branch_code": None,
+             "synced_at": DAY_AGO, "is_deleted": False},
+            {"system_id": "20GR", "so_id": "400", "so_status": "O", "sale_type": "DELIVERY", "branch_code": None,
+             "synced_at": DAY_AGO, "is_deleted": True},
+        ])
+        conn.execute(ITEMS.insert(), [
+            {"system_id": "20GR", "item_ptr": "D1", "handling_code": "door1", "synced_at": DAY_AGO},
+            {"system_id": "20GR", "item_ptr": "E1", "handling_code": "EWP", "synced_at": DAY_AGO},
+            {"system_id": "25BW", "item_ptr": "M1", "handling_code": "MILLWORK", "synced_at": DAY_AGO},
+        ])
+        conn.execute(LINES.insert(), [
+            {"system_id": "20GR", "so_id": "200", "sequence": 1, "item_ptr": "D1", "synced_at": DAY_AGO},
+            {"system_id": "20GR", "so_id": "200", "sequence": 2, "item_ptr": "D1", "synced_at": DAY_AGO},
+            {"system_id": "20GR", "so_id": "200", "sequence": 3, "item_ptr": "E1", "synced_at": DAY_AGO},
+            {"system_id": "25BW", "so_id": "200", "sequence": 1, "item_ptr": "M1", "synced_at": DAY_AGO},
+        ])
+    return engine
+
+
+def test_full_load_keeps_open_orders_only(tmp_path):
+    index = SOAttributeIndex(_engine(tmp_path))
+    assert index.get("100") is None  # not loaded yet: callers fall back to the mirror
+
+    assert index.refresh()["mode"] == "rebuild"
+    assert len(index) == 2
+    assert index.get("100") == SOAttributes("20GR", "O", "WILLCALL", None, "20GR")
+    assert index.get("200") == SOAttributes("20GR", "K", "DELIVERY", "DOOR1", "20GR")
+    assert index.get("300") is None and index.get("400") is None
+    assert set(index.get_many(["100", "300", 200])) == {"100", "200"}
+
+
+def test_lookups_count_under_a_lock_without_waiting_for_a_refresh(tmp_path):
+    index = SOAttributeIndex(_engine(tmp_path))
+    index.refresh()
+    workers = [threading.Thread(target=lambda: [index.get(so) for so in ("100", "999") * 500]) for _ in range(4)]
+    with index._lock:  # a refresh holds this across its mirror queries
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=5)
+        assert not any(worker.is_alive() for worker in workers)
+    assert (index.stats["hits"], index.stats["misses"]) == (2000, 2000)
+
+
+def test_incremental_refresh_applies_changes_since_watermark(tmp_path):
+    engine = _engine(tmp_path)
+    index = SOAttributeIndex(engine)
+    index.refresh()
+    # Only rows synced after the watermark (minus the overlap) are re-read.
+    index.WATERMARK_OVERLAP = timedelta(0)
+
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(HEADERS.update().where(HEADERS.c.so_id == "100").values(so_status="I", synced_at=now))
+        conn.execute(HEADERS.insert(), [
+            {"system_id": "20GR", "so_id": "500", "so_status": "O", "sale_type": "DELIVERY",
+             "synced_at": now, "is_deleted": False},
+        ])
+        conn.execute(LINES.insert(), [
+            {"system_id": "20GR", "so_id": "500", "sequence": 1, "item_ptr": "E1", "synced_at": now},
+        ])
+        conn.execute(ITEMS.update().where(ITEMS.c.item_ptr == "D1").values(handling_code="DECKING", synced_at=now))
+
+    result = index.refresh()
+    assert (result["mode"], result["orders"]) == ("incremental", 3)
+    assert index.get("100") is None
+    assert index.get("500").handling_code == "EWP"
+    # 20GR's copy of SO 200 was re-read; the untouched 25BW copy is kept.
+    assert index.get("200").handling_code == "DECKING"
+    assert [entry.system_id for entry in index._entries["200"]] == ["20GR", "25BW"]
+    assert index.refresh()["orders"] == 0
+
+
+def test_service_lookups_consult_index_before_mirror(monkeypatch, tmp_path):
+    engine = _engine(tmp_path)
+    index = SOAttributeIndex(engine)
+    index.refresh()
+    monkeypatch.setattr(so_attributes, "_index", index)
+    queries = []
+    monkeypatch.setattr(ERPServiceBase, "_mirror_engine", staticmethod(lambda: engine))
+    original = ERPServiceBase._mirror_query
+    monkeypatch.setattr(ERPServiceBase, "_mirror_query",
+                        lambda self, sql, params=None, expanding=None: queries.append(params) or original(self, sql, params, expanding))
+    reset_query_cache()
+    service = ERPService()
+    service.central_db_mode = True
+
+    assert service.get_so_sale_type("100") == "WILLCALL"
+    assert service.get_so_primary_handling_code("200") == "DOOR1"
+    assert queries == []
+
+    # The invoiced SO isn't indexed, so only it goes to the mirror.
+    assert service.get_so_scan_attributes(["100", "300"]) == {
+        "100": {"sale_type": "WILLCALL", "handling_code": None},
+        "300": {"sale_type": "DELIVERY", "handling_code": None},
+    }
+    assert queries == [{"so_numbers": ["300"]}]
@@ -0,0 +1,161 @@
+import random
+from datetime import date
+
+import pytest
+from flask import Flask
+
+import app.Models.models  # noqa: F401  (app_users, referenced by dispatch_routes)
+from app.extensions import db
+from app.Models.dispatch_models import DispatchRoute, DispatchRouteStop
+from app.Services.route_optimizer import haversine_miles
+from app.Services.spatial_index import DispatchSpatialIndex, GridIndex
+
+SETTINGS = {"cell_degrees": 0.05, "stops_refresh_seconds": 60, "max_scopes": 2, "viewport_limit": 3}
+
+
+def _random_points(rng, count):
+    return {
+        f"p{n}": (41.6 + rng.uniform(-1.0, 1.0), -93.6 + rng.uniform(-1.5, 1.5), {"id": n})
+        for n in range(count)
+    }
+
+
+@pytest.mark.parametrize("cell_degrees", [0.01, 0.05, 0.5])
+def test_grid_queries_match_brute_force(cell_degrees):
+    rng = random.Random(4)
+    points = _random_points(rng, 400)
+    index = GridIndex(cell_degrees)
+    index.sync(points)
+
+    for _ in range(20):
+        lat, lon = 41.6 + rng.uniform(-1.2, 1.2), -93.6 + rng.uniform(-1.7, 1.7)
+        distances = sorted(
+            (haversine_miles(lat, lon, plat, plon), key) for key, (plat, plon, _item) in points.items()
+        )
+
+        within = index.within(lat, lon, 12)
+        assert [key for _d, key, _item in within] == [key for d, key in distances if d <= 12]
+
+        nearest = index.nearest(lat, lon, k=7)
+        assert [key for _d, key, _item in nearest] == [key for _d, key in distances[:7]]
+
+        south, west, north, east = lat - 0.2, lon - 0.3, lat + 0.1, lon + 0.25
+        inside = {key for key, (plat, plon, _i) in points.items() if south <= plat <= north and west <= plon <= east}
+        assert {key for key, _item in index.bbox(south, west, north, east)} == inside
+
+    odd = index.nearest(41.6, -93.6, k=3, predicate=lambda item: item["id"] % 2 == 1)
+    assert all(item["id"] % 2 == 1 for _d, _key, item in odd) and len(odd) == 3
+    assert index.nearest(41.6, -93.6, k=5, max_miles=0.001) == []
+
+
+def test_sync_only_touches_what_changed():
+    index = GridIndex(0.05)
+    assert index.sync({"a": (41.6, -93.6, {"v": 1}), "b": (41.7, -93.7, {"v": 1})})["added"] == 2
+
+    counts = index.sync({
+        "a": (41.6, -93.6, {"v": 1}),      # unchanged
+        "b": (41.9, -93.9, {"v": 1}),      # moved to another cell
+        "c": (42.0, -94.0, {"v": 1}),      # new
+    })
+    assert counts == {"added": 1, "moved": 1, "updated": 0, "removed": 0, "unchanged": 1}
+    assert index.within(41.7, -93.7, 1) == []
+    assert [key for _d, key, _i in index.within(41.9, -93.9, 1)] == ["b"]
+
+    counts = index.sync({"a": (41.6, -93.6, {"v": 2}), "c": (42.0, -94.0, {"v": 1})})
+    assert counts == {"added": 0, "moved": 0, "updated": 1, "removed": 1, "unchanged": 1}
+    assert index.get("a")[2] == {"v": 2} and len(index) == 2
+
+
+def test_stop_scopes_reload_when_stale_or_after_a_sync():
+    calls = []
+    rows = [{"id": "1", "shipment_num": 1, "lat": 41.6, "lon": -93.6, "branch": "20GR"}]
+
+    def load(start, end, branch):
+        calls.append((start, end, branch))
+        return [dict(row) for row in rows]
+
+    spatial = DispatchSpatialIndex(load, SETTINGS)
+    index = spatial.stops(date(2026, 5, 1), date(2026, 5, 2), "20gr")
+    assert len(index) == 1 and len(calls) == 1
+    assert spatial.stops(date(2026, 5, 1), date(2026, 5, 2), "20GR") is index and len(calls) == 1
+
+    rows.append({"id": "2", "shipment_num": None, "lat": 41.7, "lon": -93.7, "branch": "20GR"})
+    spatial.on_change("local", None)  # local writes don't touch ERP stops
+    spatial.on_change("sync", {"40CV"})
+    assert len(spatial.stops(date(2026, 5, 1), date(2026, 5, 2), "20GR")) == 1
+    spatial.on_change("sync", {"20GR"})
+    assert len(spatial.stops(date(2026, 5, 1), date(2026, 5, 2), "20GR")) == 2
+    assert spatial.stats["last_stop_sync"]["added"] == 1 and spatial.stats["last_stop_sync"]["unchanged"] == 1
+
+    # A failed reload keeps serving the previous load.
+    def broken(*_args):
+        raise RuntimeError("mirror down")
+
+    spatial.load_stops = broken
+    spatial.on_change("sync", None)
+    assert len(spatial.stops(date(2026, 5, 1), date(2026, 5, 2), "20GR")) == 2
+    assert spatial.stats["stop_load_errors"] == 1
+
+
+def test_vehicle_sync_skips_a_repeated_snapshot():
+    spatial = DispatchSpatialIndex(lambda *_args: [], SETTINGS)
+    vehicles = [{"id": "v1", "lat": 41.6, "lon": -93.6}, {"id": "v2", "lat": None, "lon": None}]
+    assert spatial.sync_vehicles(vehicles, version="t1")["added"] == 1
+    assert spatial.sync_vehicles(vehicles, version="t1") is None
+    assert spatial.sync_vehicles([{"id": "v1", "lat": 41.8, "lon": -93.6}], version="t2")["moved"] == 1
+
+
+def test_viewport_and_nearby_endpoints(monkeypatch, tmp_path):
+    import app.auth
+    from app.Routes.dispatch import api as dispatch_api
+    from app.Routes.dispatch import dispatch_bp
+    from app.Routes.dispatch import stops as dispatch_stops
+
+    stops = [
+        {"id": "100", "shipment_num": 1, "lat": 41.60, "lon": -93.60, "branch": "20GR", "expected_date": "2026-05-01"},
+        {"id": "101", "shipment_num": 1, "lat": 41.62, "lon": -93.62, "branch": "20GR", "expected_date": "2026-05-01"},
+        {"id": "102", "shipment_num": 1, "lat": 41.90, "lon": -93.10, "branch": "20GR", "expected_date": "2026-05-01"},
+    ]
+    spatial = DispatchSpatialIndex(lambda *_args: [dict(stop) for stop in stops], SETTINGS)
+    vehicles = {"vehicles": [{"id": "v1", "branch": "20GR", "lat": 41.61, "lon": -93.61},
+                             {"id": "v2", "branch": "25BW", "lat": 41.89, "lon": -93.11}],
+                "fetched_at": "2026-05-01T12:00:00Z", "source": "samsara"}
+    monkeypatch.setattr(app.auth, "is_authenticated", lambda: True)
+    monkeypatch.setattr(dispatch_stops, "get_spatial_index", lambda: spatial)
+    monkeypatch.setattr(dispatch_api, "get_spatial_index", lambda: spatial)
+    monkeypatch.setattr(dispatch_api.samsara_service, "get_dispatch_vehicle_payload", lambda **_kw: vehicles)
+
+    flask_app = Flask(__name__)
+    flask_app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'app.db'}"
+    db.init_app(flask_app)
+    flask_app.register_blueprint(dispatch_bp)
+    with flask_app.app_context():
+        db.metadata.create_all(db.engine, tables=[DispatchRoute.__table__, DispatchRouteStop.__table__])
+        route = DispatchRoute(route_date=date(2026, 5, 1), route_name="North", branch_code="20GR")
+        route.stops.append(DispatchRouteStop(so_id="101", sequence=1))
+        db.session.add(route)
+        db.session.commit()
+
+    client = flask_app.test_client()
+    window = "start=2026-05-01&end=2026-05-01&branch=20GR"
+
+    body = client.get(f"/dispatch/api/stops/viewport?bbox=41.5,-93.7,41.7,-93.5&{window}").get_json()
+    assert [s["id"] for s in body["stops"]] == ["100", "101"] and body["in_scope"] == 3
+    assert [s["route_assigned"] for s in body["stops"]] == [False, True]
+    body = client.get(f"/dispatch/api/stops/viewport?bbox=41.5,-93.7,41.7,-93.5&unassigned=1&{window}").get_json()
+    assert [s["id"] for s in body["stops"]] == ["100"]
+    assert client.get("/dispatch/api/stops/viewport?bbox=1,2,3").status_code == 400
+
+    # Unassigned stops within 10 miles of truck v1.
+    body = client.get(f"/dispatch/api/spatial/stops?near_vehicle=v1&radius_miles=10&unassigned=1&{window}").get_json()
+    assert [s["id"] for s in body["results"]] == ["100"]
+    assert body["results"][0]["distance_miles"] < 1
+
+    # Closest truck to stop 102, and the closest 20GR truck.
+    body = client.get(f"/dispatch/api/spatial/vehicles?near_stop=102&k=1&start=2026-05-01&end=2026-05-01").get_json()
+    assert [v["id"] for v in body["results"]] == ["v2"]
+    body = client.get(f"/dispatch/api/spatial/vehicles?near_stop=102&k=1&{window}").get_json()
+    assert [v["id"] for v in body["results"]] == ["v1"]
+
+    assert client.get("/dispatch/api/spatial/vehicles?near_vehicle=nope").status_code == 404
+    assert client.get("/dispatch/api/spatial/stats").get_json()["vehicles"] == 2
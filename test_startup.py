@@ -0,0 +1,94 @@
+import json
+import os
+import subprocess
+import sys
+
+from sqlalchemy import create_engine, text
+
+from app.startup import migration_heads, schema_is_current
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+MIGRATIONS = os.path.join(ROOT, "migrations")
+
+
+def test_migration_heads_match_alembic_and_are_cached(tmp_path):
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    config = Config()
+    config.set_main_option("script_location", MIGRATIONS)
+    cache = tmp_path / "heads.json"
+    assert migration_heads(MIGRATIONS, str(cache)) == sorted(ScriptDirectory.from_config(config).get_heads())
+
+    # Same scripts on disk: the cached answer is used as-is.
+    cached = json.loads(cache.read_text())
+    cache.write_text(json.dumps({**cached, "heads": ["cached"]}))
+    assert migration_heads(MIGRATIONS, str(cache)) == ["cached"]
+
+
+def test_schema_is_current_compares_alembic_version(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    assert not schema_is_current(engine, MIGRATIONS)  # no alembic_version yet
+
+    (head,) = migration_heads(MIGRATIONS)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) PRIMARY KEY)"))
+        conn.execute(text("INSERT INTO alembic_version VALUES ('b1c2d3e4f5a6')"))
+    assert not schema_is_current(engine, MIGRATIONS)
+
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE alembic_version SET version_num = :head"), {"head": head})
+    assert schema_is_current(engine, MIGRATIONS)
+
+
+def test_current_schema_boots_without_alembic_or_deferred_services(tmp_path):
+    db_path = tmp_path / "app.db"
+    engine = create_engine(f"sqlite:///{db_path}")
+    (head,) = migration_heads(MIGRATIONS)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) PRIMARY KEY)"))
+        conn.execute(text("INSERT INTO alembic_version VALUES (:head)"), {"head": head})
+
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "RUN_MIGRATIONS_ON_START": "true",
+        "MIGRATION_HEADS_CACHE": str(tmp_path / "heads.json"),
+        "SAMSARA_POLLER_ENABLED": "false",
+        "SO_ATTRIBUTE_INDEX_ENABLED": "false",
+    }
+    probe = (
+        "import sys; from app import create_app; app = create_app(); "
+        "print(sorted(m for m in ('alembic', 'flask_migrate', 'boto3', 'reportlab', 'qrcode', 'msal', "
+        "'rapidfuzz', 'numpy') if m in sys.modules)); "
+        "result = app.test_cli_runner().invoke(args=['db', 'current']); "
+        "print(result.exit_code, result.output.strip().splitlines()[-1])"
+    )
+    proc = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, env=env, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr
+    # `flask db` loads Flask-Migrate on first use, and its group callback still runs.
+    assert proc.stdout.splitlines()[-2:] == ["[]", f"0 {head} (head)"]
+
+
+def test_background_threads_start_from_the_gunicorn_worker_hook_only(tmp_path):
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{tmp_path / 'app.db'}",
+        "CENTRAL_DB_URL": f"sqlite:///{tmp_path / 'mirror.db'}",
+        "RUN_MIGRATIONS_ON_START": "false",
+        "SO_ATTRIBUTE_INDEX_ENABLED": "true",
+        "SAMSARA_API_TOKEN": "test-token",
+        "SAMSARA_BASE_URL": "http://127.0.0.1:9",
+        "SAMSARA_POLLER_ENABLED": "true",
+        "SAMSARA_SNAPSHOT_PATH": str(tmp_path / "locations.json"),
+    }
+    probe = (
+        "import runpy, threading; from app import create_app; create_app(); "
+        "names = lambda: sorted(t.name for t in threading.enumerate() if t.name != 'MainThread'); "
+        "print(names()); "
+        "runpy.run_path('gunicorn.conf.py')['post_worker_init'](None); "
+        "print(names())"
+    )
+    proc = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, env=env, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.splitlines()[-2:] == ["[]", "['samsara-poller', 'so-attribute-index']"]
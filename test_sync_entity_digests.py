@@ -0,0 +1,107 @@
+import json
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.erp_mirror import EntityDigestIndex
+from sync_erp import LocalSync
+
+
+def _pick(so, branch, code="A", seq=1, qty=1.0):
+    return {"so_number": so, "sequence": seq, "handling_code": code, "qty": qty, "system_id": branch}
+
+
+def _payload(picks, work_orders=(), kpis=()):
+    return {"picks": list(picks), "work_orders": list(work_orders), "kpis": list(kpis)}
+
+
+def test_first_cycle_adds_every_entity_and_repeat_cycle_is_empty():
+    index = EntityDigestIndex()
+    data = _payload([_pick("1", "20GR"), _pick("1", "20GR", seq=2), _pick("2", "25BW")], [{"wo_id": 7}])
+    delta = index.diff(data)
+    assert sorted(delta.added["picks"]) == [("20GR", "1"), ("25BW", "2")]
+    assert delta.branches("picks") == {"20GR", "25BW"}
+    index.commit(delta)
+
+    again = index.diff(_payload([_pick("1", "20GR"), _pick("1", "20GR", seq=2), _pick("2", "25BW")], [{"wo_id": 7}]))
+    assert again.is_empty
+    assert again.fingerprint == index.fingerprint
+
+
+def test_line_change_and_removal_only_touch_their_branches():
+    index = EntityDigestIndex()
+    index.commit(index.diff(_payload([_pick("1", "20GR"), _pick("2", "25BW"), _pick("3", "10FD")])))
+
+    delta = index.diff(_payload([_pick("1", "20GR", qty=5.0), _pick("2", "25BW")]))
+    assert delta.changed["picks"] == [("20GR", "1")]
+    assert delta.removed["picks"] == [("10FD", "3")]
+    assert delta.branches("picks") == {"20GR", "10FD"}
+    assert delta.summary()["picks"] == {"added": 0, "changed": 1, "removed": 1}
+
+
+def test_uncommitted_delta_is_reported_again():
+    index = EntityDigestIndex()
+    index.commit(index.diff(_payload([_pick("1", "20GR")])))
+    data = _payload([_pick("1", "20GR", code="B")])
+    assert index.diff(data).changed["picks"] == [("20GR", "1")]
+    assert index.diff(data).changed["picks"] == [("20GR", "1")]
+
+
+def _syncer(tmp_path, statuses):
+    engine = create_engine(f"sqlite:///{tmp_path / 'stats.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE dashboard_stats (system_id TEXT PRIMARY KEY, open_picks INTEGER, "
+            "handling_breakdown_json TEXT, open_work_orders INTEGER, updated_at TIMESTAMP, "
+            "stats_version INTEGER NOT NULL DEFAULT 0)"
+        ))
+    syncer = LocalSync.__new__(LocalSync)
+    syncer.db_session = sessionmaker(bind=engine)()
+    syncer.digests = EntityDigestIndex()
+    syncer.change_monitoring = True
+    syncer.scheduler = None
+    syncer.last_payload_hash = None
+    syncer.last_change_token = None
+    syncer.worker_name = "test"
+    syncer.worker_mode = "pi"
+    syncer.sync_interval = 5
+    syncer.record_status = statuses.append
+    return engine, syncer
+
+
+def test_push_updates_only_affected_branches(tmp_path):
+    engine, syncer = _syncer(tmp_path, [])
+    syncer.push_to_cloud(_payload([_pick("1", "20GR"), _pick("2", "25BW")]))
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE dashboard_stats SET open_picks = 99 WHERE system_id = '25BW'"))
+
+    status = syncer.push_to_cloud(_payload([_pick("1", "20GR", code="B")]))
+    assert status["delta"]["picks"] == {"added": 0, "changed": 1, "removed": 1}
+    with engine.connect() as conn:
+        rows = dict(conn.execute(text("SELECT system_id, open_picks FROM dashboard_stats")).fetchall())
+        breakdown = conn.execute(
+            text("SELECT handling_breakdown_json FROM dashboard_stats WHERE system_id = '20GR'")
+        ).scalar()
+    assert rows == {"20GR": 1, "25BW": 0}
+    assert json.loads(breakdown) == {"B": 1}
+
+    assert syncer.push_to_cloud(_payload([_pick("1", "20GR", code="B")]))["status"] == "noop"
+
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE dashboard_stats SET updated_at = '2026-01-01 00:00:00'"))
+    assert syncer.push_to_cloud(_payload([_pick("1", "20GR", code="B")]))["status"] == "noop"
+    with engine.connect() as conn:
+        stamps = conn.execute(text("SELECT DISTINCT updated_at FROM dashboard_stats")).scalars().all()
+    assert len(stamps) == 1 and not stamps[0].startswith("2026-01-01")
+
+
+def test_failed_stats_write_is_recorded_and_retried(tmp_path):
+    statuses = []
+    engine, syncer = _syncer(tmp_path, statuses)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE dashboard_stats"))
+
+    status = syncer.push_to_cloud(_payload([_pick("1", "20GR")]))
+    assert (status["status"], status["last_push_reason"]) == ("error", "push_failed")
+    assert syncer.digests.diff(_payload([_pick("1", "20GR")])).branches("picks") == {"20GR"}
+    assert syncer.push_to_cloud(_payload([_pick("1", "20GR")]))["status"] == "error"
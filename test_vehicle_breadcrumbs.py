@@ -0,0 +1,118 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, func, select, text
+
+from app.Services.vehicle_breadcrumbs import BREADCRUMBS, BreadcrumbStore, record_vehicle_breadcrumbs
+
+SETTINGS = {
+    "enabled": True, "retention_days": 90, "downsample_after_days": 7, "downsample_seconds": 60,
+    "instant_lookback_minutes": 10,
+}
+T0 = datetime(2026, 3, 2, 14, 0, 0)
+
+
+def _fix(vehicle_id, at, lat=41.6, lon=-93.7, branch="20GR"):
+    return {"id": vehicle_id, "name": vehicle_id, "branch": branch, "lat": lat, "lon": lon, "heading": 90,
+            "speed": 30.0, "located_at": at.isoformat() + "Z", "address": None, "tags": []}
+
+
+def _store(tmp_path, **settings):
+    engine = create_engine(f"sqlite:///{tmp_path / 'crumbs.db'}")
+    BREADCRUMBS.metadata.create_all(engine, tables=[BREADCRUMBS])
+    return BreadcrumbStore(engine=engine, settings={**SETTINGS, **settings})
+
+
+def _count(store):
+    with store.engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(BREADCRUMBS)).scalar()
+
+
+def test_track_and_positions_at_an_instant(tmp_path):
+    store = _store(tmp_path)
+    for minute in range(0, 30, 5):
+        at = T0 + timedelta(minutes=minute)
+        store.append([_fix("v-1", at, lat=41.6 + minute / 1000), _fix("v-2", at, branch="25BW")])
+    # The poller re-reports an unchanged fix: nothing new is stored.
+    assert store.append([_fix("v-1", T0)]) == 1
+    assert _count(store) == 12
+
+    track = store.track("v-1", T0 + timedelta(minutes=5), T0 + timedelta(minutes=20))
+    assert [p["recorded_at"] for p in track] == ["2026-03-02T14:05:00Z", "2026-03-02T14:10:00Z",
+                                                 "2026-03-02T14:15:00Z"]
+    assert track[0]["lat"] == pytest.approx(41.605)
+
+    at = T0 + timedelta(minutes=12)
+    assert [(p["vehicle_id"], p["recorded_at"]) for p in store.positions_at(at)] == [
+        ("v-1", "2026-03-02T14:10:00Z"), ("v-2", "2026-03-02T14:10:00Z"),
+    ]
+    assert [p["vehicle_id"] for p in store.positions_at(at, branch="25bw")] == ["v-2"]
+    # Nothing within the lookback window: no position.
+    assert store.positions_at(T0 + timedelta(hours=2)) == []
+
+
+def test_old_fixes_are_downsampled_then_expired(tmp_path):
+    store = _store(tmp_path)
+    now = T0 + timedelta(days=8)
+    # Every 15s for five minutes, eight days ago; and one fix today.
+    store.append([_fix("v-1", T0 + timedelta(seconds=15 * n)) for n in range(20)])
+    store.append([_fix("v-1", now - timedelta(minutes=1))])
+
+    assert store.maintain(now)["downsampled"] == 15
+    assert [p["recorded_at"][11:19] for p in store.track("v-1", T0, T0 + timedelta(hours=1))] == [
+        "14:00:00", "14:01:00", "14:02:00", "14:03:00", "14:04:00",
+    ]
+    assert store.maintain(now)["downsampled"] == 0
+    assert len(store.track("v-1", now - timedelta(hours=1), now)) == 1
+
+    result = store.maintain(T0 + timedelta(days=91))
+    assert result["expired"] == 5
+    assert _count(store) == 1
+
+
+def test_downsampling_covers_every_day_past_the_cutoff(tmp_path):
+    store = _store(tmp_path)
+    now = T0 + timedelta(days=30)
+    for days_ago in (25, 12, 8):
+        at = now - timedelta(days=days_ago)
+        store.append([_fix("v-1", at + timedelta(seconds=15 * n)) for n in range(8)])
+
+    assert store.maintain(now)["downsampled"] == 18
+    assert _count(store) == 6
+    # A late fix for an already-thinned day is picked up on the next pass.
+    store.append([_fix("v-1", now - timedelta(days=25) + timedelta(seconds=20))])
+    assert store.maintain(now)["downsampled"] == 1
+
+
+@pytest.mark.skipif(not os.environ.get("TEST_DATABASE_URL", "").startswith("postgresql"),
+                    reason="needs a PostgreSQL TEST_DATABASE_URL")
+def test_partition_created_in_a_failed_append_is_recreated():
+    engine = create_engine(os.environ["TEST_DATABASE_URL"])
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS vehicle_breadcrumbs CASCADE"))
+        conn.execute(text(
+            "CREATE TABLE vehicle_breadcrumbs (vehicle_id VARCHAR(128) NOT NULL, "
+            "recorded_at TIMESTAMP NOT NULL, lat DOUBLE PRECISION NOT NULL, lon DOUBLE PRECISION NOT NULL, "
+            "heading SMALLINT, speed DOUBLE PRECISION, branch_code VARCHAR(32), "
+            "PRIMARY KEY (vehicle_id, recorded_at)) PARTITION BY RANGE (recorded_at)"
+        ))
+    store = BreadcrumbStore(engine=engine, settings=SETTINGS)
+    try:
+        with pytest.raises(Exception):
+            store.append([_fix("v-1", T0, branch="X" * 40)])  # too long for branch_code
+        assert store.append([_fix("v-1", T0)]) == 1
+        assert len(store.track("v-1", T0, T0 + timedelta(minutes=1))) == 1
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS vehicle_breadcrumbs CASCADE"))
+
+
+def test_recording_reads_the_poller_snapshot(tmp_path):
+    class Poller:
+        def snapshot(self):
+            return [_fix("v-1", T0), _fix("v-2", T0), {"id": "v-3", "lat": None, "lon": None}], T0
+
+    store = _store(tmp_path)
+    assert record_vehicle_breadcrumbs(poller=Poller(), store=store) == 2
+    assert _count(store) == 2